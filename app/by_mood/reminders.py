@@ -5,6 +5,9 @@ import logging
 
 from telegram.ext import ContextTypes
 
+from app.dispatcher import REMINDER, in_lane
+from app.leader import leader_only
+from app.metrics import count_message, timed_job
 from data.db import (
     get_users_for_by_mood_reminder,
     mark_by_mood_reminder_sent,
@@ -25,6 +28,8 @@ BY_MOOD_REMINDER_TEXTS = [
 ]
 
 
+@timed_job
+@in_lane(REMINDER)
 async def send_weekly_by_mood_reminders(context: ContextTypes.DEFAULT_TYPE):
     """Шлёт напоминание не чаще раза в 7 дней пользователям By mood без активности 7+ дней."""
     try:
@@ -42,6 +47,7 @@ async def send_weekly_by_mood_reminders(context: ContextTypes.DEFAULT_TYPE):
                     text=text,
                     parse_mode="Markdown",
                 )
+                count_message("reminder")
                 mark_by_mood_reminder_sent(user_id)
                 logger.info(f"Отправлено By mood-напоминание пользователю {user_id}")
             except Exception as e:
@@ -61,7 +67,7 @@ def schedule_by_mood_reminders(application):
             return
 
         job_queue.run_repeating(
-            send_weekly_by_mood_reminders,
+            leader_only(send_weekly_by_mood_reminders),
             interval=60 * 60 * 6,
             first=45,
             name="by_mood_weekly_reminders",
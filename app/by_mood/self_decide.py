@@ -3,6 +3,7 @@
 from telegram import InlineKeyboardButton, InlineKeyboardMarkup, Update
 from telegram.ext import ContextTypes
 
+from app.router import callback_payload
 from data.db import pick_random_by_mood_practice, remove_extra_practices_inline_message
 
 from .send_utils import deliver_by_mood_practice
@@ -102,19 +103,16 @@ async def handle_time_callback(
     update: Update,
     context: ContextTypes.DEFAULT_TYPE,
     *,
-    time_callback_prefix: str = "self_time",
     intensity_callback_prefix: str = "self_intensity",
 ) -> None:
+    """Выбор времени ({prefix}:{time}); поля callback_data разбирает CallbackRouter."""
     query = update.callback_query
     if not query:
         return
     await query.answer()
 
-    data = query.data or ""
-    pfx = f"{time_callback_prefix}:"
-    if not data.startswith(pfx):
-        return
-    time_key = data[len(pfx) :]
+    payload = callback_payload(context)
+    time_key = payload.get("time") if payload else None
     if time_key not in KEY_TO_TIME:
         await query.edit_message_reply_markup(reply_markup=None)
         await query.message.reply_text("Что-то пошло не так. Нажми «Сам решу» ещё раз.")
@@ -129,26 +127,16 @@ async def handle_time_callback(
 async def handle_intensity_callback(
     update: Update,
     context: ContextTypes.DEFAULT_TYPE,
-    *,
-    intensity_callback_prefix: str = "self_intensity",
 ) -> None:
+    """Выбор интенсивности ({prefix}:{time}:{intensity}) и подбор практики."""
     query = update.callback_query
     if not query:
         return
     await query.answer()
 
-    data = query.data or ""
-    pfx = f"{intensity_callback_prefix}:"
-    if not data.startswith(pfx):
-        return
-    rest = data[len(pfx) :]
-    try:
-        time_key, intensity_key = rest.split(":", 1)
-    except ValueError:
-        await query.edit_message_reply_markup(reply_markup=None)
-        await query.message.reply_text("Что-то пошло не так. Нажми «Сам решу» ещё раз.")
-        return
-
+    payload = callback_payload(context) or {}
+    time_key = payload.get("time")
+    intensity_key = payload.get("intensity")
     time_label = KEY_TO_TIME.get(time_key)
     intensity_label = KEY_TO_INTENSITY.get(intensity_key)
     if not time_label or not intensity_label:
@@ -5,9 +5,9 @@ import logging
 from telegram.ext import ContextTypes
 
 from app.keyboards import get_practice_done_keyboard
+from app.metrics import count_message
 from data.db import (
     BY_MOOD_PRACTICE_LOG_DAY,
-    get_last_practice_message_id,
     increment_total_practices,
     log_practice_sent,
     record_by_mood_seen,
@@ -62,15 +62,6 @@ async def deliver_by_mood_practice(
     ) = practice_row
 
     try:
-        last_message_id = get_last_practice_message_id(user_id)
-        if last_message_id is not None:
-            try:
-                await context.bot.edit_message_reply_markup(
-                    chat_id=chat_id, message_id=last_message_id, reply_markup=None
-                )
-            except Exception as edit_err:
-                logger.debug("Не удалось снять кнопку с прошлого сообщения: %s", edit_err)
-
         record_by_mood_seen(user_id, filter_key, practice_id)
 
         text = format_by_mood_practice_message(
@@ -88,6 +79,7 @@ async def deliver_by_mood_practice(
             reply_markup=get_practice_done_keyboard(),
         )
         set_last_practice_message_id(user_id, msg.message_id)
+        count_message("by_mood")
         set_user_blocked(user_id, False)
         increment_total_practices(user_id)
         touch_by_mood_activity(user_id)
@@ -6,6 +6,7 @@ from zoneinfo import ZoneInfo
 
 from telegram.ext import ContextTypes
 
+from app import clock
 from app.config import CHALLENGE_GROUP_CHAT_ID, DEFAULT_TZ
 from app.challenge.messages import (
     CHALLENGE_DURATION,
@@ -19,12 +20,15 @@ from app.challenge.messages import (
     detect_summary_kind,
     get_upcoming_week_day_range,
 )
+from app.dispatcher import DAILY, in_lane
+from app.leader import leader_only
+from app.schedule.triggers import daily_at, schedule_trigger, weekly_at
 from data.db import (
     get_active_challenge_participants,
     get_challenge_completed_in_last_n_days,
     get_group_challenge_day,
     get_group_challenge_start_id,
-    get_yoga_practice_by_challenge_order,
+    get_yoga_practices_by_challenge_range,
     get_yesterday_completed_challenge_user_ids,
     is_challenge_summary_sent_on,
     is_challenge_summary_stopped,
@@ -37,22 +41,32 @@ from data.db import (
 logger = logging.getLogger(__name__)
 MOSCOW_TZ = ZoneInfo(DEFAULT_TZ)
 
+SCHEDULE_WEEKDAY = 6  # воскресенье
+# Сколько после пропущенного (бот был выключен) запуска его ещё можно догнать при старте
+SUMMARY_CATCH_UP = timedelta(hours=3)
+SCHEDULE_CATCH_UP = timedelta(hours=2)
+
 
 def _now_moscow() -> datetime:
-    return datetime.now(MOSCOW_TZ)
+    return clock.now(MOSCOW_TZ)
 
 
 def _is_summary_time(now: datetime) -> bool:
+    """Сводку уже пора отправлять: сегодня наступило SUMMARY_HOUR:SUMMARY_MINUTE МСК.
+
+    Не точное совпадение минуты: задача может прийти чуть позже (догон после рестарта),
+    от дублей защищает is_challenge_summary_sent_on.
+    """
     local = now.astimezone(MOSCOW_TZ)
-    return local.hour == SUMMARY_HOUR and local.minute == SUMMARY_MINUTE
+    return (local.hour, local.minute) >= (SUMMARY_HOUR, SUMMARY_MINUTE)
 
 
 def _is_schedule_time(now: datetime) -> bool:
+    """Воскресенье, и SCHEDULE_HOUR:SCHEDULE_MINUTE МСК уже наступило."""
     local = now.astimezone(MOSCOW_TZ)
     return (
-        local.weekday() == 6
-        and local.hour == SCHEDULE_HOUR
-        and local.minute == SCHEDULE_MINUTE
+        local.weekday() == SCHEDULE_WEEKDAY
+        and (local.hour, local.minute) >= (SCHEDULE_HOUR, SCHEDULE_MINUTE)
     )
 
 
@@ -73,8 +87,9 @@ def _build_completed_map(participants_raw: list[tuple], kind: str) -> dict[int,
 
 def _load_week_practices(challenge_start_id: int, from_day: int, to_day: int) -> list[tuple[int, str, str, int]]:
     practices: list[tuple[int, str, str, int]] = []
+    rows = dict(get_yoga_practices_by_challenge_range(challenge_start_id, from_day, to_day))
     for day in range(from_day, to_day + 1):
-        row = get_yoga_practice_by_challenge_order(challenge_start_id, day)
+        row = rows.get(day)
         if not row:
             logger.warning("Практика для дня %s не найдена (start_id=%s)", day, challenge_start_id)
             continue
@@ -85,6 +100,7 @@ def _load_week_practices(challenge_start_id: int, from_day: int, to_day: int) ->
     return practices
 
 
+@in_lane(DAILY)
 async def send_challenge_group_summary(context: ContextTypes.DEFAULT_TYPE, *, force: bool = False) -> bool:
     """Отправляет утреннюю сводку в групповой чат. force=True — без проверки времени (preview)."""
     if not CHALLENGE_GROUP_CHAT_ID:
@@ -155,6 +171,7 @@ async def send_challenge_group_summary(context: ContextTypes.DEFAULT_TYPE, *, fo
     return True
 
 
+@in_lane(DAILY)
 async def send_challenge_weekly_schedule(context: ContextTypes.DEFAULT_TYPE, *, force: bool = False) -> bool:
     """Отправляет расписание на неделю в групповой чат. force=True — без проверки времени (preview)."""
     if not CHALLENGE_GROUP_CHAT_ID:
@@ -224,17 +241,19 @@ def schedule_challenge_summary(application):
             logger.error("JobQueue недоступен для сводки челленджа")
             return
 
-        job_queue.run_repeating(
-            send_challenge_group_summary,
-            interval=60,
-            first=1,
+        schedule_trigger(
+            job_queue,
+            leader_only(send_challenge_group_summary),
+            daily_at(SUMMARY_HOUR, SUMMARY_MINUTE),
             name="challenge_group_summary",
+            catch_up=SUMMARY_CATCH_UP,
         )
-        job_queue.run_repeating(
-            send_challenge_weekly_schedule,
-            interval=60,
-            first=1,
+        schedule_trigger(
+            job_queue,
+            leader_only(send_challenge_weekly_schedule),
+            weekly_at(SCHEDULE_WEEKDAY, SCHEDULE_HOUR, SCHEDULE_MINUTE),
             name="challenge_weekly_schedule",
+            catch_up=SCHEDULE_CATCH_UP,
         )
         logger.info(
             "Сводка челленджа запланирована на %02d:%02d МСК, расписание — вс %02d:%02d МСК",
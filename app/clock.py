@@ -0,0 +1,46 @@
+"""Текущее время для задач и хендлеров бота.
+
+Всё, что решает «пора ли» (рассылка по notify_time, напоминание в 19:30, сводка челленджа,
+план на день), берёт время через clock.now(tz), а не datetime.now(). По умолчанию это
+системные часы; симуляция (tools/simulate_day.py) подставляет VirtualClock через set_clock(),
+и задачи вместе с хранилищем в памяти (data/memory_db.py) видят одно и то же виртуальное «сейчас».
+
+PostgreSQL считает NOW() сам, поэтому виртуальное время имеет смысл только с STORAGE_BACKEND=memory.
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Callable, Optional
+
+# Источник времени: функция без аргументов, возвращающая aware datetime; None — системные часы
+_source: Optional[Callable[[], datetime]] = None
+
+
+def now(tz=timezone.utc) -> datetime:
+    """Текущий момент в таймзоне tz (aware)."""
+    if _source is None:
+        return datetime.now(tz)
+    return _source().astimezone(tz)
+
+
+def set_clock(source: Optional[Callable[[], datetime]]) -> None:
+    """Подменяет источник времени (None — вернуть системные часы)."""
+    global _source
+    _source = source
+
+
+class VirtualClock:
+    """Часы, которые идут только по команде: set() и advance()."""
+
+    def __init__(self, start: datetime):
+        if start.tzinfo is None:
+            raise ValueError("VirtualClock ждёт aware datetime")
+        self._now = start.astimezone(timezone.utc)
+
+    def __call__(self) -> datetime:
+        return self._now
+
+    def set(self, moment: datetime) -> None:
+        self._now = moment.astimezone(timezone.utc)
+
+    def advance(self, delta: timedelta) -> None:
+        self._now += delta
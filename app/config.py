@@ -10,9 +10,88 @@ load_dotenv(env_file)
 # Обязательные/основные переменные
 BOT_TOKEN: str = os.getenv("BOT_TOKEN", "")
 DEFAULT_TZ: str = os.getenv("DEFAULT_TZ", "Europe/Moscow")
-LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO")
+LOG_LEVEL: str = os.getenv("LOG_LEVEL", "INFO").strip().upper()
+# Формат логов (app/logging_setup.py): text — как раньше, строкой; json — объект на строку для сборщика логов
+LOG_FORMAT: str = os.getenv("LOG_FORMAT", "text").strip().lower()
+# Доля записей ниже WARNING, которые пишутся, по логгерам: "httpx=0,data.postgres_db=0.1".
+# Предупреждения и ошибки не сэмплируются. httpx=0 по умолчанию: строка на каждый запрос к Bot API
+# (с токеном в URL).
+LOG_SAMPLING: str = os.getenv("LOG_SAMPLING", "httpx=0")
 CHALLENGE_GROUP_CHAT_ID: str = os.getenv("CHALLENGE_GROUP_CHAT_ID", "")
 
+# Сколько месяцев practice_logs держим «горячими» (остальное сворачивается в агрегаты).
+# Меньше 2 не бывает: сводкам челленджа нужны последние 28 дней логов.
+PRACTICE_LOGS_HOT_MONTHS: int = max(2, int(os.getenv("PRACTICE_LOGS_HOT_MONTHS", "3")))
+
+# Хранилище данных (data/db.py): postgres — рабочий режим; memory — всё в памяти процесса
+# (data/memory_db.py) для офлайн-симуляций и бенчмарков, без PostgreSQL и без сохранения данных
+STORAGE_BACKEND: str = os.getenv("STORAGE_BACKEND", "postgres").strip().lower()
+
+# Инструментация слоя БД (data/instrumentation.py): счётчики по функциям и лог медленных запросов
+DB_METRICS_ENABLED: bool = os.getenv("DB_METRICS_ENABLED", "1").strip().lower() not in ("0", "false", "no", "off")
+DB_SLOW_QUERY_MS: float = float(os.getenv("DB_SLOW_QUERY_MS", "200"))
+# При старте бота догонять схему БД миграциями (data/migrations). 0 — только проверить версию,
+# миграции запускаются отдельно: python -m data.migrate
+DB_AUTO_MIGRATE: bool = os.getenv("DB_AUTO_MIGRATE", "1").strip().lower() not in ("0", "false", "no", "off")
+
+# Подробный профиль старта в логе (app/startup_profile.py): самые долгие импорты модулей.
+# Итог по фазам старта пишется всегда.
+STARTUP_PROFILE: bool = os.getenv("STARTUP_PROFILE", "0").strip().lower() not in ("0", "false", "no", "off")
+
+# HTTP-эндпоинт метрик Prometheus (app/metrics.py): 0 или пусто — выключен
+METRICS_PORT: int = int(os.getenv("METRICS_PORT", "0") or 0)
+METRICS_HOST: str = os.getenv("METRICS_HOST", "127.0.0.1")
+
+# Монитор цикла событий (app/loop_monitor.py): задержка цикла и стек кода, который блокирует его
+# дольше порога (синхронные запросы к БД, yt_dlp внутри хендлеров)
+LOOP_MONITOR_ENABLED: bool = os.getenv("LOOP_MONITOR_ENABLED", "1").strip().lower() not in ("0", "false", "no", "off")
+LOOP_STALL_THRESHOLD_MS: float = float(os.getenv("LOOP_STALL_THRESHOLD_MS", "250"))
+
+# Трассировка (app/tracing.py): спаны апдейтов и джобов, функций БД и запросов Bot API.
+# Включается файлом (JSON Lines в формате OTLP) и/или OTLP/HTTP-коллектором (http://host:4318);
+# оба пустые — выключена.
+TRACE_FILE: str = os.getenv("TRACE_FILE", "").strip()
+TRACE_OTLP_ENDPOINT: str = os.getenv("TRACE_OTLP_ENDPOINT", "").strip()
+# Доля трасс, сохраняемых заранее; трассы дольше TRACE_SLOW_MS и с ошибками сохраняются всегда
+TRACE_SAMPLE_RATE: float = float(os.getenv("TRACE_SAMPLE_RATE", "0.01"))
+TRACE_SLOW_MS: float = float(os.getenv("TRACE_SLOW_MS", "1000"))
+
+# Общий бюджет исходящих сообщений Bot API на процесс (app/dispatcher.py): ~30/с разрешает Telegram.
+# 0 — без ограничения.
+OUTBOUND_RATE_PER_SECOND: float = float(os.getenv("OUTBOUND_RATE_PER_SECOND", "25"))
+OUTBOUND_BURST: int = int(os.getenv("OUTBOUND_BURST", "25"))
+# Общий для всех процессов с этим токеном лимит в PostgreSQL (data/rate_limit.py): бот, реплики и
+# скрипты из tools/ делят один бюджет. Вес бота при делении скорости со скриптами (у скриптов — 1).
+# Нужен PostgreSQL: при STORAGE_BACKEND=memory выключен.
+SHARED_RATE_LIMIT_ENABLED: bool = (
+    os.getenv("SHARED_RATE_LIMIT_ENABLED", "1").strip().lower() not in ("0", "false", "no", "off")
+    and STORAGE_BACKEND == "postgres"
+)
+SHARED_RATE_LIMIT_WEIGHT: float = float(os.getenv("SHARED_RATE_LIMIT_WEIGHT", "3"))
+
+# Выбор лидера среди реплик (app/leader.py): фоновые задачи рассылок выполняет только лидер.
+# LEADER_LOCK_ID — ключ advisory-lock; разный для окружений, которые делят одну БД.
+# При STORAGE_BACKEND=memory выключен: процесс один, и он всегда лидер.
+LEADER_ELECTION_ENABLED: bool = (
+    os.getenv("LEADER_ELECTION_ENABLED", "1").strip().lower() not in ("0", "false", "no", "off")
+    and STORAGE_BACKEND == "postgres"
+)
+LEADER_LOCK_ID: int = int(os.getenv("LEADER_LOCK_ID", "1500473185"))
+LEADER_HEARTBEAT_SECONDS: float = float(os.getenv("LEADER_HEARTBEAT_SECONDS", "5"))
+
+# Приём обновлений через вебхук (нужен для нескольких реплик: getUpdates допускает одного клиента).
+# Пусто — long polling, как раньше.
+WEBHOOK_URL: str = os.getenv("WEBHOOK_URL", "").strip()
+WEBHOOK_LISTEN: str = os.getenv("WEBHOOK_LISTEN", "0.0.0.0")
+WEBHOOK_PORT: int = int(os.getenv("WEBHOOK_PORT", "8443"))
+WEBHOOK_SECRET: str = os.getenv("WEBHOOK_SECRET", "")
+
+# Запись входящих апдейтов для воспроизведения нагрузки (app/update_recorder.py, tools/replay_updates.py):
+# путь к файлу .jsonl.gz, пусто — запись выключена. Имена, тексты и id обезличиваются до записи.
+# UPDATE_RECORD_SALT — соль псевдонимов id: пусто — новая на каждый запуск процесса.
+UPDATE_RECORD_PATH: str = os.getenv("UPDATE_RECORD_PATH", "").strip()
+UPDATE_RECORD_SALT: str = os.getenv("UPDATE_RECORD_SALT", "")
+
 
 def get_database_url() -> str:
     """Строка подключения PostgreSQL, если задана DATABASE_URL."""
@@ -17,6 +17,7 @@ from app.by_mood.self_decide import time_keyboard
 from app.by_mood.self_decide import handle_intensity_callback as self_handle_intensity
 from app.by_mood.self_decide import handle_time_callback as self_handle_time
 from app.by_mood.send_utils import deliver_by_mood_practice
+from app.router import callback_payload
 from data.db import (
     append_extra_practices_inline_message,
     get_user_bot_mode,
@@ -156,10 +157,8 @@ async def handle_extra_mood_callback(update: Update, context: ContextTypes.DEFAU
         await query.message.reply_text(_STALE_EXTRA_MSG)
         return
 
-    data = query.data or ""
-    if not data.startswith(EXTRA_MOOD_PREFIX):
-        return
-    slug = data[len(EXTRA_MOOD_PREFIX) :]
+    payload = callback_payload(context)
+    slug = payload.get("slug") if payload else None
 
     if slug == "self_start":
         msg = await query.message.reply_text(
@@ -202,7 +201,6 @@ async def handle_extra_self_time_callback(update: Update, context: ContextTypes.
     await self_handle_time(
         update,
         context,
-        time_callback_prefix=EXTRA_SELF_TIME_PREFIX,
         intensity_callback_prefix=EXTRA_SELF_INTENSITY_PREFIX,
     )
 
@@ -222,6 +220,4 @@ async def handle_extra_self_intensity_callback(
                 )
             await query.message.reply_text(_STALE_EXTRA_MSG)
         return
-    await self_handle_intensity(
-        update, context, intensity_callback_prefix=EXTRA_SELF_INTENSITY_PREFIX
-    )
+    await self_handle_intensity(update, context)
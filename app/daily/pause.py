@@ -4,6 +4,9 @@ import logging
 from telegram import Update
 from telegram.ext import ContextTypes
 
+from app.dispatcher import REMINDER, in_lane
+from app.leader import leader_only
+from app.metrics import count_message, timed_job
 from data.db import (
     get_user_notify_time,
     toggle_user_pause,
@@ -73,6 +76,8 @@ async def pause_toggle_command(update: Update, context: ContextTypes.DEFAULT_TYP
     logger.info(f"Пользователь {user_id} возобновил рассылку")
 
 
+@timed_job
+@in_lane(REMINDER)
 async def send_weekly_pause_reminders(context: ContextTypes.DEFAULT_TYPE):
     """Отправляет пользователям в паузе напоминание не чаще 1 раза в 7 дней."""
     try:
@@ -88,6 +93,7 @@ async def send_weekly_pause_reminders(context: ContextTypes.DEFAULT_TYPE):
                     text=text,
                     parse_mode='Markdown'
                 )
+                count_message("reminder")
                 mark_pause_reminder_sent(user_id)
                 logger.info(f"Отправлено напоминание о паузе пользователю {user_id}")
             except Exception as e:
@@ -105,7 +111,7 @@ def schedule_pause_reminders(application):
             return
 
         job_queue.run_repeating(
-            send_weekly_pause_reminders,
+            leader_only(send_weekly_pause_reminders),
             interval=60 * 60 * 6,  # каждые 6 часов
             first=30,
             name="pause_weekly_reminders"
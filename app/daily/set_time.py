@@ -1,16 +1,20 @@
 """Handlers for selecting and saving preferred delivery time."""
 
+import logging
 import re
-from datetime import datetime, timedelta
+from datetime import timedelta
 from zoneinfo import ZoneInfo
 
 from telegram import Update
 from telegram.ext import ContextTypes
 
+from app import clock
 from app.config import DEFAULT_TZ
 from app.schedule.scheduler import send_practice_to_user
 from data.db import get_current_weekday, get_user_notify_time
 
+logger = logging.getLogger(__name__)
+
 
 MOSCOW_TZ = ZoneInfo(DEFAULT_TZ)
 
@@ -61,9 +65,6 @@ async def handle_set_time_callback(update: Update, context: ContextTypes.DEFAULT
         update: Объект обновления от Telegram
         context: Контекст бота
     """
-    print(f"=== DEBUG: handle_set_time_callback вызвана ===")
-    print(f"User data до изменений: {context.user_data}")
-    
     # Отвечаем на callback query если это inline кнопка
     if hasattr(update, 'callback_query') and update.callback_query:
         await update.callback_query.answer()
@@ -75,8 +76,6 @@ async def handle_set_time_callback(update: Update, context: ContextTypes.DEFAULT
     context.user_data['waiting_for_time'] = True
     # Устанавливаем флаг, что это изменение времени, а не онбординг
     context.user_data['is_time_change'] = True
-    print(f"=== DEBUG: Установлено состояние waiting_for_time = True и is_time_change = True ===")
-    print(f"User data после изменений: {context.user_data}")
     
     # Получаем chat_id
     chat_id = update.effective_chat.id
@@ -104,18 +103,12 @@ async def handle_time_change_input(update: Update, context: ContextTypes.DEFAULT
         update: Объект обновления от Telegram
         context: Контекст бота
     """
-    print(f"=== DEBUG: handle_time_change_input вызвана ===")
-    print(f"User data: {context.user_data}")
-    print(f"Waiting for time: {context.user_data.get('waiting_for_time')}")
-    
     # Проверяем, что пользователь в состоянии ожидания ввода времени
     if not context.user_data.get('waiting_for_time'):
-        print("=== DEBUG: Пользователь не в состоянии ожидания времени ===")
         return
     
     # Получаем введенное время
     time_input = update.message.text
-    print(f"=== DEBUG: Введенное время: '{time_input}' ===")
     
     # Валидируем формат времени
     is_valid, result = validate_time_format(time_input)
@@ -154,7 +147,7 @@ async def handle_time_change_input(update: Update, context: ContextTypes.DEFAULT
     )
 
     if not save_success:
-        print(f"Ошибка сохранения времени пользователя {user_id} в БД")
+        logger.error(f"Ошибка сохранения времени пользователя {user_id} в БД")
 
     # Если пользователь изменил время ДО того, как должна была прийти сегодняшняя практика,
     # гарантируем, что она всё равно придёт по старому времени один раз.
@@ -166,7 +159,7 @@ async def handle_time_change_input(update: Update, context: ContextTypes.DEFAULT
             and hasattr(context, "job_queue")
             and context.job_queue is not None
         ):
-            now = datetime.now(MOSCOW_TZ)
+            now = clock.now(MOSCOW_TZ)
 
             try:
                 old_hour, old_minute = map(int, old_notify_time.split(":"))
@@ -199,7 +192,7 @@ async def handle_time_change_input(update: Update, context: ContextTypes.DEFAULT
                         name=f"today_practice_{user_id}_{old_notify_time.replace(':', '')}",
                     )
     except Exception as e:
-        print(f"=== DEBUG: Ошибка при планировании сегодняшней практики по старому времени для user_id={user_id}: {e} ===")
+        logger.error(f"Ошибка при планировании сегодняшней практики по старому времени для user_id={user_id}: {e}")
 
     # Сообщение для изменения времени
     success_text = (
@@ -13,8 +13,6 @@ async def handle_tips_callback(update: Update, context: ContextTypes.DEFAULT_TYP
         update: Объект обновления от Telegram
         context: Контекст бота
     """
-    print("=== handle_tips_callback вызван ===")
-    
     # Отвечаем на callback query если это inline кнопка
     if hasattr(update, 'callback_query') and update.callback_query:
         await update.callback_query.answer()
@@ -25,7 +23,6 @@ async def handle_tips_callback(update: Update, context: ContextTypes.DEFAULT_TYP
     
     # Получаем chat_id
     chat_id = update.effective_chat.id
-    print(f"Chat ID: {chat_id}")
     
     # Рекомендации по использованию бота
     recommendations_text = (
@@ -0,0 +1,300 @@
+"""Центральный диспетчер исходящих запросов к Bot API: полосы приоритета и общий бюджет.
+
+Все запросы бота проходят через PrioritizedRequest (HTTP-слой PTB), поэтому ограничение
+действует и на хендлеры, и на джобы, и на воркеры outbox — без правок в местах отправки.
+
+Полосы (меньше — важнее):
+- interactive — ответы на действия пользователя (по умолчанию для всего, что не размечено);
+- daily — плановая практика дня, бонусы, сводки челленджа;
+- reminder — напоминания (пауза, By mood, «Я сделал», онбординг);
+- broadcast — массовая рассылка админа;
+- cleanup — отложенное снятие старых кнопок (app/keyboard_cleanup.py).
+
+Полоса задаётся контекстом: `with outbound_lane("reminder"): ...` или декоратором
+`@in_lane("reminder")` на callback джоба. Контекст копируется в задачи asyncio, поэтому
+разметка действует на всё, что запущено внутри.
+
+Бюджет — token bucket на OUTBOUND_RATE_PER_SECOND сообщений в секунду (запас до лимита
+Telegram ~30/с). Пока токены есть и никто не ждёт, запрос идёт сразу. Иначе он встаёт в очередь
+своей полосы, а освободившийся токен получает ожидающий с наименьшим
+«приоритет − ожидание / LANE_AGING_SECONDS»: интерактив всегда впереди, но рассылка, прождавшая
+достаточно долго, всё равно получит свою долю (защита от голодания).
+
+Бюджет расходуют только методы, которые Telegram ограничивает как сообщения (send*, edit*,
+copy/forward/delete); answerCallbackQuery, getUpdates и служебные вызовы идут без очереди.
+
+Локальный бюджет — на процесс. Получивший токен запрос дополнительно берёт токен общего
+для всех процессов с этим BOT_TOKEN ведра в PostgreSQL (data/rate_limit.py,
+SHARED_RATE_LIMIT_ENABLED): так реплики бота и рассылки из tools/ не превышают лимит Telegram
+вместе. Ответ 429 останавливает и локальную очередь, и общее ведро на retry_after.
+"""
+
+import asyncio
+import contextlib
+import contextvars
+import functools
+import json
+import logging
+import time
+from collections import deque
+
+from app.config import (
+    BOT_TOKEN,
+    OUTBOUND_BURST,
+    OUTBOUND_RATE_PER_SECOND,
+    SHARED_RATE_LIMIT_ENABLED,
+    SHARED_RATE_LIMIT_WEIGHT,
+)
+from app.metrics import REGISTRY, InstrumentedRequest
+from app.tracing import KIND_CLIENT, start_span
+from data.rate_limit import SharedRateLimiter, bucket_for_token, default_client_id, parse_retry_after
+
+logger = logging.getLogger(__name__)
+
+INTERACTIVE = "interactive"
+DAILY = "daily"
+REMINDER = "reminder"
+BROADCAST = "broadcast"
+CLEANUP = "cleanup"
+
+# Базовый приоритет полосы: меньше — раньше
+LANE_PRIORITY = {INTERACTIVE: 0, DAILY: 1, REMINDER: 2, BROADCAST: 3, CLEANUP: 4}
+# За сколько секунд ожидания полоса «поднимается» на один уровень приоритета
+LANE_AGING_SECONDS = 10.0
+
+_THROTTLED_PREFIXES = ("send", "edit", "copy", "forward", "delete")
+
+OUTBOUND_QUEUE_DEPTH = REGISTRY.gauge(
+    "yogabot_outbound_queue_depth", "Запросы к Bot API, ждущие токена, по полосам", ("lane",)
+)
+OUTBOUND_WAIT_SECONDS = REGISTRY.histogram(
+    "yogabot_outbound_wait_seconds", "Ожидание токена перед запросом к Bot API", ("lane",)
+)
+OUTBOUND_REQUESTS = REGISTRY.counter(
+    "yogabot_outbound_requests_total", "Запросы к Bot API, прошедшие через бюджет, по полосам", ("lane",)
+)
+SHARED_RATE_WAIT_SECONDS = REGISTRY.histogram(
+    "yogabot_shared_rate_wait_seconds", "Ожидание токена общего (межпроцессного) лимита Bot API"
+)
+TELEGRAM_THROTTLED = REGISTRY.counter(
+    "yogabot_telegram_throttled_total", "Ответы 429 Too Many Requests от Bot API"
+)
+
+_current_lane: contextvars.ContextVar = contextvars.ContextVar("outbound_lane", default=INTERACTIVE)
+
+
+def current_lane() -> str:
+    return _current_lane.get()
+
+
+@contextlib.contextmanager
+def outbound_lane(lane: str):
+    """Все запросы к Bot API внутри блока идут по полосе lane."""
+    if lane not in LANE_PRIORITY:
+        raise ValueError(f"Неизвестная полоса {lane}")
+    token = _current_lane.set(lane)
+    try:
+        yield
+    finally:
+        _current_lane.reset(token)
+
+
+def in_lane(lane: str):
+    """Декоратор async-функции (обычно callback'а джоба): её запросы идут по полосе lane."""
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with outbound_lane(lane):
+                return await func(*args, **kwargs)
+
+        return wrapper
+
+    return decorator
+
+
+class OutboundDispatcher:
+    """Token bucket с очередями по полосам. Работает только в потоке event loop."""
+
+    def __init__(self, rate: float, burst: int, aging_seconds: float = LANE_AGING_SECONDS):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.aging_seconds = aging_seconds
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._waiters = {lane: deque() for lane in LANE_PRIORITY}
+        self._timer = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.rate > 0
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def _has_waiters(self) -> bool:
+        return any(self._waiters.values())
+
+    def penalize(self, seconds: float) -> None:
+        """После 429: новые токены не выдаются ближайшие seconds секунд."""
+        if not self.enabled:
+            return
+        self._refill()
+        self._tokens = min(self._tokens, 1 - seconds * self.rate)
+
+    def has_headroom(self, min_tokens: float) -> bool:
+        """Никто не ждёт и в ведре не меньше min_tokens — можно тратить бюджет на фоновое."""
+        if not self.enabled:
+            return True
+        self._refill()
+        return not self._has_waiters() and self._tokens >= min_tokens
+
+    def queue_depth(self, lane: str) -> int:
+        return len(self._waiters[lane])
+
+    async def acquire(self, lane: str) -> None:
+        """Ждёт токен для запроса полосы lane."""
+        OUTBOUND_REQUESTS.inc(lane)
+        if not self.enabled:
+            return
+        self._refill()
+        if self._tokens >= 1 and not self._has_waiters():
+            self._tokens -= 1
+            OUTBOUND_WAIT_SECONDS.observe(0.0, lane)
+            return
+
+        loop = asyncio.get_running_loop()
+        enqueued_at = time.monotonic()
+        future = loop.create_future()
+        self._waiters[lane].append((enqueued_at, future))
+        OUTBOUND_QUEUE_DEPTH.inc(lane)
+        self._schedule(loop)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                # Токен уже выдан, но запрос отменили — возвращаем
+                self._tokens = min(self.burst, self._tokens + 1)
+            else:
+                self._remove(lane, future)
+            raise
+        OUTBOUND_WAIT_SECONDS.observe(time.monotonic() - enqueued_at, lane)
+
+    def _remove(self, lane: str, future) -> None:
+        queue = self._waiters[lane]
+        for item in queue:
+            if item[1] is future:
+                queue.remove(item)
+                OUTBOUND_QUEUE_DEPTH.dec(lane)
+                break
+
+    def _schedule(self, loop) -> None:
+        if self._timer is not None or not self._has_waiters():
+            return
+        delay = max(0.0, (1 - self._tokens) / self.rate)
+        self._timer = loop.call_later(delay, self._dispatch)
+
+    def _pick_lane(self, now: float):
+        best_lane, best_score = None, None
+        for lane, queue in self._waiters.items():
+            if not queue:
+                continue
+            waited = now - queue[0][0]
+            score = LANE_PRIORITY[lane] - waited / self.aging_seconds
+            if best_score is None or score < best_score:
+                best_lane, best_score = lane, score
+        return best_lane
+
+    def _dispatch(self) -> None:
+        self._timer = None
+        self._refill()
+        now = time.monotonic()
+        while self._tokens >= 1:
+            lane = self._pick_lane(now)
+            if lane is None:
+                break
+            _, future = self._waiters[lane].popleft()
+            OUTBOUND_QUEUE_DEPTH.dec(lane)
+            if future.done():
+                continue
+            self._tokens -= 1
+            future.set_result(None)
+        if self._has_waiters():
+            self._schedule(asyncio.get_running_loop())
+
+
+DISPATCHER = OutboundDispatcher(OUTBOUND_RATE_PER_SECOND, OUTBOUND_BURST)
+
+
+def _connect_rate_limit_db():
+    from data.db import get_connection
+
+    return get_connection()
+
+
+SHARED_LIMITER = (
+    SharedRateLimiter(
+        _connect_rate_limit_db,
+        bucket_for_token(BOT_TOKEN),
+        rate=OUTBOUND_RATE_PER_SECOND,
+        burst=OUTBOUND_BURST,
+        weight=SHARED_RATE_LIMIT_WEIGHT,
+        client_id=default_client_id("bot"),
+    )
+    if SHARED_RATE_LIMIT_ENABLED and BOT_TOKEN and OUTBOUND_RATE_PER_SECOND > 0
+    else None
+)
+
+
+def close_shared_rate_limit() -> None:
+    if SHARED_LIMITER is not None:
+        SHARED_LIMITER.close()
+
+
+def _is_throttled(api_method: str) -> bool:
+    return api_method.startswith(_THROTTLED_PREFIXES)
+
+
+class PrioritizedRequest(InstrumentedRequest):
+    """InstrumentedRequest, который перед отправкой сообщения ждёт токен своей полосы."""
+
+    async def do_request(self, url: str, method: str, request_data=None, *args, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        # Спан трассы: ожидание токена полосы + HTTP-запрос (дочерний спан в InstrumentedRequest)
+        span = start_span(f"telegram {api_method}", KIND_CLIENT)
+        try:
+            if _is_throttled(api_method):
+                lane = current_lane()
+                started = time.perf_counter()
+                await DISPATCHER.acquire(lane)
+                if SHARED_LIMITER is not None:
+                    SHARED_RATE_WAIT_SECONDS.observe(await SHARED_LIMITER.acquire_async())
+                if span is not None:
+                    span.set("lane", lane)
+                    span.set("wait_ms", round((time.perf_counter() - started) * 1000, 1))
+            code, payload = await super().do_request(url, method, request_data, *args, **kwargs)
+        except BaseException as e:
+            if span is not None:
+                span.end(e)
+            raise
+        if span is not None:
+            span.end()
+        if code == 429:
+            await _on_throttled(payload)
+        return code, payload
+
+
+async def _on_throttled(payload: bytes) -> None:
+    """429 от Telegram: пауза локальной очереди и общего ведра на retry_after."""
+    TELEGRAM_THROTTLED.inc()
+    try:
+        retry_after = parse_retry_after(json.loads(payload))
+    except ValueError:
+        retry_after = None
+    if not retry_after:
+        return
+    DISPATCHER.penalize(retry_after)
+    if SHARED_LIMITER is not None:
+        await asyncio.to_thread(SHARED_LIMITER.report_retry_after, retry_after)
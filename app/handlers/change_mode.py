@@ -1,5 +1,7 @@
 """Команда /change_mode — снова выбрать Daily или By mood (без сброса прогресса)."""
 
+import logging
+
 from telegram import Update
 from telegram.ext import ContextTypes
 
@@ -8,6 +10,8 @@ from app.handlers.done import cancel_done_reminders, dismiss_done_reminders
 from app.keyboards import get_mode_choice_keyboard
 from app.onboarding import MODE_CHOICE_INTRO_MARKDOWN, schedule_mode_pick_reminders
 
+logger = logging.getLogger(__name__)
+
 
 async def change_mode_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Показывает выбор режима. Прогресс не трогаем — полный сброс только по /start."""
@@ -22,7 +26,7 @@ async def change_mode_command(update: Update, context: ContextTypes.DEFAULT_TYPE
                 reply_markup=None,
             )
         except Exception as e:
-            print(f"Не удалось убрать кнопку выбора времени после /change_mode: {e}")
+            logger.warning(f"Не удалось убрать кнопку выбора времени после /change_mode: {e}")
 
     if user_id and context.user_data.get("waiting_for_time"):
         from app.onboarding import cancel_reminders
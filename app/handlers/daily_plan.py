@@ -0,0 +1,77 @@
+"""Админ-команда /plan: план рассылки на день из daily_plan (кто, сколько, когда)."""
+
+import logging
+from datetime import date, timedelta
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from app.handlers.secret import ADMIN_USER_ID
+from app.schedule.daily_plan import rebuild_daily_plan, today_moscow
+from data.db import get_daily_plan_summary
+
+logger = logging.getLogger(__name__)
+
+
+def _parse_plan_date(arg: str):
+    if arg in ("", "today"):
+        return today_moscow()
+    if arg == "tomorrow":
+        return today_moscow() + timedelta(days=1)
+    try:
+        return date.fromisoformat(arg)
+    except ValueError:
+        return None
+
+
+def format_plan_summary(plan_date: date, summary: dict) -> str:
+    """Текст для /plan: объём, режимы, нагрузка по часам, популярные практики, проверки."""
+    lines = [
+        f"План рассылки на {plan_date.isoformat()}",
+        f"Пользователей: {summary['users']} (челлендж {summary['challenge']}), сообщений с бонусами: {summary['messages']}",
+    ]
+    if summary["unplanned"]:
+        lines.append(f"⚠️ Без практики в плане: {summary['unplanned']} — проверь каталог на этот день недели")
+    if summary["by_hour"]:
+        lines.append("")
+        lines.append("По часам МСК:")
+        lines.extend(f"{hour}:00 — {count}" for hour, count in summary["by_hour"])
+    if summary["top_practices"]:
+        lines.append("")
+        lines.append("Чаще всего:")
+        lines.extend(f"#{practice_id} {title} — {count}" for practice_id, title, count in summary["top_practices"])
+    return "\n".join(lines)
+
+
+async def daily_plan_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/plan [today|tomorrow|ГГГГ-ММ-ДД] [rebuild] — сводка плана; без готового плана он строится.
+
+    План на будущие дни считается от текущих счётчиков пользователей — это предпросмотр
+    нагрузки; точный план на день строится в 00:05 МСК.
+    """
+    user_id = update.effective_user.id if update.effective_user else None
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ У тебя нет доступа к этой команде.")
+        return
+
+    args = [arg.lower() for arg in (context.args or [])]
+    rebuild = "rebuild" in args
+    args = [arg for arg in args if arg != "rebuild"]
+    plan_date = _parse_plan_date(args[0] if args else "")
+    if plan_date is None:
+        await update.message.reply_text("Формат: /plan [today|tomorrow|ГГГГ-ММ-ДД] [rebuild]")
+        return
+
+    summary = get_daily_plan_summary(plan_date)
+    if summary is not None and (rebuild or not summary["users"]):
+        if rebuild_daily_plan(plan_date) is None:
+            await update.message.reply_text("❌ Не удалось построить план, подробности в логах.")
+            return
+        logger.info("Админ %s пересчитал план рассылки на %s", user_id, plan_date.isoformat())
+        summary = get_daily_plan_summary(plan_date)
+    if summary is None:
+        await update.message.reply_text("❌ Не удалось прочитать план, подробности в логах.")
+        return
+
+    # Без parse_mode: в названиях практик бывает разметка
+    await update.message.reply_text(format_plan_summary(plan_date, summary))
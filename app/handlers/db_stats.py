@@ -0,0 +1,69 @@
+"""Админ-команда /db_stats: какие функции слоя БД нагружают базу сильнее всего."""
+
+import logging
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from app.handlers.secret import ADMIN_USER_ID
+from data.instrumentation import reset as reset_db_stats, snapshot, totals
+
+logger = logging.getLogger(__name__)
+
+# Сколько функций показывать в ответе (сообщение Telegram ограничено 4096 символами)
+DB_STATS_TOP = 15
+
+# /db_stats [time|calls|avg|queries] — поле сортировки
+DB_STATS_SORT_KEYS = {
+    "time": "total_time",
+    "calls": "calls",
+    "avg": "avg_ms",
+    "queries": "queries",
+}
+
+
+def format_db_stats(sort_by: str = "time", top: int = DB_STATS_TOP) -> str:
+    """Текст для /db_stats: итоги и топ функций по выбранному полю."""
+    data = snapshot()
+    if not data:
+        return "Статистики пока нет — к БД ещё не обращались."
+
+    sum_ = totals()
+    key = DB_STATS_SORT_KEYS.get(sort_by, "total_time")
+    rows = sorted(data.items(), key=lambda item: item[1][key], reverse=True)[:top]
+
+    lines = [
+        f"БД: вызовов {sum_['calls']}, SQL {sum_['queries']}, подключений {sum_['connections']}, "
+        f"ошибок {sum_['errors']}",
+        f"Время: функции {sum_['total_time']:.1f} с, SQL {sum_['query_time']:.1f} с, "
+        f"подключения {sum_['connect_time']:.1f} с",
+        "",
+        f"Топ-{len(rows)} по {sort_by}:",
+    ]
+    for name, stats in rows:
+        calls = stats["calls"] or 1
+        lines.append(
+            f"{name}: {stats['calls']}× "
+            f"avg {stats['avg_ms']:.1f} / p95≤{stats['p95_ms']:.0f} / max {stats['max_ms']:.0f} мс, "
+            f"SQL {stats['queries'] / calls:.1f}, conn {stats['connections'] / calls:.1f}, "
+            f"строк {stats['rows']}, ошибок {stats['errors']}"
+        )
+    return "\n".join(lines)
+
+
+async def db_stats_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/db_stats [time|calls|avg|queries] — статистика слоя БД; /db_stats reset — обнулить."""
+    user_id = update.effective_user.id if update.effective_user else None
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ У тебя нет доступа к этой команде.")
+        return
+
+    arg = (context.args[0].lower() if context.args else "time")
+    if arg == "reset":
+        reset_db_stats()
+        logger.info("Админ %s обнулил статистику БД", user_id)
+        await update.message.reply_text("✅ Статистика БД обнулена.")
+        return
+
+    # Без parse_mode: в именах функций подчёркивания, Markdown их съест
+    await update.message.reply_text(format_db_stats(arg))
@@ -3,6 +3,8 @@
 from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes
 
+from app.router import callback_payload
+
 
 async def handle_donations_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик кнопки 'Донаты'.
@@ -141,9 +143,11 @@ async def handle_stars_amount_callback(update: Update, context: ContextTypes.DEF
     user_id = update.effective_user.id
     user_name = update.effective_user.first_name or "друг"
     
-    # Извлекаем количество звезд из callback_data
-    callback_data = update.callback_query.data
-    stars_amount = int(callback_data.split('_')[1])  # "stars_50" -> 50
+    # Количество звезд из callback_data: "stars_50" -> 50 (разбирает CallbackRouter)
+    payload = callback_payload(context)
+    if not payload:
+        return
+    stars_amount = payload["amount"]
     
     # Создаем инвойс для оплаты звездами
     # Согласно документации, для цифровых товаров используем валюту "XTR" (Telegram Stars)
@@ -9,9 +9,13 @@ from zoneinfo import ZoneInfo
 from telegram import Update
 from telegram.ext import ContextTypes
 
+from app import clock
 from app.config import DEFAULT_TZ
 from app.handlers.progress import format_progress_stats, format_similar_result_line
+from app.dispatcher import REMINDER, in_lane
+from app.metrics import count_message
 from data.db import (
+    forget_practice_message,
     get_completed_count,
     get_similar_result_percent,
     get_streak_days,
@@ -108,7 +112,7 @@ def pick_done_reminder_text() -> str:
 
 
 def _now_moscow() -> datetime:
-    return datetime.now(MOSCOW_TZ)
+    return clock.now(MOSCOW_TZ)
 
 
 def _delay_for_evening_reminder(now: datetime) -> Optional[timedelta]:
@@ -149,6 +153,7 @@ async def cancel_done_reminders(context: ContextTypes.DEFAULT_TYPE, user_id: int
             pass
 
 
+@in_lane(REMINDER)
 async def _send_done_reminder_job(context: ContextTypes.DEFAULT_TYPE) -> None:
     job = context.job
     data = job.data or {}
@@ -173,6 +178,7 @@ async def _send_done_reminder_job(context: ContextTypes.DEFAULT_TYPE) -> None:
             text=pick_done_reminder_text(),
             parse_mode="Markdown",
         )
+        count_message("reminder")
     except Exception as e:
         logger.error("Ошибка напоминания о практике user=%s log=%s: %s", user_id, log_id, e)
 
@@ -232,6 +238,9 @@ async def handle_practice_done_callback(update: Update, context: ContextTypes.DE
     if ok:
         try:
             await query.edit_message_reply_markup(reply_markup=None)
+            # Кнопка уже снята — это сообщение не нужно ставить в очередь снятия кнопок
+            if query.message:
+                forget_practice_message(user_id, query.message.message_id)
         except Exception:
             pass
         n = get_completed_count(user_id)
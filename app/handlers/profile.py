@@ -0,0 +1,70 @@
+"""Админ-команда /profile: сэмплирующий профиль процесса на N секунд (app/sampling_profiler.py)."""
+
+import asyncio
+import logging
+from datetime import datetime
+
+from telegram import Update
+from telegram.ext import ContextTypes
+
+from app.handlers.secret import ADMIN_USER_ID
+from app.sampling_profiler import start_profile, stop_profile
+
+logger = logging.getLogger(__name__)
+
+PROFILE_DEFAULT_SECONDS = 30
+PROFILE_MAX_SECONDS = 300
+# Сообщение Telegram ограничено 4096 символами; полный текст — в документе
+SUMMARY_MESSAGE_LIMIT = 3500
+
+
+async def profile_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """/profile [секунды] — снимает профиль и присылает collapsed stacks и топ функций документами."""
+    user_id = update.effective_user.id if update.effective_user else None
+    if user_id != ADMIN_USER_ID:
+        await update.message.reply_text("❌ У тебя нет доступа к этой команде.")
+        return
+
+    try:
+        seconds = int(context.args[0]) if context.args else PROFILE_DEFAULT_SECONDS
+    except ValueError:
+        seconds = 0
+    if not 1 <= seconds <= PROFILE_MAX_SECONDS:
+        await update.message.reply_text(f"Использование: /profile [секунды], от 1 до {PROFILE_MAX_SECONDS}.")
+        return
+
+    profiler = start_profile()
+    if profiler is None:
+        await update.message.reply_text("⏳ Профиль уже снимается — дождись результата.")
+        return
+
+    logger.info("Админ %s запустил профиль на %s с", user_id, seconds)
+    await update.message.reply_text(f"⏱ Снимаю профиль {seconds} с…")
+    # Ждём в отдельной задаче: хендлер не должен держать обработку апдейтов на время профиля
+    context.application.create_task(
+        _finish_profile(update, context, profiler, seconds), update=update, name="profile_command"
+    )
+
+
+async def _finish_profile(update: Update, context: ContextTypes.DEFAULT_TYPE, profiler, seconds: int) -> None:
+    try:
+        await asyncio.sleep(seconds)
+    finally:
+        await asyncio.to_thread(stop_profile, profiler)
+
+    summary = profiler.summary()
+    collapsed = profiler.collapsed()
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    chat_id = update.effective_chat.id
+
+    await context.bot.send_document(
+        chat_id,
+        document=collapsed.encode("utf-8"),
+        filename=f"profile-{stamp}.folded",
+        caption="Collapsed stacks: flamegraph.pl, speedscope.app или inferno-flamegraph",
+    )
+    await context.bot.send_document(chat_id, document=summary.encode("utf-8"), filename=f"profile-{stamp}.txt")
+    if len(summary) > SUMMARY_MESSAGE_LIMIT:
+        summary = summary[:SUMMARY_MESSAGE_LIMIT].rsplit("\n", 1)[0] + "\n…"
+    # Без parse_mode: в именах функций подчёркивания и угловые скобки
+    await context.bot.send_message(chat_id, summary)
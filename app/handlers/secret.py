@@ -8,6 +8,7 @@ import logging
 from telegram import Update
 from telegram.ext import ContextTypes
 
+
 # --- Названия команд (для регистрации в main.py и при изменении) ---
 # /secret       — массовая рассылка (текст или фото с подписью)
 # /secret_delete — удаление последней рассылки у всех пользователей
@@ -76,7 +77,8 @@ async def handle_secret_input(update: Update, context: ContextTypes.DEFAULT_TYPE
     context.user_data.pop('waiting_for_secret', None)
     
     # Получаем всех пользователей из базы данных
-    from data.db import get_all_users, get_next_broadcast_batch_id, save_broadcast_message
+    from data.db import enqueue_broadcast, get_all_users, get_broadcast_outbox_status, get_next_broadcast_batch_id
+    from app.outbox import drain_outbox
     users = get_all_users()
     
     if not users:
@@ -103,65 +105,46 @@ async def handle_secret_input(update: Update, context: ContextTypes.DEFAULT_TYPE
     logger.info(f"Начало массовой рассылки администратором {user_id}. "
                 f"Пользователей: {total_users}, Тип: {'фото с подписью' if has_photo else 'текст'}, batch_id={broadcast_batch_id}")
     
-    success_count = 0
-    error_count = 0
-    errors = []
-    
-    for idx, user_data in enumerate(users, 1):
-        try:
-            target_user_id, chat_id = user_data[0], user_data[1]
-            
-            if has_photo:
-                sent_message = await context.bot.send_photo(
-                    chat_id=chat_id,
-                    photo=photo_file_id,
-                    caption=message_text if message_text else None,
-                    parse_mode='Markdown' if message_text else None
-                )
-            else:
-                sent_message = await context.bot.send_message(
-                    chat_id=chat_id,
-                    text=message_text,
-                    parse_mode='Markdown'
-                )
-            
-            save_broadcast_message(
-                broadcast_batch_id=broadcast_batch_id,
-                user_id=target_user_id,
-                chat_id=chat_id,
-                message_id=sent_message.message_id,
-                message_type=message_type,
-                message_text=message_text,
-                photo_file_id=photo_file_id
-            )
-            success_count += 1
-            
-            if idx % 10 == 0:
-                logger.info(f"Прогресс рассылки: {idx}/{total_users} пользователей обработано")
-            
-            if idx < total_users:
-                await asyncio.sleep(0.05)
-                
-        except Exception as e:
-            error_count += 1
-            error_msg = f"Ошибка отправки пользователю {target_user_id} (chat_id: {chat_id}): {str(e)}"
-            errors.append(error_msg)
-            logger.error(error_msg)
-    
+    # Сообщения ставятся в outbox одной транзакцией (ключ broadcast:<batch>:<user_id>),
+    # отправляют их воркеры app/outbox.py — с повторами при сетевых ошибках и 429
+    if has_photo:
+        payload = {
+            "method": "send_photo",
+            "params": {
+                "photo": photo_file_id,
+                "caption": message_text if message_text else None,
+                "parse_mode": 'Markdown' if message_text else None,
+            },
+        }
+    else:
+        payload = {"method": "send_message", "params": {"text": message_text, "parse_mode": 'Markdown'}}
+    enqueued = enqueue_broadcast(
+        broadcast_batch_id,
+        [(user_data[0], user_data[1]) for user_data in users],
+        payload,
+        {"message_type": message_type, "message_text": message_text, "photo_file_id": photo_file_id},
+    )
+    if not enqueued:
+        await update.message.reply_text("❌ Не удалось поставить рассылку в очередь, подробности в логах.")
+        return
+
+    await drain_outbox(context)
+    statuses = get_broadcast_outbox_status(broadcast_batch_id)
+    success_count = statuses.get("sent", 0)
+    retry_count = statuses.get("pending", 0) + statuses.get("sending", 0)
+    error_count = statuses.get("failed", 0) + statuses.get("dead", 0)
+
     report = (
         f"✅ *Рассылка завершена*\n\n"
         f"📊 *Статистика:*\n"
         f"• Всего пользователей: {total_users}\n"
         f"• Успешно отправлено: {success_count}\n"
-        f"• Ошибок: {error_count}\n\n"
-        f"Используй /secret_delete для удаления или /secret_edit для редактирования."
+        f"• Ошибок: {error_count}\n"
     )
-    if errors:
-        error_preview = "\n".join(errors[:5])
-        if len(errors) > 5:
-            error_preview += f"\n... и еще {len(errors) - 5} ошибок"
-        report += f"\n\n⚠️ *Ошибки:*\n`{error_preview}`"
-    
+    if retry_count:
+        report += f"• Ждут повторной отправки: {retry_count}\n"
+    report += "\nИспользуй /secret_delete для удаления или /secret_edit для редактирования."
+
     await update.message.reply_text(report, parse_mode='Markdown')
     logger.info(f"Массовая рассылка завершена. Успешно: {success_count}, Ошибок: {error_count}")
 
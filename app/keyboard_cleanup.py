@@ -0,0 +1,73 @@
+"""Отложенное снятие кнопки «✅ Я сделал!» со старых сообщений с практикой.
+
+Раньше перед каждой отправкой практики бот снимал кнопку с предыдущего сообщения — два
+запроса к Telegram на пользователя в 08:00. Теперь set_last_practice_message_id кладёт
+предыдущее сообщение в keyboard_cleanup_queue (одна строка на сообщение, дубли отбрасываются),
+а эта задача снимает кнопки, когда бюджет запросов свободен: никто не ждёт в очереди
+диспетчера и в ведре есть запас. Запросы идут по самой низкой полосе cleanup.
+
+Сообщения старше KEYBOARD_CLEANUP_MAX_AGE_HOURS выбрасываются без запроса.
+Задача работает во всех репликах: строки забираются с FOR UPDATE SKIP LOCKED.
+"""
+
+import logging
+
+from app.dispatcher import CLEANUP, DISPATCHER, outbound_lane
+from app.metrics import REGISTRY
+from data.db import claim_keyboard_cleanups
+
+logger = logging.getLogger(__name__)
+
+KEYBOARD_CLEANUP_POLL_SECONDS = 30
+KEYBOARD_CLEANUP_BATCH = 20
+# Старше — не трогаем: кнопку уже никто не нажмёт, а запрос тратит бюджет
+KEYBOARD_CLEANUP_MAX_AGE_HOURS = 48
+# Сколько токенов локального бюджета должно оставаться, чтобы начать пачку
+# (не больше половины ведра: при маленьком OUTBOUND_BURST порог иначе недостижим)
+KEYBOARD_CLEANUP_MIN_HEADROOM = 10
+
+KEYBOARD_CLEANUPS = REGISTRY.counter(
+    "yogabot_keyboard_cleanups_total", "Снятие старых кнопок «Я сделал!»: done / failed", ("result",)
+)
+
+
+async def run_keyboard_cleanup(context) -> None:
+    """Снимает кнопки пачками, пока бюджет свободен и очередь не пуста."""
+    headroom = max(1, min(KEYBOARD_CLEANUP_MIN_HEADROOM, DISPATCHER.burst // 2))
+    try:
+        while DISPATCHER.has_headroom(headroom):
+            rows = claim_keyboard_cleanups(KEYBOARD_CLEANUP_BATCH, KEYBOARD_CLEANUP_MAX_AGE_HOURS)
+            if not rows:
+                return
+            with outbound_lane(CLEANUP):
+                for chat_id, message_id in rows:
+                    try:
+                        await context.bot.edit_message_reply_markup(
+                            chat_id=chat_id, message_id=message_id, reply_markup=None
+                        )
+                        KEYBOARD_CLEANUPS.inc("done")
+                    except Exception as edit_err:
+                        # «message is not modified», удалённое сообщение, заблокированный бот — не повторяем
+                        KEYBOARD_CLEANUPS.inc("failed")
+                        logger.debug(f"Не удалось снять кнопку с сообщения {message_id}: {edit_err}")
+    except Exception as e:
+        logger.error(f"Ошибка снятия старых кнопок: {e}")
+
+
+def schedule_keyboard_cleanup(application):
+    """Регистрирует фоновое снятие старых кнопок."""
+    try:
+        job_queue = application.job_queue
+        if not job_queue:
+            logger.error("JobQueue недоступен для снятия старых кнопок")
+            return
+
+        job_queue.run_repeating(
+            run_keyboard_cleanup,
+            interval=KEYBOARD_CLEANUP_POLL_SECONDS,
+            first=KEYBOARD_CLEANUP_POLL_SECONDS,
+            name="keyboard_cleanup",
+        )
+        logger.info("Снятие старых кнопок запланировано")
+    except Exception as e:
+        logger.error(f"Ошибка планирования снятия старых кнопок: {e}")
@@ -0,0 +1,93 @@
+"""Ленивые callback'и хендлеров: модуль хендлера импортируется при первом апдейте, а не при старте.
+
+lazy_handler("app.handlers.donations:handle_donate_card_callback") возвращает async-функцию
+с тем же именем; первый вызов импортирует модуль и дальше вызывает найденную функцию напрямую.
+Регистрация в app/main.py не меняется: фильтры, паттерны и метки метрик остаются прежними.
+
+Чтобы первый пользователь после деплоя не ждал импорта, preload_lazy_handlers() догружает
+оставшиеся модули в фоне вскоре после старта; опечатка в пути всплывает там же, в логе.
+Модули с задачами JobQueue (рассылки, напоминания) по-прежнему импортируются при старте.
+"""
+
+import asyncio
+import importlib
+import logging
+import sys
+import time
+
+logger = logging.getLogger(__name__)
+
+# Через сколько секунд после старта догружать модули хендлеров
+PRELOAD_DELAY_SECONDS = 15
+
+# Пути всех ленивых callback'ов процесса (модуль, функция) — для догрузки
+_LAZY_TARGETS = []
+
+
+def _resolve(module_name: str, attr: str):
+    module = sys.modules.get(module_name)
+    if module is None:
+        started = time.perf_counter()
+        module = importlib.import_module(module_name)
+        logger.debug("Ленивый импорт %s: %.1f мс", module_name, (time.perf_counter() - started) * 1000)
+    return getattr(module, attr)
+
+
+def lazy_handler(path: str):
+    """Callback хендлера по пути «модуль:функция»; модуль импортируется при первом вызове."""
+    module_name, _, attr = path.partition(":")
+    if not module_name or not attr:
+        raise ValueError(f"Путь хендлера должен быть вида 'модуль:функция', получено: {path!r}")
+    _LAZY_TARGETS.append((module_name, attr))
+    target = None
+
+    async def callback(update, context):
+        nonlocal target
+        if target is None:
+            target = _resolve(module_name, attr)
+        return await target(update, context)
+
+    # Имя нужно меткам метрик (instrument_handlers) и логам PTB
+    callback.__name__ = callback.__qualname__ = attr
+    callback.__module__ = module_name
+    return callback
+
+
+def _import_all() -> int:
+    loaded = 0
+    for module_name, attr in _LAZY_TARGETS:
+        try:
+            _resolve(module_name, attr)
+            loaded += 1
+        except Exception as e:
+            logger.error(f"Не удалось загрузить хендлер {module_name}:{attr}: {e}")
+    return loaded
+
+
+async def preload_lazy_handlers(context) -> None:
+    """Задача JobQueue: импортирует модули хендлеров в отдельном потоке, не блокируя цикл событий."""
+    started = time.perf_counter()
+    loaded = await asyncio.to_thread(_import_all)
+    logger.info(
+        "Хендлеры догружены: %s из %s за %.1f мс",
+        loaded, len(_LAZY_TARGETS), (time.perf_counter() - started) * 1000,
+    )
+
+
+def schedule_lazy_handlers_preload(application):
+    """Регистрирует фоновую догрузку модулей хендлеров после старта."""
+    try:
+        job_queue = application.job_queue
+        if not job_queue:
+            logger.error("JobQueue недоступен для догрузки хендлеров")
+            return
+
+        # Без misfire_grace_time: старт с проверкой схемы бывает дольше задержки, задача всё равно нужна
+        job_queue.run_once(
+            preload_lazy_handlers,
+            when=PRELOAD_DELAY_SECONDS,
+            name="lazy_handlers_preload",
+            job_kwargs={"misfire_grace_time": None},
+        )
+    except Exception as e:
+        logger.error(f"Ошибка планирования догрузки хендлеров: {e}")
@@ -0,0 +1,172 @@
+"""Выбор лидера среди реплик бота через advisory-lock PostgreSQL.
+
+Фоновые задачи-синглтоны (ежедневная рассылка, напоминания, сводки челленджа, обслуживание
+practice_logs) зарегистрированы в каждой реплике, но выполняются только у лидера — их
+callback'и обёрнуты leader_only. Обработка апдейтов от пользователей идёт во всех репликах.
+
+Лидер — процесс, который держит сессионный pg_advisory_lock(LEADER_LOCK_ID) на отдельном
+долгоживущем подключении. Каждые LEADER_HEARTBEAT_SECONDS:
+- лидер проверяет, что подключение живо (блокировка живёт ровно столько, сколько сессия);
+  при ошибке сразу перестаёт считать себя лидером;
+- остальные пробуют pg_try_advisory_lock.
+
+Если лидер упал, Postgres снимает блокировку вместе с сессией, и за один heartbeat её берёт
+другая реплика. При обрыве сети сессию добивают keepalive'ы (~10 с с обеих сторон).
+
+Реплика, ставшая лидером по heartbeat, вызывает колбэки on_leadership_acquired: так календарные
+триггеры (app/schedule/triggers.py) догоняют запуск, который пришёлся на ведомого или на смену лидера.
+
+Задачи конкретного пользователя (run_once из хендлеров: напоминания «Я сделал», онбординг)
+не обёрнуты — они живут в памяти той реплики, которая обработала апдейт.
+"""
+
+import asyncio
+import functools
+import logging
+import threading
+from typing import Optional
+
+from app.config import LEADER_ELECTION_ENABLED, LEADER_HEARTBEAT_SECONDS, LEADER_LOCK_ID
+
+logger = logging.getLogger(__name__)
+
+# Keepalive'ы лидерского подключения: мёртвая сессия обнаруживается за ~10 секунд
+_KEEPALIVE_OPTIONS = {
+    "keepalives": 1,
+    "keepalives_idle": 5,
+    "keepalives_interval": 2,
+    "keepalives_count": 3,
+    "connect_timeout": 5,
+}
+
+
+class LeaderElection:
+    """Состояние лидерства процесса; check() блокирующий — вызывать из потока."""
+
+    def __init__(self, lock_id: int = LEADER_LOCK_ID):
+        self.lock_id = lock_id
+        self.is_leader = False
+        self._conn = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        from data.db import get_connection
+
+        conn = get_connection(**_KEEPALIVE_OPTIONS)
+        conn.autocommit = True
+        cursor = conn.cursor()
+        # Те же keepalive'ы на стороне сервера: он освободит блокировку, не дожидаясь системных 2 часов
+        cursor.execute("SET tcp_keepalives_idle = 5")
+        cursor.execute("SET tcp_keepalives_interval = 2")
+        cursor.execute("SET tcp_keepalives_count = 3")
+        cursor.execute("SET application_name = 'yogabot-leader'")
+        return conn
+
+    def _close(self) -> None:
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        self._conn = None
+
+    def check(self) -> bool:
+        """Один heartbeat: подтвердить лидерство или попытаться его получить."""
+        with self._lock:
+            try:
+                if self._conn is None or self._conn.closed:
+                    self._close()
+                    self.is_leader = False
+                    self._conn = self._connect()
+                cursor = self._conn.cursor()
+                if self.is_leader:
+                    cursor.execute("SELECT 1")
+                else:
+                    cursor.execute("SELECT pg_try_advisory_lock(%s)", (self.lock_id,))
+                    if cursor.fetchone()[0]:
+                        self.is_leader = True
+                        logger.info("Процесс стал лидером (advisory lock %s)", self.lock_id)
+            except Exception as e:
+                if self.is_leader:
+                    logger.error("Лидерство потеряно: %s", e)
+                else:
+                    logger.warning("Не удалось проверить лидерство: %s", e)
+                self.is_leader = False
+                self._close()
+            return self.is_leader
+
+    def resign(self) -> None:
+        """Отдаёт лидерство (при остановке бота), чтобы другая реплика подхватила задачи сразу."""
+        with self._lock:
+            if self.is_leader and self._conn is not None and not self._conn.closed:
+                try:
+                    self._conn.cursor().execute("SELECT pg_advisory_unlock(%s)", (self.lock_id,))
+                    logger.info("Лидерство отдано")
+                except Exception as e:
+                    logger.warning("Не удалось отпустить advisory lock: %s", e)
+            self.is_leader = False
+            self._close()
+
+
+_election: Optional[LeaderElection] = None
+# Колбэки (job_queue) при получении лидерства по heartbeat
+_acquired_callbacks: list = []
+
+
+def is_leader() -> bool:
+    """Выполнять ли синглтон-задачи в этом процессе."""
+    if not LEADER_ELECTION_ENABLED:
+        return True
+    return _election is not None and _election.is_leader
+
+
+def leader_only(func):
+    """Обёртка callback'а JobQueue: у не-лидера задача пропускается."""
+
+    @functools.wraps(func)
+    async def wrapper(context, *args, **kwargs):
+        if not is_leader():
+            return None
+        return await func(context, *args, **kwargs)
+
+    return wrapper
+
+
+def on_leadership_acquired(callback) -> None:
+    """Регистрирует callback(job_queue), вызываемый, когда процесс становится лидером по heartbeat.
+
+    При старте не вызывается: задачи, пропущенные до старта, догоняются при их регистрации.
+    """
+    _acquired_callbacks.append(callback)
+
+
+async def _heartbeat(context) -> None:
+    was_leader = _election.is_leader
+    if not await asyncio.to_thread(_election.check) or was_leader:
+        return
+    for callback in _acquired_callbacks:
+        try:
+            callback(context.job_queue)
+        except Exception as e:
+            logger.error("Ошибка обработчика получения лидерства: %s", e)
+
+
+async def start_leader_election(application) -> None:
+    """Первая попытка стать лидером и регулярный heartbeat (post_init)."""
+    global _election
+    if not LEADER_ELECTION_ENABLED:
+        logger.info("Выбор лидера выключен — синглтон-задачи выполняются в этом процессе")
+        return
+    _election = LeaderElection()
+    # Решаем до первых тиков задач, чтобы лидер не пропустил запуск сразу после старта
+    if not await asyncio.to_thread(_election.check):
+        logger.info("Процесс — ведомый: синглтон-задачи выполняет другая реплика")
+    application.job_queue.run_repeating(
+        _heartbeat, interval=LEADER_HEARTBEAT_SECONDS, first=LEADER_HEARTBEAT_SECONDS,
+        name="leader_heartbeat",
+    )
+
+
+async def stop_leader_election(application) -> None:
+    if _election is not None:
+        await asyncio.to_thread(_election.resign)
@@ -0,0 +1,171 @@
+"""Логирование бота: очередь и поток-писатель, текст или JSON, сэмплирование шумных логгеров.
+
+setup_logging() вешает на корневой логгер один QueueHandler. Вызов logger.info() в хендлере
+или джобе только подставляет аргументы в сообщение и кладёт запись в очередь; форматирование
+и запись в stderr делает поток QueueListener. Очередь ограничена LOG_QUEUE_SIZE: если поток
+не успевает (stderr забит), запись отбрасывается и учитывается в dropped_records() —
+логирование никогда не ждёт и не тормозит обработку апдейтов.
+
+Настройки (app/config.py):
+  LOG_LEVEL     — уровень корневого логгера (DEBUG, INFO, WARNING, ...);
+  LOG_FORMAT    — text (как раньше) или json: {"ts", "level", "logger", "msg", ...};
+                  поля из extra={...} попадают в JSON как есть;
+  LOG_SAMPLING  — доля записей ниже WARNING по логгерам ("httpx=0,data.postgres_db=0.1");
+                  правило логгера действует и на дочерние (data → data.postgres_db).
+
+Пишите через logger с %-аргументами: logger.debug("… %s", user_id) ничего не стоит,
+пока уровень выше DEBUG.
+"""
+
+import atexit
+import copy
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Optional
+
+from .config import LOG_FORMAT, LOG_LEVEL, LOG_SAMPLING
+
+# Сколько записей может ждать потока-писателя
+LOG_QUEUE_SIZE = 10_000
+TEXT_FORMAT = "%(asctime)s - %(name)s - %(levelname)s - %(message)s"
+
+# Атрибуты LogRecord; остальное в record.__dict__ пришло из extra={...}
+_RECORD_ATTRS = frozenset(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_handler: Optional["NonBlockingQueueHandler"] = None
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def parse_sampling(spec: str) -> dict:
+    """'httpx=0, data.postgres_db=0.1' → {'httpx': 0.0, 'data.postgres_db': 0.1}."""
+    rates = {}
+    for item in spec.split(","):
+        name, _, value = item.strip().partition("=")
+        if not name.strip():
+            continue
+        try:
+            rates[name.strip()] = min(1.0, max(0.0, float(value)))
+        except ValueError:
+            print(f"LOG_SAMPLING: не число для {name.strip()!r}: {value!r}", file=sys.stderr)
+    return rates
+
+
+class SamplingFilter(logging.Filter):
+    """Пропускает долю записей ниже WARNING по правилу ближайшего логгера-предка."""
+
+    def __init__(self, rates: dict):
+        super().__init__()
+        self._rates = rates
+        self._cache = {}
+
+    def _rate(self, name: str) -> float:
+        rate = self._cache.get(name)
+        if rate is None:
+            rate = 1.0
+            candidate = name
+            while candidate:
+                if candidate in self._rates:
+                    rate = self._rates[candidate]
+                    break
+                candidate = candidate.rpartition(".")[0]
+            self._cache[name] = rate
+        return rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self._rate(record.name)
+        return rate >= 1.0 or (rate > 0.0 and random.random() < rate)
+
+
+class NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler, который при полной очереди отбрасывает запись вместо ожидания."""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Аргументы подставляем сейчас (объекты могут измениться), форматирование — в потоке-писателе
+        record = copy.copy(record)
+        record.message = record.getMessage()
+        record.msg = record.message
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+
+class JsonFormatter(logging.Formatter):
+    """Одна запись — один JSON-объект в строке."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        payload = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                payload[key] = value
+        if record.exc_text:
+            payload["exc"] = record.exc_text
+        if record.stack_info:
+            payload["stack"] = record.stack_info
+        return json.dumps(payload, ensure_ascii=False, default=str)
+
+
+def _level(name: str) -> int:
+    level = logging.getLevelName(name)
+    return level if isinstance(level, int) else logging.INFO
+
+
+def setup_logging(level: str = LOG_LEVEL, fmt: str = LOG_FORMAT, sampling: str = LOG_SAMPLING) -> None:
+    """Настраивает корневой логгер (повторный вызов ничего не делает)."""
+    global _handler, _listener
+    if _handler is not None:
+        return
+
+    output = logging.StreamHandler(sys.stderr)
+    output.setFormatter(JsonFormatter() if fmt == "json" else logging.Formatter(TEXT_FORMAT))
+
+    _handler = NonBlockingQueueHandler(queue.Queue(maxsize=LOG_QUEUE_SIZE))
+    rates = parse_sampling(sampling)
+    if rates:
+        _handler.addFilter(SamplingFilter(rates))
+    _listener = logging.handlers.QueueListener(_handler.queue, output, respect_handler_level=True)
+    _listener.start()
+
+    root = logging.getLogger()
+    root.addHandler(_handler)
+    root.setLevel(_level(level))
+    atexit.register(stop_logging)
+
+
+def stop_logging() -> None:
+    """Дописывает очередь и останавливает поток-писатель (при выходе из процесса)."""
+    global _listener
+    if _listener is None:
+        return
+    listener, _listener = _listener, None
+    listener.stop()
+    if _handler is not None and _handler.dropped:
+        print(f"Логирование: отброшено записей при переполнении очереди — {_handler.dropped}", file=sys.stderr)
+
+
+def dropped_records() -> int:
+    """Сколько записей отброшено из-за переполненной очереди."""
+    return _handler.dropped if _handler is not None else 0
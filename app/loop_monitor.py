@@ -0,0 +1,193 @@
+"""Монитор цикла событий: задержка и блокировки синхронным кодом.
+
+psycopg2, yt_dlp и прочий синхронный код внутри async-хендлеров останавливает весь цикл PTB:
+пока он работает, не обрабатываются апдейты и не тикает JobQueue. Монитор состоит из двух частей:
+
+- задача asyncio засыпает на INTERVAL_SECONDS и меряет, насколько позже проснулась
+  (yogabot_event_loop_lag_seconds); перед сном отмечает «пульс»;
+- поток-сторож раз в несколько десятков мс смотрит на пульс. Если цикл молчит дольше
+  LOOP_STALL_THRESHOLD_MS, сторож снимает стек потока цикла (sys._current_frames) — это стек
+  именно того кода, который держит цикл, — и метку хендлера/джоба текущей задачи
+  (app.metrics.current_activity).
+
+Когда цикл оживает, задача-монитор пишет в лог WARNING с длительностью, хендлером и стеком и
+добавляет блокировку в yogabot_event_loop_stall_seconds{activity,site}; site — ближайшая к
+месту блокировки функция кода бота (data/postgres_db.py:get_user). Если цикл не оживает
+HANG_LOG_SECONDS, сторож пишет стек сам, не дожидаясь.
+
+Метрики обновляются только из цикла событий (как и остальные в app/metrics.py): сторож лишь
+кладёт снимок в атрибут.
+
+Настройки (app/config.py): LOOP_MONITOR_ENABLED, LOOP_STALL_THRESHOLD_MS.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from .config import LOOP_STALL_THRESHOLD_MS
+from .metrics import LOOP_LAG_SECONDS, LOOP_STALL_SECONDS, current_activity
+
+logger = logging.getLogger(__name__)
+
+# Период задачи-монитора, сек: столько же «стоит» минимальная измеримая задержка
+INTERVAL_SECONDS = 0.1
+# Через сколько секунд непрерывной блокировки сторож пишет стек, не дожидаясь её конца
+HANG_LOG_SECONDS = 30.0
+# Сколько кадров стека (ближайших к месту блокировки) попадает в лог
+STACK_LIMIT = 25
+
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+_OWN_DIRS = tuple(os.path.join(_ROOT, name) + os.sep for name in ("app", "data"))
+_SKIP_DIRS = (os.path.dirname(asyncio.__file__) + os.sep, os.path.dirname(threading.__file__) + os.sep + "threading")
+# Обёртки (метрики, ленивая загрузка, инструментация и лок БД) — не место блокировки
+_WRAPPER_FILES = frozenset(
+    os.path.join(_ROOT, name)
+    for name in ("app/metrics.py", "app/lazy_handlers.py", "app/loop_monitor.py", "data/instrumentation.py")
+)
+_WRAPPER_NAMES = frozenset({"wrapper"})
+
+
+class StallSample:
+    """Снимок заблокированного цикла: стек, хендлер/джоб, место в коде бота."""
+
+    __slots__ = ("beat", "activity", "task", "site", "stack")
+
+    def __init__(self, beat: float, activity: str, task: str, site: str, stack: str):
+        self.beat = beat
+        self.activity = activity
+        self.task = task
+        self.site = site
+        self.stack = stack
+
+
+def _capture(frame, beat: float, task) -> StallSample:
+    frames = [
+        summary for summary in traceback.extract_stack(frame)
+        if not summary.filename.startswith(_SKIP_DIRS)
+    ][-STACK_LIMIT:]
+    site = "unknown"
+    for summary in reversed(frames):
+        if (
+            summary.filename.startswith(_OWN_DIRS)
+            and summary.filename not in _WRAPPER_FILES
+            and summary.name not in _WRAPPER_NAMES
+        ):
+            site = f"{os.path.relpath(summary.filename, _ROOT)}:{summary.name}"
+            break
+    activity = (current_activity(task) if task is not None else None) or "-"
+    task_name = task.get_name() if task is not None else "-"
+    return StallSample(beat, activity, task_name, site, "".join(traceback.format_list(frames)))
+
+
+class LoopMonitor:
+    """Задача-монитор в цикле событий и поток-сторож рядом с ним."""
+
+    def __init__(self, threshold_ms: float = LOOP_STALL_THRESHOLD_MS, interval: float = INTERVAL_SECONDS):
+        self.threshold = threshold_ms / 1000
+        self.interval = interval
+        self.stalls = 0
+        self.max_lag = 0.0
+        self._beat = time.monotonic()
+        self._sample: Optional[StallSample] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        """Вызывается из цикла событий."""
+        self._loop = asyncio.get_running_loop()
+        self._loop_thread = threading.get_ident()
+        self._beat = time.monotonic()
+        self._stop.clear()
+        self._task = self._loop.create_task(self._tick(), name="loop_monitor")
+        self._thread = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._thread.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join, 1.0)
+            self._thread = None
+
+    async def _tick(self) -> None:
+        while True:
+            beat = self._beat = time.monotonic()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, time.monotonic() - beat - self.interval)
+            LOOP_LAG_SECONDS.observe(lag)
+            self.max_lag = max(self.max_lag, lag)
+            if lag >= self.threshold:
+                self._report(lag, beat)
+
+    def _report(self, lag: float, beat: float) -> None:
+        sample, self._sample = self._sample, None
+        self.stalls += 1
+        if sample is None or sample.beat != beat:
+            # Блокировка короче периода сторожа — стек снять не успели
+            LOOP_STALL_SECONDS.observe(lag, "-", "unknown")
+            logger.warning(f"Цикл событий был заблокирован {lag * 1000:.0f} мс (стек не снят)")
+            return
+        LOOP_STALL_SECONDS.observe(lag, sample.activity, sample.site)
+        logger.warning(
+            f"Цикл событий был заблокирован {lag * 1000:.0f} мс: {sample.activity} "
+            f"(задача {sample.task}) в {sample.site}\n{sample.stack}",
+            extra={"stall_ms": round(lag * 1000), "activity": sample.activity, "site": sample.site},
+        )
+
+    def _watch(self) -> None:
+        # Проверяем в несколько раз чаще порога, чтобы застать блокировку, пока она идёт
+        period = max(0.01, min(self.interval, self.threshold / 4))
+        hang_logged = None
+        while not self._stop.wait(period):
+            beat = self._beat
+            silent = time.monotonic() - beat - self.interval
+            if silent < self.threshold:
+                continue
+            sample = self._sample
+            if sample is None or sample.beat != beat:
+                frame = sys._current_frames().get(self._loop_thread)
+                if frame is None:
+                    continue
+                self._sample = _capture(frame, beat, asyncio.current_task(self._loop))
+                del frame
+            if silent >= HANG_LOG_SECONDS and hang_logged != beat:
+                hang_logged = beat
+                sample = self._sample
+                logger.error(
+                    f"Цикл событий заблокирован уже {silent:.0f} с: {sample.activity} "
+                    f"(задача {sample.task}) в {sample.site}\n{sample.stack}"
+                )
+
+
+_monitor: Optional[LoopMonitor] = None
+
+
+def start_loop_monitor() -> LoopMonitor:
+    """Запускает монитор в текущем цикле событий (post_init)."""
+    global _monitor
+    _monitor = LoopMonitor()
+    _monitor.start()
+    logger.info(f"Монитор цикла событий: порог блокировки {_monitor.threshold * 1000:.0f} мс")
+    return _monitor
+
+
+async def stop_loop_monitor() -> None:
+    global _monitor
+    if _monitor is not None:
+        await _monitor.stop()
+        _monitor = None
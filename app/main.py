@@ -2,87 +2,110 @@
 Main application file that initializes the bot and registers all handlers.
 """
 
+# Первым: профиль старта замеряет все импорты ниже (app/startup_profile.py)
+from .startup_profile import PROFILER, report_startup
+
 import asyncio
 import logging
-import re
-from telegram.ext import Application, CommandHandler, CallbackQueryHandler, MessageHandler, PreCheckoutQueryHandler, filters, ContextTypes
+import sys
+from urllib.parse import urlsplit
+from telegram.ext import Application, CommandHandler, MessageHandler, PreCheckoutQueryHandler, filters, ContextTypes
 from telegram import Update
 
-from .config import BOT_TOKEN
-from .onboarding import (
-    start_command,
-    want_start_callback,
-    handle_time_input,
-    onboarding_open_mode_choice_callback,
-    onboarding_show_example_callback,
-    mode_pick_daily_callback,
-    mode_pick_by_mood_callback,
-)
-from .daily.set_time import handle_time_change_input
-from .handlers.reply_handlers import handle_reply_button
-from .handlers.suggest_practice import handle_practice_suggestion_input
-from .handlers.donations import (
-    handle_donations_callback,
-    handle_donate_card_callback,
-    handle_donate_stars_callback,
-    handle_stars_amount_callback,
-    handle_pre_checkout_query,
-    handle_successful_payment
+from .config import (
+    BOT_TOKEN, DB_AUTO_MIGRATE, LOOP_MONITOR_ENABLED, STORAGE_BACKEND, UPDATE_RECORD_PATH,
+    WEBHOOK_LISTEN, WEBHOOK_PORT, WEBHOOK_SECRET, WEBHOOK_URL,
 )
-from .handlers.done import handle_practice_done_callback
+from .lazy_handlers import lazy_handler, schedule_lazy_handlers_preload
+from .logging_setup import setup_logging
 from .daily.pause import schedule_pause_reminders
 from .by_mood.reminders import schedule_by_mood_reminders
-from .handlers.change_mode import change_mode_command
-from .handlers.progress import (
-    handle_progress_reset_callback,
-    handle_progress_reset_yes_callback,
-    handle_progress_reset_no_callback,
-)
-from .handlers.secret import (
-    secret_command,
-    handle_secret_input,
-    secret_delete_command,
-    secret_edit_command,
-    handle_secret_edit_input,
-)
 from .schedule.scheduler import schedule_daily_practices, send_test_practice
 from .challenge.job import schedule_challenge_summary
-from .challenge.admin import (
-    challenge_summary_preview_command,
-    challenge_summary_reset_command,
-    challenge_schedule_preview_command,
-)
-from .challenge.challenge_commands import (
-    CHALLENGE_TIME_FLOW_KEY,
-    challenge_command,
-    challenge_compact_command,
-    challenge_off_command,
-    handle_challenge_time_input,
-)
-from .handlers.suggest_practice import handle_suggest_practice_callback
-from .handlers.donations import handle_donations_callback
-from .handlers.progress import handle_progress_callback
-from .handlers.help import help_command
+from .schedule.daily_plan import schedule_daily_plan
+from .schedule.maintenance import schedule_practice_logs_maintenance
+from .outbox import schedule_outbox_sender
+from .keyboard_cleanup import schedule_keyboard_cleanup
+from .leader import start_leader_election, stop_leader_election
+from .dispatcher import PrioritizedRequest, close_shared_rate_limit
+from .router import ButtonRouter, CallbackRouter
+from .metrics import instrument_handlers, start_metrics_server, stop_metrics_server
+from .loop_monitor import start_loop_monitor, stop_loop_monitor
+from .tracing import TracedApplication, TracedJobQueue, start_tracing, stop_tracing
+from .update_recorder import install_update_recorder, stop_update_recorder
+from .challenge.challenge_commands import CHALLENGE_TIME_FLOW_KEY
 from .bot_commands import setup_bot_commands
-from app.by_mood.self_decide import handle_intensity_callback as by_mood_self_intensity_callback
-from app.by_mood.self_decide import handle_time_callback as by_mood_self_time_callback
-from app.daily.extra_practices import (
-    handle_extra_mood_callback,
-    handle_extra_self_intensity_callback,
-    handle_extra_self_time_callback,
-)
-
+from data.db import load_system_state, start_system_state_listener, stop_system_state_listener
+from data.migrations import ensure_schema
 
-async def suggest_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await handle_suggest_practice_callback(update, context)
+# Модули хендлеров импортируются при первом апдейте (app/lazy_handlers.py), задачи JobQueue — сразу
+start_command = lazy_handler("app.onboarding:start_command")
+want_start_callback = lazy_handler("app.onboarding:want_start_callback")
+handle_time_input = lazy_handler("app.onboarding:handle_time_input")
+onboarding_open_mode_choice_callback = lazy_handler("app.onboarding:onboarding_open_mode_choice_callback")
+onboarding_show_example_callback = lazy_handler("app.onboarding:onboarding_show_example_callback")
+mode_pick_daily_callback = lazy_handler("app.onboarding:mode_pick_daily_callback")
+mode_pick_by_mood_callback = lazy_handler("app.onboarding:mode_pick_by_mood_callback")
+handle_time_change_input = lazy_handler("app.daily.set_time:handle_time_change_input")
+handle_change_time_button = lazy_handler("app.handlers.reply_handlers:handle_change_time_button")
+handle_tips_button = lazy_handler("app.handlers.reply_handlers:handle_tips_button")
+handle_pause_button = lazy_handler("app.handlers.reply_handlers:handle_pause_button")
+handle_extra_practices_button = lazy_handler("app.handlers.reply_handlers:handle_extra_practices_button")
+handle_by_mood_button = lazy_handler("app.handlers.reply_handlers:handle_by_mood_button")
+handle_practice_suggestion_input = lazy_handler("app.handlers.suggest_practice:handle_practice_suggestion_input")
+suggest_command = lazy_handler("app.handlers.suggest_practice:handle_suggest_practice_callback")
+donate_command = lazy_handler("app.handlers.donations:handle_donations_callback")
+handle_donate_card_callback = lazy_handler("app.handlers.donations:handle_donate_card_callback")
+handle_donate_stars_callback = lazy_handler("app.handlers.donations:handle_donate_stars_callback")
+handle_stars_amount_callback = lazy_handler("app.handlers.donations:handle_stars_amount_callback")
+handle_pre_checkout_query = lazy_handler("app.handlers.donations:handle_pre_checkout_query")
+handle_successful_payment = lazy_handler("app.handlers.donations:handle_successful_payment")
+handle_practice_done_callback = lazy_handler("app.handlers.done:handle_practice_done_callback")
+change_mode_command = lazy_handler("app.handlers.change_mode:change_mode_command")
+progress_command = lazy_handler("app.handlers.progress:handle_progress_callback")
+handle_progress_reset_callback = lazy_handler("app.handlers.progress:handle_progress_reset_callback")
+handle_progress_reset_yes_callback = lazy_handler("app.handlers.progress:handle_progress_reset_yes_callback")
+handle_progress_reset_no_callback = lazy_handler("app.handlers.progress:handle_progress_reset_no_callback")
+secret_command = lazy_handler("app.handlers.secret:secret_command")
+handle_secret_input = lazy_handler("app.handlers.secret:handle_secret_input")
+secret_delete_command = lazy_handler("app.handlers.secret:secret_delete_command")
+secret_edit_command = lazy_handler("app.handlers.secret:secret_edit_command")
+handle_secret_edit_input = lazy_handler("app.handlers.secret:handle_secret_edit_input")
+challenge_summary_preview_command = lazy_handler("app.challenge.admin:challenge_summary_preview_command")
+challenge_summary_reset_command = lazy_handler("app.challenge.admin:challenge_summary_reset_command")
+challenge_schedule_preview_command = lazy_handler("app.challenge.admin:challenge_schedule_preview_command")
+db_stats_command = lazy_handler("app.handlers.db_stats:db_stats_command")
+profile_command = lazy_handler("app.handlers.profile:profile_command")
+daily_plan_command = lazy_handler("app.handlers.daily_plan:daily_plan_command")
+challenge_command = lazy_handler("app.challenge.challenge_commands:challenge_command")
+challenge_compact_command = lazy_handler("app.challenge.challenge_commands:challenge_compact_command")
+challenge_off_command = lazy_handler("app.challenge.challenge_commands:challenge_off_command")
+handle_challenge_time_input = lazy_handler("app.challenge.challenge_commands:handle_challenge_time_input")
+help_command = lazy_handler("app.handlers.help:help_command")
+by_mood_self_intensity_callback = lazy_handler("app.by_mood.self_decide:handle_intensity_callback")
+by_mood_self_time_callback = lazy_handler("app.by_mood.self_decide:handle_time_callback")
+handle_extra_mood_callback = lazy_handler("app.daily.extra_practices:handle_extra_mood_callback")
+handle_extra_self_intensity_callback = lazy_handler("app.daily.extra_practices:handle_extra_self_intensity_callback")
+handle_extra_self_time_callback = lazy_handler("app.daily.extra_practices:handle_extra_self_time_callback")
 
 
-async def donate_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await handle_donations_callback(update, context)
+async def _route_waiting_for_time(update: Update, context):
+    """Ввод времени: челлендж, изменение времени или онбординг."""
+    if context.user_data.get(CHALLENGE_TIME_FLOW_KEY):
+        await handle_challenge_time_input(update, context)
+    elif context.user_data.get('is_time_change'):
+        await handle_time_change_input(update, context)
+    else:
+        await handle_time_input(update, context)
 
 
-async def progress_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    await handle_progress_callback(update, context)
+# Флаг ожидания в user_data → обработчик текста; проверяются по порядку, срабатывает первый
+_TEXT_STATE_ROUTES = (
+    ('waiting_for_secret_edit', handle_secret_edit_input),
+    ('waiting_for_secret', handle_secret_input),
+    ('waiting_for_practice_suggestion', handle_practice_suggestion_input),
+    ('waiting_for_time', _route_waiting_for_time),
+)
 
 
 async def handle_text_input(update: Update, context):
@@ -90,66 +113,33 @@ async def handle_text_input(update: Update, context):
     
     Определяет, какой обработчик вызвать на основе состояния пользователя.
     """
-    print(f"=== DEBUG: handle_text_input вызвана ===")
-    print(f"Message text: '{update.message.text}'")
-    print(f"User data: {context.user_data}")
-
-    # Проверяем состояние ожидания редактирования рассылки
-    if context.user_data.get('waiting_for_secret_edit'):
-        await handle_secret_edit_input(update, context)
-        return
-    # Проверяем состояние ожидания рассылки
-    if context.user_data.get('waiting_for_secret'):
-        print("=== DEBUG: Переадресация на handle_secret_input ===")
-        await handle_secret_input(update, context)
-        return
-    
-    # Проверяем состояние ожидания предложения практики
-    if context.user_data.get('waiting_for_practice_suggestion'):
-        print("=== DEBUG: Переадресация на handle_practice_suggestion_input ===")
-        await handle_practice_suggestion_input(update, context)
-        return
-    
-    # Проверяем состояние ожидания ввода времени
-    if context.user_data.get('waiting_for_time'):
-        if context.user_data.get(CHALLENGE_TIME_FLOW_KEY):
-            print("=== DEBUG: Переадресация на handle_challenge_time_input ===")
-            await handle_challenge_time_input(update, context)
+    # Состояния ожидания ввода — в порядке приоритета (_TEXT_STATE_ROUTES)
+    for flag, route in _TEXT_STATE_ROUTES:
+        if context.user_data.get(flag):
+            logger.debug("Текст пользователя %s → %s", update.effective_user and update.effective_user.id, flag)
+            await route(update, context)
             return
-        # Проверяем, это изменение времени или онбординг
-        if context.user_data.get('is_time_change'):
-            print("=== DEBUG: Переадресация на handle_time_change_input (изменение времени) ===")
-            await handle_time_change_input(update, context)
-        else:
-            print("=== DEBUG: Переадресация на handle_time_input (онбординг) ===")
-            await handle_time_input(update, context)
-        return
 
+    # Без состояния в user_data: онбординг мог начаться до перезапуска бота — смотрим БД.
+    # Обычный пользователь (онбординг пройден) стоит одного запроса.
     from data.db import get_user_bot_mode, is_user_onboarding_required
 
-    if (
-        update.effective_user
-        and get_user_bot_mode(update.effective_user.id) == "challenge"
-        and is_user_onboarding_required(update.effective_user.id)
-    ):
-        print("=== DEBUG: Переадресация на handle_challenge_time_input (challenge из БД) ===")
-        await handle_challenge_time_input(update, context)
-        return
-
-    if (
-        update.effective_user
-        and is_user_onboarding_required(update.effective_user.id)
-        and get_user_bot_mode(update.effective_user.id) in ("pending", "daily")
-    ):
-        from app.onboarding import validate_time_format
-
-        is_valid, _ = validate_time_format(update.message.text or "")
-        if is_valid:
-            print("=== DEBUG: Переадресация на handle_time_input (время без кнопки) ===")
-            await handle_time_input(update, context)
+    user = update.effective_user
+    if user and is_user_onboarding_required(user.id):
+        mode = get_user_bot_mode(user.id)
+        if mode == "challenge":
+            logger.debug("Текст пользователя %s → время челленджа (онбординг из БД)", user.id)
+            await handle_challenge_time_input(update, context)
             return
+        if mode in ("pending", "daily"):
+            from app.onboarding import validate_time_format
+
+            is_valid, _ = validate_time_format(update.message.text or "")
+            if is_valid:
+                logger.debug("Текст пользователя %s → время онбординга без кнопки", user.id)
+                await handle_time_input(update, context)
+                return
 
-    print("=== DEBUG: Никакое состояние не установлено, сообщение игнорируется ===")
     # Если никакое состояние не установлено, сбрасываем возможные "зависшие" состояния
     # и игнорируем сообщение (это может быть обычное сообщение пользователя)
     context.user_data.pop('waiting_for_practice_suggestion', None)
@@ -157,11 +147,8 @@ async def handle_text_input(update: Update, context):
     context.user_data.pop('waiting_for_secret', None)
     context.user_data.pop('waiting_for_secret_edit', None)
 
-# Настройка логирования
-logging.basicConfig(
-    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-    level=logging.INFO
-)
+# Логирование через очередь и поток-писатель: LOG_LEVEL, LOG_FORMAT, LOG_SAMPLING (app/logging_setup.py)
+setup_logging()
 logger = logging.getLogger(__name__)
 
 
@@ -206,16 +193,91 @@ async def myid_command(update: Update, context):
     logger.info(f"Отправлен ID пользователю {user_id}: user_id={user_id}, chat_id={chat_id}")
 
 
-def main():
-    """Основная функция запуска бота."""
-    # Создаем приложение с JobQueue
-    application = (
-        Application.builder()
-        .token(BOT_TOKEN)
-        .post_init(setup_bot_commands)
-        .build()
+async def post_init(application: Application) -> None:
+    """Меню команд, HTTP-эндпоинт метрик и кэш system_state — после инициализации бота."""
+    await setup_bot_commands(application)
+    PROFILER.mark("bot_commands")
+    await start_metrics_server(application)
+    if LOOP_MONITOR_ENABLED:
+        start_loop_monitor()
+    # Флаги сводок читаются из памяти; поток-слушатель держит их в синхроне с БД
+    await asyncio.to_thread(load_system_state)
+    start_system_state_listener()
+    PROFILER.mark("system_state")
+    # Рассылки и прочие синглтон-задачи выполняет только реплика-лидер
+    await start_leader_election(application)
+    PROFILER.mark("leader_election")
+    # Первый тик JobQueue — после запуска опроса/вебхука: профиль старта закрывается там
+    application.job_queue.run_once(
+        report_startup, when=0, name="startup_profile", job_kwargs={"misfire_grace_time": None}
     )
 
+
+async def post_shutdown(application: Application) -> None:
+    await stop_leader_election(application)
+    await stop_metrics_server(application)
+    await stop_loop_monitor()
+    await asyncio.to_thread(stop_system_state_listener)
+    await asyncio.to_thread(close_shared_rate_limit)
+    await asyncio.to_thread(stop_update_recorder)
+    await asyncio.to_thread(stop_tracing)
+
+
+# Reply-кнопки Daily и By mood: точный текст → хендлер (ButtonRouter).
+# Кнопки By mood ведут в один хендлер — внутри проверяется режим.
+REPLY_BUTTON_ROUTES = {
+    "Изменить время": handle_change_time_button,
+    "Советы": handle_tips_button,
+    "Пауза": handle_pause_button,
+    "Еще практики": handle_extra_practices_button,
+    "Практика дня": handle_by_mood_button,
+    "Без коврика": handle_by_mood_button,
+    "Ленивые дни": handle_by_mood_button,
+    "Мини": handle_by_mood_button,
+    "Хард": handle_by_mood_button,
+    "Сам решу": handle_by_mood_button,
+}
+
+
+def register_handlers(application: Application) -> None:
+    """Регистрирует все хендлеры апдейтов, обработчик ошибок и замер длительности.
+
+    Вызывается из main() и из tools/replay_updates.py — воспроизведение идёт через тот же набор хендлеров.
+    """
+    # Роутеры — первыми в группе 0: callback-кнопки и reply-кнопки не пересекаются с командами
+    # и текстом, а так апдейт находит хендлер за одну проверку вместо двух десятков.
+    # Все callback-кнопки — один роутер: точное значение или префикс с полями (app/router.py).
+    # Поля шаблона хендлер получает в context.callback_payload.
+    callback_router = CallbackRouter()
+    # Онбординг и выбор режима
+    callback_router.add("onboarding_show_example", onboarding_show_example_callback)
+    callback_router.add("onboarding_open_mode_choice", onboarding_open_mode_choice_callback)
+    callback_router.add("mode_pick_daily", mode_pick_daily_callback)
+    callback_router.add("mode_pick_by_mood", mode_pick_by_mood_callback)
+    callback_router.add("want_start", want_start_callback)
+    # «Сам решу» и «Еще практики»
+    callback_router.add("self_time:{time}", by_mood_self_time_callback)
+    callback_router.add("self_intensity:{time}:{intensity}", by_mood_self_intensity_callback)
+    callback_router.add("extra_mood:{slug}", handle_extra_mood_callback)
+    callback_router.add("extra_self_time:{time}", handle_extra_self_time_callback)
+    callback_router.add("extra_self_intensity:{time}:{intensity}", handle_extra_self_intensity_callback)
+    # Донаты и выбор количества звезд
+    callback_router.add("donate_card", handle_donate_card_callback)
+    callback_router.add("donate_stars", handle_donate_stars_callback)
+    callback_router.add("stars_{amount:int}", handle_stars_amount_callback)
+    # Трекер прогресса: кнопка «✅ Я сделал!» и «Мой прогресс» / сброс
+    callback_router.add("practice_done", handle_practice_done_callback)
+    callback_router.add("progress_reset", handle_progress_reset_callback)
+    callback_router.add("progress_reset_yes", handle_progress_reset_yes_callback)
+    callback_router.add("progress_reset_no", handle_progress_reset_no_callback)
+    application.add_handler(callback_router)
+
+    # Reply-кнопки Daily и By mood — по точному тексту, только в личке
+    button_router = ButtonRouter()
+    for label, callback in REPLY_BUTTON_ROUTES.items():
+        button_router.add(label, callback)
+    application.add_handler(button_router)
+
     # Регистрируем обработчики команд
     application.add_handler(CommandHandler("start", start_command))
     application.add_handler(CommandHandler("change_mode", change_mode_command))
@@ -233,60 +295,15 @@ def main():
     application.add_handler(CommandHandler("challenge_summary_preview", challenge_summary_preview_command))
     application.add_handler(CommandHandler("challenge_summary_reset", challenge_summary_reset_command))
     application.add_handler(CommandHandler("challenge_schedule_preview", challenge_schedule_preview_command))
+    application.add_handler(CommandHandler("db_stats", db_stats_command))
+    application.add_handler(CommandHandler("profile", profile_command))
+    application.add_handler(CommandHandler("plan", daily_plan_command))
     application.add_handler(MessageHandler(filters.COMMAND & filters.Regex(r"^/challenge(?:@[\w_]+)?\d+$"), challenge_compact_command))
-    
-    # Регистрируем обработчики callback-запросов (онбординг и выбор режима)
-    application.add_handler(CallbackQueryHandler(onboarding_show_example_callback, pattern="^onboarding_show_example$"))
-    application.add_handler(CallbackQueryHandler(onboarding_open_mode_choice_callback, pattern="^onboarding_open_mode_choice$"))
-    application.add_handler(CallbackQueryHandler(mode_pick_daily_callback, pattern="^mode_pick_daily$"))
-    application.add_handler(CallbackQueryHandler(mode_pick_by_mood_callback, pattern="^mode_pick_by_mood$"))
-    application.add_handler(CallbackQueryHandler(want_start_callback, pattern="^want_start$"))
-    application.add_handler(CallbackQueryHandler(by_mood_self_time_callback, pattern="^self_time:"))
-    application.add_handler(CallbackQueryHandler(by_mood_self_intensity_callback, pattern="^self_intensity:"))
-    application.add_handler(CallbackQueryHandler(handle_extra_mood_callback, pattern="^extra_mood:"))
-    application.add_handler(CallbackQueryHandler(handle_extra_self_time_callback, pattern="^extra_self_time:"))
-    application.add_handler(
-        CallbackQueryHandler(handle_extra_self_intensity_callback, pattern="^extra_self_intensity:")
-    )
 
-    # Регистрируем обработчики для донатов
-    application.add_handler(CallbackQueryHandler(handle_donate_card_callback, pattern="^donate_card$"))
-    application.add_handler(CallbackQueryHandler(handle_donate_stars_callback, pattern="^donate_stars$"))
-    
-    # Регистрируем обработчики для выбора количества звезд
-    application.add_handler(CallbackQueryHandler(handle_stars_amount_callback, pattern="^stars_"))
-
-    # Трекер прогресса: кнопка «✅ Я сделал!» и «Мой прогресс» / сброс
-    application.add_handler(CallbackQueryHandler(handle_practice_done_callback, pattern="^practice_done$"))
-    application.add_handler(CallbackQueryHandler(handle_progress_reset_callback, pattern="^progress_reset$"))
-    application.add_handler(CallbackQueryHandler(handle_progress_reset_yes_callback, pattern="^progress_reset_yes$"))
-    application.add_handler(CallbackQueryHandler(handle_progress_reset_no_callback, pattern="^progress_reset_no$"))
-    
     # Регистрируем обработчики для платежей
     application.add_handler(MessageHandler(filters.SUCCESSFUL_PAYMENT, handle_successful_payment))
     application.add_handler(PreCheckoutQueryHandler(handle_pre_checkout_query))
     
-    # Reply-кнопки Daily и By mood (один обработчик — внутри проверяется режим)
-    reply_buttons = [
-        "Изменить время",
-        "Советы",
-        "Пауза",
-        "Еще практики",
-        "Практика дня",
-        "Без коврика",
-        "Ленивые дни",
-        "Мини",
-        "Хард",
-        "Сам решу",
-    ]
-    escaped = [re.escape(b) for b in reply_buttons]
-    application.add_handler(
-        MessageHandler(
-            filters.TEXT & filters.Regex(f"^({'|'.join(escaped)})$") & filters.ChatType.PRIVATE,
-            handle_reply_button,
-        )
-    )
-    
     # Регистрируем обработчик фото для массовой рассылки (с высоким приоритетом)
     # Этот обработчик проверяет состояние waiting_for_secret и обрабатывает фото с подписью
     async def handle_photo_or_text_for_secret(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -316,18 +333,78 @@ def main():
     
     # Регистрируем обработчик ошибок
     application.add_error_handler(error_handler)
-    
+    # Замер длительности всех хендлеров (метка — паттерн callback_data или /команда)
+    instrument_handlers(application)
+
+
+def main():
+    """Основная функция запуска бота."""
+    PROFILER.mark("imports")
+    # Один запрос к schema_version; отставшую схему догоняем миграциями (или только предупреждаем)
+    if STORAGE_BACKEND == "memory":
+        logger.warning("STORAGE_BACKEND=memory: данные хранятся в памяти процесса и пропадут при перезапуске")
+    else:
+        try:
+            ensure_schema(auto_migrate=DB_AUTO_MIGRATE)
+        except Exception as e:
+            # На недомигрированной схеме бот не запускаем: миграция откачена, её нужно починить
+            logger.critical(f"Ошибка проверки или миграции схемы БД, запуск остановлен: {e}")
+            sys.exit(1)
+    PROFILER.mark("schema")
+
+    # Создаем приложение с JobQueue.
+    # PrioritizedRequest — HTTPXRequest с метриками задержки/ошибок Bot API и общим бюджетом
+    # отправки по полосам приоритета (app/dispatcher.py).
+    # TracedApplication/TracedJobQueue открывают корневой спан на апдейт и запуск джоба;
+    # пока TRACE_FILE и TRACE_OTLP_ENDPOINT пусты, это одна проверка (app/tracing.py).
+    start_tracing()
+    application = (
+        Application.builder()
+        .application_class(TracedApplication)
+        .job_queue(TracedJobQueue())
+        .token(BOT_TOKEN)
+        .request(PrioritizedRequest(connection_pool_size=256))
+        .post_init(post_init)
+        .post_shutdown(post_shutdown)
+        .build()
+    )
+
+    register_handlers(application)
+    # Запись входящих апдейтов для воспроизведения (UPDATE_RECORD_PATH, по умолчанию выключена)
+    if UPDATE_RECORD_PATH:
+        install_update_recorder(application, UPDATE_RECORD_PATH, keep_texts=REPLY_BUTTON_ROUTES)
+
     # Планируем ежедневную отправку практик
     schedule_daily_practices(application)
+    schedule_daily_plan(application)
     # Планируем напоминания пользователям в режиме паузы (логика паузы живет в handlers/pause.py)
     schedule_pause_reminders(application)
     # Планируем напоминания неактивным пользователям в режиме By mood
     schedule_by_mood_reminders(application)
     schedule_challenge_summary(application)
+    # Партиции practice_logs на будущие месяцы и свёртка холодных логов в агрегаты
+    schedule_practice_logs_maintenance(application)
+    # Отправка плановых сообщений из outbox (работает во всех репликах)
+    schedule_outbox_sender(application)
+    schedule_keyboard_cleanup(application)
+    schedule_lazy_handlers_preload(application)
+    PROFILER.mark("setup")
     
     # Запускаем бота
     logger.info("Запускаем YogaDailyBot с JobQueue...")
-    application.run_polling(allowed_updates=Update.ALL_TYPES)
+    if WEBHOOK_URL:
+        # Вебхук: апдейты можно раздавать нескольким репликам через балансировщик
+        url_path = urlsplit(WEBHOOK_URL).path.lstrip("/")
+        application.run_webhook(
+            listen=WEBHOOK_LISTEN,
+            port=WEBHOOK_PORT,
+            url_path=url_path,
+            webhook_url=WEBHOOK_URL,
+            secret_token=WEBHOOK_SECRET or None,
+            allowed_updates=Update.ALL_TYPES,
+        )
+    else:
+        application.run_polling(allowed_updates=Update.ALL_TYPES)
 
 
 if __name__ == "__main__":
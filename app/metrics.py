@@ -0,0 +1,411 @@
+"""Метрики бота в формате Prometheus и HTTP-эндпоинт /metrics.
+
+Что считаем:
+- yogabot_messages_sent_total{kind} — отправленные сообщения: daily, challenge, bonus,
+  by_mood, broadcast, reminder;
+- yogabot_telegram_request_seconds{method} и yogabot_telegram_errors_total{method,code} —
+  задержка и ошибки Bot API (InstrumentedRequest вместо стандартного HTTPXRequest);
+- yogabot_delivery_lag_seconds — насколько ежедневная практика опоздала относительно notify_time;
+- yogabot_job_duration_seconds{job} — длительность фоновых задач (декоратор timed_job);
+- yogabot_handler_duration_seconds{handler} — длительность хендлеров по паттерну callback/команде;
+- yogabot_event_loop_lag_seconds и yogabot_event_loop_stall_seconds{activity,site} — задержка
+  цикла событий и его блокировки синхронным кодом (app/loop_monitor.py).
+
+timed_job и instrument_handlers запоминают, какой джоб или хендлер сейчас выполняется в задаче
+asyncio (current_activity) — по этой метке монитор цикла называет виновника блокировки.
+
+Счётчики обновляются только из потока event loop (хендлеры и джобы PTB), поэтому это
+простые словари без локов и без await — обновление стоит пару операций со словарём.
+Статистика слоя БД (data/instrumentation.py) отдаётся тем же эндпоинтом.
+
+Эндпоинт включается переменной METRICS_PORT (по умолчанию выключен) и слушает METRICS_HOST
+(по умолчанию 127.0.0.1).
+"""
+
+import asyncio
+import bisect
+import functools
+import logging
+import re
+import time
+from datetime import datetime
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from telegram.error import TimedOut
+from telegram.ext import CallbackQueryHandler, CommandHandler
+from telegram.request import HTTPXRequest
+
+from app import clock
+from app.config import DEFAULT_TZ, METRICS_HOST, METRICS_PORT
+from app.router import ButtonRouter, CallbackRouter
+from app.tracing import KIND_CLIENT, start_span
+
+logger = logging.getLogger(__name__)
+
+MOSCOW_TZ = ZoneInfo(DEFAULT_TZ)
+
+# Границы корзин по умолчанию, секунды: от запросов к API до долгих джобов
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Опоздание рассылки: от «вовремя» до «дослали к вечеру»
+LAG_BUCKETS = (5, 15, 30, 60, 120, 300, 600, 1800, 3600, 2 * 3600, 6 * 3600, 12 * 3600)
+# Задержка цикла событий, сек: от миллисекунды (норма) до блокировки на десятки секунд
+LOOP_LAG_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+
+def _escape_label(value) -> str:
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(names: tuple, values: tuple, extra: str = "") -> str:
+    pairs = [f'{name}="{_escape_label(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str, label_names: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: dict = {}
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} counter"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Gauge:
+    def __init__(self, name: str, help_text: str, label_names: tuple = ()):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self._values: dict = {}
+
+    def set(self, value: float, *labels) -> None:
+        self._values[labels] = value
+
+    def inc(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) + amount
+
+    def dec(self, *labels, amount: float = 1) -> None:
+        self._values[labels] = self._values.get(labels, 0) - amount
+
+    def value(self, *labels) -> float:
+        return self._values.get(labels, 0)
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} gauge"]
+        for labels, value in sorted(self._values.items()):
+            lines.append(f"{self.name}{_format_labels(self.label_names, labels)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help_text: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.label_names = label_names
+        self.buckets = tuple(buckets)
+        # labels -> [счётчики по корзинам (+Inf последним), сумма, количество]
+        self._series: dict = {}
+
+    def observe(self, value: float, *labels) -> None:
+        series = self._series.get(labels)
+        if series is None:
+            series = self._series[labels] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        series[0][bisect.bisect_left(self.buckets, value)] += 1
+        series[1] += value
+        series[2] += 1
+
+    def render(self) -> list:
+        lines = [f"# HELP {self.name} {self.help_text}", f"# TYPE {self.name} histogram"]
+        for labels, (counts, total, count) in sorted(self._series.items()):
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                le = 'le="%s"' % bound
+                lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {cumulative}")
+            le = 'le="+Inf"'
+            lines.append(f"{self.name}_bucket{_format_labels(self.label_names, labels, le)} {count}")
+            lines.append(f"{self.name}_sum{_format_labels(self.label_names, labels)} {total:.6f}")
+            lines.append(f"{self.name}_count{_format_labels(self.label_names, labels)} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self._metrics: list = []
+
+    def counter(self, name: str, help_text: str, label_names: tuple = ()) -> Counter:
+        metric = Counter(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def gauge(self, name: str, help_text: str, label_names: tuple = ()) -> Gauge:
+        metric = Gauge(name, help_text, label_names)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name: str, help_text: str, label_names: tuple = (), buckets: tuple = DEFAULT_BUCKETS) -> Histogram:
+        metric = Histogram(name, help_text, label_names, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics:
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+MESSAGES_SENT = REGISTRY.counter(
+    "yogabot_messages_sent_total", "Отправленные сообщения по типу", ("kind",)
+)
+TELEGRAM_REQUEST_SECONDS = REGISTRY.histogram(
+    "yogabot_telegram_request_seconds", "Длительность запросов к Bot API", ("method",)
+)
+TELEGRAM_ERRORS = REGISTRY.counter(
+    "yogabot_telegram_errors_total", "Ошибки Bot API по методу и коду ответа", ("method", "code")
+)
+DELIVERY_LAG_SECONDS = REGISTRY.histogram(
+    "yogabot_delivery_lag_seconds", "Опоздание ежедневной практики относительно notify_time", (), LAG_BUCKETS
+)
+JOB_DURATION_SECONDS = REGISTRY.histogram(
+    "yogabot_job_duration_seconds", "Длительность фоновых задач JobQueue", ("job",)
+)
+HANDLER_DURATION_SECONDS = REGISTRY.histogram(
+    "yogabot_handler_duration_seconds", "Длительность хендлеров по паттерну", ("handler",)
+)
+LOOP_LAG_SECONDS = REGISTRY.histogram(
+    "yogabot_event_loop_lag_seconds", "Опоздание пробуждения задачи-монитора цикла событий", (), LOOP_LAG_BUCKETS
+)
+LOOP_STALL_SECONDS = REGISTRY.histogram(
+    "yogabot_event_loop_stall_seconds",
+    "Блокировки цикла событий выше порога: хендлер/джоб и место в коде",
+    ("activity", "site"),
+    LOOP_LAG_BUCKETS,
+)
+STARTUP_SECONDS = REGISTRY.gauge(
+    "yogabot_startup_seconds", "Длительность фаз старта процесса (app/startup_profile.py)", ("phase",)
+)
+
+
+def count_message(kind: str, amount: int = 1) -> None:
+    """+1 к отправленным сообщениям типа kind (daily, challenge, bonus, by_mood, broadcast, reminder)."""
+    MESSAGES_SENT.inc(kind, amount=amount)
+
+
+def observe_delivery_lag(notify_time: Optional[str], now: Optional[datetime] = None) -> None:
+    """Сколько секунд прошло от notify_time (ЧЧ:ММ, МСК) сегодняшнего дня до отправки."""
+    if not notify_time:
+        return
+    try:
+        hours, minutes = map(int, str(notify_time).split(":")[:2])
+    except ValueError:
+        return
+    now = now or clock.now(MOSCOW_TZ)
+    scheduled = now.replace(hour=hours, minute=minutes, second=0, microsecond=0)
+    DELIVERY_LAG_SECONDS.observe(max(0.0, (now - scheduled).total_seconds()))
+
+
+# Задача asyncio → метка выполняемого в ней хендлера или джоба
+_ACTIVITIES: dict = {}
+
+
+def _enter_activity(label: str):
+    task = asyncio.current_task()
+    previous = _ACTIVITIES.get(task)
+    _ACTIVITIES[task] = label
+    return task, previous
+
+
+def _exit_activity(task, previous) -> None:
+    if previous is None:
+        _ACTIVITIES.pop(task, None)
+    else:
+        _ACTIVITIES[task] = previous
+
+
+def current_activity(task) -> Optional[str]:
+    """Метка хендлера/джоба, который сейчас выполняется в задаче (None — не размечено)."""
+    return _ACTIVITIES.get(task)
+
+
+def timed_job(func):
+    """Декоратор для callback'ов JobQueue: длительность под именем джоба (или функции)."""
+
+    @functools.wraps(func)
+    async def wrapper(context, *args, **kwargs):
+        job = getattr(context, "job", None)
+        name = getattr(job, "name", None) or func.__name__
+        activity = _enter_activity(f"job:{name}")
+        started = time.perf_counter()
+        try:
+            return await func(context, *args, **kwargs)
+        finally:
+            JOB_DURATION_SECONDS.observe(time.perf_counter() - started, name)
+            _exit_activity(*activity)
+
+    return wrapper
+
+
+def _handler_label(handler, check_result=None) -> str:
+    """Метка хендлера; у роутеров — метка маршрута из check_result (если передан)."""
+    if isinstance(handler, (CallbackRouter, ButtonRouter)):
+        return check_result[0].label if check_result else type(handler).__name__
+    if isinstance(handler, CommandHandler):
+        return "/" + ",".join(sorted(handler.commands))
+    if isinstance(handler, CallbackQueryHandler):
+        pattern = handler.pattern
+        if isinstance(pattern, re.Pattern):
+            return pattern.pattern
+        if isinstance(pattern, str):
+            return pattern
+    return getattr(handler.callback, "__name__", type(handler).__name__)
+
+
+def instrument_handlers(application) -> int:
+    """Оборачивает callback'и зарегистрированных хендлеров замером длительности.
+
+    Вызывается после всех add_handler: метка — паттерн callback_data, /команда или имя функции.
+    У CallbackRouter и ButtonRouter оборачивается каждый маршрут со своей меткой.
+
+    Returns:
+        int: сколько хендлеров (маршрутов) обёрнуто
+    """
+    wrapped = 0
+    for handlers in application.handlers.values():
+        for handler in handlers:
+            if isinstance(handler, (CallbackRouter, ButtonRouter)):
+                targets = [(route, route.label) for route in handler.routes()]
+            else:
+                targets = [(handler, _handler_label(handler))]
+            for target, label in targets:
+                callback = target.callback
+                if getattr(callback, "__metrics_wrapped__", False):
+                    continue
+                target.callback = _timed_handler(callback, label)
+                wrapped += 1
+    return wrapped
+
+
+def _timed_handler(callback, label: str):
+    @functools.wraps(callback)
+    async def timed(update, context):
+        activity = _enter_activity(label)
+        span = start_span(f"handler {label}")
+        if span is not None and span.trace.spans[0].name == "update":
+            # Корень апдейта называется по первому сработавшему хендлеру
+            span.trace.spans[0].name = f"update {label}"
+        started = time.perf_counter()
+        error = None
+        try:
+            return await callback(update, context)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            HANDLER_DURATION_SECONDS.observe(time.perf_counter() - started, label)
+            if span is not None:
+                span.end(error)
+            _exit_activity(*activity)
+
+    timed.__metrics_wrapped__ = True
+    return timed
+
+
+class InstrumentedRequest(HTTPXRequest):
+    """HTTPXRequest с замером длительности и кодов ошибок каждого метода Bot API."""
+
+    async def do_request(self, url: str, method: str, request_data=None, *args, **kwargs):
+        api_method = url.rsplit("/", 1)[-1]
+        span = start_span(f"http {api_method}", KIND_CLIENT)
+        started = time.perf_counter()
+        try:
+            code, payload = await super().do_request(url, method, request_data, *args, **kwargs)
+        except TimedOut as e:
+            TELEGRAM_ERRORS.inc(api_method, "timeout")
+            if span is not None:
+                span.end(e)
+            raise
+        except Exception as e:
+            TELEGRAM_ERRORS.inc(api_method, "network")
+            if span is not None:
+                span.end(e)
+            raise
+        finally:
+            TELEGRAM_REQUEST_SECONDS.observe(time.perf_counter() - started, api_method)
+        if code >= 400:
+            TELEGRAM_ERRORS.inc(api_method, str(code))
+        if span is not None:
+            span.set("http.status_code", code)
+            span.end()
+        return code, payload
+
+
+def render_metrics() -> str:
+    """Все метрики: бот + слой БД."""
+    from data.instrumentation import render_prometheus
+
+    return REGISTRY.render() + render_prometheus()
+
+
+async def _handle_http(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    try:
+        request_line = await asyncio.wait_for(reader.readline(), timeout=5)
+        # Заголовки не нужны, но их надо дочитать до пустой строки
+        while True:
+            line = await asyncio.wait_for(reader.readline(), timeout=5)
+            if not line or line in (b"\r\n", b"\n"):
+                break
+        parts = request_line.decode("latin-1").split()
+        path = parts[1] if len(parts) >= 2 else "/"
+
+        if path.split("?", 1)[0] == "/metrics":
+            status, content_type, body = "200 OK", "text/plain; version=0.0.4; charset=utf-8", render_metrics()
+        elif path == "/healthz":
+            status, content_type, body = "200 OK", "text/plain; charset=utf-8", "ok\n"
+        else:
+            status, content_type, body = "404 Not Found", "text/plain; charset=utf-8", "not found\n"
+
+        data = body.encode("utf-8")
+        writer.write(
+            f"HTTP/1.1 {status}\r\nContent-Type: {content_type}\r\n"
+            f"Content-Length: {len(data)}\r\nConnection: close\r\n\r\n".encode("latin-1") + data
+        )
+        await writer.drain()
+    except Exception as e:
+        logger.debug("Ошибка запроса к /metrics: %s", e)
+    finally:
+        writer.close()
+
+
+async def start_metrics_server(application) -> None:
+    """Поднимает HTTP-эндпоинт метрик (post_init), если задан METRICS_PORT."""
+    if not METRICS_PORT:
+        return
+    try:
+        server = await asyncio.start_server(_handle_http, METRICS_HOST, METRICS_PORT)
+        application.bot_data["metrics_server"] = server
+        logger.info(f"Метрики доступны на http://{METRICS_HOST}:{METRICS_PORT}/metrics")
+    except Exception as e:
+        logger.error(f"Не удалось запустить сервер метрик на {METRICS_HOST}:{METRICS_PORT}: {e}")
+
+
+async def stop_metrics_server(application) -> None:
+    server = application.bot_data.pop("metrics_server", None)
+    if server:
+        server.close()
+        await server.wait_closed()
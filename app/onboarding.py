@@ -3,6 +3,7 @@
 """
 
 import asyncio
+import logging
 import re
 from datetime import datetime, timedelta
 from typing import Optional
@@ -11,6 +12,10 @@ from telegram.ext import ContextTypes, CallbackContext
 from data.db import activate_user_by_mood
 from data.db import get_yoga_practice_by_video_id
 from app.schedule.scheduler import format_practice_message
+from app.dispatcher import REMINDER, outbound_lane
+from app.metrics import count_message
+
+logger = logging.getLogger(__name__)
 
 ONBOARDING_EXAMPLE_VIDEO_URL = "https://youtu.be/2s0T9z9v-aQ?si=cdK69rPKdQXTu0l4"
 ONBOARDING_EXAMPLE_VIDEO_ID = "2s0T9z9v-aQ"
@@ -159,7 +164,7 @@ async def _cancel_named_jobs(context: ContextTypes.DEFAULT_TYPE, job_names: list
             for job in job_queue.get_jobs_by_name(job_name):
                 job.schedule_removal()
         except Exception as e:
-            print(f"Ошибка отмены задачи '{job_name}': {e}")
+            logger.error(f"Ошибка отмены задачи '{job_name}': {e}")
     try:
         scheduler = job_queue.scheduler
         for job_name in job_names:
@@ -169,7 +174,7 @@ async def _cancel_named_jobs(context: ContextTypes.DEFAULT_TYPE, job_names: list
             except Exception:
                 pass
     except Exception as e:
-        print(f"Ошибка доступа к scheduler: {e}")
+        logger.error(f"Ошибка доступа к scheduler: {e}")
 
 
 async def strip_inline_keyboard(
@@ -182,7 +187,7 @@ async def strip_inline_keyboard(
             chat_id=chat_id, message_id=message_id, reply_markup=None
         )
     except Exception as e:
-        print(f"Не удалось снять inline-кнопки с сообщения {message_id}: {e}")
+        logger.warning(f"Не удалось снять inline-кнопки с сообщения {message_id}: {e}")
 
 
 async def _send_reminder_message(
@@ -191,12 +196,14 @@ async def _send_reminder_message(
     text: str,
     reply_markup=None,
 ) -> None:
-    await context.bot.send_message(
-        chat_id,
-        text,
-        reply_markup=reply_markup,
-        parse_mode="Markdown",
-    )
+    with outbound_lane(REMINDER):
+        await context.bot.send_message(
+            chat_id,
+            text,
+            reply_markup=reply_markup,
+            parse_mode="Markdown",
+        )
+    count_message("reminder")
 
 
 def _remember_onboarding_keyboard_state(
@@ -224,7 +231,7 @@ async def _remove_previous_onboarding_keyboard(context: ContextTypes.DEFAULT_TYP
             reply_markup=None,
         )
     except Exception as e:
-        print(f"Не удалось убрать предыдущие onboarding-кнопки: {e}")
+        logger.warning(f"Не удалось убрать предыдущие onboarding-кнопки: {e}")
 
 
 async def send_mode_start_reminder_1h(context: ContextTypes.DEFAULT_TYPE):
@@ -242,7 +249,7 @@ async def send_mode_start_reminder_1h(context: ContextTypes.DEFAULT_TYPE):
             reply_markup=get_start_onboarding_keyboard(),
         )
     except Exception as e:
-        print(f"Ошибка напоминания о режиме после /start (1ч): {e}")
+        logger.error(f"Ошибка напоминания о режиме после /start (1ч): {e}")
 
 
 async def send_mode_start_reminder_24h(context: ContextTypes.DEFAULT_TYPE):
@@ -260,7 +267,7 @@ async def send_mode_start_reminder_24h(context: ContextTypes.DEFAULT_TYPE):
             reply_markup=get_start_onboarding_keyboard(),
         )
     except Exception as e:
-        print(f"Ошибка напоминания о режиме после /start (24ч): {e}")
+        logger.error(f"Ошибка напоминания о режиме после /start (24ч): {e}")
 
 
 async def send_mode_pick_reminder_1h(context: ContextTypes.DEFAULT_TYPE):
@@ -278,7 +285,7 @@ async def send_mode_pick_reminder_1h(context: ContextTypes.DEFAULT_TYPE):
             reply_markup=get_mode_choice_keyboard(),
         )
     except Exception as e:
-        print(f"Ошибка напоминания на экране режима (1ч): {e}")
+        logger.error(f"Ошибка напоминания на экране режима (1ч): {e}")
 
 
 async def send_mode_pick_reminder_24h(context: ContextTypes.DEFAULT_TYPE):
@@ -296,7 +303,7 @@ async def send_mode_pick_reminder_24h(context: ContextTypes.DEFAULT_TYPE):
             reply_markup=get_mode_choice_keyboard(),
         )
     except Exception as e:
-        print(f"Ошибка напоминания на экране режима (24ч): {e}")
+        logger.error(f"Ошибка напоминания на экране режима (24ч): {e}")
 
 
 async def send_time_pick_reminder_1h(context: ContextTypes.DEFAULT_TYPE):
@@ -314,7 +321,7 @@ async def send_time_pick_reminder_1h(context: ContextTypes.DEFAULT_TYPE):
             context, chat_id, TIME_REMINDER_AFTER_DAILY_PICK_1H
         )
     except Exception as e:
-        print(f"Ошибка напоминания о времени после Daily (1ч): {e}")
+        logger.error(f"Ошибка напоминания о времени после Daily (1ч): {e}")
 
 
 async def send_time_pick_reminder_24h(context: ContextTypes.DEFAULT_TYPE):
@@ -332,7 +339,7 @@ async def send_time_pick_reminder_24h(context: ContextTypes.DEFAULT_TYPE):
             context, chat_id, TIME_REMINDER_AFTER_DAILY_PICK_24H
         )
     except Exception as e:
-        print(f"Ошибка напоминания о времени после Daily (24ч): {e}")
+        logger.error(f"Ошибка напоминания о времени после Daily (24ч): {e}")
 
 
 async def send_time_input_reminder_1h(context: ContextTypes.DEFAULT_TYPE):
@@ -347,7 +354,7 @@ async def send_time_input_reminder_1h(context: ContextTypes.DEFAULT_TYPE):
             context, chat_id, TIME_REMINDER_AFTER_TIME_BUTTON_1H
         )
     except Exception as e:
-        print(f"Ошибка напоминания о вводе времени (1ч): {e}")
+        logger.error(f"Ошибка напоминания о вводе времени (1ч): {e}")
 
 
 async def send_time_input_reminder_24h(context: ContextTypes.DEFAULT_TYPE):
@@ -362,13 +369,13 @@ async def send_time_input_reminder_24h(context: ContextTypes.DEFAULT_TYPE):
             context, chat_id, TIME_REMINDER_AFTER_TIME_BUTTON_24H
         )
     except Exception as e:
-        print(f"Ошибка напоминания о вводе времени (24ч): {e}")
+        logger.error(f"Ошибка напоминания о вводе времени (24ч): {e}")
 
 
 async def schedule_mode_reminders(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int):
     """Напоминания о выборе режима через 1 и 24 ч после /start."""
     if not hasattr(context, "job_queue") or context.job_queue is None:
-        print("JobQueue недоступен — напоминания о выборе режима не будут отправлены")
+        logger.warning("JobQueue недоступен — напоминания о выборе режима не будут отправлены")
         return
 
     await cancel_mode_reminders(context, user_id)
@@ -387,7 +394,7 @@ async def schedule_mode_reminders(context: ContextTypes.DEFAULT_TYPE, chat_id: i
             name=f"mode_start_reminder_24h_{user_id}",
         )
     except Exception as e:
-        print(f"Ошибка планирования напоминаний о режиме после /start: {e}")
+        logger.error(f"Ошибка планирования напоминаний о режиме после /start: {e}")
 
 
 async def schedule_mode_pick_reminders(
@@ -423,7 +430,7 @@ async def schedule_mode_pick_reminders(
             name=f"mode_pick_reminder_24h_{user_id}",
         )
     except Exception as e:
-        print(f"Ошибка планирования напоминаний на экране режима: {e}")
+        logger.error(f"Ошибка планирования напоминаний на экране режима: {e}")
 
 
 async def cancel_mode_reminders(context: ContextTypes.DEFAULT_TYPE, user_id: int):
@@ -444,7 +451,7 @@ async def schedule_time_pick_reminders(
 ):
     """Напоминания о времени: выбрали Daily/Challenge, но не нажали «Выбрать время»."""
     if not hasattr(context, "job_queue") or context.job_queue is None:
-        print("JobQueue недоступен — напоминания о времени не будут отправлены")
+        logger.warning("JobQueue недоступен — напоминания о времени не будут отправлены")
         return
 
     await _cancel_named_jobs(context, _time_pick_job_names(user_id))
@@ -469,13 +476,13 @@ async def schedule_time_pick_reminders(
             name=f"time_pick_reminder_24h_{user_id}",
         )
     except Exception as e:
-        print(f"Ошибка планирования напоминаний о времени (Daily): {e}")
+        logger.error(f"Ошибка планирования напоминаний о времени (Daily): {e}")
 
 
 async def schedule_reminders(context: ContextTypes.DEFAULT_TYPE, chat_id: int, user_id: int):
     """Напоминания о времени: нажали «Выбрать время», но не ввели."""
     if not hasattr(context, "job_queue") or context.job_queue is None:
-        print("JobQueue недоступен — напоминания не будут отправлены")
+        logger.warning("JobQueue недоступен — напоминания не будут отправлены")
         return
 
     await _cancel_named_jobs(context, _time_pick_job_names(user_id))
@@ -496,7 +503,7 @@ async def schedule_reminders(context: ContextTypes.DEFAULT_TYPE, chat_id: int, u
             name=f"time_input_reminder_24h_{user_id}",
         )
     except Exception as e:
-        print(f"Ошибка планирования напоминаний о вводе времени: {e}")
+        logger.error(f"Ошибка планирования напоминаний о вводе времени: {e}")
 
 
 async def cancel_reminders(context: ContextTypes.DEFAULT_TYPE, user_id: int):
@@ -515,7 +522,7 @@ async def remove_callback_keyboard(query):
     try:
         await query.edit_message_reply_markup(reply_markup=None)
     except Exception as e:
-        print(f"Не удалось убрать inline-кнопки после callback {query.data}: {e}")
+        logger.warning(f"Не удалось убрать inline-кнопки после callback {query.data}: {e}")
 
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -818,11 +825,8 @@ async def want_start_callback(update: Update, context: CallbackContext):
         update: Объект обновления от Telegram
         context: Контекст бота
     """
-    print("=== want_start_callback вызван ===")
-    
     # Получаем callback query (нажатие кнопки)
     query = update.callback_query
-    print(f"Callback data: {query.data}")
 
     user_id = update.effective_user.id
     from app.challenge.challenge_commands import (
@@ -878,7 +882,7 @@ async def want_start_callback(update: Update, context: CallbackContext):
     if hasattr(context, 'job_queue') and context.job_queue is not None:
         await schedule_reminders(context, chat_id, user_id)
     else:
-        print("JobQueue недоступен - напоминания не будут отправлены")
+        logger.warning("JobQueue недоступен - напоминания не будут отправлены")
 
 
 async def handle_time_input(update: Update, context: CallbackContext):
@@ -890,13 +894,7 @@ async def handle_time_input(update: Update, context: CallbackContext):
         update: Объект обновления от Telegram
         context: Контекст бота
     """
-    print(f"=== DEBUG: handle_time_input (онбординг) вызвана ===")
-    print(f"User data: {context.user_data}")
-    print(f"Waiting for time: {context.user_data.get('waiting_for_time')}")
-    print(f"Is time change: {context.user_data.get('is_time_change')}")
-    
     if context.user_data.get("is_time_change"):
-        print("=== DEBUG: Это изменение времени, не онбординг ===")
         return
 
     user_id = update.effective_user.id if update.effective_user else None
@@ -904,11 +902,10 @@ async def handle_time_input(update: Update, context: CallbackContext):
 
     if not context.user_data.get("waiting_for_time"):
         if not user_id or not is_user_onboarding_required(user_id):
-            print("=== DEBUG: Пользователь не в состоянии ожидания времени ===")
+            logger.debug("Ввод времени от %s вне онбординга — пропускаем", user_id)
             return
 
     time_input = update.message.text
-    print(f"=== DEBUG: Введенное время: '{time_input}' ===")
     
     # Валидируем формат времени
     is_valid, result = validate_time_format(time_input)
@@ -939,7 +936,7 @@ async def handle_time_input(update: Update, context: CallbackContext):
     save_success = save_user_time(user_id, chat_id, selected_time, user_name, user_nickname=user_nickname)
     
     if not save_success:
-        print(f"Ошибка сохранения времени пользователя {user_id} в БД")
+        logger.error(f"Ошибка сохранения времени пользователя {user_id} в БД")
 
     # TODO: Настроить расписание для отправки
     # await schedule_daily_message(user_id, selected_time)
@@ -0,0 +1,216 @@
+"""Отправка сообщений из outbox_messages (см. «Outbox исходящих сообщений» в data/postgres_db.py).
+
+Плановые сообщения кладутся в outbox в одной транзакции с изменением состояния, а этот модуль
+их доставляет: забирает пачки с арендой (FOR UPDATE SKIP LOCKED — безопасно в нескольких
+репликах), отправляет параллельно OUTBOX_WORKERS воркерами и записывает итог:
+- отправлено — sent + message_id, затем побочные эффекты по виду сообщения
+  (старая кнопка «✅ Я сделал!» — в очередь снятия, напоминание в 19:30, запись в broadcast_messages);
+- RetryAfter / сеть / таймаут — повтор с экспоненциальной паузой, после OUTBOX_MAX_ATTEMPTS — dead;
+  практика и бонусы дня (прогресс за них уже засчитан при enqueue) повторяются до конца дня
+  рассылки по таймзоне бота, чтобы сбой Telegram на полчаса не съедал практику;
+- Forbidden / BadRequest — failed (повторять бессмысленно); Forbidden ещё и помечает is_blocked.
+
+Доставка «хотя бы один раз»: если процесс упал между ответом Telegram и отметкой sent,
+сообщение уйдёт повторно после истечения аренды. Дубли при обычной работе исключены
+ключами идемпотентности на стороне enqueue.
+"""
+
+import asyncio
+import logging
+from datetime import date, datetime, time, timedelta
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from telegram.error import BadRequest, ChatMigrated, Forbidden, RetryAfter
+
+from app import clock
+from app.config import DEFAULT_TZ
+from app.dispatcher import BROADCAST, DAILY, REMINDER, outbound_lane
+from app.keyboards import get_practice_done_keyboard
+from app.metrics import count_message, observe_delivery_lag
+from data.db import (
+    claim_outbox_messages,
+    mark_outbox_failed,
+    mark_outbox_retry,
+    mark_outbox_sent,
+    save_broadcast_message,
+    set_last_practice_message_id,
+    set_user_blocked,
+)
+
+logger = logging.getLogger(__name__)
+
+# Параллельных отправок в одном процессе
+OUTBOX_WORKERS = 4
+# Сколько сообщений забирать за раз
+OUTBOX_BATCH = 50
+OUTBOX_MAX_ATTEMPTS = 8
+# Пауза перед повтором: 5 с, 10 с, 20 с … но не больше часа
+OUTBOX_RETRY_BASE_SECONDS = 5
+OUTBOX_RETRY_MAX_SECONDS = 3600
+# Сообщения дня повторяются до его конца (без лимита попыток) не реже чем раз в 10 минут
+DAY_BOUND_KINDS = ("daily", "challenge", "bonus")
+OUTBOX_DAY_RETRY_MAX_SECONDS = 600
+# Как часто фоновая задача проверяет outbox, сек
+OUTBOX_POLL_SECONDS = 5
+
+# Виды сообщений с практикой: после отправки под ними кнопка «✅ Я сделал!»
+PRACTICE_KINDS = ("daily", "challenge")
+_ALLOWED_METHODS = ("send_message", "send_photo")
+# Полоса приоритета диспетчера (app/dispatcher.py) по виду сообщения
+KIND_LANES = {"daily": DAILY, "challenge": DAILY, "bonus": DAILY, "broadcast": BROADCAST}
+
+
+def _retry_delay(attempts: int) -> float:
+    return min(OUTBOX_RETRY_BASE_SECONDS * 2 ** max(attempts - 1, 0), OUTBOX_RETRY_MAX_SECONDS)
+
+
+def _day_deadline(kind: str, meta: dict) -> Optional[datetime]:
+    """Конец дня рассылки (meta["day"]) для сообщений дня; None — действует лимит попыток."""
+    if kind not in DAY_BOUND_KINDS or not meta.get("day"):
+        return None
+    day = date.fromisoformat(meta["day"])
+    return datetime.combine(day + timedelta(days=1), time.min, tzinfo=ZoneInfo(DEFAULT_TZ))
+
+
+def _retry_after_seconds(error: RetryAfter) -> float:
+    retry_after = error.retry_after
+    if isinstance(retry_after, timedelta):
+        return retry_after.total_seconds()
+    return float(retry_after)
+
+
+async def _after_sent(context, kind: str, user_id: Optional[int], chat_id: int, meta: dict, message) -> None:
+    count_message(kind)
+    if kind in PRACTICE_KINDS:
+        set_last_practice_message_id(user_id, message.message_id)
+        # Если отправка прошла успешно, снимаем флаг блокировки (если он был)
+        set_user_blocked(user_id, False)
+        observe_delivery_lag(meta.get("notify_time"))
+        from app.handlers.done import schedule_done_reminders
+
+        await schedule_done_reminders(context, chat_id, user_id, meta.get("log_id"))
+    elif kind == "broadcast":
+        save_broadcast_message(
+            broadcast_batch_id=meta["broadcast_batch_id"],
+            user_id=user_id,
+            chat_id=chat_id,
+            message_id=message.message_id,
+            message_type=meta.get("message_type", "text"),
+            message_text=meta.get("message_text"),
+            photo_file_id=meta.get("photo_file_id"),
+        )
+
+
+async def deliver_outbox_message(context, row: tuple) -> str:
+    """Отправляет одно сообщение outbox и записывает результат.
+
+    Returns:
+        str: новый статус (sent, pending, failed, dead)
+    """
+    outbox_id, user_id, chat_id, kind, payload, meta, attempts = row
+    meta = meta or {}
+    method = payload.get("method", "send_message")
+    params = dict(payload.get("params") or {})
+    if method not in _ALLOWED_METHODS:
+        mark_outbox_failed(outbox_id, f"Неизвестный метод {method}")
+        return "failed"
+    if payload.get("done_keyboard"):
+        params["reply_markup"] = get_practice_done_keyboard()
+
+    try:
+        with outbound_lane(KIND_LANES.get(kind, REMINDER)):
+            message = await getattr(context.bot, method)(chat_id=chat_id, **params)
+    except RetryAfter as e:
+        mark_outbox_retry(outbox_id, str(e), _retry_after_seconds(e))
+        return "pending"
+    except Forbidden as e:
+        if user_id and "blocked" in str(e).lower():
+            set_user_blocked(user_id, True)
+            logger.info(f"Пользователь {user_id} заблокировал бота, помечаем is_blocked=True")
+        mark_outbox_failed(outbox_id, str(e))
+        return "failed"
+    except (BadRequest, ChatMigrated) as e:
+        logger.error(f"Сообщение outbox {outbox_id} ({kind}) отклонено Telegram: {e}")
+        mark_outbox_failed(outbox_id, str(e))
+        return "failed"
+    except Exception as e:
+        # NetworkError/TimedOut и всё непредвиденное — временная ошибка
+        delay = _retry_delay(attempts)
+        deadline = _day_deadline(kind, meta)
+        if deadline is None:
+            exhausted = attempts >= OUTBOX_MAX_ATTEMPTS
+        else:
+            remaining = (deadline - clock.now(deadline.tzinfo)).total_seconds()
+            exhausted = remaining <= 0
+            delay = min(delay, OUTBOX_DAY_RETRY_MAX_SECONDS, max(remaining, 0))
+        if exhausted:
+            logger.error(f"Сообщение outbox {outbox_id} ({kind}) не доставлено за {attempts} попыток: {e}")
+            mark_outbox_failed(outbox_id, str(e), status="dead")
+            return "dead"
+        mark_outbox_retry(outbox_id, str(e), delay)
+        return "pending"
+
+    mark_outbox_sent(outbox_id, message.message_id)
+    try:
+        await _after_sent(context, kind, user_id, chat_id, meta, message)
+    except Exception as e:
+        # Сообщение уже у пользователя — побочные эффекты не повод отправлять повторно
+        logger.error(f"Ошибка обработки отправленного сообщения outbox {outbox_id}: {e}")
+    return "sent"
+
+
+async def drain_outbox(context, max_batches: Optional[int] = None) -> dict:
+    """Отправляет всё, что готово к отправке, пока outbox не опустеет.
+
+    Args:
+        context: объект с bot (и job_queue — для напоминаний «Я сделал»)
+        max_batches: ограничение на число пачек (None — до конца очереди)
+
+    Returns:
+        dict: {статус: количество} за этот проход
+    """
+    results: dict = {}
+    semaphore = asyncio.Semaphore(OUTBOX_WORKERS)
+
+    async def worker(row):
+        async with semaphore:
+            status = await deliver_outbox_message(context, row)
+            results[status] = results.get(status, 0) + 1
+
+    batches = 0
+    while max_batches is None or batches < max_batches:
+        rows = claim_outbox_messages(OUTBOX_BATCH)
+        if not rows:
+            break
+        batches += 1
+        await asyncio.gather(*(worker(row) for row in rows))
+    if results:
+        logger.info(f"Outbox: {results}")
+    return results
+
+
+async def run_outbox_sender(context) -> None:
+    try:
+        await drain_outbox(context)
+    except Exception as e:
+        logger.error(f"Ошибка отправки сообщений outbox: {e}")
+
+
+def schedule_outbox_sender(application):
+    """Регистрирует фоновую отправку outbox (во всех репликах: строки разбираются с арендой)."""
+    try:
+        job_queue = application.job_queue
+        if not job_queue:
+            logger.error("JobQueue недоступен для отправки outbox")
+            return
+
+        job_queue.run_repeating(
+            run_outbox_sender,
+            interval=OUTBOX_POLL_SECONDS,
+            first=3,
+            name="outbox_sender",
+        )
+        logger.info("Отправка outbox запланирована")
+    except Exception as e:
+        logger.error(f"Ошибка планирования отправки outbox: {e}")
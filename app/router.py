@@ -0,0 +1,175 @@
+"""Маршрутизация callback_data и reply-кнопок по таблицам, собранным при старте.
+
+Вместо двух десятков CallbackQueryHandler с regex, которые PTB проверяет по очереди, —
+один CallbackRouter: точное значение callback_data ищется в словаре, остальное — по префиксу
+до первого разделителя (":" или "_"), тоже словарём. Стоимость маршрутизации не зависит
+от числа кнопок.
+
+Маршрут задаётся шаблоном:
+    router.add("practice_done", handle_practice_done_callback)             # точное значение
+    router.add("self_intensity:{time}:{intensity}", handle_intensity)      # префикс + поля
+    router.add("stars_{amount:int}", handle_stars_amount_callback)         # поле с типом
+
+Поля шаблона разбираются при маршрутизации и доступны хендлеру как
+context.callback_payload (dict; {} для точных значений). Если данные не разбираются
+(другое число полей, не число в {…:int}) — хендлер всё равно вызывается с payload None
+и сам отвечает «что-то пошло не так», как и раньше с regex-паттерном.
+
+ButtonRouter — то же для reply-кнопок: точный текст сообщения в личке → хендлер.
+
+Метки метрик (instrument_handlers) остаются прежними: ^practice_done$, ^self_time: и т.д.
+"""
+
+from typing import Any, Callable, Optional
+
+from telegram import Update
+from telegram.constants import ChatType
+from telegram.ext import BaseHandler
+
+# Разделители префикса в callback_data, в порядке проверки
+CALLBACK_SEPARATORS = (":", "_")
+
+_CONVERTERS = {"str": str, "int": int}
+
+
+class Route:
+    """Маршрут: callback хендлера, метка для метрик и разбор полей."""
+
+    __slots__ = ("callback", "label", "separator", "fields")
+
+    def __init__(self, callback: Callable, label: str, separator: str = "", fields: tuple = ()):
+        self.callback = callback
+        self.label = label
+        self.separator = separator
+        # (имя, конвертер) по порядку; последнее поле забирает остаток строки
+        self.fields = fields
+
+    def parse(self, rest: str) -> Optional[dict]:
+        parts = rest.split(self.separator, len(self.fields) - 1)
+        if len(parts) != len(self.fields):
+            return None
+        payload = {}
+        for (name, convert), value in zip(self.fields, parts):
+            if not value:
+                return None
+            try:
+                payload[name] = convert(value)
+            except ValueError:
+                return None
+        return payload
+
+
+def _parse_fields(template: str, separator: str, spec: str) -> tuple:
+    fields = []
+    for part in template.split(separator):
+        if not (part.startswith("{") and part.endswith("}")):
+            raise ValueError(f"Поле шаблона должно быть вида {{имя}} или {{имя:тип}}: {spec!r}")
+        name, _, type_name = part[1:-1].partition(":")
+        convert = _CONVERTERS.get(type_name or "str")
+        if not name or convert is None:
+            raise ValueError(f"Неизвестное поле {part!r} в шаблоне {spec!r}")
+        fields.append((name, convert))
+    return tuple(fields)
+
+
+class CallbackRouter(BaseHandler[Update, Any, Any]):
+    """Один хендлер на все callback-кнопки: словарь точных значений и словарь префиксов."""
+
+    def __init__(self, block: bool = True):
+        super().__init__(self._dispatch, block=block)
+        self._exact: dict = {}
+        self._prefixes: dict = {}
+
+    def add(self, spec: str, callback: Callable) -> None:
+        """Добавляет маршрут: точное значение callback_data или префикс с полями {имя[:тип]}."""
+        if "{" not in spec:
+            if spec in self._exact:
+                raise ValueError(f"Маршрут {spec!r} уже зарегистрирован")
+            self._exact[spec] = Route(callback, f"^{spec}$")
+            return
+        prefix, brace, template = spec.partition("{")
+        separator = prefix[-1:] if prefix else ""
+        head = prefix[:-1]
+        if separator not in CALLBACK_SEPARATORS or not head or separator in head:
+            raise ValueError(
+                f"Префикс {prefix!r} должен заканчиваться одним из {CALLBACK_SEPARATORS} и не содержать его раньше"
+            )
+        key = (separator, head)
+        if key in self._prefixes:
+            raise ValueError(f"Префикс {prefix!r} уже зарегистрирован")
+        fields = _parse_fields(brace + template, separator, spec)
+        self._prefixes[key] = Route(callback, f"^{prefix}", separator, fields)
+
+    def routes(self) -> list:
+        return list(self._exact.values()) + list(self._prefixes.values())
+
+    def match(self, data: str) -> Optional[tuple]:
+        """(маршрут, payload) для callback_data или None, если маршрута нет."""
+        route = self._exact.get(data)
+        if route is not None:
+            return route, {}
+        for separator in CALLBACK_SEPARATORS:
+            head, found, rest = data.partition(separator)
+            if found:
+                route = self._prefixes.get((separator, head))
+                if route is not None:
+                    return route, route.parse(rest)
+        return None
+
+    def check_update(self, update: object) -> Optional[tuple]:
+        if not isinstance(update, Update) or not update.callback_query:
+            return None
+        data = update.callback_query.data
+        if not isinstance(data, str):
+            return None
+        return self.match(data)
+
+    def collect_additional_context(self, context, update, application, check_result) -> None:
+        context.callback_payload = check_result[1]
+
+    async def handle_update(self, update, application, check_result, context):
+        self.collect_additional_context(context, update, application, check_result)
+        return await check_result[0].callback(update, context)
+
+    async def _dispatch(self, update, context):
+        # callback обязателен для BaseHandler; маршрутизирует handle_update
+        raise RuntimeError("CallbackRouter вызывается через handle_update")
+
+
+class ButtonRouter(BaseHandler[Update, Any, Any]):
+    """Reply-кнопки: точный текст сообщения в личке → хендлер."""
+
+    def __init__(self, block: bool = True):
+        super().__init__(self._dispatch, block=block)
+        self._routes: dict = {}
+
+    def add(self, label: str, callback: Callable) -> None:
+        if label in self._routes:
+            raise ValueError(f"Кнопка {label!r} уже зарегистрирована")
+        self._routes[label] = Route(callback, getattr(callback, "__name__", label))
+
+    def labels(self) -> list:
+        return list(self._routes)
+
+    def routes(self) -> list:
+        return list(self._routes.values())
+
+    def check_update(self, update: object) -> Optional[tuple]:
+        if not isinstance(update, Update) or not update.message:
+            return None
+        text = update.message.text
+        if not text or update.message.chat.type != ChatType.PRIVATE:
+            return None
+        route = self._routes.get(text)
+        return (route, {}) if route is not None else None
+
+    async def handle_update(self, update, application, check_result, context):
+        return await check_result[0].callback(update, context)
+
+    async def _dispatch(self, update, context):
+        raise RuntimeError("ButtonRouter вызывается через handle_update")
+
+
+def callback_payload(context) -> Optional[dict]:
+    """Поля callback_data, разобранные CallbackRouter (None — данные не разобрались)."""
+    return getattr(context, "callback_payload", None)
@@ -0,0 +1,181 @@
+"""Сэмплирующий профилировщик: где тратится время во всех потоках процесса.
+
+Фоновый поток каждые SAMPLE_INTERVAL_SECONDS снимает стеки всех потоков (sys._current_frames)
+и считает одинаковые стеки. Код бота не трогается и не замедляется трассировкой: цена —
+обход стеков десятков потоков раз в 10 мс, в сумме меньше процента CPU. Ничего, кроме
+стандартной библиотеки, не нужно — профиль снимается на работающем проде.
+
+Попадают цикл событий (MainThread), потоки asyncio.to_thread / run_in_executor (там идут
+запросы к БД), слушатели и прочие фоновые потоки. Номера в именах потоков пула
+(asyncio_3) убираются, чтобы стеки воркеров складывались вместе.
+
+Результат:
+- collapsed stacks (folded): строка «поток;файл:функция;...;файл:функция N» — формат
+  flamegraph.pl, speedscope.app и inferno;
+- summary(): занятость потоков, топ функций по собственному времени и топ функций бота
+  (app/, data/) по полному времени — с вложенными вызовами, в том числе библиотек.
+
+Кадры ожидания (select цикла событий, wait/get в очередях и локах) считаются простоем:
+они есть в collapsed stacks, но не в топе функций.
+"""
+
+import os
+import re
+import sys
+import sysconfig
+import threading
+import time
+from collections import Counter
+from typing import Optional
+
+# Период снятия стеков, сек
+SAMPLE_INTERVAL_SECONDS = 0.01
+# Максимальная глубина стека (самые глубокие кадры отбрасываются со стороны корня)
+MAX_DEPTH = 128
+# Функции, в которых поток ждёт, а не работает: лист стека → простой
+IDLE_LEAVES = frozenset({
+    "selectors.py:EpollSelector.select", "selectors.py:PollSelector.select",
+    "selectors.py:KqueueSelector.select", "selectors.py:SelectSelector.select",
+    "threading.py:Condition.wait", "threading.py:Event.wait", "threading.py:Thread._wait_for_tstate_lock",
+    "queue.py:Queue.get", "concurrent/futures/thread.py:_worker",
+})
+
+# Код бота: по нему считается топ полного времени
+OWN_PREFIXES = ("app/", "data/")
+
+_THREAD_NUMBER_RE = re.compile(r"[_-]?\d+$")
+_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def _path_prefixes() -> list:
+    """Каталоги, относительно которых печатаются пути: проект, stdlib, site-packages."""
+    paths = {_ROOT, sysconfig.get_paths()["stdlib"]}
+    paths.update(path for path in sys.path if path and os.path.isdir(path))
+    return sorted((os.path.abspath(path) + os.sep for path in paths), key=len, reverse=True)
+
+
+class SamplingProfiler:
+    """Поток, собирающий стеки всех потоков процесса до stop()."""
+
+    def __init__(self, interval: float = SAMPLE_INTERVAL_SECONDS):
+        self.interval = interval
+        self.samples = 0
+        self.started_at: Optional[float] = None
+        self.duration = 0.0
+        self._stacks: Counter = Counter()
+        self._labels: dict = {}
+        self._prefixes = _path_prefixes()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self) -> None:
+        self.started_at = time.monotonic()
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+        self.duration = time.monotonic() - self.started_at
+
+    def _label(self, code) -> str:
+        label = self._labels.get(code)
+        if label is None:
+            filename = code.co_filename
+            for prefix in self._prefixes:
+                if filename.startswith(prefix):
+                    filename = filename[len(prefix):]
+                    break
+            label = f"{filename}:{code.co_qualname}".replace(";", ",")
+            self._labels[code] = label
+        return label
+
+    def _run(self) -> None:
+        own = threading.get_ident()
+        names = {}
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            threads = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in frames.items():
+                if ident == own:
+                    continue
+                name = threads.get(ident, "thread")
+                group = names.get(name)
+                if group is None:
+                    group = names[name] = _THREAD_NUMBER_RE.sub("", name) or name
+                stack = []
+                while frame is not None and len(stack) < MAX_DEPTH:
+                    stack.append(self._label(frame.f_code))
+                    frame = frame.f_back
+                stack.append(group)
+                self._stacks[tuple(reversed(stack))] += 1
+            self.samples += 1
+            del frames, frame
+
+    def collapsed(self) -> str:
+        """Стеки в формате collapsed (folded), самые частые первыми."""
+        return "".join(f"{';'.join(stack)} {count}\n" for stack, count in self._stacks.most_common())
+
+    def summary(self, top: int = 15) -> str:
+        """Занятость потоков, топ функций по собственному времени и функций бота по полному."""
+        if not self.samples:
+            return "Сэмплов нет — профиль слишком короткий."
+        by_thread: Counter = Counter()
+        busy_by_thread: Counter = Counter()
+        self_time: Counter = Counter()
+        total_time: Counter = Counter()
+        busy = 0
+        for stack, count in self._stacks.items():
+            thread, frames = stack[0], stack[1:]
+            by_thread[thread] += count
+            if not frames or frames[-1] in IDLE_LEAVES:
+                continue
+            busy_by_thread[thread] += count
+            busy += count
+            self_time[frames[-1]] += count
+            for label in set(frames):
+                if label.startswith(OWN_PREFIXES):
+                    total_time[label] += count
+
+        seconds_per_sample = self.duration / self.samples
+        lines = [
+            f"Профиль {self.duration:.0f} с, {self.samples} сэмплов по {self.interval * 1000:.0f} мс",
+            "",
+            "Занятость потоков (доля сэмплов не в ожидании):",
+        ]
+        for thread, count in by_thread.most_common(8):
+            threads = round(count / self.samples)
+            suffix = f" (потоков: {threads})" if threads > 1 else ""
+            lines.append(f"  {thread}: {busy_by_thread[thread] / count:.0%}{suffix}")
+        if not busy:
+            lines.append("")
+            lines.append("Все потоки простаивали.")
+            return "\n".join(lines)
+        for title, counter in (("собственное время", self_time), ("полное время функций бота", total_time)):
+            lines.append("")
+            lines.append(f"Топ-{top}, {title}:")
+            for label, count in counter.most_common(top):
+                lines.append(f"  {count / busy:6.1%}  {count * seconds_per_sample:6.2f} с  {label}")
+        return "\n".join(lines)
+
+
+_active: Optional[SamplingProfiler] = None
+_active_lock = threading.Lock()
+
+
+def start_profile(interval: float = SAMPLE_INTERVAL_SECONDS) -> Optional[SamplingProfiler]:
+    """Запускает профилировщик; None — другой профиль уже идёт."""
+    global _active
+    with _active_lock:
+        if _active is not None:
+            return None
+        _active = SamplingProfiler(interval)
+    _active.start()
+    return _active
+
+
+def stop_profile(profiler: SamplingProfiler) -> None:
+    global _active
+    profiler.stop()
+    with _active_lock:
+        if _active is profiler:
+            _active = None
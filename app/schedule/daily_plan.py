@@ -0,0 +1,73 @@
+"""Ночной расчёт плана рассылки (таблица daily_plan, см. build_daily_plan в data/postgres_db.py).
+
+В 00:05 МСК лидер одним запросом раскладывает практику и бонусы дня для всех пользователей
+с рассылкой. В минуту рассылки планировщик берёт план пачки одним запросом вместо выбора
+практики для каждого пользователя; устаревшие строки (режим или счётчик успели измениться)
+не выдаются, и такие пользователи получают практику, посчитанную как раньше.
+
+Если бот был выключен в 00:05, план строится сразу после старта (если на сегодня его ещё нет).
+"""
+
+import logging
+from datetime import date, timedelta
+from zoneinfo import ZoneInfo
+
+from app import clock
+from app.config import DEFAULT_TZ
+from app.leader import leader_only
+from app.schedule.triggers import daily_at, schedule_trigger
+from data.db import build_daily_plan, get_state_date, set_state_date
+
+logger = logging.getLogger(__name__)
+
+MOSCOW_TZ = ZoneInfo(DEFAULT_TZ)
+
+PLAN_HOUR = 0
+PLAN_MINUTE = 5
+# Догоняем почти весь день: без плана рассылка работает, но медленнее
+PLAN_CATCH_UP = timedelta(hours=23)
+# Ключ system_state: на какой день план уже построен
+PLAN_BUILT_STATE_KEY = "daily_plan_built_on"
+
+
+def today_moscow() -> date:
+    return clock.now(MOSCOW_TZ).date()
+
+
+def rebuild_daily_plan(plan_date: date):
+    """Строит план на plan_date и запоминает дату. Возвращает число пользователей или None."""
+    planned = build_daily_plan(plan_date)
+    if planned is not None:
+        # Предпросмотр будущего дня не считается: ночной догон всё равно пересчитает его
+        if plan_date == today_moscow():
+            set_state_date(PLAN_BUILT_STATE_KEY, plan_date)
+        logger.info("План рассылки на %s: %s пользователей", plan_date.isoformat(), planned)
+    return planned
+
+
+async def build_today_plan(context) -> None:
+    """Задача JobQueue: план на сегодня. Догоняющий запуск не пересчитывает готовый план."""
+    plan_date = today_moscow()
+    if context.job and context.job.data == "catch_up" and get_state_date(PLAN_BUILT_STATE_KEY) == plan_date:
+        return
+    rebuild_daily_plan(plan_date)
+
+
+def schedule_daily_plan(application):
+    """Регистрирует ночной расчёт плана рассылки."""
+    try:
+        job_queue = application.job_queue
+        if not job_queue:
+            logger.error("JobQueue недоступен для плана рассылки")
+            return
+
+        schedule_trigger(
+            job_queue,
+            leader_only(build_today_plan),
+            daily_at(PLAN_HOUR, PLAN_MINUTE),
+            name="daily_plan_builder",
+            catch_up=PLAN_CATCH_UP,
+        )
+        logger.info("Расчёт плана рассылки запланирован на %02d:%02d МСК", PLAN_HOUR, PLAN_MINUTE)
+    except Exception as e:
+        logger.error("Ошибка планирования расчёта плана рассылки: %s", e)
@@ -0,0 +1,47 @@
+"""Обслуживание practice_logs: заготовка месячных партиций и свёртка холодных месяцев."""
+
+import asyncio
+import logging
+
+from telegram.ext import ContextTypes
+
+from app.leader import leader_only
+from data.db import ensure_practice_logs_partitions, rollup_cold_practice_logs
+
+logger = logging.getLogger(__name__)
+
+
+async def run_practice_logs_maintenance(context: ContextTypes.DEFAULT_TYPE):
+    """Создаёт партиции на ближайшие месяцы и сворачивает логи старше горячего окна.
+
+    Свёртка держит блокировки на DETACH/агрегации, поэтому уходит в отдельный поток,
+    чтобы не подвешивать event loop с отправками.
+    """
+    try:
+        created = await asyncio.to_thread(ensure_practice_logs_partitions)
+        rolled = await asyncio.to_thread(rollup_cold_practice_logs)
+        if created or rolled:
+            logger.info(
+                f"practice_logs: создано партиций {created}, свёрнуто логов {rolled}"
+            )
+    except Exception as e:
+        logger.error(f"Ошибка обслуживания practice_logs: {e}")
+
+
+def schedule_practice_logs_maintenance(application):
+    """Регистрирует фоновую задачу обслуживания practice_logs (раз в 6 часов)."""
+    try:
+        job_queue = application.job_queue
+        if not job_queue:
+            logger.error("JobQueue недоступен для обслуживания practice_logs")
+            return
+
+        job_queue.run_repeating(
+            leader_only(run_practice_logs_maintenance),
+            interval=60 * 60 * 6,  # каждые 6 часов
+            first=120,
+            name="practice_logs_maintenance"
+        )
+        logger.info("Обслуживание practice_logs запланировано")
+    except Exception as e:
+        logger.error(f"Ошибка планирования обслуживания practice_logs: {e}")
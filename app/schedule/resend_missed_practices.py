@@ -1,70 +1,61 @@
-"""Скрипт для ручной доотправки практик пользователям, которые сегодня ещё не получили практику,
-но их время уведомлений уже наступило.
+"""Скрипт для ручной доотправки недоставленных сообщений из outbox.
 
-Логика полностью повторяет обычную ежедневную рассылку:
-- учитывается режим челленджа;
-- обновляются program_position / challenge_day и total_practices;
-- логируется отправка в practice_logs;
-- отправляются бонусные практики.
+Плановые сообщения (практики, бонусы, рассылки) ставятся в outbox_messages вместе с изменением
+прогресса, поэтому «потерянных» практик больше нет — есть только недоставленные строки outbox:
+- pending — ждут следующей попытки (обычно их дошлёт сам бот);
+- sending с истёкшей арендой — процесс упал посреди отправки;
+- dead — исчерпаны попытки (долгая недоступность Telegram);
+- failed — Telegram отказал окончательно (бот заблокирован, неверный чат); только с --failed.
+
+Скрипт возвращает dead (и failed с --failed) за последние --days дней в очередь и разбирает outbox.
 
 Использование (локально или через одноразовый Railway job/shell):
-    python -m app.schedule.resend_missed_practices
+    python -m app.schedule.resend_missed_practices [--failed] [--days 1]
 """
 
+import argparse
 import asyncio
 import logging
 from types import SimpleNamespace
-from datetime import datetime
-from zoneinfo import ZoneInfo
 
 from telegram.ext import Application
 
-from app.config import BOT_TOKEN, DEFAULT_TZ
-from app.schedule.scheduler import send_practice_to_user
-from data.db import get_users_pending_for_today, get_current_weekday
+from app.config import BOT_TOKEN
+from app.outbox import drain_outbox
+from data.db import get_outbox_status_counts, requeue_outbox_messages
 
 
 logger = logging.getLogger(__name__)
 
-MOSCOW_TZ = ZoneInfo(DEFAULT_TZ)
-
-
-async def resend_missed_practices() -> None:
-    """Находит пользователей, которым сегодня ещё не отправляли практику,
-    и чьё время уведомлений уже наступило, и доотправляет им практику.
-    """
-    current_time = datetime.now(MOSCOW_TZ).strftime("%H:%M")
-    current_weekday = get_current_weekday()
 
-    users = get_users_pending_for_today(current_time)
-    if not users:
-        print(f"Нет пользователей для доотправки практики на {current_time}")
-        return
-
-    print(f"Найдено {len(users)} пользователей для доотправки практики на {current_time}")
+async def resend_missed_practices(include_failed: bool = False, days: int = 1) -> None:
+    """Возвращает недоставленные сообщения outbox в очередь и отправляет всё, что готово."""
+    statuses = ("dead", "failed") if include_failed else ("dead",)
+    requeued = requeue_outbox_messages(statuses, since_days=days)
+    print(f"Outbox до доотправки: {get_outbox_status_counts(days)}; возвращено в очередь: {requeued}")
 
     application = Application.builder().token(BOT_TOKEN).build()
 
     await application.initialize()
 
     try:
-        # Контекст, совместимый с send_practice_to_user: нужен только bot
-        context = SimpleNamespace(bot=application.bot)
-
-        for user_id, chat_id in users:
-            try:
-                await send_practice_to_user(context, user_id, chat_id, current_weekday)
-                print(f"Практика доотправлена пользователю {user_id}")
-            except Exception as e:
-                logger.error(f"Ошибка доотправки практики пользователю {user_id}: {e}")
+        # Контекст, совместимый с app.outbox: нужен только bot (напоминания «Я сделал» не планируются)
+        context = SimpleNamespace(bot=application.bot, job_queue=None)
+        results = await drain_outbox(context)
+        print(f"Результат доотправки: {results or 'нечего отправлять'}")
     finally:
         await application.shutdown()
 
+    print(f"Outbox после доотправки: {get_outbox_status_counts(days)}")
+
 
 def main() -> None:
-    asyncio.run(resend_missed_practices())
+    parser = argparse.ArgumentParser(description="Доотправка недоставленных сообщений outbox")
+    parser.add_argument("--failed", action="store_true", help="повторить и окончательно отклонённые (failed)")
+    parser.add_argument("--days", type=int, default=1, help="за сколько последних дней брать сообщения")
+    args = parser.parse_args()
+    asyncio.run(resend_missed_practices(include_failed=args.failed, days=args.days))
 
 
 if __name__ == "__main__":
     main()
-
@@ -2,35 +2,34 @@
 Handles daily practice sending and scheduling.
 """
 
-import sys
-import os
-# Добавляем корневую директорию проекта в путь
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-
 import asyncio
 import logging
-from datetime import datetime
 from zoneinfo import ZoneInfo  # Используем таймзону, чтобы сравнивать время корректно
 from telegram.ext import ContextTypes
+from app import clock
 from app.keyboards import get_practice_done_keyboard
 from data.db import (
     get_users_by_time,
-    get_users_pending_for_today,
+    claim_users_pending_for_today,
+    release_delivery_leases,
     get_yoga_practice_by_weekday_order,
     increment_total_practices,
     get_total_practices,
     get_program_position,
     increment_program_position,
+    log_practice_sent,
     get_user_challenge_day,
-    increment_challenge_day,
     set_last_practice_message_id,
-    get_last_practice_message_id,
-    log_practice_sent,
+    enqueue_practice_delivery,
     get_current_weekday,
     get_bonus_practices_by_parent,
-    set_user_blocked,
+    get_planned_deliveries,
 )
 from app.challenge.challenge_commands import get_practice_for_daily_send
+from app.dispatcher import DAILY, in_lane
+from app.leader import leader_only
+from app.metrics import REGISTRY, timed_job
+from app.outbox import drain_outbox
 from app.config import DEFAULT_TZ  # Подтягиваем базовую таймзону проекта
 
 logger = logging.getLogger(__name__)
@@ -38,7 +37,13 @@ logger = logging.getLogger(__name__)
 # Создаём объект таймзоны один раз, чтобы переиспользовать его в дальнейших расчётах
 MOSCOW_TZ = ZoneInfo(DEFAULT_TZ)
 
+DAILY_PLAN_LOOKUPS = REGISTRY.counter(
+    "yogabot_daily_plan_lookups_total", "Практики дня: hit — из daily_plan, miss — посчитаны при отправке", ("result",)
+)
+
 
+@timed_job
+@in_lane(DAILY)
 async def send_daily_practice(context: ContextTypes.DEFAULT_TYPE):
     """Отправляет ежедневную практику всем пользователям в указанное время.
     
@@ -47,139 +52,145 @@ async def send_daily_practice(context: ContextTypes.DEFAULT_TYPE):
     """
     try:
         # Получаем текущее время в базовой таймзоне, чтобы сравнение с notify_time было честным
-        current_time = datetime.now(MOSCOW_TZ).strftime("%H:%M")
+        now = clock.now(MOSCOW_TZ)
+        current_time = now.strftime("%H:%M")
         
-        # Получаем всех пользователей, которые должны получить практику сегодня:
+        # Забираем пачками пользователей, которые должны получить практику сегодня:
         # их время уведомлений уже наступило (notify_time <= current_time),
-        # и в логах practice_logs за сегодня ещё нет записи.
-        users = get_users_pending_for_today(current_time)
-        
-        if not users:
+        # в логах practice_logs за сегодня ещё нет записи и их не держит другой воркер.
+        # Захваченные пользователи арендованы на DELIVERY_LEASE_SECONDS — параллельный тик
+        # или вторая реплика их не получат, пока мы не снимем аренду или она не истечёт.
+        current_weekday = None
+        claimed: list = []
+        try:
+            while True:
+                users = claim_users_pending_for_today(current_time)
+                if not users:
+                    break
+                if current_weekday is None:
+                    # Получаем текущий день недели
+                    current_weekday = get_current_weekday()
+                logger.info(f"Отправляем практики {len(users)} пользователям в {current_time}, день недели: {current_weekday}")
+
+                # План на сегодня (daily_plan) для всей пачки одним запросом
+                plans = get_planned_deliveries([user[0] for user in users], now.date())
+
+                # Отправляем практику каждому пользователю
+                for user_id, chat_id, notify_time in users:
+                    claimed.append(user_id)
+                    await send_practice_to_user(
+                        context, user_id, chat_id, current_weekday, notify_time=notify_time, drain=False,
+                        plan=plans.get(user_id),
+                    )
+                # Пачка в outbox — отправляем, не дожидаясь фоновой задачи
+                await drain_outbox(context)
+        finally:
+            # Аренду снимаем в конце прохода: неудачные отправки повторятся на следующем тике,
+            # а не в этом же цикле
+            release_delivery_leases(claimed)
+
+        if not claimed:
             logger.info(f"Нет пользователей для отправки практики в {current_time}")
-            return
-        
-        # Получаем текущий день недели
-        current_weekday = get_current_weekday()
-        
-        logger.info(f"Отправляем практики {len(users)} пользователям в {current_time}, день недели: {current_weekday}")
-        
-        # Отправляем практику каждому пользователю
-        for user_id, chat_id in users:
-            await send_practice_to_user(context, user_id, chat_id, current_weekday)
             
     except Exception as e:
         logger.error(f"Ошибка отправки ежедневных практик: {e}")
 
 
-async def send_practice_to_user(context: ContextTypes.DEFAULT_TYPE, user_id: int, chat_id: int, weekday: int):
-    """Отправляет практику конкретному пользователю.
+async def send_practice_to_user(context: ContextTypes.DEFAULT_TYPE, user_id: int, chat_id: int, weekday: int,
+                                notify_time: str = None, drain: bool = True, plan: dict = None):
+    """Ставит практику (и бонусы к ней) пользователю в outbox и, по умолчанию, сразу отправляет.
     
     Если у пользователя включён режим челленджа — практика по порядку id (app.challenge.challenge_commands).
-    Иначе — практика по дню недели и счётчику дней.
+    Иначе — практика по дню недели и счётчику дней. Если передан план из daily_plan,
+    практика, заголовок и бонусы берутся из него без обращений к БД.
+
+    Прогресс (program_position / challenge_day, total_practices), лог practice_logs и сообщения
+    outbox записываются одной транзакцией (enqueue_practice_delivery): сообщение не потеряется
+    при падении и не задвоится при повторном вызове в тот же день. Отправку, кнопку
+    «✅ Я сделал!» и напоминание в 19:30 берёт на себя app.outbox.
     
     Args:
         context: Контекст бота
         user_id: ID пользователя
         chat_id: ID чата
         weekday: день недели (используется только в обычном режиме)
+        notify_time: плановое время пользователя (для метрики опоздания)
+        drain: сразу разобрать outbox (False — отправит вызывающий или фоновая задача)
+        plan: строка плана из get_planned_deliveries (None — посчитать практику сейчас)
+
+    Returns:
+        bool: True, если практика поставлена в outbox
     """
     try:
-        # Снимаем кнопку «✅ Я сделал!» с предыдущего сообщения с практикой
-        last_message_id = get_last_practice_message_id(user_id)
-        if last_message_id is not None:
-            try:
-                await context.bot.edit_message_reply_markup(
-                    chat_id=chat_id, message_id=last_message_id, reply_markup=None
-                )
-            except Exception as edit_err:
-                logger.debug(f"Не удалось снять кнопку с сообщения {last_message_id}: {edit_err}")
-
-        # Вычисляем плановые счётчики, но подтверждаем их только после успешной отправки.
-        # Это защищает от скачков прогресса при сетевых таймаутах Telegram API.
-        program_position = get_program_position(user_id)
-        next_position = program_position + 1
-        total_practices = get_total_practices(user_id) + 1
-        challenge_day = get_user_challenge_day(user_id) + 1
-
-        # Daily выбирается по program_position; Challenge — по отдельному challenge_day.
-        practice, is_challenge = get_practice_for_daily_send(user_id, weekday, challenge_day)
-        if not is_challenge:
-            practice = get_yoga_practice_by_weekday_order(weekday, next_position)
-        if not practice:
-            if is_challenge:
-                logger.error(f"Не найдена практика челленджа для пользователя {user_id}, день {challenge_day}")
-            else:
-                logger.error(f"Не найдена практика для дня недели {weekday}, день {next_position}")
-            return
+        if plan is not None:
+            DAILY_PLAN_LOOKUPS.inc("hit")
+            practice, is_challenge, title = plan["practice"], plan["is_challenge"], plan["title"]
+            bonuses = plan["bonuses"]
+        else:
+            DAILY_PLAN_LOOKUPS.inc("miss")
+            program_position = get_program_position(user_id)
+            next_position = program_position + 1
+            challenge_day = get_user_challenge_day(user_id) + 1
+
+            # Daily выбирается по program_position; Challenge — по отдельному challenge_day.
+            practice, is_challenge = get_practice_for_daily_send(user_id, weekday, challenge_day)
+            if not is_challenge:
+                practice = get_yoga_practice_by_weekday_order(weekday, next_position)
+            if not practice:
+                if is_challenge:
+                    logger.error(f"Не найдена практика челленджа для пользователя {user_id}, день {challenge_day}")
+                else:
+                    logger.error(f"Не найдена практика для дня недели {weekday}, день {next_position}")
+                return False
+            title = f"{challenge_day} день челленджа" if is_challenge else "Практика дня"
+            bonuses = get_bonus_practices_by_parent(practice[0])
 
         # Распаковываем данные практики
-        (practice_id, title, video_url, time_practices, channel_name,
+        (practice_id, _title, video_url, time_practices, channel_name,
          description, my_description, intensity, practice_weekday, created_at, updated_at) = practice
 
-        title = f"{challenge_day} день челленджа" if is_challenge else "Практика дня"
         message_text = format_practice_message(title, my_description, time_practices, intensity, channel_name, video_url)
 
-        # Отправляем сообщение с кнопкой «✅ Я сделал!»
-        done_keyboard = get_practice_done_keyboard()
-
-        # Отправляем сообщение с кнопкой
-        message = await context.bot.send_message(
-            chat_id=chat_id,
-            text=message_text,
-            parse_mode='Markdown',
-            disable_web_page_preview=False,
-            reply_markup=done_keyboard
-        )
-        set_last_practice_message_id(user_id, message.message_id)
-
-        # Если отправка прошла успешно, снимаем флаг блокировки (если он был)
-        set_user_blocked(user_id, False)
-
-        # Подтверждаем прогресс только после успешной отправки пользователю.
-        if is_challenge:
-            increment_challenge_day(user_id)
-        else:
-            increment_program_position(user_id)
-        increment_total_practices(user_id)
-
-        # Логируем отправку основной практики
-        log_id = log_practice_sent(user_id, practice_id, total_practices)
-        if log_id:
-            from app.handlers.done import schedule_done_reminders
-
-            await schedule_done_reminders(context, chat_id, user_id, log_id)
-
-        logger.info(f"Практика {practice_id} отправлена пользователю {user_id}, всего практик {total_practices}")
-        
-        # Получаем бонусные практики, если они есть
-        bonus_practices = get_bonus_practices_by_parent(practice_id)
-        
-        for bonus in bonus_practices:
+        # Основное сообщение с кнопкой «✅ Я сделал!», за ним бонусные практики, если они есть
+        messages = [(
+            "challenge" if is_challenge else "daily",
+            {
+                "method": "send_message",
+                "params": {"text": message_text, "parse_mode": "Markdown", "disable_web_page_preview": False},
+                "done_keyboard": True,
+            },
+        )]
+        for bonus in bonuses:
             # Берем только нужные колонки, чтобы не плодить неиспользуемые переменные
-            bonus_id = bonus[0]
             bonus_url = bonus[3]
             bonus_my_description = bonus[7]
-            
-            # Формируем бонусное сообщение
-            bonus_message = format_bonus_practice_message(bonus_my_description, bonus_url)
-            
-            await context.bot.send_message(
-                chat_id=chat_id,
-                text=bonus_message,
-                parse_mode='Markdown',
-                disable_web_page_preview=False
-            )
-            
-            logger.info(f"Бонусная практика {bonus_id} отправлена пользователю {user_id} вместе с {practice_id}")
+            messages.append((
+                "bonus",
+                {
+                    "method": "send_message",
+                    "params": {
+                        "text": format_bonus_practice_message(bonus_my_description, bonus_url),
+                        "parse_mode": "Markdown",
+                        "disable_web_page_preview": False,
+                    },
+                },
+            ))
+
+        enqueued = enqueue_practice_delivery(user_id, chat_id, practice_id, is_challenge, messages, notify_time)
+        if not enqueued:
+            return False
+
+        logger.info(
+            f"Практика {practice_id} поставлена в outbox пользователю {user_id}, "
+            f"всего практик {enqueued['total_practices']}, бонусов {len(messages) - 1}"
+        )
+        if drain:
+            await drain_outbox(context)
+        return True
         
     except Exception as e:
-        # Если пользователь заблокировал бота - помечаем его как is_blocked, чтобы не слать дальше
-        error_text = str(e)
-        if "bot was blocked by the user" in error_text or "Forbidden: bot was blocked by the user" in error_text:
-            set_user_blocked(user_id, True)
-            logger.info(f"Пользователь {user_id} заблокировал бота, помечаем is_blocked=True")
-        else:
-            logger.error(f"Ошибка отправки практики пользователю {user_id}: {e}")
+        logger.error(f"Ошибка постановки практики пользователю {user_id}: {e}")
+        return False
 
 
 def format_practice_message(title: str, my_description: str, time_practices: int,
@@ -260,7 +271,7 @@ def schedule_daily_practices(application):
         # Планируем отправку практик каждую минуту для проверки времени
         # Это не очень эффективно, но простое решение для MVP
         job_queue.run_repeating(
-            send_daily_practice,
+            leader_only(send_daily_practice),
             interval=60,  # каждую минуту
             first=1,  # через 1 секунду после запуска
             name="daily_practice_sender"
@@ -282,15 +293,6 @@ async def send_test_practice(context: ContextTypes.DEFAULT_TYPE, user_id: int, c
     try:
         logger.info(f"Отправка тестовой практики пользователю {user_id}")
 
-        last_message_id = get_last_practice_message_id(user_id)
-        if last_message_id is not None:
-            try:
-                await context.bot.edit_message_reply_markup(
-                    chat_id=chat_id, message_id=last_message_id, reply_markup=None
-                )
-            except Exception as edit_err:
-                logger.debug(f"Не удалось снять кнопку с сообщения {last_message_id}: {edit_err}")
-
         program_position = get_program_position(user_id)
         next_position = program_position + 1
         total_practices = get_total_practices(user_id) + 1
@@ -318,14 +320,17 @@ async def send_test_practice(context: ContextTypes.DEFAULT_TYPE, user_id: int, c
         )
         set_last_practice_message_id(user_id, message.message_id)
 
+        # Сначала лог отправки, потом счётчики: без записи в practice_logs прогресс не сдвигаем
+        log_id = log_practice_sent(user_id, practice_id, total_practices)
+        if not log_id:
+            await context.bot.send_message(chat_id, "❌ Не удалось записать отправку практики, прогресс не изменён")
+            return
         increment_program_position(user_id)
         increment_total_practices(user_id)
 
-        log_id = log_practice_sent(user_id, practice_id, total_practices)
-        if log_id:
-            from app.handlers.done import schedule_done_reminders
+        from app.handlers.done import schedule_done_reminders
 
-            await schedule_done_reminders(context, chat_id, user_id, log_id)
+        await schedule_done_reminders(context, chat_id, user_id, log_id)
         logger.info(f"Тестовая практика {practice_id} отправлена пользователю {user_id}, всего практик {total_practices}")
         
         # Получаем бонусные практики, если они есть
@@ -0,0 +1,142 @@
+"""Календарные триггеры поверх JobQueue: «каждый день в ЧЧ:ММ» и «по воскресеньям в ЧЧ:ММ».
+
+Вместо run_repeating(interval=60), который будит задачу каждую минуту ради проверки
+«а не 10:10 ли сейчас», задача ставится через run_once ровно на следующий момент срабатывания
+и после выполнения сама перепланируется на следующий.
+
+Следующий момент считается по настенному времени в таймзоне триггера (по умолчанию МСК),
+поэтому переходы на летнее/зимнее время не сдвигают запуск:
+- время, которого нет (перевод часов вперёд), переносится на первый момент после скачка;
+- время, которое было дважды (перевод назад), срабатывает один раз — в первый.
+
+Догон при старте: если бот был выключен в момент срабатывания и с него прошло не больше
+catch_up, задача запускается сразу после старта. Та же проверка повторяется, когда реплика
+становится лидером (app.leader.on_leadership_acquired): срабатывание, пришедшееся на ведомого
+или на смену лидера, leader_only пропускает, и его догоняет новый лидер. Защита от повторной
+отправки в тот же день остаётся на стороне самой задачи (флаги в system_state).
+"""
+
+import logging
+from dataclasses import dataclass
+from datetime import date, datetime, time, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from app import clock
+from app.config import DEFAULT_TZ
+from app.leader import on_leadership_acquired
+
+logger = logging.getLogger(__name__)
+
+# Задержка догоняющего запуска после старта, сек — чтобы бот успел инициализироваться
+CATCH_UP_DELAY_SECONDS = 5
+
+
+@dataclass(frozen=True)
+class CalendarTrigger:
+    """Срабатывание в hour:minute по настенному времени tz.
+
+    Args:
+        hour: час (0–23)
+        minute: минута (0–59)
+        weekdays: дни недели (0=понедельник … 6=воскресенье); None — каждый день
+        tz: имя таймзоны
+    """
+    hour: int
+    minute: int
+    weekdays: Optional[frozenset] = None
+    tz: str = DEFAULT_TZ
+
+    def _fire_on(self, day: date) -> datetime:
+        """Момент срабатывания в день day (aware, в tz) с учётом перевода часов."""
+        zone = ZoneInfo(self.tz)
+        local = datetime.combine(day, time(self.hour, self.minute), tzinfo=zone)
+        # Круг через UTC нормализует несуществующее время (скачок вперёд) к реальному моменту;
+        # для неоднозначного fold=0 даёт первое из двух
+        return local.astimezone(timezone.utc).astimezone(zone)
+
+    def _matches(self, day: date) -> bool:
+        return self.weekdays is None or day.weekday() in self.weekdays
+
+    def next_fire(self, after: datetime) -> datetime:
+        """Первый момент срабатывания строго позже after."""
+        local_day = after.astimezone(ZoneInfo(self.tz)).date()
+        # Самый редкий случай — раз в неделю, +1 день на случай скачка часов
+        for offset in range(9):
+            day = local_day + timedelta(days=offset)
+            if self._matches(day):
+                fire = self._fire_on(day)
+                if fire > after:
+                    return fire
+        raise ValueError(f"Не удалось вычислить следующий запуск для {self}")
+
+    def previous_fire(self, before: datetime) -> datetime:
+        """Последний момент срабатывания не позже before."""
+        local_day = before.astimezone(ZoneInfo(self.tz)).date()
+        for offset in range(9):
+            day = local_day - timedelta(days=offset)
+            if self._matches(day):
+                fire = self._fire_on(day)
+                if fire <= before:
+                    return fire
+        raise ValueError(f"Не удалось вычислить предыдущий запуск для {self}")
+
+
+def daily_at(hour: int, minute: int, tz: str = DEFAULT_TZ) -> CalendarTrigger:
+    """Каждый день в hour:minute."""
+    return CalendarTrigger(hour, minute, None, tz)
+
+
+def weekly_at(weekday: int, hour: int, minute: int, tz: str = DEFAULT_TZ) -> CalendarTrigger:
+    """Раз в неделю: weekday (0=понедельник … 6=воскресенье) в hour:minute."""
+    return CalendarTrigger(hour, minute, frozenset({weekday}), tz)
+
+
+def schedule_trigger(job_queue, callback, trigger: CalendarTrigger, name: str,
+                     catch_up: Optional[timedelta] = None, now: Optional[datetime] = None):
+    """Ставит callback на ближайшее срабатывание trigger и перепланирует его после каждого запуска.
+
+    Args:
+        job_queue: JobQueue приложения
+        callback: async-функция (context), как для run_once
+        trigger: CalendarTrigger
+        name: имя задачи в JobQueue
+        catch_up: сколько после пропущенного срабатывания его ещё можно догнать при старте
+            и при получении лидерства
+        now: текущее время (для тестов и симуляции)
+
+    Returns:
+        datetime: момент ближайшего планового срабатывания
+    """
+    now = now or clock.now(timezone.utc)
+
+    async def fire(context):
+        try:
+            await callback(context)
+        except Exception as e:
+            logger.error("Ошибка задачи %s: %s", name, e)
+        finally:
+            # Перепланируем только после плановых запусков: у догоняющего своё расписание уже стоит
+            if context.job and context.job.data == "scheduled":
+                _schedule_next(context.job_queue)
+
+    def _schedule_next(queue, after: Optional[datetime] = None) -> datetime:
+        # +1 сек: если задача отработала за доли секунды, не поставить её на тот же момент
+        after = after or clock.now(timezone.utc) + timedelta(seconds=1)
+        next_fire = trigger.next_fire(after)
+        queue.run_once(fire, when=next_fire, name=name, data="scheduled")
+        logger.debug("Задача %s запланирована на %s", name, next_fire.isoformat())
+        return next_fire
+
+    def _catch_up(queue, reason: str, at: Optional[datetime] = None) -> None:
+        at = at or clock.now(timezone.utc)
+        missed = trigger.previous_fire(at)
+        if at - missed <= catch_up:
+            logger.info("Задача %s пропустила запуск в %s — догоняем %s", name, missed.isoformat(), reason)
+            queue.run_once(fire, when=CATCH_UP_DELAY_SECONDS, name=name, data="catch_up")
+
+    if catch_up is not None:
+        _catch_up(job_queue, "после старта", now)
+        on_leadership_acquired(lambda queue: _catch_up(queue, "после получения лидерства"))
+
+    return _schedule_next(job_queue, now)
@@ -0,0 +1,153 @@
+"""Профиль старта бота: время импорта модулей и фаз запуска до первого опроса Telegram.
+
+Модуль импортируется первым в app/main.py и сразу ставит в начало sys.meta_path обёртку,
+которая замеряет загрузку каждого модуля: полное время и собственное (без вложенных импортов).
+Фазы отмечаются вызовами PROFILER.mark(): импорты, проверка схемы, сборка приложения,
+шаги post_init; последняя фаза заканчивается первым тиком JobQueue — к этому моменту
+опрос getUpdates (или вебхук) уже запущен.
+
+Итог всегда пишется одной строкой в лог и в метрику yogabot_startup_seconds{phase};
+при STARTUP_PROFILE=1 в лог попадают ещё и самые долгие импорты. После старта перехват
+импорта снимается: ленивые импорты хендлеров пишет в лог app/lazy_handlers.py.
+"""
+
+import importlib.machinery
+import logging
+import sys
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+# Загрузчики с отдельным экземпляром на модуль: им можно подменить методы без побочных эффектов
+_TIMED_LOADERS = (
+    importlib.machinery.SourceFileLoader,
+    importlib.machinery.SourcelessFileLoader,
+    importlib.machinery.ExtensionFileLoader,
+)
+# Сколько самых долгих импортов показывать при STARTUP_PROFILE=1
+TOP_IMPORTS = 25
+
+
+class _ImportTimer:
+    """Finder в начале sys.meta_path: сам ничего не ищет, только оборачивает найденный загрузчик."""
+
+    def __init__(self, profile):
+        self._profile = profile
+
+    def find_spec(self, fullname, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self:
+                continue
+            find_spec = getattr(finder, "find_spec", None)
+            if find_spec is None:
+                continue
+            spec = find_spec(fullname, path, target)
+            if spec is not None:
+                if isinstance(spec.loader, _TIMED_LOADERS):
+                    self._profile._wrap_loader(fullname, spec.loader)
+                return spec
+        return None
+
+
+class StartupProfile:
+    """Замеры старта одного процесса."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases = []
+        # имя модуля -> [полное время, собственное время], секунды
+        self.imports = {}
+        self._last_mark = self.started
+        self._local = threading.local()
+        self._timer = None
+        self._finished = False
+
+    def install(self) -> None:
+        if self._timer is None:
+            self._timer = _ImportTimer(self)
+            sys.meta_path.insert(0, self._timer)
+
+    def uninstall(self) -> None:
+        if self._timer is not None:
+            try:
+                sys.meta_path.remove(self._timer)
+            except ValueError:
+                pass
+            self._timer = None
+
+    def _wrap_loader(self, name, loader) -> None:
+        create_module = loader.create_module
+        exec_module = loader.exec_module
+        # Расширения (psycopg2._psycopg) инициализируются уже в create_module — считаем оба шага
+        loader.create_module = lambda spec: self._timed(name, create_module, spec)
+        loader.exec_module = lambda module: self._timed(name, exec_module, module)
+
+    def _timed(self, name, func, arg):
+        stack = getattr(self._local, "stack", None)
+        if stack is None:
+            stack = self._local.stack = []
+        stack.append(0.0)
+        started = time.perf_counter()
+        try:
+            return func(arg)
+        finally:
+            total = time.perf_counter() - started
+            nested = stack.pop()
+            if stack:
+                stack[-1] += total
+            entry = self.imports.setdefault(name, [0.0, 0.0])
+            entry[0] += total
+            entry[1] += total - nested
+
+    def mark(self, phase: str) -> None:
+        """Закрывает фазу: её длительность — время с предыдущей отметки."""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last_mark))
+        self._last_mark = now
+
+    def total_seconds(self) -> float:
+        return self._last_mark - self.started
+
+    def top_imports(self, limit: int = TOP_IMPORTS) -> list:
+        """[(модуль, полное, собственное)] по убыванию собственного времени."""
+        rows = [(name, total, own) for name, (total, own) in self.imports.items()]
+        rows.sort(key=lambda row: row[2], reverse=True)
+        return rows[:limit]
+
+    def format_report(self, detailed: bool = False) -> str:
+        phases = ", ".join(f"{phase} {seconds:.2f}" for phase, seconds in self.phases)
+        lines = [f"Старт за {self.total_seconds():.2f} с ({phases}); импортировано модулей: {len(self.imports)}"]
+        if detailed:
+            own_app = sum(own for name, (_, own) in self.imports.items() if name.split(".")[0] in ("app", "data"))
+            lines.append(f"Собственный код (app, data): {own_app * 1000:.1f} мс. Самые долгие импорты:")
+            lines.extend(
+                f"  {own * 1000:8.1f} мс (с вложенными {total * 1000:8.1f} мс)  {name}"
+                for name, total, own in self.top_imports()
+            )
+        return "\n".join(lines)
+
+    def finish(self, phase: str) -> None:
+        """Последняя фаза: снимает перехват импорта, пишет итог в лог и метрики."""
+        if self._finished:
+            return
+        self._finished = True
+        self.mark(phase)
+        self.uninstall()
+
+        from app.config import STARTUP_PROFILE
+        from app.metrics import STARTUP_SECONDS
+
+        for name, seconds in self.phases:
+            STARTUP_SECONDS.set(seconds, name)
+        STARTUP_SECONDS.set(self.total_seconds(), "total")
+        logger.info(self.format_report(detailed=STARTUP_PROFILE))
+
+
+PROFILER = StartupProfile()
+PROFILER.install()
+
+
+async def report_startup(context) -> None:
+    """Задача JobQueue на первый тик после запуска: бот принимает апдейты."""
+    PROFILER.finish("polling")
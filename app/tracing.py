@@ -0,0 +1,335 @@
+"""Трассировка: из чего складывается время апдейта или джоба.
+
+Корневой спан открывается на каждый апдейт (TracedApplication.process_update) и каждый запуск
+джоба JobQueue (TracedJobQueue). Дочерние спаны пишутся автоматически:
+- handler <метка> — хендлер с меткой как в метриках (app/metrics.py, instrument_handlers);
+- db <функция> — каждая функция data/postgres_db.py (data/instrumentation.py, в т.ч. из
+  asyncio.to_thread: контекст копируется в поток);
+- telegram <метод> — запрос к Bot API с ожиданием токена полосы (app/dispatcher.py).
+
+Текущий спан хранится в contextvar; без корневого спана (tools/, трассировка выключена)
+start_span() возвращает None и ничего не стоит, кроме чтения contextvar.
+
+Сэмплирование решается для трассы целиком: доля TRACE_SAMPLE_RATE корней сохраняется
+заранее, а трасса дольше TRACE_SLOW_MS или с ошибкой в любом спане — всегда. Спаны копятся
+в памяти до конца корня, поэтому медленные апдейты не теряются при малой доле. В трассе не больше
+MAX_SPANS_PER_TRACE спанов (рассылка в джобе делает тысячи вызовов БД); лишние считаются
+в атрибуте корня spans.dropped.
+
+Экспорт — фоновым потоком, пачками:
+- TRACE_FILE — JSON Lines, строка = запрос OTLP/JSON ExportTraceServiceRequest
+  (читается tools/trace_report.py и ресивером otlpjsonfile OpenTelemetry Collector);
+- TRACE_OTLP_ENDPOINT — POST того же JSON на <endpoint>/v1/traces (OTLP/HTTP: Collector,
+  Jaeger, Tempo).
+
+Очередь экспорта ограничена: при переполнении трассы отбрасываются, обработка апдейтов не ждёт.
+В атрибутах нет текстов сообщений и данных пользователей — только id апдейта, метки и коды.
+"""
+
+import contextvars
+import json
+import logging
+import os
+import queue
+import random
+import threading
+import time
+import urllib.request
+from typing import Optional
+
+from telegram.ext import Application, JobQueue
+
+from .config import TRACE_FILE, TRACE_OTLP_ENDPOINT, TRACE_SAMPLE_RATE, TRACE_SLOW_MS
+
+logger = logging.getLogger(__name__)
+
+SERVICE_NAME = "yogadailybot"
+# Спанов в одной трассе; остальные только считаются
+MAX_SPANS_PER_TRACE = 500
+# Сколько трасс может ждать экспорта
+EXPORT_QUEUE_MAX = 2_000
+# Спанов в одной пачке экспорта и как часто отправлять неполную пачку, сек
+EXPORT_BATCH_SPANS = 1_000
+EXPORT_INTERVAL_SECONDS = 2.0
+OTLP_TIMEOUT_SECONDS = 5.0
+
+# Виды спанов OTLP
+KIND_INTERNAL = 1
+KIND_SERVER = 2
+KIND_CLIENT = 3
+
+_current: contextvars.ContextVar = contextvars.ContextVar("trace_span", default=None)
+
+
+class _Trace:
+    """Спаны одной трассы до решения, сохранять ли её."""
+
+    __slots__ = ("trace_id", "sampled", "spans", "dropped", "failed", "closed")
+
+    def __init__(self, sampled: bool):
+        self.trace_id = f"{random.getrandbits(128):032x}"
+        self.sampled = sampled
+        self.spans = []
+        self.dropped = 0
+        self.failed = False
+        # Корень закрыт: задачи, запущенные из апдейта и пережившие его, спаны уже не добавляют
+        self.closed = False
+
+
+class Span:
+    """Спан: имя, время начала/конца (unix, нс), атрибуты и ошибка."""
+
+    __slots__ = ("trace", "span_id", "parent_id", "name", "kind", "start_ns", "end_ns", "attributes", "error", "_token")
+
+    def __init__(self, trace: _Trace, parent_id: Optional[str], name: str, kind: int, attributes: dict):
+        self.trace = trace
+        self.span_id = f"{random.getrandbits(64):016x}"
+        self.parent_id = parent_id
+        self.name = name
+        self.kind = kind
+        self.attributes = attributes
+        self.error: Optional[str] = None
+        self.end_ns = 0
+        self.start_ns = time.time_ns()
+        self._token = _current.set(self)
+
+    @property
+    def is_root(self) -> bool:
+        return self.parent_id is None
+
+    def set(self, key: str, value) -> None:
+        self.attributes[key] = value
+
+    def end(self, error: Optional[BaseException] = None) -> None:
+        self.end_ns = time.time_ns()
+        if error is not None:
+            self.error = f"{type(error).__name__}: {error}"
+            self.trace.failed = True
+        _current.reset(self._token)
+
+    def to_otlp(self) -> dict:
+        span = {
+            "traceId": self.trace.trace_id,
+            "spanId": self.span_id,
+            "name": self.name,
+            "kind": self.kind,
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [_otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": 2, "message": self.error} if self.error else {"code": 0},
+        }
+        if self.parent_id:
+            span["parentSpanId"] = self.parent_id
+        return span
+
+
+def _otlp_attribute(key: str, value) -> dict:
+    if isinstance(value, bool):
+        return {"key": key, "value": {"boolValue": value}}
+    if isinstance(value, int):
+        return {"key": key, "value": {"intValue": str(value)}}
+    if isinstance(value, float):
+        return {"key": key, "value": {"doubleValue": value}}
+    return {"key": key, "value": {"stringValue": str(value)}}
+
+
+class SpanExporter:
+    """Поток, отправляющий сохранённые трассы пачками в файл и/или OTLP/HTTP."""
+
+    def __init__(self, path: str = "", endpoint: str = ""):
+        self.path = path
+        self.url = endpoint.rstrip("/") + "/v1/traces" if endpoint else ""
+        self.exported = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=EXPORT_QUEUE_MAX)
+        self._thread = threading.Thread(target=self._run, name="trace-exporter", daemon=True)
+        self._otlp_failing = False
+
+    def start(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread.start()
+
+    def submit(self, spans: list) -> None:
+        try:
+            self._queue.put_nowait(spans)
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _run(self) -> None:
+        batch = []
+        last_export = time.monotonic()
+        while True:
+            try:
+                item = self._queue.get(timeout=EXPORT_INTERVAL_SECONDS)
+            except queue.Empty:
+                item = False
+            if item is None:
+                break
+            if item:
+                batch.extend(item)
+            if batch and (
+                len(batch) >= EXPORT_BATCH_SPANS or time.monotonic() - last_export >= EXPORT_INTERVAL_SECONDS
+            ):
+                self._export(batch)
+                batch = []
+                last_export = time.monotonic()
+        if batch:
+            self._export(batch)
+
+    def _export(self, spans: list) -> None:
+        body = json.dumps({
+            "resourceSpans": [{
+                "resource": {"attributes": [_otlp_attribute("service.name", SERVICE_NAME)]},
+                "scopeSpans": [{"scope": {"name": __name__}, "spans": [span.to_otlp() for span in spans]}],
+            }]
+        }, ensure_ascii=False)
+        if self.path:
+            try:
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(body + "\n")
+            except OSError as e:
+                logger.error(f"Ошибка записи трасс в {self.path}: {e}")
+        if self.url:
+            request = urllib.request.Request(
+                self.url, data=body.encode("utf-8"), headers={"Content-Type": "application/json"}, method="POST"
+            )
+            try:
+                with urllib.request.urlopen(request, timeout=OTLP_TIMEOUT_SECONDS):
+                    pass
+                if self._otlp_failing:
+                    logger.info(f"Экспорт трасс в {self.url} восстановлен")
+                self._otlp_failing = False
+            except Exception as e:
+                # Пишем один раз на серию ошибок, а не на каждую пачку
+                if not self._otlp_failing:
+                    logger.warning(f"Ошибка экспорта трасс в {self.url}: {e}")
+                self._otlp_failing = True
+        self.exported += len(spans)
+
+
+_exporter: Optional[SpanExporter] = None
+_sample_rate = TRACE_SAMPLE_RATE
+_slow_ns = int(TRACE_SLOW_MS * 1_000_000)
+
+
+def tracing_enabled() -> bool:
+    return _exporter is not None
+
+
+def start_tracing(
+    path: str = TRACE_FILE,
+    endpoint: str = TRACE_OTLP_ENDPOINT,
+    sample_rate: float = TRACE_SAMPLE_RATE,
+    slow_ms: float = TRACE_SLOW_MS,
+) -> bool:
+    """Запускает экспорт (main); False — не задан ни файл, ни OTLP endpoint."""
+    global _exporter, _sample_rate, _slow_ns
+    if _exporter is not None:
+        return True
+    if not path and not endpoint:
+        return False
+    _sample_rate = sample_rate
+    _slow_ns = int(slow_ms * 1_000_000)
+    _exporter = SpanExporter(path, endpoint)
+    _exporter.start()
+    logger.info(
+        f"Трассировка включена: {' и '.join(filter(None, (path, _exporter.url)))}, "
+        f"доля {sample_rate:g}, всегда дольше {slow_ms:g} мс"
+    )
+    return True
+
+
+def stop_tracing(timeout: float = 10.0) -> None:
+    """Отправляет накопленное и останавливает поток (post_shutdown)."""
+    global _exporter
+    exporter, _exporter = _exporter, None
+    if exporter is not None:
+        exporter.stop(timeout)
+        logger.info(f"Трассировка остановлена: спанов {exporter.exported}, отброшено трасс {exporter.dropped}")
+
+
+def current_span() -> Optional[Span]:
+    return _current.get()
+
+
+def start_root_span(name: str, kind: int = KIND_SERVER, **attributes) -> Optional[Span]:
+    """Корень трассы; None — трассировка выключена или корень уже открыт (вложенный вызов)."""
+    if _exporter is None or _current.get() is not None:
+        return None
+    trace = _Trace(sampled=random.random() < _sample_rate)
+    span = Span(trace, None, name, kind, attributes)
+    trace.spans.append(span)
+    return span
+
+
+def end_root_span(span: Span, error: Optional[BaseException] = None) -> None:
+    span.end(error)
+    trace = span.trace
+    trace.closed = True
+    if trace.dropped:
+        span.attributes["spans.dropped"] = trace.dropped
+    exporter = _exporter
+    if exporter is not None and (trace.sampled or trace.failed or span.end_ns - span.start_ns >= _slow_ns):
+        exporter.submit(list(trace.spans))
+
+
+def start_span(name: str, kind: int = KIND_INTERNAL, **attributes) -> Optional[Span]:
+    """Дочерний спан текущего; None — трассы нет. Закрывается span.end() в том же контексте."""
+    parent = _current.get()
+    if parent is None:
+        return None
+    trace = parent.trace
+    if trace.closed:
+        return None
+    if len(trace.spans) >= MAX_SPANS_PER_TRACE:
+        trace.dropped += 1
+        return None
+    span = Span(trace, parent.span_id, name, kind, attributes)
+    trace.spans.append(span)
+    return span
+
+
+def _update_kind(update) -> str:
+    for kind in ("callback_query", "message", "pre_checkout_query", "my_chat_member", "edited_message"):
+        if getattr(update, kind, None) is not None:
+            return kind
+    return "other"
+
+
+class TracedApplication(Application):
+    """Application, открывающий корневой спан на каждый апдейт."""
+
+    async def process_update(self, update: object) -> None:
+        span = start_root_span("update", update_id=getattr(update, "update_id", 0), update_type=_update_kind(update))
+        if span is None:
+            return await super().process_update(update)
+        try:
+            await super().process_update(update)
+        except BaseException as e:
+            end_root_span(span, e)
+            raise
+        end_root_span(span)
+
+
+class TracedJobQueue(JobQueue):
+    """JobQueue, открывающий корневой спан на каждый запуск джоба."""
+
+    @staticmethod
+    async def job_callback(job_queue, job) -> None:
+        span = start_root_span(f"job {job.name}", KIND_INTERNAL)
+        if span is None:
+            return await JobQueue.job_callback(job_queue, job)
+        try:
+            await JobQueue.job_callback(job_queue, job)
+        except BaseException as e:
+            end_root_span(span, e)
+            raise
+        end_root_span(span)
@@ -0,0 +1,233 @@
+"""Запись входящих апдейтов для воспроизведения нагрузки (tools/replay_updates.py).
+
+Включается UPDATE_RECORD_PATH: каждый апдейт до хендлеров (группа -1) попадает в очередь,
+фоновый поток обезличивает его и дописывает строкой JSON в gzip-файл:
+
+    {"t": 1760000000.123, "update": {...}}
+
+t — время получения (unix, сек). Файл только дописывается: каждый запуск бота добавляет
+новый gzip-member, а gzip читает склеенные member'ы как один поток. Поток сбрасывает данные
+раз в FLUSH_INTERVAL_SECONDS, так что файл читается и во время записи.
+
+Обезличивание: id пользователей и чатов заменяются псевдонимами (HMAC с солью
+UPDATE_RECORD_SALT, одинаковые в пределах соли), имена — на «user<псевдоним>», username,
+телефоны, геопозиция и платёжные данные удаляются, file_id/charge_id хэшируются. Текст
+сохраняется как есть только для команд (без аргументов), reply-кнопок и ввода времени;
+в остальном буквы заменяются на «x», цифры на «0» — длина и разметка (entities) не меняются.
+callback_data — данные самого бота — остаются, по ним маршрутизируются хендлеры.
+
+Хендлеры и цикл событий запись не тормозит: очередь ограничена, при переполнении апдейт
+пропускается и учитывается в dropped.
+"""
+
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import re
+import secrets
+import threading
+import time
+from typing import Iterable, Optional
+
+from telegram import Update
+from telegram.ext import TypeHandler
+
+from .config import UPDATE_RECORD_SALT
+
+logger = logging.getLogger(__name__)
+
+# Сколько апдейтов может ждать записи; больше — пропускаем, а не копим память
+QUEUE_MAX = 10_000
+# Как часто сбрасывать gzip-поток на диск, сек
+FLUSH_INTERVAL_SECONDS = 2.0
+
+# Объекты Telegram с личными данными пользователя или чата
+_PERSON_KEYS = {
+    "from", "chat", "user", "sender_chat", "forward_from", "forward_from_chat",
+    "new_chat_member", "old_chat_member", "left_chat_member",
+}
+# Поля, которые выбрасываем целиком
+_DROP_KEYS = {
+    "username", "last_name", "bio", "phone_number", "email", "contact", "location", "venue",
+    "order_info", "shipping_address", "photo_url", "active_usernames", "personal_chats",
+}
+# Строковые идентификаторы, которые заменяем хэшем
+_HASH_KEYS = {
+    "file_id", "file_unique_id", "telegram_payment_charge_id",
+    "provider_payment_charge_id", "invoice_payload", "inline_message_id",
+}
+_TEXT_KEYS = {"text", "caption"}
+
+_COMMAND_RE = re.compile(r"^/[A-Za-z0-9_]+(?:@[A-Za-z0-9_]+)?")
+_TIME_RE = re.compile(r"^\s*\d{1,2}[.:]\d{2}\s*$")
+_LETTER_RE = re.compile(r"[^\W\d_]")
+_DIGIT_RE = re.compile(r"\d")
+
+
+class UpdateAnonymizer:
+    """Обезличивает dict апдейта (Update.to_dict()); псевдонимы стабильны для одной соли."""
+
+    def __init__(self, salt: str, keep_texts: Iterable[str] = ()):
+        self._key = salt.encode("utf-8")
+        self._keep_texts = frozenset(keep_texts)
+
+    def pseudonym(self, value: int) -> int:
+        digest = hmac.new(self._key, str(abs(value)).encode(), hashlib.sha256).digest()
+        # Положительные id — пользователи и личные чаты, отрицательные — группы: знак сохраняем
+        alias = int.from_bytes(digest[:6], "big") % 10**12 + 1
+        return -alias if value < 0 else alias
+
+    def _hash_str(self, value: str) -> str:
+        return hmac.new(self._key, value.encode("utf-8"), hashlib.sha256).hexdigest()[:32]
+
+    def text(self, value: str) -> str:
+        if value in self._keep_texts or _TIME_RE.match(value):
+            return value
+        command = _COMMAND_RE.match(value)
+        if command:
+            # Команда маршрутизирует апдейт; аргументы (текст рассылки, ссылки) — личные
+            head = command.group(0)
+            return head + _DIGIT_RE.sub("0", _LETTER_RE.sub("x", value[len(head):]))
+        return _DIGIT_RE.sub("0", _LETTER_RE.sub("x", value))
+
+    def _person(self, obj: dict) -> dict:
+        result = {}
+        for key, value in obj.items():
+            if key in _DROP_KEYS:
+                continue
+            if key == "id" and isinstance(value, int):
+                value = self.pseudonym(value)
+            elif key in ("first_name", "title"):
+                value = f"user{self.pseudonym(obj.get('id', 0))}"
+            else:
+                value = self.anonymize(value)
+            result[key] = value
+        return result
+
+    def anonymize(self, obj):
+        if isinstance(obj, list):
+            return [self.anonymize(item) for item in obj]
+        if not isinstance(obj, dict):
+            return obj
+        result = {}
+        for key, value in obj.items():
+            if key in _DROP_KEYS:
+                continue
+            if key in _PERSON_KEYS and isinstance(value, dict):
+                value = self._person(value)
+            elif key in _TEXT_KEYS and isinstance(value, str):
+                value = self.text(value)
+            elif key in _HASH_KEYS and isinstance(value, str):
+                value = self._hash_str(value)
+            elif key in ("user_id", "chat_id") and isinstance(value, int):
+                value = self.pseudonym(value)
+            else:
+                value = self.anonymize(value)
+            result[key] = value
+        return result
+
+
+class UpdateRecorder:
+    """Фоновый поток, дописывающий обезличенные апдейты в gzip-файл."""
+
+    def __init__(self, path: str, anonymizer: UpdateAnonymizer):
+        self.path = path
+        self.anonymizer = anonymizer
+        self.recorded = 0
+        self.dropped = 0
+        self._queue = queue.Queue(maxsize=QUEUE_MAX)
+        self._thread = threading.Thread(target=self._run, name="update-recorder", daemon=True)
+
+    def start(self) -> None:
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._thread.start()
+
+    def submit(self, update: Update) -> None:
+        try:
+            self._queue.put_nowait((time.time(), update))
+        except queue.Full:
+            self.dropped += 1
+
+    def stop(self, timeout: float = 10.0) -> None:
+        if not self._thread.is_alive():
+            return
+        self._queue.put(None)
+        self._thread.join(timeout)
+
+    def _encode(self, received_at: float, update: Update) -> str:
+        payload = self.anonymizer.anonymize(update.to_dict())
+        return json.dumps({"t": round(received_at, 3), "update": payload}, ensure_ascii=False)
+
+    def _run(self) -> None:
+        with gzip.open(self.path, "at", encoding="utf-8") as f:
+            last_flush = time.monotonic()
+            while True:
+                try:
+                    item = self._queue.get(timeout=FLUSH_INTERVAL_SECONDS)
+                except queue.Empty:
+                    item = False
+                if item is None:
+                    break
+                if item:
+                    try:
+                        f.write(self._encode(*item) + "\n")
+                        self.recorded += 1
+                    except Exception as e:
+                        logger.error(f"Ошибка записи апдейта: {e}")
+                if time.monotonic() - last_flush >= FLUSH_INTERVAL_SECONDS:
+                    f.flush()
+                    last_flush = time.monotonic()
+        logger.info(f"Запись апдейтов остановлена: записано {self.recorded}, пропущено {self.dropped}")
+
+
+_recorder: Optional[UpdateRecorder] = None
+
+
+def install_update_recorder(application, path: str, keep_texts: Iterable[str] = ()) -> UpdateRecorder:
+    """Запускает запись и регистрирует хендлер группы -1, который видит каждый апдейт.
+
+    Args:
+        keep_texts: тексты, которые пишутся как есть (reply-кнопки) — без них воспроизведение
+            не попадёт в нужный хендлер
+    """
+    global _recorder
+    salt = UPDATE_RECORD_SALT or secrets.token_hex(16)
+    _recorder = UpdateRecorder(path, UpdateAnonymizer(salt, keep_texts))
+    _recorder.start()
+
+    async def record_update(update: Update, context) -> None:
+        _recorder.submit(update)
+
+    # Регистрируется после instrument_handlers: в метрики хендлеров запись не попадает
+    application.add_handler(TypeHandler(Update, record_update), group=-1)
+    logger.info(f"Запись апдейтов включена: {path}")
+    return _recorder
+
+
+def stop_update_recorder(timeout: float = 10.0) -> None:
+    """Дописывает очередь и закрывает файл (post_shutdown)."""
+    if _recorder is not None:
+        _recorder.stop(timeout)
+
+
+def read_recording(path: str):
+    """Итератор (t, update_dict) по файлу записи; недописанный хвост (обрыв процесса) пропускается."""
+    with gzip.open(path, "rt", encoding="utf-8") as f:
+        try:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    record = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                yield record["t"], record["update"]
+        except (EOFError, gzip.BadGzipFile) as e:
+            logger.warning(f"Файл записи {path} оборван: {e}")
@@ -1,14 +1,22 @@
 """
-Модуль для работы с PostgreSQL базой данных YogaDailyBot.
+Модуль для работы с базой данных YogaDailyBot.
 
 Этот модуль предоставляет все функции для работы с пользователями,
-йога практиками и логами в PostgreSQL базе данных.
+йога практиками и логами. Реализация выбирается STORAGE_BACKEND:
+PostgreSQL (data/postgres_db.py) или память процесса (data/memory_db.py) —
+у обеих одинаковые имена функций, аргументы и формы результатов.
 """
 
-# Импортируем все функции из PostgreSQL модуля
-from .postgres_db import *
+from app.config import STORAGE_BACKEND
 
-print("✅ Используется PostgreSQL база данных")
+if STORAGE_BACKEND == "memory":
+    from .memory_db import *
+else:
+    # Импортируем все функции из PostgreSQL модуля
+    from .postgres_db import *
 
-# Инициализируем базу данных при импорте модуля
-init_database()
+# Не зависят от хранилища (формат practice_logs, чистые функции) — из postgres_db в любом режиме
+from .postgres_db import BY_MOOD_PRACTICE_LOG_DAY, name_to_weekday  # noqa: F401
+
+# Импорт не обращается к базе: схему обновляет `python -m data.migrate`
+# или проверка версии при старте бота (data.migrations.ensure_schema)
@@ -0,0 +1,322 @@
+"""Инструментация слоя БД: счётчики и гистограммы по функциям data/postgres_db.py.
+
+Каждая публичная функция postgres_db оборачивается instrument_module(): считаем вызовы и
+длительность. Подключения создаются через InstrumentedConnection — время подключения,
+запросы, возвращённые строки и ошибки приписываются функции, которая сейчас выполняется
+(contextvar, поэтому работает и из asyncio.to_thread).
+
+Если идёт трасса (app/tracing.py), каждый вызов пишется ещё и спаном «db <функция>».
+
+Медленные запросы (дольше DB_SLOW_QUERY_MS) пишутся в лог с именем функции и текстом SQL
+без параметров — в параметрах бывают персональные данные.
+
+Накладные расходы — пара perf_counter и обновление словаря под локом на вызов/запрос,
+поэтому инструментация включена по умолчанию (выключается DB_METRICS_ENABLED=0).
+
+snapshot() — словарь для админ-команды, render_prometheus() — текстовый формат Prometheus.
+"""
+
+import bisect
+import contextvars
+import functools
+import inspect
+import logging
+import threading
+import time
+from typing import Optional
+
+import psycopg2.extensions
+
+from app.config import DB_METRICS_ENABLED, DB_SLOW_QUERY_MS
+from app.tracing import KIND_CLIENT, current_span, start_span
+
+logger = logging.getLogger(__name__)
+
+# Границы корзин гистограммы длительности, секунды (как le в Prometheus)
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+
+# Функция, вне которой сделан запрос (например, напрямую из tools/)
+UNATTRIBUTED = "<unattributed>"
+
+_current_function: contextvars.ContextVar = contextvars.ContextVar("db_function", default=UNATTRIBUTED)
+_lock = threading.Lock()
+
+
+class FunctionStats:
+    """Накопленная статистика одной функции слоя БД."""
+
+    __slots__ = (
+        "calls", "total_time", "max_time", "buckets",
+        "queries", "query_time", "rows", "errors",
+        "connections", "connect_time",
+    )
+
+    def __init__(self):
+        self.calls = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+        # buckets[i] — число вызовов с длительностью <= LATENCY_BUCKETS[i]; последний — +Inf
+        self.buckets = [0] * (len(LATENCY_BUCKETS) + 1)
+        self.queries = 0
+        self.query_time = 0.0
+        self.rows = 0
+        self.errors = 0
+        self.connections = 0
+        self.connect_time = 0.0
+
+    def quantile(self, q: float) -> float:
+        """Оценка квантиля по гистограмме: верхняя граница корзины, в которую он попал."""
+        if not self.calls:
+            return 0.0
+        target = q * self.calls
+        seen = 0
+        for index, count in enumerate(self.buckets):
+            seen += count
+            if seen >= target:
+                return LATENCY_BUCKETS[index] if index < len(LATENCY_BUCKETS) else self.max_time
+        return self.max_time
+
+    def to_dict(self) -> dict:
+        return {
+            "calls": self.calls,
+            "total_time": self.total_time,
+            "avg_ms": self.total_time / self.calls * 1000 if self.calls else 0.0,
+            "p50_ms": self.quantile(0.5) * 1000,
+            "p95_ms": self.quantile(0.95) * 1000,
+            "max_ms": self.max_time * 1000,
+            "queries": self.queries,
+            "query_time": self.query_time,
+            "rows": self.rows,
+            "errors": self.errors,
+            "connections": self.connections,
+            "connect_time": self.connect_time,
+            "buckets": list(self.buckets),
+        }
+
+
+_stats: dict = {}
+
+
+def _get_stats(name: str) -> FunctionStats:
+    stats = _stats.get(name)
+    if stats is None:
+        stats = _stats.setdefault(name, FunctionStats())
+    return stats
+
+
+def _record_call(name: str, duration: float) -> None:
+    with _lock:
+        stats = _get_stats(name)
+        stats.calls += 1
+        stats.total_time += duration
+        if duration > stats.max_time:
+            stats.max_time = duration
+        stats.buckets[bisect.bisect_left(LATENCY_BUCKETS, duration)] += 1
+
+
+def _record_query(duration: float, rows: int, failed: bool) -> None:
+    span = current_span()
+    if span is not None:
+        span.attributes["db.queries"] = span.attributes.get("db.queries", 0) + 1
+    with _lock:
+        stats = _get_stats(_current_function.get())
+        stats.queries += 1
+        stats.query_time += duration
+        if rows > 0:
+            stats.rows += rows
+        if failed:
+            stats.errors += 1
+
+
+def record_connection(duration: float, failed: bool = False) -> None:
+    """Время получения подключения (psycopg2.connect) — вызывается из get_connection."""
+    if not DB_METRICS_ENABLED:
+        return
+    with _lock:
+        stats = _get_stats(_current_function.get())
+        stats.connections += 1
+        stats.connect_time += duration
+        if failed:
+            stats.errors += 1
+
+
+def _log_slow_query(query, duration: float) -> None:
+    sql = query.decode(errors="replace") if isinstance(query, bytes) else str(query)
+    sql = " ".join(sql.split())
+    if len(sql) > 300:
+        sql = sql[:300] + "…"
+    logger.warning(
+        "Медленный запрос %.0f мс в %s: %s", duration * 1000, _current_function.get(), sql
+    )
+
+
+class _InstrumentedCursorMixin:
+    """Подмешивается к любому классу курсора: время, строки и ошибки каждого execute."""
+
+    def execute(self, query, vars=None):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().execute(query, vars)
+            failed = False
+            return result
+        finally:
+            duration = time.perf_counter() - started
+            _record_query(duration, self.rowcount if not failed else 0, failed)
+            if duration * 1000 >= DB_SLOW_QUERY_MS:
+                _log_slow_query(query, duration)
+
+    def executemany(self, query, vars_list):
+        started = time.perf_counter()
+        failed = True
+        try:
+            result = super().executemany(query, vars_list)
+            failed = False
+            return result
+        finally:
+            duration = time.perf_counter() - started
+            _record_query(duration, self.rowcount if not failed else 0, failed)
+            if duration * 1000 >= DB_SLOW_QUERY_MS:
+                _log_slow_query(query, duration)
+
+
+@functools.lru_cache(maxsize=None)
+def _instrumented_cursor_class(cursor_class):
+    return type(f"Instrumented{cursor_class.__name__}", (_InstrumentedCursorMixin, cursor_class), {})
+
+
+class InstrumentedConnection(psycopg2.extensions.connection):
+    """connection_factory для psycopg2.connect: все курсоры (в т.ч. RealDictCursor) считаются."""
+
+    def cursor(self, *args, cursor_factory=None, **kwargs):
+        base = cursor_factory or self.cursor_factory or psycopg2.extensions.cursor
+        return super().cursor(*args, cursor_factory=_instrumented_cursor_class(base), **kwargs)
+
+
+def connection_factory() -> Optional[type]:
+    """Фабрика подключений для get_connection (None — инструментация выключена)."""
+    return InstrumentedConnection if DB_METRICS_ENABLED else None
+
+
+def instrument(func):
+    """Декоратор: вызовы и длительность функции, запросы внутри приписываются ей."""
+    name = func.__name__
+
+    span_name = f"db {name}"
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        token = _current_function.set(name)
+        span = start_span(span_name, KIND_CLIENT)
+        started = time.perf_counter()
+        error = None
+        try:
+            return func(*args, **kwargs)
+        except Exception as e:
+            error = e
+            raise
+        finally:
+            _record_call(name, time.perf_counter() - started)
+            if span is not None:
+                span.end(error)
+            _current_function.reset(token)
+
+    wrapper.__instrumented__ = True
+    return wrapper
+
+
+def instrument_module(namespace: dict, exclude: tuple = ()) -> int:
+    """Оборачивает все публичные функции, определённые в модуле namespace.
+
+    Вызывается в конце модуля (instrument_module(globals())): внутренние вызовы между
+    функциями идут через глобальные имена, поэтому тоже попадают в статистику.
+
+    Returns:
+        int: сколько функций обёрнуто
+    """
+    if not DB_METRICS_ENABLED:
+        return 0
+    module_name = namespace.get("__name__")
+    wrapped = 0
+    for name, value in list(namespace.items()):
+        if (
+            name.startswith("_")
+            or name in exclude
+            or not inspect.isfunction(value)
+            or value.__module__ != module_name
+            or getattr(value, "__instrumented__", False)
+        ):
+            continue
+        namespace[name] = instrument(value)
+        wrapped += 1
+    return wrapped
+
+
+def snapshot() -> dict:
+    """Копия статистики: {имя функции: FunctionStats.to_dict()}."""
+    with _lock:
+        return {name: stats.to_dict() for name, stats in _stats.items()}
+
+
+def reset() -> None:
+    with _lock:
+        _stats.clear()
+
+
+def totals() -> dict:
+    """Суммы по всем функциям: вызовы, запросы, строки, подключения, время."""
+    result = {"calls": 0, "queries": 0, "rows": 0, "errors": 0, "connections": 0,
+              "total_time": 0.0, "query_time": 0.0, "connect_time": 0.0}
+    with _lock:
+        for name, stats in _stats.items():
+            if name != UNATTRIBUTED:
+                result["calls"] += stats.calls
+                result["total_time"] += stats.total_time
+            result["queries"] += stats.queries
+            result["rows"] += stats.rows
+            result["errors"] += stats.errors
+            result["connections"] += stats.connections
+            result["query_time"] += stats.query_time
+            result["connect_time"] += stats.connect_time
+    return result
+
+
+def render_prometheus() -> str:
+    """Статистика в текстовом формате Prometheus (exposition format 0.0.4)."""
+    data = snapshot()
+    lines = [
+        "# HELP yogabot_db_calls_total Вызовы функций слоя БД",
+        "# TYPE yogabot_db_calls_total counter",
+    ]
+    for name, stats in sorted(data.items()):
+        lines.append(f'yogabot_db_calls_total{{function="{name}"}} {stats["calls"]}')
+
+    lines += [
+        "# HELP yogabot_db_call_duration_seconds Длительность функций слоя БД",
+        "# TYPE yogabot_db_call_duration_seconds histogram",
+    ]
+    for name, stats in sorted(data.items()):
+        cumulative = 0
+        for bound, count in zip(LATENCY_BUCKETS, stats["buckets"]):
+            cumulative += count
+            lines.append(f'yogabot_db_call_duration_seconds_bucket{{function="{name}",le="{bound}"}} {cumulative}')
+        cumulative += stats["buckets"][-1]
+        lines.append(f'yogabot_db_call_duration_seconds_bucket{{function="{name}",le="+Inf"}} {cumulative}')
+        lines.append(f'yogabot_db_call_duration_seconds_sum{{function="{name}"}} {stats["total_time"]:.6f}')
+        lines.append(f'yogabot_db_call_duration_seconds_count{{function="{name}"}} {stats["calls"]}')
+
+    for metric, key, kind, help_text in (
+        ("yogabot_db_queries_total", "queries", "counter", "SQL-запросы"),
+        ("yogabot_db_query_seconds_total", "query_time", "counter", "Время выполнения SQL-запросов"),
+        ("yogabot_db_rows_total", "rows", "counter", "Строки, возвращённые/изменённые запросами"),
+        ("yogabot_db_errors_total", "errors", "counter", "Ошибки SQL-запросов и подключений"),
+        ("yogabot_db_connections_total", "connections", "counter", "Подключения к БД"),
+        ("yogabot_db_connect_seconds_total", "connect_time", "counter", "Время получения подключения"),
+    ):
+        lines.append(f"# HELP {metric} {help_text}")
+        lines.append(f"# TYPE {metric} {kind}")
+        for name, stats in sorted(data.items()):
+            value = stats[key]
+            formatted = f"{value:.6f}" if isinstance(value, float) else str(value)
+            lines.append(f'{metric}{{function="{name}"}} {formatted}')
+    return "\n".join(lines) + "\n"
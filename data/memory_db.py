@@ -0,0 +1,2049 @@
+"""Хранилище в памяти процесса с тем же API, что у data/postgres_db.py (STORAGE_BACKEND=memory).
+
+data/db.py выбирает модуль по STORAGE_BACKEND, поэтому хендлеры, планировщик и tools/ работают
+с этим хранилищем без изменений: те же имена функций, аргументы, формы строк (кортежи в порядке
+колонок SELECT) и значения по умолчанию при ошибках. Нужен для офлайн-прогонов: нагрузочные
+симуляции и бенчмарки хендлеров внутри одного процесса, без PostgreSQL и сетевых задержек.
+
+Устройство: «таблицы» — словари по первичному ключу, рядом индексы под запросы горячего пути
+(пользователи по notify_time с отсортированным списком времён, id практик по возрастанию и по
+дням недели, логи по пользователю, активные сообщения outbox по чату, счётчики выполненных
+практик). Все функции выполняются под одним RLock — это аналог транзакции: вызов виден другим
+потокам целиком или не виден вовсе. SKIP LOCKED не нужен: захваты (claim_*) атомарны под локом.
+
+Семантика повторяет SQL из postgres_db: фильтры COALESCE, каскады внешних ключей (удаление
+пользователя или практики), свёртка старых логов в агрегаты, аренды доставки и outbox,
+уникальность idempotency_key. Времена хранятся так же, как вернул бы psycopg2: TIMESTAMP —
+наивный UTC, TIMESTAMPTZ — aware UTC. Данные живут до конца процесса (reset_memory_db() — очистить).
+
+Чего здесь нет: подключений (get_connection() бросает RuntimeError, поэтому выборы лидера и
+общий лимитер запросов в этом режиме выключены), партиций practice_logs и LISTEN/NOTIFY —
+system_state процесса и так единственный. В pick_random_by_mood_practice понимаются только
+фрагменты WHERE, которые строит бот (длительность, интенсивность, «без коврика»).
+"""
+
+import bisect
+import copy
+import functools
+import json
+import logging
+import operator
+import random
+import re
+import threading
+from datetime import date, datetime, timedelta, timezone
+from typing import Optional
+from zoneinfo import ZoneInfo
+
+from app import clock
+from app.config import DEFAULT_TZ, PRACTICE_LOGS_HOT_MONTHS
+from data.instrumentation import instrument_module
+from data.postgres_db import (  # noqa: F401 — константы реэкспортируются через data.db
+    CHALLENGE_SUMMARY_LAST_SENT_KEY,
+    CHALLENGE_SUMMARY_STOPPED_KEY,
+    CHALLENGE_WEEKLY_SCHEDULE_SENT_KEY,
+    DAILY_PLAN_KEEP_DAYS,
+    DELIVERY_CLAIM_BATCH,
+    DELIVERY_LEASE_SECONDS,
+    DELIVERY_WORKER_ID,
+    MAX_EXTRA_PRACTICES_INLINE_TRACKED,
+    OUTBOX_ACTIVE_STATUSES,
+    OUTBOX_LEASE_SECONDS,
+    SYSTEM_STATE_LISTEN_POLL_SECONDS,
+    _add_months,
+    _decode_bonus_practice_row,
+    _decode_my_description,
+    _decode_practice_row,
+    _extra_inline_messages_as_lists,
+    weekday_to_name,
+)
+
+logger = logging.getLogger(__name__)
+
+MOSCOW_TZ = ZoneInfo(DEFAULT_TZ)
+
+_ACTIVE_MODES = ("daily", "challenge")
+
+
+# --- Время ---
+# Все «NOW()» модуля идут через эти функции.
+
+def _now() -> datetime:
+    """NOW(): aware UTC — для колонок TIMESTAMPTZ (виртуальное время симуляции — через app.clock)."""
+    return clock.now(timezone.utc)
+
+
+def _now_naive() -> datetime:
+    """CURRENT_TIMESTAMP для колонок TIMESTAMP: наивный UTC, как sent_at/completed_at в БД."""
+    return _now().replace(tzinfo=None)
+
+
+def _today() -> date:
+    """(NOW() AT TIME ZONE DEFAULT_TZ)::date — календарный день бота."""
+    return _now().astimezone(MOSCOW_TZ).date()
+
+
+def _msk_day(value: Optional[datetime]) -> Optional[date]:
+    """sent_day_msk / completed_day_msk: день МСК для наивного UTC."""
+    if value is None:
+        return None
+    return value.replace(tzinfo=timezone.utc).astimezone(MOSCOW_TZ).date()
+
+
+def _hot_start() -> datetime:
+    """Начало горячего окна логов (как _practice_logs_hot_start, но от часов этого модуля)."""
+    current_month = _now_naive().date().replace(day=1)
+    start = _add_months(current_month, -(PRACTICE_LOGS_HOT_MONTHS - 1))
+    return datetime(start.year, start.month, 1)
+
+
+# --- Хранилище ---
+
+class _Store:
+    """Все таблицы и индексы; reset_memory_db() заменяет объект целиком."""
+
+    def __init__(self):
+        self.sequences = {}
+        self.users = {}
+        self.users_by_time = {}       # notify_time -> {user_id}
+        self.notify_times = []        # различные notify_time по возрастанию
+        self.suggestions = {}
+        self.practices = {}
+        self.practice_ids = []        # practices_id по возрастанию
+        self.practice_by_url = {}
+        self.weekday_ids = {}         # weekday -> [practices_id] по возрастанию
+        self.bonuses = {}
+        self.bonus_by_parent = {}     # parent_practice_id -> [bonus_id] по возрастанию
+        self.bonus_urls = set()
+        self.logs = {}
+        self.user_logs = {}           # user_id -> [log_id] в порядке sent_at
+        self.scheduled_logs = {}      # user_id -> горячих логов с day_number >= 1
+        self.completed_logs = {}      # user_id -> горячих логов с completed_at
+        self.scheduled_day = {}       # user_id -> sent_day_msk последнего лога с day_number >= 1
+        self.daily_rollups = {}       # (user_id, day_msk) -> [sent, scheduled, completed]
+        self.user_totals = {}         # user_id -> [sent, scheduled, completed]
+        self.by_mood_seen = {}        # (user_id, filter_key) -> {practice_id}
+        self.broadcast_messages = {}
+        self.outbox = {}
+        self.outbox_keys = {}         # idempotency_key -> id
+        self.outbox_chat_active = {}  # chat_id -> [id] в pending/sending по возрастанию
+        self.keyboard_queue = {}      # (chat_id, message_id) -> строка, в порядке queued_at
+        self.daily_plan = {}          # plan_date -> {user_id: строка}
+        self.system_state = {}
+
+    def next_id(self, sequence: str) -> int:
+        value = self.sequences.get(sequence, 0) + 1
+        self.sequences[sequence] = value
+        return value
+
+
+_db = _Store()
+_lock = threading.RLock()
+
+
+def _locked(func):
+    """Вызов целиком под общим локом — аналог одной транзакции."""
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with _lock:
+            return func(*args, **kwargs)
+    return wrapper
+
+
+def reset_memory_db() -> None:
+    """Удаляет все данные (между прогонами симуляции)."""
+    global _db
+    with _lock:
+        _db = _Store()
+
+
+def get_connection(**options):
+    raise RuntimeError("STORAGE_BACKEND=memory: подключения к PostgreSQL нет")
+
+
+def ensure_practice_logs_partitions() -> int:
+    # Партиций в памяти нет — создавать нечего
+    return 0
+
+
+@_locked
+def rollup_cold_practice_logs() -> int:
+    """Сворачивает логи старше горячего окна в агрегаты и удаляет их (как свёртка партиций)."""
+    hot_start = _hot_start()
+    cold = [log for log in _db.logs.values() if log["sent_at"] < hot_start]
+    for log in cold:
+        _rollup_log(log)
+        _remove_log(log)
+    return len(cold)
+
+
+def init_database():
+    # Схема в памяти не меняется; как и migrate(), возвращает применённые версии
+    return []
+
+
+# --- Пользователи ---
+
+def _new_user(user_id: int, chat_id: int) -> dict:
+    now = _now_naive()
+    return {
+        "user_id": user_id,
+        "chat_id": chat_id,
+        "notify_time": None,
+        "user_name": None,
+        "user_nickname": None,
+        "total_practices": 0,
+        "challenge_start_id": None,
+        "challenge_day": 0,
+        "program_position": 0,
+        "is_blocked": False,
+        "onboarding_required": False,
+        "is_paused": False,
+        "bot_mode": "daily",
+        "daily_schedule_enabled": True,
+        "paused_at": None,
+        "last_pause_reminder_at": None,
+        "pause_reminder_step": 0,
+        "last_by_mood_active_at": None,
+        "last_by_mood_reminder_at": None,
+        "by_mood_reminder_step": 0,
+        "last_practice_message_id": None,
+        "last_practice_message_at": None,
+        "extra_practices_inline_messages": [],
+        "first_daily_send_date": None,
+        "delivery_lease_until": None,
+        "delivery_lease_owner": None,
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def _set_notify_time(user: dict, notify_time: Optional[str]) -> None:
+    """Меняет notify_time вместе с индексом users_by_time / notify_times."""
+    old = user["notify_time"]
+    if old == notify_time:
+        return
+    if old is not None:
+        ids = _db.users_by_time.get(old)
+        if ids is not None:
+            ids.discard(user["user_id"])
+            if not ids:
+                del _db.users_by_time[old]
+                index = bisect.bisect_left(_db.notify_times, old)
+                if index < len(_db.notify_times) and _db.notify_times[index] == old:
+                    del _db.notify_times[index]
+    user["notify_time"] = notify_time
+    if notify_time is not None:
+        ids = _db.users_by_time.get(notify_time)
+        if ids is None:
+            ids = _db.users_by_time[notify_time] = set()
+            bisect.insort(_db.notify_times, notify_time)
+        ids.add(user["user_id"])
+
+
+def _upsert_user(user_id: int, chat_id: int) -> tuple:
+    """(строка, создана ли) — INSERT ... ON CONFLICT (user_id)."""
+    user = _db.users.get(user_id)
+    if user is not None:
+        return user, False
+    user = _db.users[user_id] = _new_user(user_id, chat_id)
+    return user, True
+
+
+def _update(user: dict, **fields) -> None:
+    """UPDATE users SET ..., updated_at = CURRENT_TIMESTAMP."""
+    if "notify_time" in fields:
+        _set_notify_time(user, fields.pop("notify_time"))
+    user.update(fields)
+    user["updated_at"] = _now_naive()
+
+
+def _schedule_enabled(user: dict) -> bool:
+    """Общий фильтр рассылки: не заблокирован, не на паузе, без онбординга, daily/challenge."""
+    return (
+        not user["is_blocked"]
+        and not user["is_paused"]
+        and not user["onboarding_required"]
+        and user["bot_mode"] in _ACTIVE_MODES
+        and user["daily_schedule_enabled"]
+    )
+
+
+_RESET_PAUSE = {"is_paused": False, "paused_at": None, "last_pause_reminder_at": None, "pause_reminder_step": 0}
+
+
+@_locked
+def save_user_time(user_id: int, chat_id: int, notify_time: str, user_name: str = None, user_nickname: str = None, reset_days: bool = True) -> bool:
+    user, created = _upsert_user(user_id, chat_id)
+    fields = {
+        "chat_id": chat_id,
+        "notify_time": notify_time,
+        "user_name": user_name,
+        "user_nickname": user_nickname,
+        "onboarding_required": False,
+        "daily_schedule_enabled": True,
+    }
+    if reset_days:
+        # Первый запуск онбординга: первая рассылка только со следующего календарного дня
+        fields.update(
+            total_practices=0,
+            bot_mode="daily",
+            first_daily_send_date=_today() + timedelta(days=1),
+            challenge_start_id=None,
+            challenge_day=0,
+        )
+    else:
+        fields["bot_mode"] = "challenge" if not created and user["bot_mode"] == "challenge" else "daily"
+    _update(user, **fields)
+    return True
+
+
+@_locked
+def save_user_practice_suggestion(user_id: int, video_url: str, comment: str = None, user_nickname: str = None) -> bool:
+    if user_id not in _db.users:
+        logger.warning(f"Пользователь {user_id} не найден")
+        return False
+    suggestion_id = _db.next_id("user_suggestions")
+    _db.suggestions[suggestion_id] = {
+        "suggestion_id": suggestion_id,
+        "user_id": user_id,
+        "video_url": video_url,
+        "comment": comment,
+        "user_nickname": user_nickname,
+        "created_at": _now_naive(),
+    }
+    return True
+
+
+def _latest_suggestions(rows, limit: int) -> list:
+    return sorted(rows, key=lambda row: (row["created_at"], row["suggestion_id"]), reverse=True)[:limit]
+
+
+@_locked
+def get_user_suggestions(user_id: int, limit: int = 10) -> list:
+    rows = [row for row in _db.suggestions.values() if row["user_id"] == user_id]
+    return [
+        (row["suggestion_id"], row["video_url"], row["comment"], row["user_nickname"], row["created_at"])
+        for row in _latest_suggestions(rows, limit)
+    ]
+
+
+@_locked
+def get_all_user_suggestions(limit: int = 100) -> list:
+    return [
+        (row["suggestion_id"], row["user_id"], row["video_url"], row["comment"], row["user_nickname"], row["created_at"])
+        for row in _latest_suggestions(_db.suggestions.values(), limit)
+    ]
+
+
+@_locked
+def increment_total_practices(user_id: int) -> bool:
+    user = _db.users.get(user_id)
+    if user is None:
+        logger.warning(f"Пользователь {user_id} не найден")
+        return False
+    _update(user, total_practices=user["total_practices"] + 1)
+    return True
+
+
+@_locked
+def get_total_practices(user_id: int) -> int:
+    user = _db.users.get(user_id)
+    return user["total_practices"] if user else 0
+
+
+@_locked
+def reset_total_practices(user_id: int) -> bool:
+    user = _db.users.get(user_id)
+    if user is None:
+        logger.warning(f"Пользователь {user_id} не найден")
+        return False
+    _update(user, total_practices=0)
+    return True
+
+
+@_locked
+def get_program_position(user_id: int) -> int:
+    user = _db.users.get(user_id)
+    return user["program_position"] if user else 0
+
+
+@_locked
+def increment_program_position(user_id: int) -> bool:
+    user = _db.users.get(user_id)
+    if user is None:
+        return False
+    _update(user, program_position=user["program_position"] + 1)
+    return True
+
+
+@_locked
+def set_last_practice_message_id(user_id: int, message_id: int) -> bool:
+    user = _db.users.get(user_id)
+    if user is None:
+        return False
+    chat_id = user["chat_id"]
+    previous_message_id = user["last_practice_message_id"]
+    previous_sent_at = user["last_practice_message_at"]
+    _update(user, last_practice_message_id=message_id, last_practice_message_at=_now())
+    if chat_id is not None and previous_message_id is not None and previous_message_id != message_id:
+        _db.keyboard_queue.setdefault((chat_id, previous_message_id), {
+            "user_id": user_id,
+            "message_sent_at": previous_sent_at,
+            "queued_at": _now(),
+        })
+    return True
+
+
+@_locked
+def forget_practice_message(user_id: int, message_id: int) -> bool:
+    user = _db.users.get(user_id)
+    if user is None or user["last_practice_message_id"] != message_id:
+        return False
+    user["last_practice_message_id"] = None
+    return True
+
+
+@_locked
+def claim_keyboard_cleanups(limit: int, max_age_hours: float) -> list:
+    border = _now() - timedelta(hours=max_age_hours)
+    expired = [
+        key for key, row in _db.keyboard_queue.items()
+        if (row["message_sent_at"] or row["queued_at"]) < border
+    ]
+    for key in expired:
+        del _db.keyboard_queue[key]
+    picked = sorted(_db.keyboard_queue.items(), key=lambda item: item[1]["queued_at"])[:limit]
+    for key, _row in picked:
+        del _db.keyboard_queue[key]
+    if expired:
+        logger.info(f"Очередь снятия кнопок: выброшено устаревших сообщений — {len(expired)}")
+    return [key for key, _row in picked]
+
+
+@_locked
+def get_keyboard_cleanup_queue_size() -> int:
+    return len(_db.keyboard_queue)
+
+
+@_locked
+def get_last_practice_message_id(user_id: int):
+    user = _db.users.get(user_id)
+    return user["last_practice_message_id"] if user else None
+
+
+@_locked
+def delete_user(user_id: int) -> bool:
+    user = _db.users.get(user_id)
+    if user is None:
+        return True
+    _set_notify_time(user, None)
+    del _db.users[user_id]
+    # ON DELETE CASCADE: логи, агрегаты, предложения, сообщения рассылок
+    for log_id in list(_db.user_logs.get(user_id, ())):
+        _remove_log(_db.logs[log_id])
+    _db.user_logs.pop(user_id, None)
+    _db.scheduled_day.pop(user_id, None)
+    _db.user_totals.pop(user_id, None)
+    for key in [key for key in _db.daily_rollups if key[0] == user_id]:
+        del _db.daily_rollups[key]
+    for table in (_db.suggestions, _db.broadcast_messages):
+        for row_id in [row_id for row_id, row in table.items() if row["user_id"] == user_id]:
+            del table[row_id]
+    return True
+
+
+@_locked
+def get_all_users() -> list:
+    return [
+        (user["user_id"], user["chat_id"], user["notify_time"], user["user_name"], user["user_nickname"], user["total_practices"])
+        for _, user in sorted(_db.users.items())
+    ]
+
+
+@_locked
+def get_users_by_time(notify_time: str) -> list:
+    result = []
+    for user_id in _db.users_by_time.get(notify_time, ()):
+        user = _db.users[user_id]
+        if (
+            not user["is_blocked"]
+            and not user["onboarding_required"]
+            and user["bot_mode"] in _ACTIVE_MODES
+            and user["daily_schedule_enabled"]
+        ):
+            result.append((user_id, user["chat_id"]))
+    return result
+
+
+def _is_pending_today(user: dict, today: date) -> bool:
+    """Условия _PENDING_FOR_TODAY_SQL, кроме notify_time <= current_time."""
+    user_id = user["user_id"]
+    if _db.scheduled_day.get(user_id) == today or not _schedule_enabled(user):
+        return False
+    first_date = user["first_daily_send_date"]
+    if first_date is not None and first_date > today:
+        return False
+    totals = _db.user_totals.get(user_id)
+    return (
+        _db.scheduled_logs.get(user_id, 0) > 0
+        or (totals is not None and totals[1] > 0)
+        or _msk_day(user["updated_at"]) < today
+    )
+
+
+def _pending_users(current_time: str):
+    """Пользователи, которым пора отправить практику, по индексу notify_time <= current_time."""
+    today = _today()
+    scheduled_day = _db.scheduled_day
+    end = bisect.bisect_right(_db.notify_times, current_time)
+    for notify_time in _db.notify_times[:end]:
+        for user_id in _db.users_by_time[notify_time]:
+            # Самая частая причина отказа — практика сегодня уже ушла: отсекаем без вызова функции
+            if scheduled_day.get(user_id) == today:
+                continue
+            user = _db.users[user_id]
+            if _is_pending_today(user, today):
+                yield user
+
+
+@_locked
+def get_users_pending_for_today(current_time: str) -> list:
+    return [(user["user_id"], user["chat_id"], user["notify_time"]) for user in _pending_users(current_time)]
+
+
+@_locked
+def claim_users_pending_for_today(current_time: str, limit: int = DELIVERY_CLAIM_BATCH,
+                                  lease_seconds: int = DELIVERY_LEASE_SECONDS,
+                                  owner: str = DELIVERY_WORKER_ID) -> list:
+    now = _now()
+    due = [
+        user for user in _pending_users(current_time)
+        if user["delivery_lease_until"] is None or user["delivery_lease_until"] < now
+    ]
+    due.sort(key=lambda user: (user["notify_time"], user["user_id"]))
+    lease_until = now + timedelta(seconds=lease_seconds)
+    results = []
+    for user in due[:limit]:
+        user["delivery_lease_until"] = lease_until
+        user["delivery_lease_owner"] = owner
+        results.append((user["user_id"], user["chat_id"], user["notify_time"]))
+    return results
+
+
+@_locked
+def release_delivery_leases(user_ids: list, owner: str = DELIVERY_WORKER_ID) -> int:
+    released = 0
+    for user_id in set(user_ids or ()):
+        user = _db.users.get(user_id)
+        if user is not None and user["delivery_lease_owner"] == owner:
+            user["delivery_lease_until"] = None
+            user["delivery_lease_owner"] = None
+            released += 1
+    return released
+
+
+# --- План рассылки на день ---
+
+def _plan_candidates(plan_date: date):
+    for user in _db.users.values():
+        first_date = user["first_daily_send_date"]
+        if (
+            _schedule_enabled(user)
+            and (first_date is None or first_date <= plan_date)
+            and user["notify_time"] is not None
+        ):
+            yield user
+
+
+@_locked
+def build_daily_plan(plan_date: date) -> Optional[int]:
+    weekday_ids = _db.weekday_ids.get(plan_date.isoweekday(), [])
+    ids = _db.practice_ids
+    plan = {}
+    for user in _plan_candidates(plan_date):
+        start_id = user["challenge_start_id"]
+        if start_id is not None:
+            if not ids:
+                continue
+            start_index = bisect.bisect_left(ids, start_id)
+            if start_index >= len(ids):
+                start_index = 0
+            practice_id = ids[(start_index + user["challenge_day"]) % len(ids)]
+            is_challenge, counter = True, user["challenge_day"]
+        else:
+            if not weekday_ids:
+                continue
+            practice_id = weekday_ids[(user["program_position"] // 7) % len(weekday_ids)]
+            is_challenge, counter = False, user["program_position"]
+        day_number = counter + 1
+        plan[user["user_id"]] = {
+            "practice_id": practice_id,
+            "is_challenge": is_challenge,
+            "day_number": day_number,
+            "title": f"{day_number} день челленджа" if is_challenge else "Практика дня",
+            "bonus_ids": list(_db.bonus_by_parent.get(practice_id, ())),
+            "basis_counter": counter,
+            "basis_start_id": start_id,
+            "created_at": _now(),
+        }
+    _db.daily_plan[plan_date] = plan
+    keep_from = plan_date - timedelta(days=DAILY_PLAN_KEEP_DAYS)
+    for old_date in [old_date for old_date in _db.daily_plan if old_date < keep_from]:
+        del _db.daily_plan[old_date]
+    return len(plan)
+
+
+@_locked
+def get_planned_deliveries(user_ids: list, plan_date: date) -> dict:
+    if not user_ids:
+        return {}
+    plan = _db.daily_plan.get(plan_date, {})
+    result = {}
+    for user_id in user_ids:
+        row = plan.get(user_id)
+        user = _db.users.get(user_id)
+        practice = _db.practices.get(row["practice_id"]) if row else None
+        if row is None or user is None or practice is None:
+            continue
+        start_id = user["challenge_start_id"]
+        counter = user["challenge_day"] if row["is_challenge"] else user["program_position"]
+        if row["is_challenge"] != (start_id is not None) or row["basis_start_id"] != start_id or row["basis_counter"] != counter:
+            continue
+        result[user_id] = {
+            "practice": _practice_row(practice),
+            "is_challenge": row["is_challenge"],
+            "day_number": row["day_number"],
+            "title": row["title"],
+            "bonuses": [_bonus_row(_db.bonuses[bonus_id]) for bonus_id in row["bonus_ids"] if bonus_id in _db.bonuses],
+        }
+    return result
+
+
+@_locked
+def get_daily_plan_summary(plan_date: date) -> Optional[dict]:
+    plan = _db.daily_plan.get(plan_date, {})
+    by_hour = {}
+    by_practice = {}
+    for user_id, row in plan.items():
+        user = _db.users.get(user_id)
+        if user is not None:
+            hour = (user["notify_time"] or "").split(":")[0]
+            by_hour[hour] = by_hour.get(hour, 0) + 1
+        if row["practice_id"] in _db.practices:
+            by_practice[row["practice_id"]] = by_practice.get(row["practice_id"], 0) + 1
+    top_practices = sorted(by_practice.items(), key=lambda item: (-item[1], item[0]))[:5]
+    return {
+        "users": len(plan),
+        "challenge": sum(1 for row in plan.values() if row["is_challenge"]),
+        "messages": sum(1 + len(row["bonus_ids"]) for row in plan.values()),
+        "by_hour": sorted(by_hour.items()),
+        "top_practices": [
+            (practice_id, _db.practices[practice_id]["title"], count) for practice_id, count in top_practices
+        ],
+        "unplanned": sum(1 for user in _plan_candidates(plan_date) if user["user_id"] not in plan),
+    }
+
+
+# --- Outbox исходящих сообщений ---
+
+class _DuplicateKey(Exception):
+    """Аналог IntegrityError по idempotency_key."""
+
+
+def _as_jsonb(value) -> dict:
+    # JSONB в БД: после чтения это новый объект из чистого JSON (кортежи становятся списками)
+    return json.loads(json.dumps(value))
+
+
+def _outbox_set_status(row: dict, status: str) -> None:
+    """Меняет статус и поддерживает индекс активных сообщений чата."""
+    was_active = row["status"] in OUTBOX_ACTIVE_STATUSES
+    row["status"] = status
+    is_active = status in OUTBOX_ACTIVE_STATUSES
+    if was_active == is_active:
+        return
+    active = _db.outbox_chat_active.setdefault(row["chat_id"], [])
+    if is_active:
+        bisect.insort(active, row["id"])
+    else:
+        index = bisect.bisect_left(active, row["id"])
+        if index < len(active) and active[index] == row["id"]:
+            del active[index]
+        if not active:
+            del _db.outbox_chat_active[row["chat_id"]]
+
+
+def _insert_outbox_rows(rows: list) -> list:
+    """rows — [(idempotency_key, user_id, chat_id, kind, payload, meta)]; конфликт ключа — _DuplicateKey."""
+    keys = [row[0] for row in rows]
+    if len(set(keys)) != len(keys) or any(key in _db.outbox_keys for key in keys):
+        raise _DuplicateKey()
+    now = _now()
+    ids = []
+    for key, user_id, chat_id, kind, payload, meta in rows:
+        message_id = _db.next_id("outbox_messages")
+        row = {
+            "id": message_id,
+            "idempotency_key": key,
+            "user_id": user_id,
+            "chat_id": chat_id,
+            "kind": kind,
+            "payload": _as_jsonb(payload),
+            "meta": _as_jsonb(meta or {}),
+            "status": None,
+            "attempts": 0,
+            "next_attempt_at": now,
+            "lease_until": None,
+            "lease_owner": None,
+            "last_error": None,
+            "telegram_message_id": None,
+            "created_at": now,
+            "updated_at": now,
+            "sent_at": None,
+        }
+        _db.outbox[message_id] = row
+        _db.outbox_keys[key] = message_id
+        _outbox_set_status(row, "pending")
+        ids.append(message_id)
+    return ids
+
+
+@_locked
+def enqueue_practice_delivery(user_id: int, chat_id: int, practice_id: int, is_challenge: bool,
+                              messages: list, notify_time: Optional[str] = None) -> Optional[dict]:
+    today = _today().isoformat()
+    user = _db.users.get(user_id)
+    if user is None:
+        return None
+    if practice_id not in _db.practices:
+        logger.error(f"Ошибка постановки практики в outbox для пользователя {user_id}: практика {practice_id} не найдена")
+        return None
+    keys = [
+        f"practice:{user_id}:{today}" if index == 0 else f"practice:{user_id}:{today}:{index}"
+        for index in range(len(messages))
+    ]
+    # Уникальность ключей проверяем до изменений: в БД конфликт откатил бы всю транзакцию
+    if any(key in _db.outbox_keys for key in keys):
+        logger.debug("Практика пользователю %s на %s уже поставлена в outbox", user_id, today)
+        return None
+    counter = "challenge_day" if is_challenge else "program_position"
+    total_practices = user["total_practices"] + 1
+    _update(user, **{counter: user[counter] + 1, "total_practices": total_practices})
+    log_id = _insert_log(user_id, practice_id, total_practices)
+    rows = []
+    for index, (key, (kind, payload)) in enumerate(zip(keys, messages)):
+        # day — день рассылки: до его конца временные ошибки доставки повторяются (app/outbox.py)
+        meta = {"day": today}
+        if index == 0:
+            meta.update(practice_id=practice_id, log_id=log_id, notify_time=notify_time)
+        rows.append((key, user_id, chat_id, kind, payload, meta))
+    outbox_ids = _insert_outbox_rows(rows)
+    return {"outbox_ids": outbox_ids, "log_id": log_id, "total_practices": total_practices}
+
+
+@_locked
+def enqueue_broadcast(broadcast_batch_id: int, recipients: list, payload: dict, meta: dict) -> int:
+    batch_meta = dict(meta, broadcast_batch_id=broadcast_batch_id)
+    try:
+        ids = _insert_outbox_rows([
+            (f"broadcast:{broadcast_batch_id}:{user_id}", user_id, chat_id, "broadcast", payload, batch_meta)
+            for user_id, chat_id in recipients
+        ])
+    except _DuplicateKey:
+        logger.error(f"Ошибка постановки рассылки {broadcast_batch_id} в outbox: повтор idempotency_key")
+        return 0
+    return len(ids)
+
+
+@_locked
+def claim_outbox_messages(limit: int, lease_seconds: int = OUTBOX_LEASE_SECONDS,
+                          owner: str = DELIVERY_WORKER_ID) -> list:
+    now = _now()
+    # Кандидаты — только первое неотправленное сообщение каждого чата: порядок в чате сохраняется
+    due = []
+    for active in _db.outbox_chat_active.values():
+        row = _db.outbox[active[0]]
+        if (
+            (row["status"] == "pending" and row["next_attempt_at"] <= now)
+            or (row["status"] == "sending" and row["lease_until"] < now)
+        ):
+            due.append(row)
+    due.sort(key=lambda row: row["id"])
+    lease_until = now + timedelta(seconds=lease_seconds)
+    results = []
+    for row in due[:limit]:
+        _outbox_set_status(row, "sending")
+        row["attempts"] += 1
+        row["lease_until"] = lease_until
+        row["lease_owner"] = owner
+        row["updated_at"] = now
+        results.append((
+            row["id"], row["user_id"], row["chat_id"], row["kind"],
+            copy.deepcopy(row["payload"]), copy.deepcopy(row["meta"]), row["attempts"],
+        ))
+    return results
+
+
+def _update_outbox_message(message_id: int, owner: str, status: str, **fields) -> bool:
+    row = _db.outbox.get(message_id)
+    # Только своя аренда: если нас опередил воркер, забравший строку после истечения, не перетираем
+    if row is None or row["status"] != "sending" or row["lease_owner"] != owner:
+        return False
+    _outbox_set_status(row, status)
+    row.update(fields, lease_until=None, lease_owner=None, updated_at=_now())
+    return True
+
+
+@_locked
+def mark_outbox_sent(message_id: int, telegram_message_id: Optional[int], owner: str = DELIVERY_WORKER_ID) -> bool:
+    return _update_outbox_message(
+        message_id, owner, "sent", sent_at=_now(), telegram_message_id=telegram_message_id, last_error=None,
+    )
+
+
+@_locked
+def mark_outbox_retry(message_id: int, error: str, delay_seconds: float, owner: str = DELIVERY_WORKER_ID) -> bool:
+    return _update_outbox_message(
+        message_id, owner, "pending",
+        next_attempt_at=_now() + timedelta(seconds=delay_seconds), last_error=error[:1000],
+    )
+
+
+@_locked
+def mark_outbox_failed(message_id: int, error: str, status: str = "failed", owner: str = DELIVERY_WORKER_ID) -> bool:
+    return _update_outbox_message(message_id, owner, status, last_error=error[:1000])
+
+
+@_locked
+def get_broadcast_outbox_status(broadcast_batch_id: int) -> dict:
+    prefix = f"broadcast:{broadcast_batch_id}:"
+    counts = {}
+    for row in _db.outbox.values():
+        if row["kind"] == "broadcast" and row["idempotency_key"].startswith(prefix):
+            counts[row["status"]] = counts.get(row["status"], 0) + 1
+    return counts
+
+
+@_locked
+def requeue_outbox_messages(statuses: tuple = ("dead",), since_days: int = 1) -> int:
+    now = _now()
+    border = now - timedelta(days=since_days)
+    count = 0
+    for row in _db.outbox.values():
+        if row["status"] in statuses and row["created_at"] >= border:
+            _outbox_set_status(row, "pending")
+            row.update(attempts=0, next_attempt_at=now, lease_until=None, lease_owner=None, updated_at=now)
+            count += 1
+    return count
+
+
+@_locked
+def get_outbox_status_counts(since_days: int = 1) -> dict:
+    border = _now() - timedelta(days=since_days)
+    counts = {}
+    for row in _db.outbox.values():
+        if row["created_at"] >= border:
+            counts[row["status"]] = counts.get(row["status"], 0) + 1
+    return counts
+
+
+# --- Пауза, напоминания, режимы ---
+
+@_locked
+def toggle_user_pause(user_id: int):
+    user = _db.users.get(user_id)
+    if user is None:
+        return (False, False, False)
+    if user["is_paused"]:
+        _update(user, **_RESET_PAUSE)
+        return (True, False, False)
+    had_challenge = user["challenge_start_id"] is not None
+    _update(
+        user,
+        is_paused=True,
+        paused_at=_now_naive(),
+        last_pause_reminder_at=None,
+        pause_reminder_step=0,
+        challenge_start_id=None,
+    )
+    return (True, True, had_challenge)
+
+
+def _week_passed(value: Optional[datetime], border: datetime) -> bool:
+    return value is None or value <= border
+
+
+@_locked
+def get_users_for_pause_reminder() -> list:
+    border = _now_naive() - timedelta(days=7)
+    return [
+        (user["user_id"], user["chat_id"], user["pause_reminder_step"])
+        for user in _db.users.values()
+        if user["is_paused"]
+        and not user["is_blocked"]
+        and not user["onboarding_required"]
+        and user["bot_mode"] in _ACTIVE_MODES
+        and user["daily_schedule_enabled"]
+        and user["paused_at"] is not None
+        and user["paused_at"] <= border
+        and _week_passed(user["last_pause_reminder_at"], border)
+    ]
+
+
+@_locked
+def touch_by_mood_activity(user_id: int) -> bool:
+    user = _db.users.get(user_id)
+    if user is not None:
+        _update(user, last_by_mood_active_at=_now_naive(), last_by_mood_reminder_at=None, by_mood_reminder_step=0)
+    return True
+
+
+@_locked
+def get_users_for_by_mood_reminder() -> list:
+    border = _now_naive() - timedelta(days=7)
+    return [
+        (user["user_id"], user["chat_id"], user["by_mood_reminder_step"])
+        for user in _db.users.values()
+        if user["bot_mode"] == "by_mood"
+        and not user["is_blocked"]
+        and not user["onboarding_required"]
+        and user["last_by_mood_active_at"] is not None
+        and user["last_by_mood_active_at"] <= border
+        and _week_passed(user["last_by_mood_reminder_at"], border)
+    ]
+
+
+@_locked
+def mark_by_mood_reminder_sent(user_id: int) -> bool:
+    user = _db.users.get(user_id)
+    if user is not None:
+        _update(user, last_by_mood_reminder_at=_now_naive(), by_mood_reminder_step=user["by_mood_reminder_step"] + 1)
+    return True
+
+
+@_locked
+def mark_pause_reminder_sent(user_id: int) -> bool:
+    user = _db.users.get(user_id)
+    if user is not None:
+        _update(user, last_pause_reminder_at=_now_naive(), pause_reminder_step=user["pause_reminder_step"] + 1)
+    return True
+
+
+@_locked
+def get_user_challenge_start_id(user_id: int):
+    user = _db.users.get(user_id)
+    return user["challenge_start_id"] if user else None
+
+
+@_locked
+def get_user_challenge_day(user_id: int) -> int:
+    user = _db.users.get(user_id)
+    return int(user["challenge_day"]) if user else 0
+
+
+@_locked
+def increment_challenge_day(user_id: int) -> bool:
+    user = _db.users.get(user_id)
+    if user is None:
+        return False
+    _update(user, challenge_day=user["challenge_day"] + 1)
+    return True
+
+
+@_locked
+def start_user_challenge_setup(
+    user_id: int,
+    chat_id: int,
+    challenge_start_id: int,
+    user_name: str = None,
+    user_nickname: str = None,
+) -> bool:
+    user = _db.users.get(user_id)
+    if user is None:
+        return False
+    _update(
+        user,
+        chat_id=chat_id,
+        user_name=user_name if user_name is not None else user["user_name"],
+        user_nickname=user_nickname if user_nickname is not None else user["user_nickname"],
+        challenge_start_id=challenge_start_id,
+        challenge_day=0,
+        onboarding_required=True,
+        bot_mode="challenge",
+        daily_schedule_enabled=False,
+        **_RESET_PAUSE,
+    )
+    return True
+
+
+@_locked
+def complete_user_challenge_setup(
+    user_id: int,
+    chat_id: int,
+    notify_time: str,
+    user_name: str = None,
+    user_nickname: str = None,
+) -> bool:
+    user = _db.users.get(user_id)
+    if user is None or user["challenge_start_id"] is None:
+        return False
+    _update(
+        user,
+        chat_id=chat_id,
+        notify_time=notify_time,
+        user_name=user_name if user_name is not None else user["user_name"],
+        user_nickname=user_nickname if user_nickname is not None else user["user_nickname"],
+        challenge_day=0,
+        onboarding_required=False,
+        bot_mode="challenge",
+        daily_schedule_enabled=True,
+        first_daily_send_date=_today() + timedelta(days=1),
+        **_RESET_PAUSE,
+    )
+    return True
+
+
+@_locked
+def set_user_challenge(user_id: int, challenge_start_id: int) -> bool:
+    user = _db.users.get(user_id)
+    if user is None:
+        return False
+    _update(
+        user,
+        challenge_start_id=challenge_start_id,
+        challenge_day=0,
+        bot_mode="challenge",
+        daily_schedule_enabled=True,
+        onboarding_required=False,
+    )
+    return True
+
+
+@_locked
+def clear_user_challenge(user_id: int) -> bool:
+    user = _db.users.get(user_id)
+    if user is not None:
+        _update(
+            user,
+            challenge_start_id=None,
+            challenge_day=0,
+            bot_mode="pending",
+            daily_schedule_enabled=False,
+            onboarding_required=True,
+            **_RESET_PAUSE,
+        )
+    return True
+
+
+@_locked
+def set_user_blocked(user_id: int, is_blocked: bool) -> bool:
+    user = _db.users.get(user_id)
+    if user is not None:
+        _update(user, is_blocked=is_blocked)
+    return True
+
+
+@_locked
+def get_user_notify_time(user_id: int):
+    user = _db.users.get(user_id)
+    if (
+        user is None
+        or user["onboarding_required"]
+        or user["bot_mode"] not in _ACTIVE_MODES
+        or not user["daily_schedule_enabled"]
+    ):
+        return None
+    return user["notify_time"]
+
+
+@_locked
+def is_user_onboarding_required(user_id: int) -> bool:
+    user = _db.users.get(user_id)
+    return bool(user["onboarding_required"]) if user else False
+
+
+@_locked
+def set_user_onboarding_required(
+    user_id: int,
+    chat_id: int = None,
+    user_name: str = None,
+    user_nickname: str = None,
+) -> bool:
+    fields = {
+        "onboarding_required": True,
+        "challenge_start_id": None,
+        "challenge_day": 0,
+        "total_practices": 0,
+        "program_position": 0,
+        "bot_mode": "pending",
+        "daily_schedule_enabled": False,
+        **_RESET_PAUSE,
+    }
+    user = _db.users.get(user_id)
+    if chat_id is not None:
+        if user is None:
+            user, _ = _upsert_user(user_id, chat_id)
+            fields["notify_time"] = "00:00"
+        fields["chat_id"] = chat_id
+        if user_name is not None:
+            fields["user_name"] = user_name
+        if user_nickname is not None:
+            fields["user_nickname"] = user_nickname
+    if user is not None:
+        _update(user, **fields)
+    for key in [key for key in _db.by_mood_seen if key[0] == user_id]:
+        del _db.by_mood_seen[key]
+    _clear_completed(user_id)
+    return True
+
+
+@_locked
+def get_user_bot_mode(user_id: int) -> str:
+    user = _db.users.get(user_id)
+    return user["bot_mode"] if user else "pending"
+
+
+@_locked
+def append_extra_practices_inline_message(user_id: int, chat_id: int, message_id: int) -> bool:
+    user = _db.users.get(user_id)
+    if user is None:
+        return False
+    lst = _extra_inline_messages_as_lists(user["extra_practices_inline_messages"])
+    pair = [chat_id, message_id]
+    if pair not in lst:
+        lst.append(pair)
+    if len(lst) > MAX_EXTRA_PRACTICES_INLINE_TRACKED:
+        lst = lst[-MAX_EXTRA_PRACTICES_INLINE_TRACKED:]
+    _update(user, extra_practices_inline_messages=lst)
+    return True
+
+
+@_locked
+def remove_extra_practices_inline_message(user_id: int, chat_id: int, message_id: int) -> bool:
+    user = _db.users.get(user_id)
+    if user is None:
+        return False
+    lst = _extra_inline_messages_as_lists(user["extra_practices_inline_messages"])
+    pair = [chat_id, message_id]
+    if pair in lst:
+        _update(user, extra_practices_inline_messages=[p for p in lst if p != pair])
+    return True
+
+
+@_locked
+def take_and_clear_extra_practices_inline_messages(user_id: int) -> list:
+    user = _db.users.get(user_id)
+    if user is None:
+        return []
+    lst = _extra_inline_messages_as_lists(user["extra_practices_inline_messages"])
+    _update(user, extra_practices_inline_messages=[])
+    return lst
+
+
+@_locked
+def activate_user_by_mood(
+    user_id: int, chat_id: int, user_name: str = None, user_nickname: str = None
+) -> bool:
+    user, _ = _upsert_user(user_id, chat_id)
+    _update(
+        user,
+        chat_id=chat_id,
+        user_name=user_name if user_name is not None else user["user_name"],
+        user_nickname=user_nickname if user_nickname is not None else user["user_nickname"],
+        notify_time="00:00",
+        onboarding_required=False,
+        bot_mode="by_mood",
+        daily_schedule_enabled=False,
+        challenge_start_id=None,
+        challenge_day=0,
+        **_RESET_PAUSE,
+    )
+    return True
+
+
+@_locked
+def set_user_daily_pending(user_id: int) -> bool:
+    user = _db.users.get(user_id)
+    if user is not None:
+        _update(
+            user,
+            bot_mode="daily",
+            daily_schedule_enabled=False,
+            onboarding_required=True,
+            challenge_start_id=None,
+            challenge_day=0,
+        )
+    return True
+
+
+@_locked
+def clear_by_mood_seen_for_user(user_id: int) -> bool:
+    for key in [key for key in _db.by_mood_seen if key[0] == user_id]:
+        del _db.by_mood_seen[key]
+    return True
+
+
+# Фрагменты WHERE, которые строят app/by_mood/* и app/daily/extra_practices.py
+_BY_MOOD_OPERATORS = {"<": operator.lt, "<=": operator.le, ">": operator.gt, ">=": operator.ge, "=": operator.eq}
+_BY_MOOD_TIME_RE = re.compile(r"AND\s+yp\.time_practices\s*(<=|>=|<|>|=)\s*(\d+)")
+_BY_MOOD_INTENSITY_RE = re.compile(
+    r"AND\s+LOWER\(TRIM\(COALESCE\(yp\.intensity,\s*''\)\)\)\s*(?:=\s*'([^']*)'|IN\s*\(([^)]*)\))"
+)
+_BY_MOOD_NO_MAT_RE = re.compile(r"AND\s+yp\.without_mat\s*=\s*TRUE")
+
+
+def _by_mood_filter(extra_where_sql: str, extra_params: tuple):
+    """Предикат по строке практики для фрагмента extra_where_sql (ValueError — фрагмент неизвестен)."""
+    if extra_params:
+        raise ValueError(f"параметры фрагмента не поддерживаются: {extra_params!r}")
+    checks = []
+    for op, value in _BY_MOOD_TIME_RE.findall(extra_where_sql):
+        checks.append(lambda p, op=_BY_MOOD_OPERATORS[op], value=int(value): op(p["time_practices"], value))
+    for single, many in _BY_MOOD_INTENSITY_RE.findall(extra_where_sql):
+        allowed = {single} if many == "" else {item.strip().strip("'") for item in many.split(",")}
+        checks.append(lambda p, allowed=allowed: (p["intensity"] or "").strip().lower() in allowed)
+    if _BY_MOOD_NO_MAT_RE.search(extra_where_sql):
+        checks.append(lambda p: p["without_mat"] is True)
+    rest = extra_where_sql
+    for pattern in (_BY_MOOD_TIME_RE, _BY_MOOD_INTENSITY_RE, _BY_MOOD_NO_MAT_RE):
+        rest = pattern.sub("", rest)
+    if rest.strip():
+        raise ValueError(f"неизвестный фрагмент WHERE: {rest.strip()!r}")
+    return lambda practice: all(check(practice) for check in checks)
+
+
+@_locked
+def pick_random_by_mood_practice(
+    user_id: int, filter_key: str, extra_where_sql: str, extra_params: tuple = ()
+) -> Optional[tuple]:
+    try:
+        matches = _by_mood_filter(extra_where_sql, extra_params)
+    except ValueError as e:
+        logger.error(f"Ошибка pick_random_by_mood_practice {user_id} {filter_key}: {e}")
+        return None
+    pool = [practice for practice in _db.practices.values() if matches(practice)]
+    seen = _db.by_mood_seen.get((user_id, filter_key), set())
+    fresh = [practice for practice in pool if practice["practices_id"] not in seen]
+    if not fresh:
+        # Пул исчерпан — сбрасываем просмотренные по этому фильтру
+        _db.by_mood_seen.pop((user_id, filter_key), None)
+        fresh = pool
+    return _practice_row(random.choice(fresh)) if fresh else None
+
+
+@_locked
+def record_by_mood_seen(user_id: int, filter_key: str, practice_id: int) -> bool:
+    if practice_id not in _db.practices:
+        logger.error(f"Ошибка record_by_mood_seen {user_id}: практика {practice_id} не найдена")
+        return False
+    _db.by_mood_seen.setdefault((user_id, filter_key), set()).add(practice_id)
+    return True
+
+
+# --- Йога практики ---
+
+def _practice_row(practice: dict) -> tuple:
+    """Полная строка (_PRACTICE_COLUMNS)."""
+    return _decode_practice_row((
+        practice["practices_id"], practice["title"], practice["video_url"], practice["time_practices"],
+        practice["channel_name"], practice["description"], practice["my_description"], practice["intensity"],
+        practice["weekday"], practice["created_at"], practice["updated_at"],
+    ))
+
+
+def _practice_short_row(practice: dict) -> tuple:
+    """Строка без my_description и intensity (выборки по каналу, длительности, дню недели, поиск)."""
+    return (
+        practice["practices_id"], practice["title"], practice["video_url"], practice["time_practices"],
+        practice["channel_name"], practice["description"], practice["weekday"],
+        practice["created_at"], practice["updated_at"],
+    )
+
+
+def _newest_first(practices) -> list:
+    return sorted(practices, key=lambda p: (p["created_at"], p["practices_id"]), reverse=True)
+
+
+def _remove_sorted(values: list, value) -> None:
+    index = bisect.bisect_left(values, value)
+    if index < len(values) and values[index] == value:
+        del values[index]
+
+
+def _set_practice_weekday(practice: dict, weekday: Optional[int]) -> None:
+    old = practice["weekday"]
+    if old is not None:
+        ids = _db.weekday_ids.get(old, [])
+        _remove_sorted(ids, practice["practices_id"])
+        if not ids:
+            _db.weekday_ids.pop(old, None)
+    practice["weekday"] = weekday
+    if weekday is not None:
+        bisect.insort(_db.weekday_ids.setdefault(weekday, []), practice["practices_id"])
+
+
+@_locked
+def add_yoga_practice(title: str, video_url: str, time_practices: int, channel_name: str, description: str = None, my_description: str = None, intensity: str = None, weekday: int = None) -> tuple:
+    if video_url in _db.practice_by_url:
+        return (False, f"Видео с URL {video_url} уже существует в базе данных")
+    if weekday is not None and not 1 <= weekday <= 7:
+        return (False, f"Ошибка добавления йога практики: недопустимый день недели {weekday}")
+    if description and len(description) > 500:
+        description = description[:500]
+    now = _now_naive()
+    practice_id = _db.next_id("yoga_practices")
+    practice = {
+        "practices_id": practice_id,
+        "title": title,
+        "video_url": video_url,
+        "time_practices": time_practices,
+        "channel_name": channel_name,
+        "description": description,
+        "my_description": _decode_my_description(my_description),
+        "intensity": intensity,
+        "weekday": None,
+        "without_mat": False,
+        "created_at": now,
+        "updated_at": now,
+    }
+    _db.practices[practice_id] = practice
+    _db.practice_by_url[video_url] = practice_id
+    bisect.insort(_db.practice_ids, practice_id)
+    _set_practice_weekday(practice, weekday)
+    return (True, f"Йога практика добавлена: {title}")
+
+
+@_locked
+def get_yoga_practice_by_id(practice_id: int) -> tuple:
+    practice = _db.practices.get(practice_id)
+    return _practice_row(practice) if practice else None
+
+
+@_locked
+def get_yoga_practice_by_url(video_url: str) -> tuple:
+    practice_id = _db.practice_by_url.get(video_url)
+    return _practice_row(_db.practices[practice_id]) if practice_id is not None else None
+
+
+@_locked
+def get_yoga_practice_by_video_id(video_id: str) -> tuple:
+    needle = video_id.lower()
+    for practice_id in _db.practice_ids:
+        practice = _db.practices[practice_id]
+        if needle in practice["video_url"].lower():
+            return _practice_row(practice)
+    return None
+
+
+@_locked
+def get_all_yoga_practices() -> list:
+    return [
+        _decode_practice_row((
+            p["practices_id"], p["title"], p["video_url"], p["time_practices"], p["channel_name"],
+            p["description"], p["my_description"], p["weekday"], p["created_at"], p["updated_at"],
+        ))
+        for p in _newest_first(_db.practices.values())
+    ]
+
+
+@_locked
+def get_yoga_practices_by_channel(channel_name: str) -> list:
+    return [
+        _practice_short_row(p)
+        for p in _newest_first(p for p in _db.practices.values() if p["channel_name"] == channel_name)
+    ]
+
+
+@_locked
+def get_yoga_practices_by_duration(min_duration: int = None, max_duration: int = None) -> list:
+    practices = [
+        p for p in _db.practices.values()
+        if (min_duration is None or p["time_practices"] >= min_duration)
+        and (max_duration is None or p["time_practices"] <= max_duration)
+    ]
+    practices.sort(key=lambda p: (p["time_practices"], p["practices_id"]))
+    return [_practice_short_row(p) for p in practices]
+
+
+def _weekday_or_any(weekday: int) -> list:
+    return [p for p in _db.practices.values() if p["weekday"] == weekday or p["weekday"] is None]
+
+
+@_locked
+def get_yoga_practices_by_weekday(weekday: int) -> list:
+    practices = _weekday_or_any(weekday)
+    random.shuffle(practices)
+    return [_practice_short_row(p) for p in practices]
+
+
+@_locked
+def get_random_yoga_practice_by_weekday(weekday: int) -> tuple:
+    practices = _weekday_or_any(weekday)
+    return _practice_short_row(random.choice(practices)) if practices else None
+
+
+@_locked
+def search_yoga_practices(search_term: str) -> list:
+    needle = search_term.lower()
+    return [
+        _practice_short_row(p)
+        for p in _newest_first(
+            p for p in _db.practices.values()
+            if any(needle in (p[field] or "").lower() for field in ("title", "description", "channel_name"))
+        )
+    ]
+
+
+@_locked
+def update_yoga_practice(practice_id: int, title: str = None, video_url: str = None,
+                        time_practices: int = None, channel_name: str = None,
+                        description: str = None, my_description: str = None, intensity: str = None, weekday: int = None) -> bool:
+    fields = {
+        "title": title,
+        "time_practices": time_practices,
+        "channel_name": channel_name,
+        "description": description[:500] if description is not None else None,
+        "my_description": _decode_my_description(my_description),
+        "intensity": intensity,
+    }
+    fields = {name: value for name, value in fields.items() if value is not None}
+    if not fields and video_url is None and weekday is None:
+        logger.warning("Не указаны поля для обновления")
+        return False
+    practice = _db.practices.get(practice_id)
+    if practice is None:
+        logger.warning(f"Йога практика с ID {practice_id} не найдена")
+        return False
+    if video_url is not None and video_url != practice["video_url"]:
+        if video_url in _db.practice_by_url:
+            logger.error(f"Ошибка обновления йога практики {practice_id}: URL {video_url} уже существует")
+            return False
+        del _db.practice_by_url[practice["video_url"]]
+        _db.practice_by_url[video_url] = practice_id
+        practice["video_url"] = video_url
+    if weekday is not None:
+        _set_practice_weekday(practice, weekday)
+    practice.update(fields, updated_at=_now_naive())
+    return True
+
+
+def _delete_practice(practice_id: int) -> None:
+    """DELETE из yoga_practices с каскадом на бонусы, логи и by_mood_seen."""
+    practice = _db.practices.pop(practice_id)
+    del _db.practice_by_url[practice["video_url"]]
+    _remove_sorted(_db.practice_ids, practice_id)
+    _set_practice_weekday(practice, None)
+    for bonus_id in _db.bonus_by_parent.pop(practice_id, []):
+        _db.bonus_urls.discard(_db.bonuses.pop(bonus_id)["video_url"])
+    for log in [log for log in _db.logs.values() if log["practice_id"] == practice_id]:
+        _remove_log(log)
+    for seen in _db.by_mood_seen.values():
+        seen.discard(practice_id)
+
+
+@_locked
+def delete_yoga_practice(practice_id: int) -> bool:
+    if practice_id not in _db.practices:
+        logger.warning(f"Йога практика с ID {practice_id} не найдена")
+        return False
+    _delete_practice(practice_id)
+    return True
+
+
+@_locked
+def get_random_yoga_practice() -> tuple:
+    if not _db.practice_ids:
+        return None
+    return _practice_short_row(_db.practices[random.choice(_db.practice_ids)])
+
+
+@_locked
+def get_practice_count() -> int:
+    return len(_db.practices)
+
+
+@_locked
+def get_yoga_practice_by_weekday_order(weekday: int, day_number: int) -> tuple:
+    ids = _db.weekday_ids.get(weekday)
+    if not ids:
+        logger.warning(f"Нет практик для дня недели {weekday}")
+        return None
+    week_number = (day_number - 1) // 7
+    return _practice_row(_db.practices[ids[week_number % len(ids)]])
+
+
+def _challenge_days(challenge_start_id: int, from_day: int, to_day: int) -> list:
+    """[(day, row)]: день N — N-я практика по возрастанию id от challenge_start_id (по кругу)."""
+    ids = _db.practice_ids
+    if not ids:
+        return []
+    # Стартовую практику удалили — берём следующую по id, за концом — с начала
+    start_index = bisect.bisect_left(ids, challenge_start_id)
+    if start_index >= len(ids):
+        start_index = 0
+    return [
+        (day, _practice_row(_db.practices[ids[(start_index + day - 1) % len(ids)]]))
+        for day in range(from_day, to_day + 1)
+    ]
+
+
+@_locked
+def get_yoga_practice_by_challenge_order(challenge_start_id: int, day_number: int):
+    practices = _challenge_days(challenge_start_id, day_number, day_number)
+    return practices[0][1] if practices else None
+
+
+@_locked
+def get_yoga_practices_by_challenge_range(challenge_start_id: int, from_day: int, to_day: int) -> list:
+    if to_day < from_day:
+        return []
+    return _challenge_days(challenge_start_id, from_day, to_day)
+
+
+@_locked
+def get_practice_count_by_weekday(weekday: int) -> int:
+    return len(_db.weekday_ids.get(weekday, ()))
+
+
+# --- Бонусные практики ---
+
+def _bonus_row(bonus: dict) -> tuple:
+    return _decode_bonus_practice_row((
+        bonus["bonus_id"], bonus["parent_practice_id"], bonus["title"], bonus["video_url"],
+        bonus["time_practices"], bonus["channel_name"], bonus["description"], bonus["my_description"],
+        bonus["intensity"], bonus["created_at"], bonus["updated_at"],
+    ))
+
+
+@_locked
+def add_bonus_practice(parent_practice_id: int, title: str, video_url: str, time_practices: int,
+                       channel_name: str, description: str = None, my_description: str = None,
+                       intensity: str = None) -> bool:
+    if video_url in _db.bonus_urls:
+        logger.warning(f"Бонусное видео с URL {video_url} уже существует")
+        return False
+    if parent_practice_id not in _db.practices:
+        logger.error(f"Ошибка добавления бонусной практики: основная практика {parent_practice_id} не найдена")
+        return False
+    if description and len(description) > 500:
+        description = description[:500]
+    now = _now_naive()
+    bonus_id = _db.next_id("bonus_practices")
+    _db.bonuses[bonus_id] = {
+        "bonus_id": bonus_id,
+        "parent_practice_id": parent_practice_id,
+        "title": title,
+        "video_url": video_url,
+        "time_practices": time_practices,
+        "channel_name": channel_name,
+        "description": description,
+        "my_description": _decode_my_description(my_description),
+        "intensity": intensity,
+        "created_at": now,
+        "updated_at": now,
+    }
+    _db.bonus_urls.add(video_url)
+    bisect.insort(_db.bonus_by_parent.setdefault(parent_practice_id, []), bonus_id)
+    return True
+
+
+@_locked
+def get_bonus_practices_by_parent(parent_practice_id: int) -> list:
+    return [_bonus_row(_db.bonuses[bonus_id]) for bonus_id in _db.bonus_by_parent.get(parent_practice_id, ())]
+
+
+@_locked
+def delete_bonus_practice(bonus_id: int) -> bool:
+    bonus = _db.bonuses.pop(bonus_id, None)
+    if bonus is None:
+        logger.warning(f"Бонусная практика {bonus_id} не найдена")
+        return False
+    _db.bonus_urls.discard(bonus["video_url"])
+    siblings = _db.bonus_by_parent.get(bonus["parent_practice_id"], [])
+    _remove_sorted(siblings, bonus_id)
+    if not siblings:
+        _db.bonus_by_parent.pop(bonus["parent_practice_id"], None)
+    return True
+
+
+@_locked
+def get_bonus_practice_count() -> int:
+    return len(_db.bonuses)
+
+
+def get_current_weekday() -> int:
+    # День недели по часам этого модуля (1=понедельник, 7=воскресенье)
+    return _now().astimezone(MOSCOW_TZ).isoweekday()
+
+
+@_locked
+def get_weekday_statistics() -> dict:
+    return {weekday_to_name(weekday): len(ids) for weekday, ids in sorted(_db.weekday_ids.items())}
+
+
+# --- Логи отправленных практик ---
+
+def _insert_log(user_id: int, practice_id: int, day_number: int) -> int:
+    log_id = _db.next_id("practice_logs")
+    _db.logs[log_id] = {
+        "log_id": log_id,
+        "user_id": user_id,
+        "practice_id": practice_id,
+        "sent_at": _now_naive(),
+        "day_number": day_number,
+        "completed_at": None,
+        "done_reminder_dismissed": False,
+    }
+    _db.user_logs.setdefault(user_id, []).append(log_id)
+    if day_number >= 1:
+        _db.scheduled_logs[user_id] = _db.scheduled_logs.get(user_id, 0) + 1
+        _db.scheduled_day[user_id] = _msk_day(_db.logs[log_id]["sent_at"])
+    return log_id
+
+
+def _remove_log(log: dict) -> None:
+    user_id = log["user_id"]
+    del _db.logs[log["log_id"]]
+    _db.user_logs[user_id].remove(log["log_id"])
+    if log["day_number"] >= 1:
+        _db.scheduled_logs[user_id] -= 1
+        # Последний плановый лог ушёл — день берём у предыдущего
+        _db.scheduled_day.pop(user_id, None)
+        for other in _user_logs_newest_first(user_id):
+            if other["day_number"] >= 1:
+                _db.scheduled_day[user_id] = _msk_day(other["sent_at"])
+                break
+    if log["completed_at"] is not None:
+        _db.completed_logs[user_id] -= 1
+
+
+def _set_completed(log: dict, completed_at: Optional[datetime]) -> None:
+    """completed_at вместе со счётчиком выполненных практик пользователя."""
+    delta = (completed_at is not None) - (log["completed_at"] is not None)
+    log["completed_at"] = completed_at
+    if delta:
+        user_id = log["user_id"]
+        _db.completed_logs[user_id] = _db.completed_logs.get(user_id, 0) + delta
+
+
+def _clear_completed(user_id: int) -> None:
+    """Снимает отметки выполнения: completed_at в логах и completed_cnt в агрегатах."""
+    for log_id in _db.user_logs.get(user_id, ()):
+        _set_completed(_db.logs[log_id], None)
+    for (rollup_user, _day), counts in _db.daily_rollups.items():
+        if rollup_user == user_id:
+            counts[2] = 0
+    if user_id in _db.user_totals:
+        _db.user_totals[user_id][2] = 0
+
+
+def _rollup_log(log: dict) -> None:
+    """Добавляет лог в practice_daily_rollups и practice_user_totals (как _rollup_practice_logs)."""
+    user_id = log["user_id"]
+    scheduled = 1 if log["day_number"] >= 1 else 0
+    daily = _db.daily_rollups.setdefault((user_id, _msk_day(log["sent_at"])), [0, 0, 0])
+    daily[0] += 1
+    daily[1] += scheduled
+    totals = _db.user_totals.setdefault(user_id, [0, 0, 0])
+    totals[0] += 1
+    totals[1] += scheduled
+    if log["completed_at"] is not None:
+        _db.daily_rollups.setdefault((user_id, _msk_day(log["completed_at"])), [0, 0, 0])[2] += 1
+        totals[2] += 1
+
+
+def _user_logs_newest_first(user_id: int):
+    for log_id in reversed(_db.user_logs.get(user_id, ())):
+        yield _db.logs[log_id]
+
+
+@_locked
+def log_practice_sent(user_id: int, practice_id: int, day_number: int) -> Optional[int]:
+    if user_id not in _db.users or practice_id not in _db.practices:
+        logger.error(f"Ошибка логирования практики {practice_id} для пользователя {user_id}: нет пользователя или практики")
+        return None
+    return _insert_log(user_id, practice_id, day_number)
+
+
+@_locked
+def is_user_eligible_for_done_reminder(user_id: int) -> bool:
+    user = _db.users.get(user_id)
+    if user is None:
+        return False
+    return not user["is_blocked"] and not user["is_paused"] and not user["onboarding_required"]
+
+
+@_locked
+def dismiss_done_reminders(user_id: int) -> bool:
+    for log in _user_logs_newest_first(user_id):
+        if log["completed_at"] is None:
+            log["done_reminder_dismissed"] = True
+    return True
+
+
+def _latest_open_log(user_id: int, scheduled_only: bool = False, with_reminder: bool = False) -> Optional[dict]:
+    """Последний (по sent_at) лог без completed_at."""
+    for log in _user_logs_newest_first(user_id):
+        if log["completed_at"] is not None:
+            continue
+        if scheduled_only and log["day_number"] < 1:
+            continue
+        if with_reminder and log["done_reminder_dismissed"]:
+            continue
+        return log
+    return None
+
+
+@_locked
+def is_pending_practice_log(user_id: int, log_id: int) -> bool:
+    log = _db.logs.get(log_id)
+    if log is None or log["user_id"] != user_id or log["completed_at"] is not None or log["done_reminder_dismissed"]:
+        return False
+    latest = _latest_open_log(user_id, with_reminder=True)
+    return latest is not None and latest["log_id"] == log_id
+
+
+@_locked
+def get_user_practice_history(user_id: int, limit: int = 10) -> list:
+    history = []
+    for log in _user_logs_newest_first(user_id):
+        if len(history) >= limit:
+            break
+        practice = _db.practices[log["practice_id"]]
+        history.append((
+            log["log_id"], log["practice_id"], log["sent_at"], log["day_number"],
+            practice["title"], practice["video_url"],
+        ))
+    return history
+
+
+@_locked
+def get_practice_sent_count(practice_id: int) -> int:
+    return sum(1 for log in _db.logs.values() if log["practice_id"] == practice_id)
+
+
+def _cascade_challenge_logs_on_done(user_id: int, today_moscow: date) -> int:
+    """Практики челленджа за сегодня, а если сегодняшней ещё не было — последняя незакрытая."""
+    if get_user_bot_mode(user_id) != "challenge":
+        return 0
+    now = _now_naive()
+    updated = 0
+    challenge_sent_today = False
+    for log in _user_logs_newest_first(user_id):
+        sent_day = _msk_day(log["sent_at"])
+        if sent_day < today_moscow:
+            break
+        if sent_day == today_moscow and log["day_number"] >= 1:
+            challenge_sent_today = True
+            if log["completed_at"] is None:
+                _set_completed(log, now)
+                updated += 1
+    if not challenge_sent_today:
+        log = _latest_open_log(user_id, scheduled_only=True)
+        if log is not None:
+            _set_completed(log, now)
+            updated += 1
+    return updated
+
+
+@_locked
+def mark_practice_completed_today(user_id: int) -> bool:
+    log = _latest_open_log(user_id)
+    if log is not None:
+        _set_completed(log, _now_naive())
+        return True
+    return _cascade_challenge_logs_on_done(user_id, _today()) > 0
+
+
+def _completed_total(user_id: int) -> int:
+    totals = _db.user_totals.get(user_id)
+    return _db.completed_logs.get(user_id, 0) + (totals[2] if totals else 0)
+
+
+@_locked
+def get_completed_count(user_id: int) -> int:
+    return _completed_total(user_id)
+
+
+def _completion_days(user_id: int) -> set:
+    days = {_msk_day(log["completed_at"]) for log in _user_logs_newest_first(user_id) if log["completed_at"] is not None}
+    days.update(day for (rollup_user, day), counts in _db.daily_rollups.items() if rollup_user == user_id and counts[2] > 0)
+    return days
+
+
+@_locked
+def get_streak_days(user_id: int) -> int:
+    completion_days = _completion_days(user_id)
+    today = _today()
+    if today in completion_days:
+        day = today
+    elif today - timedelta(days=1) in completion_days:
+        day = today - timedelta(days=1)
+    else:
+        return 0
+    streak = 0
+    while day in completion_days:
+        streak += 1
+        day -= timedelta(days=1)
+    return streak
+
+
+@_locked
+def get_similar_result_percent(user_id: int, bucket_size: int = 5, min_completed: int = 3):
+    user_completed = _completed_total(user_id)
+    if user_completed < min_completed:
+        return None
+    user_bucket = user_completed // bucket_size
+    total_cnt = same_cnt = 0
+    for user in _db.users.values():
+        if user["is_blocked"]:
+            continue
+        completed = _completed_total(user["user_id"])
+        if completed >= min_completed:
+            total_cnt += 1
+            same_cnt += completed // bucket_size == user_bucket
+    if total_cnt == 0:
+        return None
+    return (same_cnt * 100.0) / total_cnt
+
+
+@_locked
+def reset_user_progress(user_id: int) -> bool:
+    user = _db.users.get(user_id)
+    if user is None:
+        return False
+    _update(user, total_practices=0)
+    _clear_completed(user_id)
+    return True
+
+
+@_locked
+def clear_all_yoga_practices() -> bool:
+    for practice_id in list(_db.practice_ids):
+        _delete_practice(practice_id)
+    return True
+
+
+# --- Массовые рассылки ---
+
+@_locked
+def get_next_broadcast_batch_id() -> int:
+    saved = max((row["broadcast_batch_id"] for row in _db.broadcast_messages.values()), default=0)
+    queued = max(
+        (int(row["meta"].get("broadcast_batch_id", 0)) for row in _db.outbox.values() if row["kind"] == "broadcast"),
+        default=0,
+    )
+    return max(saved, queued) + 1
+
+
+@_locked
+def save_broadcast_message(broadcast_batch_id: int, user_id: int, chat_id: int, message_id: int,
+                          message_type: str, message_text: str = None,
+                          photo_file_id: str = None) -> bool:
+    if user_id not in _db.users:
+        logger.error(f"Ошибка сохранения сообщения рассылки: пользователь {user_id} не найден")
+        return False
+    row_id = _db.next_id("broadcast_messages")
+    _db.broadcast_messages[row_id] = {
+        "id": row_id,
+        "broadcast_batch_id": broadcast_batch_id,
+        "user_id": user_id,
+        "chat_id": chat_id,
+        "message_id": message_id,
+        "message_type": message_type,
+        "message_text": message_text,
+        "photo_file_id": photo_file_id,
+        "created_at": _now_naive(),
+    }
+    return True
+
+
+def _latest_batch_rows() -> list:
+    """Строки последней рассылки по id (словарь хранит их в порядке вставки)."""
+    if not _db.broadcast_messages:
+        return []
+    batch_id = max(row["broadcast_batch_id"] for row in _db.broadcast_messages.values())
+    return [row for row in _db.broadcast_messages.values() if row["broadcast_batch_id"] == batch_id]
+
+
+@_locked
+def get_latest_broadcast_messages() -> list:
+    return [
+        (row["user_id"], row["chat_id"], row["message_id"], row["message_type"], row["message_text"], row["photo_file_id"])
+        for row in _latest_batch_rows()
+    ]
+
+
+@_locked
+def get_latest_broadcast_meta() -> tuple:
+    rows = _latest_batch_rows()
+    if not rows:
+        return (None, None, None)
+    return (rows[0]["message_type"], rows[0]["message_text"], rows[0]["photo_file_id"])
+
+
+@_locked
+def delete_latest_broadcast() -> bool:
+    rows = _latest_batch_rows()
+    if not rows:
+        return False
+    for row in rows:
+        del _db.broadcast_messages[row["id"]]
+    return True
+
+
+# --- system_state ---
+# В памяти процесса кэш и есть хранилище: загружать и слушать нечего.
+
+def load_system_state() -> bool:
+    return True
+
+
+def start_system_state_listener() -> None:
+    pass
+
+
+def stop_system_state_listener(timeout: float = SYSTEM_STATE_LISTEN_POLL_SECONDS + 1) -> None:
+    pass
+
+
+@_locked
+def get_state_value(key: str, default: Optional[str] = None) -> Optional[str]:
+    value = _db.system_state.get(key)
+    return default if value is None else value
+
+
+@_locked
+def get_state_bool(key: str, default: bool = False) -> bool:
+    value = _db.system_state.get(key)
+    return default if value is None else value == "true"
+
+
+@_locked
+def set_state_bool(key: str, value: bool) -> bool:
+    _db.system_state[key] = "true" if value else "false"
+    return True
+
+
+@_locked
+def get_state_date(key: str) -> Optional[date]:
+    value = _db.system_state.get(key)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+@_locked
+def set_state_date(key: str, value: date) -> bool:
+    _db.system_state[key] = value.isoformat()
+    return True
+
+
+@_locked
+def delete_state(key: str) -> bool:
+    _db.system_state.pop(key, None)
+    return True
+
+
+# --- Челлендж ---
+
+def _active_challenge_users():
+    for user in _db.users.values():
+        if (
+            user["bot_mode"] == "challenge"
+            and user["challenge_start_id"] is not None
+            and not user["is_paused"]
+            and not user["is_blocked"]
+            and not user["onboarding_required"]
+        ):
+            yield user
+
+
+@_locked
+def get_active_challenge_participants() -> list:
+    return sorted(
+        (user["user_id"], user["user_name"], user["user_nickname"], user["challenge_day"])
+        for user in _active_challenge_users()
+    )
+
+
+@_locked
+def get_group_challenge_day() -> int:
+    return max((user["challenge_day"] for user in _active_challenge_users()), default=0)
+
+
+@_locked
+def get_group_challenge_start_id() -> Optional[int]:
+    counts = {}
+    for user in _active_challenge_users():
+        counts[user["challenge_start_id"]] = counts.get(user["challenge_start_id"], 0) + 1
+    if not counts:
+        return None
+    return min(counts.items(), key=lambda item: (-item[1], item[0]))[0]
+
+
+@_locked
+def get_yesterday_completed_challenge_user_ids(yesterday: date) -> set:
+    result = set()
+    for user in _active_challenge_users():
+        for log in _user_logs_newest_first(user["user_id"]):
+            if log["completed_at"] is None:
+                continue
+            if _msk_day(log["completed_at"]) == yesterday or (
+                log["day_number"] >= 1 and _msk_day(log["sent_at"]) == yesterday
+            ):
+                result.add(user["user_id"])
+                break
+    return result
+
+
+@_locked
+def get_challenge_completed_in_last_n_days(user_id: int, n: int) -> int:
+    if n <= 0:
+        return 0
+    recent = [log for log in _user_logs_newest_first(user_id) if log["day_number"] >= 1][:n]
+    completed_days = _completion_days(user_id)
+    return sum(
+        1 for log in recent
+        if log["completed_at"] is not None or _msk_day(log["sent_at"]) in completed_days
+    )
+
+
+def is_challenge_summary_sent_on(sent_date: date) -> bool:
+    return get_state_date(CHALLENGE_SUMMARY_LAST_SENT_KEY) == sent_date
+
+
+def mark_challenge_summary_sent(sent_date: date) -> bool:
+    return set_state_date(CHALLENGE_SUMMARY_LAST_SENT_KEY, sent_date)
+
+
+def is_challenge_weekly_schedule_sent_on(sent_date: date) -> bool:
+    return get_state_date(CHALLENGE_WEEKLY_SCHEDULE_SENT_KEY) == sent_date
+
+
+def mark_challenge_weekly_schedule_sent(sent_date: date) -> bool:
+    return set_state_date(CHALLENGE_WEEKLY_SCHEDULE_SENT_KEY, sent_date)
+
+
+def is_challenge_summary_stopped() -> bool:
+    return get_state_bool(CHALLENGE_SUMMARY_STOPPED_KEY)
+
+
+def mark_challenge_summary_stopped() -> bool:
+    return set_state_bool(CHALLENGE_SUMMARY_STOPPED_KEY, True)
+
+
+def reset_challenge_summary_state() -> bool:
+    ok1 = delete_state(CHALLENGE_SUMMARY_LAST_SENT_KEY)
+    ok2 = delete_state(CHALLENGE_SUMMARY_STOPPED_KEY)
+    ok3 = delete_state(CHALLENGE_WEEKLY_SCHEDULE_SENT_KEY)
+    return ok1 and ok2 and ok3
+
+
+# Счётчики вызовов по функциям хранилища — те же метрики, что у postgres_db (data/instrumentation.py).
+# Должно оставаться в самом конце файла — оборачиваются уже определённые функции.
+instrument_module(globals(), exclude=("get_connection",))
@@ -0,0 +1,46 @@
+"""Миграции схемы БД из командной строки (см. data/migrations).
+
+Использование (локально или через одноразовый Railway job/shell):
+    python -m data.migrate             # применить все новые миграции
+    python -m data.migrate --status    # текущая и последняя версии, ничего не меняет
+    python -m data.migrate --target 3  # применить миграции до версии 3 включительно
+"""
+
+import argparse
+import sys
+
+from data.migrations import discover_migrations, get_schema_version, migrate
+from data.postgres_db import get_connection
+
+
+def print_status() -> None:
+    conn = get_connection()
+    try:
+        current = get_schema_version(conn)
+    finally:
+        conn.close()
+    print(f"Версия схемы: {current}")
+    for version, name, _module in discover_migrations():
+        mark = "✅" if version <= current else "⏳"
+        print(f"  {mark} {version:04d}_{name}")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Миграции схемы PostgreSQL YogaDailyBot")
+    parser.add_argument("--status", action="store_true", help="показать версии и не применять миграции")
+    parser.add_argument("--target", type=int, help="применить миграции только до этой версии")
+    args = parser.parse_args()
+
+    if args.status:
+        print_status()
+        return 0
+    try:
+        applied = migrate(args.target)
+    except Exception:
+        return 1
+    print(f"Применено миграций: {len(applied)}" if applied else "Схема уже актуальна")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,146 @@
+"""Версионные миграции схемы PostgreSQL.
+
+Каждая миграция — модуль vNNNN_<название>.py с функцией upgrade(cursor). Применённые версии
+записываются в schema_version; миграция и её запись в schema_version коммитятся одной
+транзакцией, поэтому прерванный прогон просто продолжится со следующего запуска.
+
+Запуск:
+- `python -m data.migrate` — применить все новые миграции (`--status` — только показать);
+- при старте бота ensure_schema() одним запросом сверяет версию и, если DB_AUTO_MIGRATE
+  включён, догоняет схему; импорт data.db к базе больше не обращается.
+
+Несколько реплик не применяют миграции одновременно: прогон держит advisory lock.
+Новую миграцию добавляем следующим номером; старые не меняем — они уже применены в проде.
+"""
+
+import importlib
+import pkgutil
+import re
+import time
+from typing import Optional
+
+import psycopg2
+
+# Ключ advisory lock прогона миграций (рядом с LEADER_LOCK_ID, но свой)
+MIGRATION_LOCK_ID = 1500473186
+
+_MODULE_RE = re.compile(r"^v(\d{4})_(\w+)$")
+
+
+def discover_migrations() -> list:
+    """[(version, name, module)] по возрастанию версии; номера должны идти подряд с 1."""
+    migrations = []
+    for info in pkgutil.iter_modules(__path__):
+        match = _MODULE_RE.match(info.name)
+        if not match:
+            continue
+        module = importlib.import_module(f"{__name__}.{info.name}")
+        migrations.append((int(match.group(1)), match.group(2), module))
+    migrations.sort(key=lambda item: item[0])
+    versions = [version for version, _, _ in migrations]
+    if versions != list(range(1, len(versions) + 1)):
+        raise RuntimeError(f"Номера миграций должны идти подряд с 1, сейчас: {versions}")
+    return migrations
+
+
+def latest_version() -> int:
+    return len(discover_migrations())
+
+
+def get_schema_version(conn) -> int:
+    """Текущая версия схемы одним запросом (0 — schema_version ещё нет)."""
+    cursor = conn.cursor()
+    try:
+        cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_version")
+        version = cursor.fetchone()[0]
+    except psycopg2.errors.UndefinedTable:
+        version = 0
+    conn.rollback()
+    return version
+
+
+def _create_version_table(cursor) -> None:
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS schema_version (
+            version INTEGER PRIMARY KEY,
+            name TEXT NOT NULL,
+            applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            duration_ms INTEGER
+        )
+    ''')
+
+
+def migrate(target: Optional[int] = None) -> list:
+    """Применяет миграции новее текущей версии (до target включительно).
+
+    Returns:
+        list: применённые версии
+
+    Raises:
+        Exception: ошибка миграции (она откатывается, более поздние не применяются)
+    """
+    from data.postgres_db import get_connection
+
+    migrations = discover_migrations()
+    conn = get_connection()
+    applied = []
+    try:
+        cursor = conn.cursor()
+        cursor.execute("SELECT pg_advisory_lock(%s)", (MIGRATION_LOCK_ID,))
+        _create_version_table(cursor)
+        conn.commit()
+        # Версию читаем уже под блокировкой: другая реплика могла успеть всё применить
+        current = get_schema_version(conn)
+        for version, name, module in migrations:
+            if version <= current or (target is not None and version > target):
+                continue
+            started = time.perf_counter()
+            try:
+                module.upgrade(cursor)
+                duration_ms = int((time.perf_counter() - started) * 1000)
+                cursor.execute(
+                    "INSERT INTO schema_version (version, name, duration_ms) VALUES (%s, %s, %s)",
+                    (version, name, duration_ms),
+                )
+                conn.commit()
+            except Exception as e:
+                conn.rollback()
+                print(f"❌ Миграция {version:04d}_{name} не применена: {e}")
+                raise
+            applied.append(version)
+            print(f"✅ Миграция {version:04d}_{name} применена за {duration_ms} мс")
+        return applied
+    finally:
+        try:
+            conn.cursor().execute("SELECT pg_advisory_unlock(%s)", (MIGRATION_LOCK_ID,))
+            conn.commit()
+        except Exception:
+            pass
+        conn.close()
+
+
+def ensure_schema(auto_migrate: bool = True) -> int:
+    """Проверка при старте: один запрос к schema_version; отставшую схему догоняет или сообщает.
+
+    Returns:
+        int: версия схемы после проверки
+    """
+    from data.postgres_db import get_connection
+
+    latest = latest_version()
+    conn = get_connection()
+    try:
+        current = get_schema_version(conn)
+    finally:
+        conn.close()
+    if current >= latest:
+        return current
+    if not auto_migrate:
+        print(
+            f"⚠️ Схема БД версии {current}, код ожидает {latest}. "
+            "Выполните `python -m data.migrate` (DB_AUTO_MIGRATE выключен)."
+        )
+        return current
+    print(f"Схема БД версии {current}, применяем миграции до {latest}")
+    migrate()
+    return latest
@@ -0,0 +1,714 @@
+"""Базовая схема: всё, что создавал init_database() до появления версионных миграций.
+
+Шаги идемпотентны (IF NOT EXISTS и проверки information_schema), поэтому миграция
+безопасна и для новой БД, и для уже работающей production-базы без schema_version.
+"""
+
+import re
+from datetime import date, datetime, timezone
+
+import psycopg2.extras
+
+from app.config import DEFAULT_TZ, PRACTICE_LOGS_HOT_MONTHS
+
+# DDL партиционирования practice_logs — копия на момент миграции: применённая миграция
+# не должна меняться вместе с живым кодом data/postgres_db.py.
+
+# На сколько месяцев вперёд заранее создаём партиции
+_PREMAKE_MONTHS = 2
+_DEFAULT_PARTITION = "practice_logs_default"
+_COLUMNS = "log_id, user_id, practice_id, sent_at, day_number, completed_at, done_reminder_dismissed"
+# Имя таймзоны попадает в DDL генерируемых колонок литералом — пропускаем только «Area/City»
+_TZ_NAME_RE = re.compile(r"^[A-Za-z0-9_+\-/]+$")
+
+
+def _add_months(month_start: date, months: int) -> date:
+    index = month_start.year * 12 + (month_start.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _current_month() -> date:
+    return datetime.now(timezone.utc).date().replace(day=1)
+
+
+def _hot_start() -> date:
+    return _add_months(_current_month(), -(PRACTICE_LOGS_HOT_MONTHS - 1))
+
+
+def _day_columns() -> list:
+    """sent_day_msk / completed_day_msk: календарная дата TIMESTAMP (UTC) в таймзоне бота."""
+    if not _TZ_NAME_RE.match(DEFAULT_TZ):
+        raise ValueError(f"Недопустимое имя таймзоны для DDL: {DEFAULT_TZ!r}")
+    return [
+        f"{name}_day_msk DATE GENERATED ALWAYS AS "
+        f"((({column} AT TIME ZONE 'UTC') AT TIME ZONE '{DEFAULT_TZ}')::date) STORED"
+        for name, column in (("sent", "sent_at"), ("completed", "completed_at"))
+    ]
+
+
+def _create_partitioned_practice_logs(cursor) -> None:
+    cursor.execute('CREATE SEQUENCE IF NOT EXISTS practice_logs_log_id_seq')
+    cursor.execute(f'''
+        CREATE TABLE IF NOT EXISTS practice_logs (
+            log_id INTEGER NOT NULL DEFAULT nextval('practice_logs_log_id_seq'),
+            user_id BIGINT NOT NULL,
+            practice_id INTEGER NOT NULL,
+            sent_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            day_number INTEGER NOT NULL,
+            completed_at TIMESTAMP,
+            done_reminder_dismissed BOOLEAN NOT NULL DEFAULT FALSE,
+            {", ".join(_day_columns())},
+            PRIMARY KEY (log_id, sent_at),
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE,
+            FOREIGN KEY (practice_id) REFERENCES yoga_practices (practices_id) ON DELETE CASCADE
+        ) PARTITION BY RANGE (sent_at)
+    ''')
+    cursor.execute('ALTER SEQUENCE practice_logs_log_id_seq OWNED BY practice_logs.log_id')
+
+
+def _create_partition(cursor, month_start: date) -> None:
+    """Месячная партиция; строки этого месяца из default-партиции переносятся в неё."""
+    name = f"practice_logs_y{month_start.year:04d}m{month_start.month:02d}"
+    cursor.execute('SELECT to_regclass(%s)', (name,))
+    if cursor.fetchone()[0] is not None:
+        return
+
+    month_end = _add_months(month_start, 1)
+    cursor.execute(
+        f'''
+        DELETE FROM {_DEFAULT_PARTITION}
+        WHERE sent_at >= %s AND sent_at < %s
+        RETURNING {_COLUMNS}
+        ''',
+        (month_start, month_end),
+    )
+    moved_rows = cursor.fetchall()
+    cursor.execute(
+        f'''
+        CREATE TABLE {name} PARTITION OF practice_logs
+        FOR VALUES FROM (%s) TO (%s)
+        ''',
+        (month_start, month_end),
+    )
+    if moved_rows:
+        psycopg2.extras.execute_values(
+            cursor, f'INSERT INTO practice_logs ({_COLUMNS}) VALUES %s', moved_rows
+        )
+
+
+def _ensure_partitions(cursor, from_month=None) -> None:
+    cursor.execute(f'CREATE TABLE IF NOT EXISTS {_DEFAULT_PARTITION} PARTITION OF practice_logs DEFAULT')
+    month = from_month or _hot_start()
+    last_month = _add_months(_current_month(), _PREMAKE_MONTHS)
+    while month <= last_month:
+        _create_partition(cursor, month)
+        month = _add_months(month, 1)
+
+
+def _migrate_to_partitioned(cursor) -> None:
+    """Обычная practice_logs → партиционированная с переносом всех строк."""
+    cursor.execute('''
+        SELECT c.relkind
+        FROM pg_class c
+        JOIN pg_namespace n ON n.oid = c.relnamespace
+        WHERE c.relname = 'practice_logs' AND n.nspname = current_schema()
+    ''')
+    row = cursor.fetchone()
+    if row and row[0] == 'p':
+        return
+
+    cursor.execute('ALTER TABLE practice_logs RENAME TO practice_logs_legacy')
+    # Последовательность SERIAL принадлежит старой колонке — отвязываем, чтобы пережила DROP
+    cursor.execute('ALTER SEQUENCE IF EXISTS practice_logs_log_id_seq OWNED BY NONE')
+    _create_partitioned_practice_logs(cursor)
+
+    cursor.execute('SELECT MIN(sent_at) FROM practice_logs_legacy')
+    oldest = cursor.fetchone()[0]
+    from_month = oldest.date().replace(day=1) if oldest else None
+    if from_month and from_month > _hot_start():
+        from_month = None
+    _ensure_partitions(cursor, from_month)
+
+    cursor.execute(f'''
+        INSERT INTO practice_logs ({_COLUMNS})
+        SELECT log_id, user_id, practice_id, COALESCE(sent_at, CURRENT_TIMESTAMP), day_number,
+               completed_at, COALESCE(done_reminder_dismissed, FALSE)
+        FROM practice_logs_legacy
+    ''')
+    copied = cursor.rowcount
+    cursor.execute('''
+        SELECT setval('practice_logs_log_id_seq', GREATEST(
+            (SELECT COALESCE(MAX(log_id), 0) FROM practice_logs),
+            (SELECT last_value FROM practice_logs_log_id_seq)
+        ))
+    ''')
+    cursor.execute('DROP TABLE practice_logs_legacy')
+    print(f"   ✅ practice_logs переведена на партиции по месяцам ({copied} записей перенесено)")
+
+
+def _ensure_day_columns(cursor) -> None:
+    """sent_day_msk / completed_day_msk: добавляем или пересоздаём при смене DEFAULT_TZ."""
+    cursor.execute('''
+        SELECT generation_expression
+        FROM information_schema.columns
+        WHERE table_schema = current_schema()
+          AND table_name = 'practice_logs'
+          AND column_name = 'sent_day_msk'
+    ''')
+    row = cursor.fetchone()
+    if row and f"'{DEFAULT_TZ}'" in (row[0] or ""):
+        return
+
+    if row:
+        cursor.execute('ALTER TABLE practice_logs DROP COLUMN IF EXISTS sent_day_msk')
+        cursor.execute('ALTER TABLE practice_logs DROP COLUMN IF EXISTS completed_day_msk')
+    cursor.execute('ALTER TABLE practice_logs ' + ', '.join(f'ADD COLUMN {column}' for column in _day_columns()))
+
+
+def _create_indexes(cursor) -> None:
+    # (user_id, sent_day_msk) покрывает и поиск по одному user_id — отдельный индекс не нужен
+    cursor.execute('DROP INDEX IF EXISTS idx_practice_logs_user')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_practice_logs_user_sent_day '
+        'ON practice_logs(user_id, sent_day_msk)'
+    )
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_practice_logs_completed_day '
+        'ON practice_logs(completed_day_msk)'
+    )
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_practice_logs_practice ON practice_logs(practice_id)')
+
+
+def _create_rollup_tables(cursor) -> None:
+    # Пользователь × календарный день МСК. sent_* — по дате отправки, completed_cnt — по дате отметки
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS practice_daily_rollups (
+            user_id BIGINT NOT NULL,
+            day_msk DATE NOT NULL,
+            sent_cnt INTEGER NOT NULL DEFAULT 0,
+            scheduled_sent_cnt INTEGER NOT NULL DEFAULT 0,
+            completed_cnt INTEGER NOT NULL DEFAULT 0,
+            PRIMARY KEY (user_id, day_msk),
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
+        )
+    ''')
+    # Итоги по пользователю — чтобы счётчики не суммировали дни за всю историю
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS practice_user_totals (
+            user_id BIGINT PRIMARY KEY,
+            sent_cnt INTEGER NOT NULL DEFAULT 0,
+            scheduled_sent_cnt INTEGER NOT NULL DEFAULT 0,
+            completed_cnt INTEGER NOT NULL DEFAULT 0,
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
+        )
+    ''')
+    cursor.execute(
+        'CREATE INDEX IF NOT EXISTS idx_practice_daily_rollups_completed '
+        'ON practice_daily_rollups(day_msk) WHERE completed_cnt > 0'
+    )
+
+
+def upgrade(cursor) -> None:
+    # Создаем таблицу пользователей
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id BIGINT PRIMARY KEY,
+            chat_id BIGINT NOT NULL,
+            notify_time VARCHAR(5) NOT NULL,
+            user_name TEXT,
+            total_practices INTEGER DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Создаем таблицу йога практик
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS yoga_practices (
+            practices_id SERIAL PRIMARY KEY,
+            title TEXT NOT NULL,
+            video_url TEXT NOT NULL UNIQUE,
+            time_practices INTEGER NOT NULL,
+            channel_name TEXT NOT NULL,
+            description TEXT,
+            my_description TEXT,
+            intensity TEXT,
+            weekday INTEGER CHECK (weekday >= 1 AND weekday <= 7),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Создаем таблицу бонусных практик, привязанных к основной
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS bonus_practices (
+            bonus_id SERIAL PRIMARY KEY,
+            parent_practice_id INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            video_url TEXT NOT NULL UNIQUE,
+            time_practices INTEGER NOT NULL,
+            channel_name TEXT NOT NULL,
+            description TEXT,
+            my_description TEXT,
+            intensity TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (parent_practice_id) REFERENCES yoga_practices (practices_id) ON DELETE CASCADE
+        )
+    ''')
+
+    # Создаем таблицу для логирования отправленных практик (партиции по месяцам sent_at)
+    _create_partitioned_practice_logs(cursor)
+
+    # Создаем таблицу для предложений пользователей
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS user_suggestions (
+            suggestion_id SERIAL PRIMARY KEY,
+            user_id BIGINT NOT NULL,
+            video_url TEXT NOT NULL,
+            comment TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
+        )
+    ''')
+
+    # Создаем таблицу для хранения отправленных сообщений массовой рассылки
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS broadcast_messages (
+            id SERIAL PRIMARY KEY,
+            broadcast_batch_id INTEGER NOT NULL,
+            user_id BIGINT NOT NULL,
+            chat_id BIGINT NOT NULL,
+            message_id INTEGER NOT NULL,
+            message_type TEXT NOT NULL,
+            message_text TEXT,
+            photo_file_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
+        )
+    ''')
+
+    # Миграция: удаляем старые поля recommend и comment из таблицы users
+    try:
+        # Проверяем, существуют ли колонки, и удаляем их
+        cursor.execute("""
+            SELECT column_name 
+            FROM information_schema.columns 
+            WHERE table_name = 'users' AND column_name IN ('recommend', 'comment')
+        """)
+        existing_columns = [row[0] for row in cursor.fetchall()]
+
+        if 'recommend' in existing_columns:
+            cursor.execute('ALTER TABLE users DROP COLUMN recommend')
+            print("✅ Колонка recommend удалена из таблицы users")
+
+        if 'comment' in existing_columns:
+            cursor.execute('ALTER TABLE users DROP COLUMN comment')
+            print("✅ Колонка comment удалена из таблицы users")
+
+    except Exception as e:
+        print(f"⚠️ Ошибка удаления колонок из users: {e}")
+
+    # Миграция: добавление столбца is_blocked для пометки заблокировавших бота пользователей
+    try:
+        cursor.execute("""
+            SELECT column_name 
+            FROM information_schema.columns 
+            WHERE table_name = 'users' AND column_name = 'is_blocked'
+        """)
+        if not cursor.fetchone():
+            cursor.execute("ALTER TABLE users ADD COLUMN is_blocked BOOLEAN DEFAULT FALSE")
+            print("   ✅ Добавлен столбец is_blocked в таблицу users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца is_blocked: {e}")
+
+    # Миграция: флаг незавершенного онбординга
+    try:
+        cursor.execute("""
+            SELECT column_name
+            FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'onboarding_required'
+        """)
+        if not cursor.fetchone():
+            cursor.execute("ALTER TABLE users ADD COLUMN onboarding_required BOOLEAN DEFAULT FALSE")
+            print("   ✅ Добавлен столбец onboarding_required в таблицу users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца onboarding_required: {e}")
+
+    # Создаем индексы для быстрого поиска
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_id ON users(user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_video_url ON yoga_practices(video_url)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_channel_name ON yoga_practices(channel_name)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_duration ON yoga_practices(time_practices)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_weekday ON yoga_practices(weekday)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_intensity ON yoga_practices(intensity)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bonus_parent_practice ON bonus_practices(parent_practice_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_bonus_video_url ON bonus_practices(video_url)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_suggestions_user ON user_suggestions(user_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_suggestions_created ON user_suggestions(created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_broadcast_messages_batch ON broadcast_messages(broadcast_batch_id)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_broadcast_messages_created ON broadcast_messages(created_at DESC)')
+
+    # Миграция: добавление столбца user_nickname (если еще нет)
+    try:
+        cursor.execute("""
+            SELECT column_name 
+            FROM information_schema.columns 
+            WHERE table_name = 'users' 
+            AND column_name = 'user_nickname'
+        """)
+        if not cursor.fetchone():
+            cursor.execute('ALTER TABLE users ADD COLUMN user_nickname TEXT')
+            print("   ✅ Добавлен столбец user_nickname в таблицу users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца user_nickname: {e}")
+
+    # Миграция: добавление столбца user_nickname в таблицу user_suggestions (если еще нет)
+    try:
+        cursor.execute("""
+            SELECT column_name 
+            FROM information_schema.columns 
+            WHERE table_name = 'user_suggestions' 
+            AND column_name = 'user_nickname'
+        """)
+        if not cursor.fetchone():
+            cursor.execute('ALTER TABLE user_suggestions ADD COLUMN user_nickname TEXT')
+            print("   ✅ Добавлен столбец user_nickname в таблицу user_suggestions")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца user_nickname в user_suggestions: {e}")
+
+    try:
+        # Обновляем ограничение для yoga_practices до 500 символов
+        # Сначала удаляем старое ограничение (если есть)
+        cursor.execute("""
+            SELECT constraint_name 
+            FROM information_schema.table_constraints 
+            WHERE table_name = 'yoga_practices' 
+            AND constraint_name = 'description_max_length'
+        """)
+        if cursor.fetchone():
+            cursor.execute('ALTER TABLE yoga_practices DROP CONSTRAINT IF EXISTS description_max_length')
+            print("   🔄 Удалено старое ограничение для yoga_practices.description")
+
+        # Создаем новое ограничение на 500 символов
+        cursor.execute("""
+            SELECT constraint_name 
+            FROM information_schema.table_constraints 
+            WHERE table_name = 'yoga_practices' 
+            AND constraint_name = 'description_max_length'
+        """)
+        if not cursor.fetchone():
+            cursor.execute('''
+                ALTER TABLE yoga_practices 
+                ADD CONSTRAINT description_max_length 
+                CHECK (description IS NULL OR LENGTH(description) <= 500)
+            ''')
+            print("   ✅ Добавлено ограничение для yoga_practices.description (500 символов)")
+
+        # Обновляем ограничение для bonus_practices до 500 символов
+        # Сначала удаляем старое ограничение (если есть)
+        cursor.execute("""
+            SELECT constraint_name 
+            FROM information_schema.table_constraints 
+            WHERE table_name = 'bonus_practices' 
+            AND constraint_name = 'bonus_description_max_length'
+        """)
+        if cursor.fetchone():
+            cursor.execute('ALTER TABLE bonus_practices DROP CONSTRAINT IF EXISTS bonus_description_max_length')
+            print("   🔄 Удалено старое ограничение для bonus_practices.description")
+
+        # Создаем новое ограничение на 500 символов
+        cursor.execute("""
+            SELECT constraint_name 
+            FROM information_schema.table_constraints 
+            WHERE table_name = 'bonus_practices' 
+            AND constraint_name = 'bonus_description_max_length'
+        """)
+        if not cursor.fetchone():
+            cursor.execute('''
+                ALTER TABLE bonus_practices 
+                ADD CONSTRAINT bonus_description_max_length 
+                CHECK (description IS NULL OR LENGTH(description) <= 500)
+            ''')
+            print("   ✅ Добавлено ограничение для bonus_practices.description (500 символов)")
+
+    except Exception as e:
+        print(f"⚠️ Ошибка при применении миграции description: {e}")
+
+    # Миграция: добавление столбца challenge_start_id для режима челленджа
+    try:
+        cursor.execute("""
+            SELECT column_name 
+            FROM information_schema.columns 
+            WHERE table_name = 'users' AND column_name = 'challenge_start_id'
+        """)
+        if not cursor.fetchone():
+            cursor.execute('ALTER TABLE users ADD COLUMN challenge_start_id INTEGER')
+            print("   ✅ Добавлен столбец challenge_start_id в таблицу users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца challenge_start_id: {e}")
+
+    # Миграция: user_days переименован в total_practices; challenge_day — отдельный счётчик челленджа
+    try:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name IN ('user_days', 'total_practices', 'challenge_day')
+        """)
+        user_columns = {row[0] for row in cursor.fetchall()}
+        if 'total_practices' not in user_columns and 'user_days' in user_columns:
+            cursor.execute('ALTER TABLE users RENAME COLUMN user_days TO total_practices')
+            user_columns.discard('user_days')
+            user_columns.add('total_practices')
+            print("   ✅ user_days переименован в total_practices")
+        if 'total_practices' not in user_columns:
+            cursor.execute('ALTER TABLE users ADD COLUMN total_practices INTEGER DEFAULT 0')
+            print("   ✅ Добавлен столбец total_practices в таблицу users")
+        if 'challenge_day' not in user_columns:
+            cursor.execute('ALTER TABLE users ADD COLUMN challenge_day INTEGER DEFAULT 0')
+            print("   ✅ Добавлен столбец challenge_day в таблицу users")
+    except Exception as e:
+        print(f"⚠️ Ошибка миграции total_practices/challenge_day: {e}")
+
+    # Миграция: program_position и last_practice_message_id для трекера прогресса
+    try:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'program_position'
+        """)
+        if not cursor.fetchone():
+            cursor.execute('ALTER TABLE users ADD COLUMN program_position INTEGER DEFAULT 0')
+            cursor.execute('UPDATE users SET program_position = total_practices WHERE program_position = 0 OR program_position IS NULL')
+            print("   ✅ Добавлен столбец program_position в таблицу users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца program_position: {e}")
+    try:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'last_practice_message_id'
+        """)
+        if not cursor.fetchone():
+            cursor.execute('ALTER TABLE users ADD COLUMN last_practice_message_id BIGINT')
+            print("   ✅ Добавлен столбец last_practice_message_id в таблицу users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца last_practice_message_id: {e}")
+
+    # Миграция: статус паузы рассылки и метаданные напоминаний о паузе
+    try:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'is_paused'
+        """)
+        if not cursor.fetchone():
+            cursor.execute('ALTER TABLE users ADD COLUMN is_paused BOOLEAN DEFAULT FALSE')
+            print("   ✅ Добавлен столбец is_paused в таблицу users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца is_paused: {e}")
+    try:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'paused_at'
+        """)
+        if not cursor.fetchone():
+            cursor.execute('ALTER TABLE users ADD COLUMN paused_at TIMESTAMP')
+            print("   ✅ Добавлен столбец paused_at в таблицу users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца paused_at: {e}")
+    try:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'last_pause_reminder_at'
+        """)
+        if not cursor.fetchone():
+            cursor.execute('ALTER TABLE users ADD COLUMN last_pause_reminder_at TIMESTAMP')
+            print("   ✅ Добавлен столбец last_pause_reminder_at в таблицу users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца last_pause_reminder_at: {e}")
+    try:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'pause_reminder_step'
+        """)
+        if not cursor.fetchone():
+            cursor.execute('ALTER TABLE users ADD COLUMN pause_reminder_step INTEGER DEFAULT 0')
+            print("   ✅ Добавлен столбец pause_reminder_step в таблицу users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца pause_reminder_step: {e}")
+
+    # Миграция: учет неактивности в режиме By mood (для еженедельных напоминаний)
+    try:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'last_by_mood_active_at'
+        """)
+        if not cursor.fetchone():
+            cursor.execute('ALTER TABLE users ADD COLUMN last_by_mood_active_at TIMESTAMP')
+            print("   ✅ Добавлен столбец last_by_mood_active_at в таблицу users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца last_by_mood_active_at: {e}")
+    try:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'last_by_mood_reminder_at'
+        """)
+        if not cursor.fetchone():
+            cursor.execute('ALTER TABLE users ADD COLUMN last_by_mood_reminder_at TIMESTAMP')
+            print("   ✅ Добавлен столбец last_by_mood_reminder_at в таблицу users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца last_by_mood_reminder_at: {e}")
+    try:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'by_mood_reminder_step'
+        """)
+        if not cursor.fetchone():
+            cursor.execute('ALTER TABLE users ADD COLUMN by_mood_reminder_step INTEGER DEFAULT 0')
+            print("   ✅ Добавлен столбец by_mood_reminder_step в таблицу users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца by_mood_reminder_step: {e}")
+
+    # Миграция: id сообщений с inline «Еще практики» (снять клавиатуру при смене режима)
+    try:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'extra_practices_inline_messages'
+        """)
+        if not cursor.fetchone():
+            cursor.execute(
+                "ALTER TABLE users ADD COLUMN extra_practices_inline_messages JSONB DEFAULT '[]'::jsonb NOT NULL"
+            )
+            print("   ✅ Добавлен столбец extra_practices_inline_messages в users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца extra_practices_inline_messages: {e}")
+
+    # Миграция: completed_at в practice_logs для отметки «✅ Я сделал!»
+    try:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'practice_logs' AND column_name = 'completed_at'
+        """)
+        if not cursor.fetchone():
+            cursor.execute('ALTER TABLE practice_logs ADD COLUMN completed_at TIMESTAMP')
+            print("   ✅ Добавлен столбец completed_at в таблицу practice_logs")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца completed_at: {e}")
+
+    # Миграция: снятие напоминания «Я сделал» после /start или /change_mode
+    try:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'practice_logs' AND column_name = 'done_reminder_dismissed'
+        """)
+        if not cursor.fetchone():
+            cursor.execute(
+                'ALTER TABLE practice_logs ADD COLUMN done_reminder_dismissed BOOLEAN NOT NULL DEFAULT FALSE'
+            )
+            print("   ✅ Добавлен столбец done_reminder_dismissed в таблицу practice_logs")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца done_reminder_dismissed: {e}")
+
+    # Миграция: режим бота (Daily / By mood), флаг активной ежедневной рассылки, признак «без коврика»
+    try:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'bot_mode'
+        """)
+        if not cursor.fetchone():
+            cursor.execute(
+                "ALTER TABLE users ADD COLUMN bot_mode VARCHAR(20) NOT NULL DEFAULT 'daily'"
+            )
+            print("   ✅ Добавлен столбец bot_mode в таблицу users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца bot_mode: {e}")
+    try:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'daily_schedule_enabled'
+        """)
+        if not cursor.fetchone():
+            cursor.execute(
+                "ALTER TABLE users ADD COLUMN daily_schedule_enabled BOOLEAN NOT NULL DEFAULT TRUE"
+            )
+            print("   ✅ Добавлен столбец daily_schedule_enabled в таблицу users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца daily_schedule_enabled: {e}")
+    try:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'users' AND column_name = 'first_daily_send_date'
+        """)
+        if not cursor.fetchone():
+            cursor.execute(
+                "ALTER TABLE users ADD COLUMN first_daily_send_date DATE"
+            )
+            print("   ✅ Добавлен столбец first_daily_send_date в таблицу users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца first_daily_send_date: {e}")
+    try:
+        cursor.execute("""
+            SELECT column_name FROM information_schema.columns
+            WHERE table_name = 'yoga_practices' AND column_name = 'without_mat'
+        """)
+        if not cursor.fetchone():
+            cursor.execute(
+                "ALTER TABLE yoga_practices ADD COLUMN without_mat BOOLEAN NOT NULL DEFAULT FALSE"
+            )
+            print("   ✅ Добавлен столбец without_mat в таблицу yoga_practices")
+    except Exception as e:
+        print(f"⚠️ Ошибка при добавлении столбца without_mat: {e}")
+    try:
+        cursor.execute("""
+            CREATE TABLE IF NOT EXISTS by_mood_seen (
+                user_id BIGINT NOT NULL,
+                filter_key TEXT NOT NULL,
+                practice_id INTEGER NOT NULL,
+                sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                PRIMARY KEY (user_id, filter_key, practice_id),
+                FOREIGN KEY (practice_id) REFERENCES yoga_practices (practices_id) ON DELETE CASCADE
+            )
+        """)
+        cursor.execute(
+            "CREATE INDEX IF NOT EXISTS idx_by_mood_seen_user_filter ON by_mood_seen(user_id, filter_key)"
+        )
+        print("   ✅ Таблица by_mood_seen готова")
+    except Exception as e:
+        print(f"⚠️ Ошибка при создании by_mood_seen: {e}")
+
+    # Cleanup-migration: удаляем устаревшие столбцы users, которые больше не используются
+    try:
+        cursor.execute('''
+            ALTER TABLE users
+            DROP COLUMN IF EXISTS user_phone,
+            DROP COLUMN IF EXISTS onboarding_weekly,
+            DROP COLUMN IF EXISTS onboarding_weeekly
+        ''')
+        print("   ✅ Удалены устаревшие столбцы user_phone/onboarding_weekly из users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при удалении устаревших столбцов users: {e}")
+
+    # Cleanup-мigration: удаляем устаревшие столбцы рангов в users
+    # (логика рангов больше не используется в коде)
+    try:
+        cursor.execute('''
+            ALTER TABLE users
+            DROP COLUMN IF EXISTS rank,
+            DROP COLUMN IF EXISTS rank_total_users,
+            DROP COLUMN IF EXISTS rank_updated_at
+        ''')
+        print("   ✅ Удалены устаревшие столбцы rank/rank_total_users/rank_updated_at из users")
+    except Exception as e:
+        print(f"⚠️ Ошибка при удалении устаревших столбцов ранга: {e}")
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS system_state (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    ''')
+
+    # Миграция: practice_logs → партиции по месяцам + агрегаты для свёрнутых месяцев.
+    # Ошибка откатывает всю миграцию: ensure_schema не запишет версию и упадёт.
+    _migrate_to_partitioned(cursor)
+    _ensure_partitions(cursor)
+    _ensure_day_columns(cursor)
+    _create_indexes(cursor)
+    _create_rollup_tables(cursor)
@@ -0,0 +1,7 @@
+"""Аренда ежедневной доставки: users.delivery_lease_until / delivery_lease_owner."""
+
+
+def upgrade(cursor) -> None:
+    # См. claim_users_pending_for_today
+    cursor.execute('ALTER TABLE users ADD COLUMN IF NOT EXISTS delivery_lease_until TIMESTAMPTZ')
+    cursor.execute('ALTER TABLE users ADD COLUMN IF NOT EXISTS delivery_lease_owner TEXT')
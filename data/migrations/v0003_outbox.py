@@ -0,0 +1,37 @@
+"""Outbox плановых сообщений: таблица outbox_messages и частичные индексы."""
+
+
+def upgrade(cursor) -> None:
+    # Outbox плановых сообщений (см. enqueue_practice_delivery и app/outbox.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS outbox_messages (
+            id BIGSERIAL PRIMARY KEY,
+            idempotency_key TEXT NOT NULL UNIQUE,
+            user_id BIGINT,
+            chat_id BIGINT NOT NULL,
+            kind TEXT NOT NULL,
+            payload JSONB NOT NULL,
+            meta JSONB NOT NULL DEFAULT '{}'::jsonb,
+            status TEXT NOT NULL DEFAULT 'pending',
+            attempts INTEGER NOT NULL DEFAULT 0,
+            next_attempt_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            lease_until TIMESTAMPTZ,
+            lease_owner TEXT,
+            last_error TEXT,
+            telegram_message_id BIGINT,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            sent_at TIMESTAMPTZ
+        )
+    ''')
+    # Частичные индексы: в работе только неотправленные строки, отправленные копятся
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_outbox_due
+        ON outbox_messages (next_attempt_at, id)
+        WHERE status IN ('pending', 'sending')
+    ''')
+    cursor.execute('''
+        CREATE INDEX IF NOT EXISTS idx_outbox_chat_active
+        ON outbox_messages (chat_id, id)
+        WHERE status IN ('pending', 'sending')
+    ''')
@@ -0,0 +1,16 @@
+"""Очередь отложенного снятия кнопки «✅ Я сделал!» и время последнего сообщения с практикой."""
+
+
+def upgrade(cursor) -> None:
+    # Отложенное снятие кнопки «✅ Я сделал!» со старых сообщений (app/keyboard_cleanup.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS keyboard_cleanup_queue (
+            chat_id BIGINT NOT NULL,
+            message_id BIGINT NOT NULL,
+            user_id BIGINT,
+            message_sent_at TIMESTAMPTZ,
+            queued_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (chat_id, message_id)
+        )
+    ''')
+    cursor.execute('ALTER TABLE users ADD COLUMN IF NOT EXISTS last_practice_message_at TIMESTAMPTZ')
@@ -0,0 +1,20 @@
+"""План рассылки на день: таблица daily_plan."""
+
+
+def upgrade(cursor) -> None:
+    # План рассылки на день (build_daily_plan, app/schedule/daily_plan.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_plan (
+            plan_date DATE NOT NULL,
+            user_id BIGINT NOT NULL,
+            practice_id INTEGER NOT NULL,
+            is_challenge BOOLEAN NOT NULL,
+            day_number INTEGER NOT NULL,
+            title TEXT NOT NULL,
+            bonus_ids INTEGER[] NOT NULL DEFAULT '{}',
+            basis_counter INTEGER NOT NULL,
+            basis_start_id INTEGER,
+            created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (plan_date, user_id)
+        )
+    ''')
@@ -0,0 +1,29 @@
+"""Общий лимит Bot API: таблицы telegram_rate_limits и telegram_rate_clients."""
+
+
+def upgrade(cursor) -> None:
+    # Ведро токенов на бота (см. take_tokens в data/rate_limit.py)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS telegram_rate_limits (
+            bucket TEXT PRIMARY KEY,
+            tokens DOUBLE PRECISION NOT NULL,
+            rate DOUBLE PRECISION NOT NULL,
+            max_rate DOUBLE PRECISION NOT NULL,
+            burst DOUBLE PRECISION NOT NULL,
+            blocked_until TIMESTAMPTZ,
+            last_throttled_at TIMESTAMPTZ,
+            throttled_count INTEGER NOT NULL DEFAULT 0,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+        )
+    ''')
+    # Под-вёдра процессов, делящих скорость по весам
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS telegram_rate_clients (
+            bucket TEXT NOT NULL,
+            client_id TEXT NOT NULL,
+            weight DOUBLE PRECISION NOT NULL DEFAULT 1,
+            tokens DOUBLE PRECISION NOT NULL DEFAULT 1,
+            updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+            PRIMARY KEY (bucket, client_id)
+        )
+    ''')
@@ -2,14 +2,19 @@ import psycopg2
 import psycopg2.extras
 import json
 import os
+import bisect
+import re
+import select
+import socket
+import threading
+import time
 import logging
-from datetime import date, datetime, timedelta
+from datetime import date, datetime, timedelta, timezone
 from zoneinfo import ZoneInfo  # Нужен для вычисления дня недели с учётом таймзоны
 from typing import Optional  # Для типов, совместимых с Python 3.9
-import sys
-import os
-sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
-from app.config import get_db_config, DEFAULT_TZ  # Берём таймзону из конфигурации проекта
+from app import clock
+from app.config import get_db_config, DEFAULT_TZ, PRACTICE_LOGS_HOT_MONTHS  # Берём таймзону из конфигурации проекта
+from data.instrumentation import connection_factory, instrument_module, record_connection
 
 logger = logging.getLogger(__name__)
 
@@ -49,555 +54,289 @@ def _decode_bonus_practice_row(row: Optional[tuple]) -> Optional[tuple]:
         row_list[7] = _decode_my_description(row_list[7])
     return tuple(row_list)
 
-def get_connection():
+def get_connection(**options):
     """Создает подключение к PostgreSQL базе данных.
     
+    Args:
+        **options: дополнительные параметры libpq (например, keepalives_idle для долгоживущих подключений)
+
     Returns:
         psycopg2.connection: Объект подключения к базе данных
     """
     config = get_db_config()
-    return psycopg2.connect(**config)
+    started = time.perf_counter()
+    try:
+        conn = psycopg2.connect(**config, **options, connection_factory=connection_factory())
+    except Exception:
+        record_connection(time.perf_counter() - started, failed=True)
+        raise
+    record_connection(time.perf_counter() - started)
+    return conn
 
-def init_database():
-    """Инициализирует базу данных и создает необходимые таблицы.
-    
-    Создает таблицы:
-    - users: для хранения данных пользователей
-    - yoga_practices: для хранения йога практик с YouTube
-    - practice_logs: для логирования отправленных практик
-    
-    Поля таблицы yoga_practices:
-    - practices_id: уникальный ID практики (SERIAL)
-    - title: название видео
-    - video_url: ссылка на видео (UNIQUE)
-    - time_practices: длительность видео в минутах
-    - channel_name: название канала
-    - description: описание видео (автоматически с YouTube)
-    - my_description: мое описание (заполняется вручную)
-    - intensity: интенсивность практики (легкая, средняя, высокая)
-    - weekday: день недели (1=понедельник, 7=воскресенье, NULL=любой день)
-    - created_at: дата добавления записи
-    - updated_at: дата последнего обновления
+
+# --- Партиционирование practice_logs ---
+#
+# practice_logs партиционирована по месяцам sent_at (sent_at хранится в UTC):
+# practice_logs_y2026m05, practice_logs_y2026m06, ... + practice_logs_default на всякий случай.
+# Партиции старше горячего окна (PRACTICE_LOGS_HOT_MONTHS) сворачиваются в
+# practice_daily_rollups (пользователь × день МСК) и practice_user_totals (итоги по пользователю),
+# после чего удаляются. Запросы читают горячие логи + агрегаты.
+
+# На сколько месяцев вперёд заранее создаём партиции
+PRACTICE_LOGS_PREMAKE_MONTHS = 2
+PRACTICE_LOGS_DEFAULT_PARTITION = "practice_logs_default"
+_PRACTICE_LOGS_PARTITION_RE = re.compile(r"^practice_logs_y(\d{4})m(\d{2})$")
+_PRACTICE_LOGS_COLUMNS = (
+    "log_id, user_id, practice_id, sent_at, day_number, completed_at, done_reminder_dismissed"
+)
+
+
+def _add_months(month_start: date, months: int) -> date:
+    """Первое число месяца, отстоящего на months от month_start."""
+    index = month_start.year * 12 + (month_start.month - 1) + months
+    return date(index // 12, index % 12 + 1, 1)
+
+
+def _utc_now_naive() -> datetime:
+    """Текущее время UTC без tzinfo — в том же виде, что sent_at/completed_at в БД."""
+    return datetime.now(timezone.utc).replace(tzinfo=None)
+
+
+def _practice_logs_partition_name(month_start: date) -> str:
+    return f"practice_logs_y{month_start.year:04d}m{month_start.month:02d}"
+
+
+def _practice_logs_hot_start() -> date:
+    """Первое число самого старого «горячего» месяца; всё раньше — кандидаты на свёртку."""
+    current_month = _utc_now_naive().date().replace(day=1)
+    return _add_months(current_month, -(PRACTICE_LOGS_HOT_MONTHS - 1))
+
+
+def _practice_logs_recent_bound(days: int = 2) -> datetime:
+    """Нижняя граница sent_at для проверок «сегодня/вчера»: планировщик отсекает старые партиции.
+
+    Граница берётся с запасом, поэтому не меняет смысл запроса, а только сужает скан.
     """
-    try:
-        conn = get_connection()
-        cursor = conn.cursor()
-        
-        # Создаем таблицу пользователей
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id BIGINT PRIMARY KEY,
-                chat_id BIGINT NOT NULL,
-                notify_time VARCHAR(5) NOT NULL,
-                user_name TEXT,
-                total_practices INTEGER DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Создаем таблицу йога практик
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS yoga_practices (
-                practices_id SERIAL PRIMARY KEY,
-                title TEXT NOT NULL,
-                video_url TEXT NOT NULL UNIQUE,
-                time_practices INTEGER NOT NULL,
-                channel_name TEXT NOT NULL,
-                description TEXT,
-                my_description TEXT,
-                intensity TEXT,
-                weekday INTEGER CHECK (weekday >= 1 AND weekday <= 7),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        # Создаем таблицу бонусных практик, привязанных к основной
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS bonus_practices (
-                bonus_id SERIAL PRIMARY KEY,
-                parent_practice_id INTEGER NOT NULL,
-                title TEXT NOT NULL,
-                video_url TEXT NOT NULL UNIQUE,
-                time_practices INTEGER NOT NULL,
-                channel_name TEXT NOT NULL,
-                description TEXT,
-                my_description TEXT,
-                intensity TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (parent_practice_id) REFERENCES yoga_practices (practices_id) ON DELETE CASCADE
-            )
-        ''')
-        
-        # Создаем таблицу для логирования отправленных практик
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS practice_logs (
-                log_id SERIAL PRIMARY KEY,
-                user_id BIGINT NOT NULL,
-                practice_id INTEGER NOT NULL,
-                sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                day_number INTEGER NOT NULL,
-                FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE,
-                FOREIGN KEY (practice_id) REFERENCES yoga_practices (practices_id) ON DELETE CASCADE
-            )
-        ''')
-        
-        # Создаем таблицу для предложений пользователей
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS user_suggestions (
-                suggestion_id SERIAL PRIMARY KEY,
-                user_id BIGINT NOT NULL,
-                video_url TEXT NOT NULL,
-                comment TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
-            )
-        ''')
-        
-        # Создаем таблицу для хранения отправленных сообщений массовой рассылки
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS broadcast_messages (
-                id SERIAL PRIMARY KEY,
-                broadcast_batch_id INTEGER NOT NULL,
-                user_id BIGINT NOT NULL,
-                chat_id BIGINT NOT NULL,
-                message_id INTEGER NOT NULL,
-                message_type TEXT NOT NULL,
-                message_text TEXT,
-                photo_file_id TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (user_id) REFERENCES users (user_id) ON DELETE CASCADE
-            )
-        ''')
-        
-        # Миграция: удаляем старые поля recommend и comment из таблицы users
-        try:
-            # Проверяем, существуют ли колонки, и удаляем их
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'users' AND column_name IN ('recommend', 'comment')
-            """)
-            existing_columns = [row[0] for row in cursor.fetchall()]
-            
-            if 'recommend' in existing_columns:
-                cursor.execute('ALTER TABLE users DROP COLUMN recommend')
-                print("✅ Колонка recommend удалена из таблицы users")
-            
-            if 'comment' in existing_columns:
-                cursor.execute('ALTER TABLE users DROP COLUMN comment')
-                print("✅ Колонка comment удалена из таблицы users")
-                
-        except Exception as e:
-            print(f"⚠️ Ошибка удаления колонок из users: {e}")
-        
-        # Миграция: добавление столбца is_blocked для пометки заблокировавших бота пользователей
-        try:
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'users' AND column_name = 'is_blocked'
-            """)
-            if not cursor.fetchone():
-                cursor.execute("ALTER TABLE users ADD COLUMN is_blocked BOOLEAN DEFAULT FALSE")
-                print("   ✅ Добавлен столбец is_blocked в таблицу users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца is_blocked: {e}")
+    return _utc_now_naive() - timedelta(days=days)
 
-        # Миграция: флаг незавершенного онбординга
-        try:
-            cursor.execute("""
-                SELECT column_name
-                FROM information_schema.columns
-                WHERE table_name = 'users' AND column_name = 'onboarding_required'
-            """)
-            if not cursor.fetchone():
-                cursor.execute("ALTER TABLE users ADD COLUMN onboarding_required BOOLEAN DEFAULT FALSE")
-                print("   ✅ Добавлен столбец onboarding_required в таблицу users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца onboarding_required: {e}")
-        
-        # Создаем индексы для быстрого поиска
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_id ON users(user_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_video_url ON yoga_practices(video_url)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_channel_name ON yoga_practices(channel_name)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_duration ON yoga_practices(time_practices)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_weekday ON yoga_practices(weekday)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_intensity ON yoga_practices(intensity)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_bonus_parent_practice ON bonus_practices(parent_practice_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_bonus_video_url ON bonus_practices(video_url)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_practice_logs_user ON practice_logs(user_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_practice_logs_practice ON practice_logs(practice_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_suggestions_user ON user_suggestions(user_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_user_suggestions_created ON user_suggestions(created_at)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_broadcast_messages_batch ON broadcast_messages(broadcast_batch_id)')
-        cursor.execute('CREATE INDEX IF NOT EXISTS idx_broadcast_messages_created ON broadcast_messages(created_at DESC)')
-        
-        # Миграция: добавление столбца user_nickname (если еще нет)
-        try:
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'users' 
-                AND column_name = 'user_nickname'
-            """)
-            if not cursor.fetchone():
-                cursor.execute('ALTER TABLE users ADD COLUMN user_nickname TEXT')
-                print("   ✅ Добавлен столбец user_nickname в таблицу users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца user_nickname: {e}")
-        
-        # Миграция: добавление столбца user_nickname в таблицу user_suggestions (если еще нет)
-        try:
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'user_suggestions' 
-                AND column_name = 'user_nickname'
-            """)
-            if not cursor.fetchone():
-                cursor.execute('ALTER TABLE user_suggestions ADD COLUMN user_nickname TEXT')
-                print("   ✅ Добавлен столбец user_nickname в таблицу user_suggestions")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца user_nickname в user_suggestions: {e}")
-        
-        try:
-            # Обновляем ограничение для yoga_practices до 500 символов
-            # Сначала удаляем старое ограничение (если есть)
-            cursor.execute("""
-                SELECT constraint_name 
-                FROM information_schema.table_constraints 
-                WHERE table_name = 'yoga_practices' 
-                AND constraint_name = 'description_max_length'
-            """)
-            if cursor.fetchone():
-                cursor.execute('ALTER TABLE yoga_practices DROP CONSTRAINT IF EXISTS description_max_length')
-                print("   🔄 Удалено старое ограничение для yoga_practices.description")
-            
-            # Создаем новое ограничение на 500 символов
-            cursor.execute("""
-                SELECT constraint_name 
-                FROM information_schema.table_constraints 
-                WHERE table_name = 'yoga_practices' 
-                AND constraint_name = 'description_max_length'
-            """)
-            if not cursor.fetchone():
-                cursor.execute('''
-                    ALTER TABLE yoga_practices 
-                    ADD CONSTRAINT description_max_length 
-                    CHECK (description IS NULL OR LENGTH(description) <= 500)
-                ''')
-                print("   ✅ Добавлено ограничение для yoga_practices.description (500 символов)")
-            
-            # Обновляем ограничение для bonus_practices до 500 символов
-            # Сначала удаляем старое ограничение (если есть)
-            cursor.execute("""
-                SELECT constraint_name 
-                FROM information_schema.table_constraints 
-                WHERE table_name = 'bonus_practices' 
-                AND constraint_name = 'bonus_description_max_length'
-            """)
-            if cursor.fetchone():
-                cursor.execute('ALTER TABLE bonus_practices DROP CONSTRAINT IF EXISTS bonus_description_max_length')
-                print("   🔄 Удалено старое ограничение для bonus_practices.description")
-            
-            # Создаем новое ограничение на 500 символов
-            cursor.execute("""
-                SELECT constraint_name 
-                FROM information_schema.table_constraints 
-                WHERE table_name = 'bonus_practices' 
-                AND constraint_name = 'bonus_description_max_length'
-            """)
-            if not cursor.fetchone():
-                cursor.execute('''
-                    ALTER TABLE bonus_practices 
-                    ADD CONSTRAINT bonus_description_max_length 
-                    CHECK (description IS NULL OR LENGTH(description) <= 500)
-                ''')
-                print("   ✅ Добавлено ограничение для bonus_practices.description (500 символов)")
-                
-        except Exception as e:
-            print(f"⚠️ Ошибка при применении миграции description: {e}")
-        
-        # Миграция: добавление столбца challenge_start_id для режима челленджа
-        try:
-            cursor.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'users' AND column_name = 'challenge_start_id'
-            """)
-            if not cursor.fetchone():
-                cursor.execute('ALTER TABLE users ADD COLUMN challenge_start_id INTEGER')
-                print("   ✅ Добавлен столбец challenge_start_id в таблицу users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца challenge_start_id: {e}")
 
-        # Миграция: user_days переименован в total_practices; challenge_day — отдельный счётчик челленджа
-        try:
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'users' AND column_name IN ('user_days', 'total_practices', 'challenge_day')
-            """)
-            user_columns = {row[0] for row in cursor.fetchall()}
-            if 'total_practices' not in user_columns and 'user_days' in user_columns:
-                cursor.execute('ALTER TABLE users RENAME COLUMN user_days TO total_practices')
-                user_columns.discard('user_days')
-                user_columns.add('total_practices')
-                print("   ✅ user_days переименован в total_practices")
-            if 'total_practices' not in user_columns:
-                cursor.execute('ALTER TABLE users ADD COLUMN total_practices INTEGER DEFAULT 0')
-                print("   ✅ Добавлен столбец total_practices в таблицу users")
-            if 'challenge_day' not in user_columns:
-                cursor.execute('ALTER TABLE users ADD COLUMN challenge_day INTEGER DEFAULT 0')
-                print("   ✅ Добавлен столбец challenge_day в таблицу users")
-        except Exception as e:
-            print(f"⚠️ Ошибка миграции total_practices/challenge_day: {e}")
+def _create_practice_logs_partition(cursor, month_start: date) -> bool:
+    """Создаёт месячную партицию, если её ещё нет.
 
-        # Миграция: program_position и last_practice_message_id для трекера прогресса
-        try:
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'users' AND column_name = 'program_position'
-            """)
-            if not cursor.fetchone():
-                cursor.execute('ALTER TABLE users ADD COLUMN program_position INTEGER DEFAULT 0')
-                cursor.execute('UPDATE users SET program_position = total_practices WHERE program_position = 0 OR program_position IS NULL')
-                print("   ✅ Добавлен столбец program_position в таблицу users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца program_position: {e}")
-        try:
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'users' AND column_name = 'last_practice_message_id'
-            """)
-            if not cursor.fetchone():
-                cursor.execute('ALTER TABLE users ADD COLUMN last_practice_message_id BIGINT')
-                print("   ✅ Добавлен столбец last_practice_message_id в таблицу users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца last_practice_message_id: {e}")
+    Если за этот месяц уже успели лечь строки в practice_logs_default, переносим их:
+    Postgres не даст создать партицию, пока подходящие строки лежат в default.
 
-        # Миграция: статус паузы рассылки и метаданные напоминаний о паузе
-        try:
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'users' AND column_name = 'is_paused'
-            """)
-            if not cursor.fetchone():
-                cursor.execute('ALTER TABLE users ADD COLUMN is_paused BOOLEAN DEFAULT FALSE')
-                print("   ✅ Добавлен столбец is_paused в таблицу users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца is_paused: {e}")
-        try:
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'users' AND column_name = 'paused_at'
-            """)
-            if not cursor.fetchone():
-                cursor.execute('ALTER TABLE users ADD COLUMN paused_at TIMESTAMP')
-                print("   ✅ Добавлен столбец paused_at в таблицу users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца paused_at: {e}")
-        try:
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'users' AND column_name = 'last_pause_reminder_at'
-            """)
-            if not cursor.fetchone():
-                cursor.execute('ALTER TABLE users ADD COLUMN last_pause_reminder_at TIMESTAMP')
-                print("   ✅ Добавлен столбец last_pause_reminder_at в таблицу users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца last_pause_reminder_at: {e}")
-        try:
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'users' AND column_name = 'pause_reminder_step'
-            """)
-            if not cursor.fetchone():
-                cursor.execute('ALTER TABLE users ADD COLUMN pause_reminder_step INTEGER DEFAULT 0')
-                print("   ✅ Добавлен столбец pause_reminder_step в таблицу users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца pause_reminder_step: {e}")
+    Returns:
+        bool: True, если партиция создана сейчас
+    """
+    name = _practice_logs_partition_name(month_start)
+    cursor.execute('SELECT to_regclass(%s)', (name,))
+    if cursor.fetchone()[0] is not None:
+        return False
 
-        # Миграция: учет неактивности в режиме By mood (для еженедельных напоминаний)
-        try:
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'users' AND column_name = 'last_by_mood_active_at'
-            """)
-            if not cursor.fetchone():
-                cursor.execute('ALTER TABLE users ADD COLUMN last_by_mood_active_at TIMESTAMP')
-                print("   ✅ Добавлен столбец last_by_mood_active_at в таблицу users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца last_by_mood_active_at: {e}")
-        try:
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'users' AND column_name = 'last_by_mood_reminder_at'
-            """)
-            if not cursor.fetchone():
-                cursor.execute('ALTER TABLE users ADD COLUMN last_by_mood_reminder_at TIMESTAMP')
-                print("   ✅ Добавлен столбец last_by_mood_reminder_at в таблицу users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца last_by_mood_reminder_at: {e}")
-        try:
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'users' AND column_name = 'by_mood_reminder_step'
-            """)
-            if not cursor.fetchone():
-                cursor.execute('ALTER TABLE users ADD COLUMN by_mood_reminder_step INTEGER DEFAULT 0')
-                print("   ✅ Добавлен столбец by_mood_reminder_step в таблицу users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца by_mood_reminder_step: {e}")
+    month_end = _add_months(month_start, 1)
+    cursor.execute('SELECT to_regclass(%s)', (PRACTICE_LOGS_DEFAULT_PARTITION,))
+    moved_rows = []
+    if cursor.fetchone()[0] is not None:
+        cursor.execute(
+            f'''
+            DELETE FROM {PRACTICE_LOGS_DEFAULT_PARTITION}
+            WHERE sent_at >= %s AND sent_at < %s
+            RETURNING {_PRACTICE_LOGS_COLUMNS}
+            ''',
+            (month_start, month_end),
+        )
+        moved_rows = cursor.fetchall()
 
-        # Миграция: id сообщений с inline «Еще практики» (снять клавиатуру при смене режима)
-        try:
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'users' AND column_name = 'extra_practices_inline_messages'
-            """)
-            if not cursor.fetchone():
-                cursor.execute(
-                    "ALTER TABLE users ADD COLUMN extra_practices_inline_messages JSONB DEFAULT '[]'::jsonb NOT NULL"
-                )
-                print("   ✅ Добавлен столбец extra_practices_inline_messages в users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца extra_practices_inline_messages: {e}")
+    cursor.execute(
+        f'''
+        CREATE TABLE {name} PARTITION OF practice_logs
+        FOR VALUES FROM (%s) TO (%s)
+        ''',
+        (month_start, month_end),
+    )
+    if moved_rows:
+        psycopg2.extras.execute_values(
+            cursor,
+            f'INSERT INTO practice_logs ({_PRACTICE_LOGS_COLUMNS}) VALUES %s',
+            moved_rows,
+        )
+        logger.info(f"{len(moved_rows)} записей practice_logs перенесено из {PRACTICE_LOGS_DEFAULT_PARTITION} в {name}")
+    return True
 
-        # Миграция: completed_at в practice_logs для отметки «✅ Я сделал!»
-        try:
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'practice_logs' AND column_name = 'completed_at'
-            """)
-            if not cursor.fetchone():
-                cursor.execute('ALTER TABLE practice_logs ADD COLUMN completed_at TIMESTAMP')
-                print("   ✅ Добавлен столбец completed_at в таблицу practice_logs")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца completed_at: {e}")
 
-        # Миграция: снятие напоминания «Я сделал» после /start или /change_mode
-        try:
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'practice_logs' AND column_name = 'done_reminder_dismissed'
-            """)
-            if not cursor.fetchone():
-                cursor.execute(
-                    'ALTER TABLE practice_logs ADD COLUMN done_reminder_dismissed BOOLEAN NOT NULL DEFAULT FALSE'
-                )
-                print("   ✅ Добавлен столбец done_reminder_dismissed в таблицу practice_logs")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца done_reminder_dismissed: {e}")
+def _ensure_practice_logs_partitions(cursor, from_month: Optional[date] = None) -> int:
+    """Создаёт default-партицию и месячные партиции от горячего окна до +PREMAKE месяцев.
 
-        # Миграция: режим бота (Daily / By mood), флаг активной ежедневной рассылки, признак «без коврика»
-        try:
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'users' AND column_name = 'bot_mode'
-            """)
-            if not cursor.fetchone():
-                cursor.execute(
-                    "ALTER TABLE users ADD COLUMN bot_mode VARCHAR(20) NOT NULL DEFAULT 'daily'"
-                )
-                print("   ✅ Добавлен столбец bot_mode в таблицу users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца bot_mode: {e}")
-        try:
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'users' AND column_name = 'daily_schedule_enabled'
-            """)
-            if not cursor.fetchone():
-                cursor.execute(
-                    "ALTER TABLE users ADD COLUMN daily_schedule_enabled BOOLEAN NOT NULL DEFAULT TRUE"
-                )
-                print("   ✅ Добавлен столбец daily_schedule_enabled в таблицу users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца daily_schedule_enabled: {e}")
-        try:
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'users' AND column_name = 'first_daily_send_date'
-            """)
-            if not cursor.fetchone():
-                cursor.execute(
-                    "ALTER TABLE users ADD COLUMN first_daily_send_date DATE"
-                )
-                print("   ✅ Добавлен столбец first_daily_send_date в таблицу users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца first_daily_send_date: {e}")
-        try:
-            cursor.execute("""
-                SELECT column_name FROM information_schema.columns
-                WHERE table_name = 'yoga_practices' AND column_name = 'without_mat'
-            """)
-            if not cursor.fetchone():
-                cursor.execute(
-                    "ALTER TABLE yoga_practices ADD COLUMN without_mat BOOLEAN NOT NULL DEFAULT FALSE"
-                )
-                print("   ✅ Добавлен столбец without_mat в таблицу yoga_practices")
-        except Exception as e:
-            print(f"⚠️ Ошибка при добавлении столбца without_mat: {e}")
-        try:
-            cursor.execute("""
-                CREATE TABLE IF NOT EXISTS by_mood_seen (
-                    user_id BIGINT NOT NULL,
-                    filter_key TEXT NOT NULL,
-                    practice_id INTEGER NOT NULL,
-                    sent_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                    PRIMARY KEY (user_id, filter_key, practice_id),
-                    FOREIGN KEY (practice_id) REFERENCES yoga_practices (practices_id) ON DELETE CASCADE
-                )
-            """)
-            cursor.execute(
-                "CREATE INDEX IF NOT EXISTS idx_by_mood_seen_user_filter ON by_mood_seen(user_id, filter_key)"
-            )
-            print("   ✅ Таблица by_mood_seen готова")
-        except Exception as e:
-            print(f"⚠️ Ошибка при создании by_mood_seen: {e}")
+    Returns:
+        int: сколько партиций создано
+    """
+    cursor.execute(
+        f'CREATE TABLE IF NOT EXISTS {PRACTICE_LOGS_DEFAULT_PARTITION} PARTITION OF practice_logs DEFAULT'
+    )
+    month = from_month or _practice_logs_hot_start()
+    last_month = _add_months(_utc_now_naive().date().replace(day=1), PRACTICE_LOGS_PREMAKE_MONTHS)
+    created = 0
+    while month <= last_month:
+        if _create_practice_logs_partition(cursor, month):
+            created += 1
+        month = _add_months(month, 1)
+    return created
 
-        # Cleanup-migration: удаляем устаревшие столбцы users, которые больше не используются
-        try:
-            cursor.execute('''
-                ALTER TABLE users
-                DROP COLUMN IF EXISTS user_phone,
-                DROP COLUMN IF EXISTS onboarding_weekly,
-                DROP COLUMN IF EXISTS onboarding_weeekly
-            ''')
-            print("   ✅ Удалены устаревшие столбцы user_phone/onboarding_weekly из users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при удалении устаревших столбцов users: {e}")
 
-        # Cleanup-мigration: удаляем устаревшие столбцы рангов в users
-        # (логика рангов больше не используется в коде)
-        try:
-            cursor.execute('''
-                ALTER TABLE users
-                DROP COLUMN IF EXISTS rank,
-                DROP COLUMN IF EXISTS rank_total_users,
-                DROP COLUMN IF EXISTS rank_updated_at
-            ''')
-            print("   ✅ Удалены устаревшие столбцы rank/rank_total_users/rank_updated_at из users")
-        except Exception as e:
-            print(f"⚠️ Ошибка при удалении устаревших столбцов ранга: {e}")
+def _rollup_practice_logs(cursor, source_sql: str, params: tuple) -> int:
+    """Добавляет строки логов из source_sql в practice_daily_rollups и practice_user_totals.
+
+    source_sql — SELECT/DELETE ... RETURNING с колонками user_id, day_number, completed_at,
+    sent_day_msk, completed_day_msk.
+
+    Returns:
+        int: сколько строк логов свёрнуто
+    """
+    cursor.execute(
+        f'''
+        WITH src AS ({source_sql}),
+        daily AS (
+            SELECT user_id, day_msk,
+                   SUM(sent) AS sent_cnt,
+                   SUM(scheduled) AS scheduled_sent_cnt,
+                   SUM(completed) AS completed_cnt
+            FROM (
+                SELECT user_id, sent_day_msk AS day_msk, 1 AS sent,
+                       CASE WHEN day_number >= 1 THEN 1 ELSE 0 END AS scheduled, 0 AS completed
+                FROM src
+                UNION ALL
+                SELECT user_id, completed_day_msk, 0, 0, 1
+                FROM src WHERE completed_at IS NOT NULL
+            ) events
+            GROUP BY user_id, day_msk
+        ),
+        daily_upsert AS (
+            INSERT INTO practice_daily_rollups (user_id, day_msk, sent_cnt, scheduled_sent_cnt, completed_cnt)
+            SELECT user_id, day_msk, sent_cnt, scheduled_sent_cnt, completed_cnt FROM daily
+            ON CONFLICT (user_id, day_msk) DO UPDATE SET
+                sent_cnt = practice_daily_rollups.sent_cnt + EXCLUDED.sent_cnt,
+                scheduled_sent_cnt = practice_daily_rollups.scheduled_sent_cnt + EXCLUDED.scheduled_sent_cnt,
+                completed_cnt = practice_daily_rollups.completed_cnt + EXCLUDED.completed_cnt
+            RETURNING 1
+        ),
+        totals_upsert AS (
+            INSERT INTO practice_user_totals (user_id, sent_cnt, scheduled_sent_cnt, completed_cnt)
+            SELECT user_id, COUNT(*), COUNT(*) FILTER (WHERE day_number >= 1), COUNT(completed_at)
+            FROM src
+            GROUP BY user_id
+            ON CONFLICT (user_id) DO UPDATE SET
+                sent_cnt = practice_user_totals.sent_cnt + EXCLUDED.sent_cnt,
+                scheduled_sent_cnt = practice_user_totals.scheduled_sent_cnt + EXCLUDED.scheduled_sent_cnt,
+                completed_cnt = practice_user_totals.completed_cnt + EXCLUDED.completed_cnt
+            RETURNING 1
+        )
+        SELECT COUNT(*) FROM src
+        ''',
+        params,
+    )
+    return int(cursor.fetchone()[0])
+
+
+def ensure_practice_logs_partitions() -> int:
+    """Заранее создаёт месячные партиции practice_logs (вызывается из фоновой задачи).
+
+    Returns:
+        int: сколько партиций создано (-1 при ошибке)
+    """
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        created = _ensure_practice_logs_partitions(cursor)
+        conn.commit()
+        conn.close()
+        return created
+    except Exception as e:
+        logger.error(f"Ошибка создания партиций practice_logs: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return -1
+
+
+def rollup_cold_practice_logs() -> int:
+    """Сворачивает партиции practice_logs старше горячего окна в агрегаты и удаляет их.
+
+    Каждая партиция сворачивается и удаляется в своей транзакции: агрегаты и DROP
+    видны одновременно, запросы не могут посчитать одну запись дважды.
 
+    Returns:
+        int: сколько записей логов свёрнуто (-1 при ошибке)
+    """
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        hot_start = _practice_logs_hot_start()
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS system_state (
-                key TEXT PRIMARY KEY,
-                value TEXT NOT NULL
-            )
+            SELECT child.relname
+            FROM pg_inherits i
+            JOIN pg_class parent ON parent.oid = i.inhparent
+            JOIN pg_class child ON child.oid = i.inhrelid
+            WHERE parent.relname = 'practice_logs'
+            ORDER BY child.relname
         ''')
+        partitions = [row[0] for row in cursor.fetchall()]
+
+        rolled = 0
+        for name in partitions:
+            match = _PRACTICE_LOGS_PARTITION_RE.match(name)
+            if not match:
+                continue
+            month_start = date(int(match.group(1)), int(match.group(2)), 1)
+            if _add_months(month_start, 1) > hot_start:
+                continue
+            count = _rollup_practice_logs(
+                cursor,
+                f'SELECT user_id, day_number, completed_at, sent_day_msk, completed_day_msk FROM {name}',
+                (),
+            )
+            cursor.execute(f'ALTER TABLE practice_logs DETACH PARTITION {name}')
+            cursor.execute(f'DROP TABLE {name}')
+            conn.commit()
+            rolled += count
+            logger.info(f"Партиция {name} свёрнута в агрегаты ({count} записей) и удалена")
+
+        if PRACTICE_LOGS_DEFAULT_PARTITION in partitions:
+            count = _rollup_practice_logs(
+                cursor,
+                f'''
+                DELETE FROM {PRACTICE_LOGS_DEFAULT_PARTITION} WHERE sent_at < %s
+                RETURNING user_id, day_number, completed_at, sent_day_msk, completed_day_msk
+                ''',
+                (hot_start,),
+            )
+            conn.commit()
+            rolled += count
 
-        conn.commit()
         conn.close()
-        print("PostgreSQL база данных инициализирована успешно")
-        
+        return rolled
     except Exception as e:
-        print(f"Ошибка инициализации PostgreSQL базы данных: {e}")
-        conn = None
+        logger.error(f"Ошибка свёртки старых партиций practice_logs: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return -1
+
+def init_database():
+    """Приводит схему базы данных к последней версии (см. data/migrations).
+
+    Раньше вызывалась при каждом импорте data.db; теперь схему обновляет
+    `python -m data.migrate` или проверка версии при старте бота (app.main).
+    Оставлена для tools/ и тестовых скриптов, которым нужна готовая схема.
+
+    Returns:
+        list: применённые версии миграций
+    """
+    from data.migrations import migrate
+
+    return migrate()
 
 def save_user_time(user_id: int, chat_id: int, notify_time: str, user_name: str = None, user_nickname: str = None, reset_days: bool = True) -> bool:
     """Сохраняет или обновляет время уведомлений пользователя.
@@ -664,14 +403,14 @@ def save_user_time(user_id: int, chat_id: int, notify_time: str, user_name: str
         conn.close()
         
         if reset_days:
-            print(f"Время пользователя {user_id} сохранено: {notify_time} (счётчик практик обнулен)")
+            logger.info(f"Время пользователя {user_id} сохранено: {notify_time} (счётчик практик обнулен)")
         else:
-            print(f"Время пользователя {user_id} изменено на: {notify_time} (счётчик практик сохранен)")
+            logger.info(f"Время пользователя {user_id} изменено на: {notify_time} (счётчик практик сохранен)")
         
         return True
         
     except Exception as e:
-        print(f"Ошибка сохранения времени пользователя {user_id}: {e}")
+        logger.error(f"Ошибка сохранения времени пользователя {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -696,7 +435,7 @@ def save_user_practice_suggestion(user_id: int, video_url: str, comment: str = N
         # Проверяем, что пользователь существует
         cursor.execute('SELECT user_id FROM users WHERE user_id = %s', (user_id,))
         if not cursor.fetchone():
-            print(f"Пользователь {user_id} не найден")
+            logger.warning(f"Пользователь {user_id} не найден")
             return False
         
         # Добавляем новое предложение в таблицу user_suggestions
@@ -708,11 +447,11 @@ def save_user_practice_suggestion(user_id: int, video_url: str, comment: str = N
         
         conn.commit()
         conn.close()
-        print(f"Предложение практики от пользователя {user_id} сохранено: {video_url}")
+        logger.info(f"Предложение практики от пользователя {user_id} сохранено: {video_url}")
         return True
         
     except Exception as e:
-        print(f"Ошибка сохранения предложения практики от пользователя {user_id}: {e}")
+        logger.error(f"Ошибка сохранения предложения практики от пользователя {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -746,7 +485,7 @@ def get_user_suggestions(user_id: int, limit: int = 10) -> list:
         return results
         
     except Exception as e:
-        print(f"Ошибка получения предложений пользователя {user_id}: {e}")
+        logger.error(f"Ошибка получения предложений пользователя {user_id}: {e}")
         if conn:
             conn.close()
         return []
@@ -777,7 +516,7 @@ def get_all_user_suggestions(limit: int = 100) -> list:
         return results
         
     except Exception as e:
-        print(f"Ошибка получения всех предложений: {e}")
+        logger.error(f"Ошибка получения всех предложений: {e}")
         if conn:
             conn.close()
         return []
@@ -802,16 +541,16 @@ def increment_total_practices(user_id: int) -> bool:
         ''', (user_id,))
         
         if cursor.rowcount == 0:
-            print(f"Пользователь {user_id} не найден")
+            logger.warning(f"Пользователь {user_id} не найден")
             return False
         
         conn.commit()
         conn.close()
-        print(f"Счётчик отправленных практик пользователя {user_id} увеличен")
+        logger.debug("Счётчик отправленных практик пользователя %s увеличен", user_id)
         return True
         
     except Exception as e:
-        print(f"Ошибка увеличения счётчика отправленных практик пользователя {user_id}: {e}")
+        logger.error(f"Ошибка увеличения счётчика отправленных практик пользователя {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -845,7 +584,7 @@ def get_total_practices(user_id: int) -> int:
             return 0
             
     except Exception as e:
-        print(f"Ошибка получения счётчика отправленных практик пользователя {user_id}: {e}")
+        logger.error(f"Ошибка получения счётчика отправленных практик пользователя {user_id}: {e}")
         if conn:
             conn.close()
         return 0
@@ -870,16 +609,16 @@ def reset_total_practices(user_id: int) -> bool:
         ''', (user_id,))
         
         if cursor.rowcount == 0:
-            print(f"Пользователь {user_id} не найден")
+            logger.warning(f"Пользователь {user_id} не найден")
             return False
         
         conn.commit()
         conn.close()
-        print(f"Счётчик отправленных практик пользователя {user_id} сброшен к 0")
+        logger.debug("Счётчик отправленных практик пользователя %s сброшен к 0", user_id)
         return True
         
     except Exception as e:
-        print(f"Ошибка сброса счётчика отправленных практик пользователя {user_id}: {e}")
+        logger.error(f"Ошибка сброса счётчика отправленных практик пользователя {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -896,7 +635,7 @@ def get_program_position(user_id: int) -> int:
         conn.close()
         return row[0] if row is not None else 0
     except Exception as e:
-        print(f"Ошибка get_program_position для {user_id}: {e}")
+        logger.error(f"Ошибка get_program_position для {user_id}: {e}")
         if conn:
             conn.close()
         return 0
@@ -916,7 +655,7 @@ def increment_program_position(user_id: int) -> bool:
         conn.close()
         return ok
     except Exception as e:
-        print(f"Ошибка increment_program_position для {user_id}: {e}")
+        logger.error(f"Ошибка increment_program_position для {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -924,207 +663,1027 @@ def increment_program_position(user_id: int) -> bool:
 
 
 def set_last_practice_message_id(user_id: int, message_id: int) -> bool:
-    """Сохраняет message_id последнего сообщения с практикой (для снятия кнопки при следующей отправке)."""
+    """Сохраняет message_id последнего сообщения с практикой.
+
+    Предыдущее сообщение с кнопкой «✅ Я сделал!» ставится в keyboard_cleanup_queue: кнопку
+    снимет app/keyboard_cleanup.py, когда у бота будет свободный бюджет запросов, а не перед
+    отправкой новой практики в час пик.
+    """
+    conn = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
         cursor.execute('''
-            UPDATE users SET last_practice_message_id = %s, updated_at = CURRENT_TIMESTAMP WHERE user_id = %s
+            SELECT chat_id, last_practice_message_id, last_practice_message_at
+            FROM users WHERE user_id = %s
+            FOR UPDATE
+        ''', (user_id,))
+        previous = cursor.fetchone()
+        if not previous:
+            conn.rollback()
+            conn.close()
+            return False
+        chat_id, previous_message_id, previous_sent_at = previous
+        cursor.execute('''
+            UPDATE users
+            SET last_practice_message_id = %s,
+                last_practice_message_at = NOW(),
+                updated_at = CURRENT_TIMESTAMP
+            WHERE user_id = %s
         ''', (message_id, user_id))
         ok = cursor.rowcount > 0
+        if chat_id is not None and previous_message_id is not None and previous_message_id != message_id:
+            cursor.execute('''
+                INSERT INTO keyboard_cleanup_queue (chat_id, message_id, user_id, message_sent_at)
+                VALUES (%s, %s, %s, %s)
+                ON CONFLICT (chat_id, message_id) DO NOTHING
+            ''', (chat_id, previous_message_id, user_id, previous_sent_at))
         conn.commit()
         conn.close()
         return ok
     except Exception as e:
-        print(f"Ошибка set_last_practice_message_id для {user_id}: {e}")
+        logger.error(f"Ошибка set_last_practice_message_id для {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
         return False
 
 
-def get_last_practice_message_id(user_id: int):
-    """Возвращает message_id последнего сообщения с практикой или None."""
+def forget_practice_message(user_id: int, message_id: int) -> bool:
+    """Кнопку с сообщения уже сняли (пользователь нажал «Я сделал!») — не ставить его в очередь очистки."""
+    conn = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
-        cursor.execute('SELECT last_practice_message_id FROM users WHERE user_id = %s', (user_id,))
-        row = cursor.fetchone()
+        cursor.execute('''
+            UPDATE users SET last_practice_message_id = NULL
+            WHERE user_id = %s AND last_practice_message_id = %s
+        ''', (user_id, message_id))
+        ok = cursor.rowcount > 0
+        conn.commit()
         conn.close()
-        return row[0] if row and row[0] is not None else None
+        return ok
     except Exception as e:
-        print(f"Ошибка get_last_practice_message_id для {user_id}: {e}")
+        logger.error(f"Ошибка forget_practice_message для {user_id}: {e}")
         if conn:
+            conn.rollback()
             conn.close()
-        return None
+        return False
 
 
-def delete_user(user_id: int) -> bool:
-    """Удаляет пользователя из базы данных.
-    
-    Args:
-        user_id: ID пользователя
-        
+def claim_keyboard_cleanups(limit: int, max_age_hours: float) -> list:
+    """Забирает из очереди до limit сообщений, с которых нужно снять кнопку.
+
+    Строки удаляются сразу (снятие кнопки — косметика, повторять при ошибке не нужно).
+    Сообщения старше max_age_hours выбрасываются без запроса к Telegram: редактировать
+    их уже нельзя или бессмысленно. FOR UPDATE SKIP LOCKED — реплики не берут одно и то же.
+
     Returns:
-        bool: True если операция успешна, False в случае ошибки
+        list: [(chat_id, message_id), ...] от старых к новым
     """
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            DELETE FROM keyboard_cleanup_queue
+            WHERE COALESCE(message_sent_at, queued_at) < NOW() - make_interval(secs => %s)
+        ''', (max_age_hours * 3600,))
+        expired = cursor.rowcount
+        cursor.execute('''
+            DELETE FROM keyboard_cleanup_queue q
+            USING (
+                SELECT chat_id, message_id
+                FROM keyboard_cleanup_queue
+                ORDER BY queued_at
+                LIMIT %s
+                FOR UPDATE SKIP LOCKED
+            ) picked
+            WHERE q.chat_id = picked.chat_id AND q.message_id = picked.message_id
+            RETURNING q.chat_id, q.message_id, q.queued_at
+        ''', (limit,))
+        rows = sorted(cursor.fetchall(), key=lambda row: row[2])
+        conn.commit()
+        conn.close()
+        if expired:
+            logger.info(f"Очередь снятия кнопок: выброшено устаревших сообщений — {expired}")
+        return [(chat_id, message_id) for chat_id, message_id, _ in rows]
+    except Exception as e:
+        logger.error(f"Ошибка claim_keyboard_cleanups: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return []
+
+
+def get_keyboard_cleanup_queue_size() -> int:
+    """Сколько сообщений ждут снятия кнопки."""
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT COUNT(*) FROM keyboard_cleanup_queue')
+        count = cursor.fetchone()[0]
+        conn.close()
+        return count
+    except Exception as e:
+        logger.error(f"Ошибка get_keyboard_cleanup_queue_size: {e}")
+        if conn:
+            conn.close()
+        return 0
+
+
+def get_last_practice_message_id(user_id: int):
+    """Возвращает message_id последнего сообщения с практикой или None."""
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT last_practice_message_id FROM users WHERE user_id = %s', (user_id,))
+        row = cursor.fetchone()
+        conn.close()
+        return row[0] if row and row[0] is not None else None
+    except Exception as e:
+        logger.error(f"Ошибка get_last_practice_message_id для {user_id}: {e}")
+        if conn:
+            conn.close()
+        return None
+
+
+def delete_user(user_id: int) -> bool:
+    """Удаляет пользователя из базы данных.
+    
+    Args:
+        user_id: ID пользователя
+        
+    Returns:
+        bool: True если операция успешна, False в случае ошибки
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('DELETE FROM users WHERE user_id = %s', (user_id,))
+        
+        conn.commit()
+        conn.close()
+        logger.info(f"Пользователь {user_id} удален из базы данных")
+        return True
+        
+    except Exception as e:
+        logger.error(f"Ошибка удаления пользователя {user_id}: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return False
+
+def get_all_users() -> list:
+    """Получает список всех пользователей с их данными.
+    
+    Returns:
+        list: Список кортежей (user_id, chat_id, notify_time, user_name, user_nickname, total_practices)
+    """
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT user_id, chat_id, notify_time, user_name, user_nickname, total_practices
+            FROM users
+            ORDER BY user_id
+        ''')
+        
+        results = cursor.fetchall()
+        conn.close()
+        
+        return results
+        
+    except Exception as e:
+        logger.error(f"Ошибка получения списка пользователей: {e}")
+        if conn:
+            conn.close()
+        return []
+
+def get_users_by_time(notify_time: str) -> list:
+    """Получает список пользователей, которые должны получать уведомления в указанное время.
+    
+    Args:
+        notify_time: время в формате HH:MM
+        
+    Returns:
+        list: Список кортежей (user_id, chat_id)
+    """
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        
+        cursor.execute('''
+            SELECT user_id, chat_id 
+            FROM users 
+            WHERE notify_time = %s
+              AND COALESCE(is_blocked, FALSE) = FALSE
+              AND COALESCE(onboarding_required, FALSE) = FALSE
+              AND COALESCE(bot_mode, 'daily') IN ('daily', 'challenge')
+              AND COALESCE(daily_schedule_enabled, TRUE) = TRUE
+        ''', (notify_time,))
+        
+        results = cursor.fetchall()
+        conn.close()
+        
+        return results
+        
+    except Exception as e:
+        logger.error(f"Ошибка получения пользователей по времени {notify_time}: {e}")
+        if conn:
+            conn.close()
+        return []
+
+
+# Отдельной константой — её же проверяет tools/explain_practice_logs.py
+_PENDING_FOR_TODAY_SQL = '''
+    SELECT u.user_id, u.chat_id, u.notify_time
+    FROM users u
+    WHERE COALESCE(u.is_blocked, FALSE) = FALSE
+      AND COALESCE(u.is_paused, FALSE) = FALSE
+      AND COALESCE(u.onboarding_required, FALSE) = FALSE
+      AND COALESCE(u.bot_mode, 'daily') IN ('daily', 'challenge')
+      AND COALESCE(u.daily_schedule_enabled, TRUE) = TRUE
+      AND (
+          u.first_daily_send_date IS NULL
+          OR u.first_daily_send_date <= (NOW() AT TIME ZONE %s)::date
+      )
+      AND NOT EXISTS (
+          SELECT 1
+          FROM practice_logs pl
+          WHERE pl.user_id = u.user_id
+            AND pl.sent_day_msk = (NOW() AT TIME ZONE %s)::date
+            AND pl.sent_at >= %s
+            AND pl.day_number >= 1
+      )
+      AND u.notify_time <= %s
+      AND (
+          EXISTS (
+              SELECT 1
+              FROM practice_logs pl
+              WHERE pl.user_id = u.user_id
+                AND pl.day_number >= 1
+          )
+          OR EXISTS (
+              SELECT 1
+              FROM practice_user_totals t
+              WHERE t.user_id = u.user_id
+                AND t.scheduled_sent_cnt > 0
+          )
+          OR (u.updated_at AT TIME ZONE %s)::date
+              < (NOW() AT TIME ZONE %s)::date
+      )
+'''
+
+
+def get_users_pending_for_today(current_time: str) -> list:
+    """Возвращает пользователей, которым ещё не отправляли практику сегодня,
+    и чьё время уведомлений уже наступило.
+
+    Для тех, кто уже получал запланированные практики (day_number >= 1 в логах),
+    используется notify_time <= current_time — чтобы дослать при сбое в тот же день.
+
+    Первая рассылка после онбординга — не раньше users.first_daily_send_date (завтра).
+    Для пользователей без этой даты действует прежняя логика (досыл в тот же день при сбое).
+
+    «Сегодня» — календарный день в таймзоне бота (sent_day_msk, индекс по (user_id, sent_day_msk)).
+    Сегодняшние логи ищутся только в последних партициях (граница sent_at с запасом),
+    история рассылок — в горячих логах и в practice_user_totals для свёрнутых месяцев.
+
+    Args:
+        current_time: текущее время в формате HH:MM (в базовой таймзоне бота)
+
+    Returns:
+        list: Список кортежей (user_id, chat_id, notify_time)
+    """
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+
+        cursor.execute(
+            _PENDING_FOR_TODAY_SQL,
+            (
+                DEFAULT_TZ,
+                DEFAULT_TZ,
+                _practice_logs_recent_bound(),
+                current_time,
+                DEFAULT_TZ,
+                DEFAULT_TZ,
+            ),
+        )
+
+        results = cursor.fetchall()
+        conn.close()
+
+        return results
+
+    except Exception as e:
+        logger.error(f"Ошибка получения пользователей для сегодняшней отправки на {current_time}: {e}")
+        if conn:
+            conn.close()
+        return []
+
+
+# --- Аренда ежедневной доставки ---
+# Пользователь, которому пора отправить практику, «арендуется» воркером: в users пишутся
+# delivery_lease_until и delivery_lease_owner. Пока аренда не истекла, другие тики
+# планировщика и другие реплики бота его не выдают. Захват — одним UPDATE по строкам,
+# выбранным с FOR UPDATE SKIP LOCKED, поэтому параллельные воркеры получают непересекающиеся
+# пачки. Если воркер упал, аренда просто истекает и пользователь снова попадает в выдачу.
+DELIVERY_LEASE_SECONDS = 600
+DELIVERY_CLAIM_BATCH = 200
+# Владелец аренды: хост + pid процесса бота
+DELIVERY_WORKER_ID = f"{socket.gethostname()}:{os.getpid()}"
+
+_CLAIM_PENDING_FOR_TODAY_SQL = f'''
+    WITH due AS (
+        {_PENDING_FOR_TODAY_SQL}
+          AND (u.delivery_lease_until IS NULL OR u.delivery_lease_until < NOW())
+        ORDER BY u.notify_time, u.user_id
+        LIMIT %s
+        FOR UPDATE OF u SKIP LOCKED
+    )
+    UPDATE users u
+    SET delivery_lease_until = NOW() + make_interval(secs => %s),
+        delivery_lease_owner = %s
+    FROM due
+    WHERE u.user_id = due.user_id
+    RETURNING u.user_id, u.chat_id, u.notify_time
+'''
+
+
+def claim_users_pending_for_today(current_time: str, limit: int = DELIVERY_CLAIM_BATCH,
+                                  lease_seconds: int = DELIVERY_LEASE_SECONDS,
+                                  owner: str = DELIVERY_WORKER_ID) -> list:
+    """Захватывает пачку пользователей, которым пора отправить практику (см. get_users_pending_for_today).
+
+    Выдаются только пользователи без действующей аренды; выданным ставится аренда на
+    lease_seconds. Строки, которые прямо сейчас захватывает другой воркер, пропускаются.
+
+    Args:
+        current_time: текущее время в формате HH:MM (в базовой таймзоне бота)
+        limit: максимальный размер пачки
+        lease_seconds: длительность аренды, сек
+        owner: идентификатор воркера
+
+    Returns:
+        list: Список кортежей (user_id, chat_id, notify_time)
+    """
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            _CLAIM_PENDING_FOR_TODAY_SQL,
+            (
+                DEFAULT_TZ,
+                DEFAULT_TZ,
+                _practice_logs_recent_bound(),
+                current_time,
+                DEFAULT_TZ,
+                DEFAULT_TZ,
+                limit,
+                lease_seconds,
+                owner,
+            ),
+        )
+        results = sorted(cursor.fetchall(), key=lambda row: (row[2], row[0]))
+        conn.commit()
+        conn.close()
+        return results
+    except Exception as e:
+        logger.error(f"Ошибка захвата пользователей для отправки на {current_time}: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return []
+
+
+def release_delivery_leases(user_ids: list, owner: str = DELIVERY_WORKER_ID) -> int:
+    """Снимает аренду с пользователей (только свою — чужую, перехваченную после истечения, не трогаем).
+
+    Returns:
+        int: сколько аренд снято
+    """
+    if not user_ids:
+        return 0
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            '''
+            UPDATE users
+            SET delivery_lease_until = NULL, delivery_lease_owner = NULL
+            WHERE user_id = ANY(%s) AND delivery_lease_owner = %s
+            ''',
+            (list(user_ids), owner),
+        )
+        released = cursor.rowcount
+        conn.commit()
+        conn.close()
+        return released
+    except Exception as e:
+        logger.error(f"Ошибка снятия аренды доставки: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return 0
+
+
+# --- План рассылки на день ---
+# В 00:05 МСК build_daily_plan одним INSERT ... SELECT раскладывает, какую практику (и какие
+# бонусы) получит сегодня каждый пользователь с рассылкой: daily — по дню недели и
+# program_position, challenge — по порядку id от challenge_start_id и challenge_day (та же
+# логика, что в get_yoga_practice_by_weekday_order / get_yoga_practice_by_challenge_order).
+# В минуту рассылки get_planned_deliveries читает план пачки одним запросом.
+#
+# Строка плана хранит счётчик и старт челленджа, от которых она посчитана (basis_*). Если к
+# моменту отправки они изменились (сменили режим, досыл вчерашней практики после полуночи),
+# строка не выдаётся и практика считается «вживую», как раньше.
+DAILY_PLAN_KEEP_DAYS = 7
+
+_BUILD_DAILY_PLAN_SQL = '''
+    WITH ordered AS (
+        SELECT practices_id, weekday,
+               ROW_NUMBER() OVER (ORDER BY practices_id) - 1 AS pos,
+               ROW_NUMBER() OVER (PARTITION BY weekday ORDER BY practices_id) - 1 AS weekday_pos
+        FROM yoga_practices
+    ),
+    totals AS (
+        SELECT COUNT(*) AS total,
+               COUNT(*) FILTER (WHERE weekday = %(weekday)s) AS weekday_total
+        FROM yoga_practices
+    ),
+    candidates AS (
+        SELECT u.user_id, u.challenge_start_id,
+               COALESCE(u.program_position, 0) AS program_position,
+               COALESCE(u.challenge_day, 0) AS challenge_day
+        FROM users u
+        WHERE COALESCE(u.is_blocked, FALSE) = FALSE
+          AND COALESCE(u.is_paused, FALSE) = FALSE
+          AND COALESCE(u.onboarding_required, FALSE) = FALSE
+          AND COALESCE(u.bot_mode, 'daily') IN ('daily', 'challenge')
+          AND COALESCE(u.daily_schedule_enabled, TRUE) = TRUE
+          AND (u.first_daily_send_date IS NULL OR u.first_daily_send_date <= %(plan_date)s)
+          AND u.notify_time IS NOT NULL
+    ),
+    planned AS (
+        SELECT c.user_id, TRUE AS is_challenge, c.challenge_day + 1 AS day_number,
+               c.challenge_day AS basis_counter, c.challenge_start_id AS basis_start_id,
+               (
+                   SELECT o.practices_id
+                   FROM ordered o, totals t
+                   WHERE o.pos = (
+                       COALESCE((SELECT MIN(s.pos) FROM ordered s WHERE s.practices_id >= c.challenge_start_id), 0)
+                       + c.challenge_day
+                   ) %% NULLIF(t.total, 0)
+               ) AS practice_id
+        FROM candidates c
+        WHERE c.challenge_start_id IS NOT NULL
+        UNION ALL
+        SELECT c.user_id, FALSE, c.program_position + 1,
+               c.program_position, NULL,
+               (
+                   SELECT o.practices_id
+                   FROM ordered o, totals t
+                   WHERE o.weekday = %(weekday)s
+                     AND o.weekday_pos = (c.program_position / 7) %% NULLIF(t.weekday_total, 0)
+               )
+        FROM candidates c
+        WHERE c.challenge_start_id IS NULL
+    )
+    INSERT INTO daily_plan (plan_date, user_id, practice_id, is_challenge, day_number, title,
+                            bonus_ids, basis_counter, basis_start_id)
+    SELECT %(plan_date)s, p.user_id, p.practice_id, p.is_challenge, p.day_number,
+           CASE WHEN p.is_challenge THEN p.day_number || ' день челленджа' ELSE 'Практика дня' END,
+           ARRAY(
+               SELECT b.bonus_id FROM bonus_practices b
+               WHERE b.parent_practice_id = p.practice_id
+               ORDER BY b.bonus_id
+           ),
+           p.basis_counter, p.basis_start_id
+    FROM planned p
+    WHERE p.practice_id IS NOT NULL
+'''
+
+
+def build_daily_plan(plan_date: date) -> Optional[int]:
+    """Пересчитывает план рассылки на plan_date (старый план на эту дату заменяется).
+
+    Args:
+        plan_date: календарный день МСК
+
+    Returns:
+        int: сколько пользователей в плане, None при ошибке
+    """
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM daily_plan WHERE plan_date = %s', (plan_date,))
+        cursor.execute(
+            _BUILD_DAILY_PLAN_SQL,
+            {"plan_date": plan_date, "weekday": plan_date.isoweekday()},
+        )
+        planned = cursor.rowcount
+        cursor.execute(
+            'DELETE FROM daily_plan WHERE plan_date < %s',
+            (plan_date - timedelta(days=DAILY_PLAN_KEEP_DAYS),),
+        )
+        conn.commit()
+        conn.close()
+        return planned
+    except Exception as e:
+        logger.error(f"Ошибка построения плана рассылки на {plan_date}: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return None
+
+
+def get_planned_deliveries(user_ids: list, plan_date: date) -> dict:
+    """План на plan_date для пачки пользователей: строки практик и бонусов, без вычислений.
+
+    Выдаются только актуальные строки: режим, счётчик и старт челленджа пользователя
+    совпадают с теми, от которых строился план.
+
+    Returns:
+        dict: {user_id: {"practice": row, "is_challenge", "day_number", "title", "bonuses": [row]}}
+    """
+    if not user_ids:
+        return {}
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            f'''
+            SELECT dp.user_id, dp.is_challenge, dp.day_number, dp.title, dp.bonus_ids,
+                   {", ".join("p." + column for column in _PRACTICE_COLUMNS.split(", "))}
+            FROM daily_plan dp
+            JOIN users u ON u.user_id = dp.user_id
+            JOIN yoga_practices p ON p.practices_id = dp.practice_id
+            WHERE dp.plan_date = %s
+              AND dp.user_id = ANY(%s)
+              AND dp.is_challenge = (u.challenge_start_id IS NOT NULL)
+              AND dp.basis_start_id IS NOT DISTINCT FROM u.challenge_start_id
+              AND dp.basis_counter = CASE WHEN dp.is_challenge
+                                          THEN COALESCE(u.challenge_day, 0)
+                                          ELSE COALESCE(u.program_position, 0) END
+            ''',
+            (plan_date, list(user_ids)),
+        )
+        rows = cursor.fetchall()
+        bonus_ids = sorted({bonus_id for row in rows for bonus_id in (row[4] or [])})
+        bonuses = {}
+        if bonus_ids:
+            cursor.execute(
+                '''
+                SELECT bonus_id, parent_practice_id, title, video_url, time_practices,
+                       channel_name, description, my_description, intensity,
+                       created_at, updated_at
+                FROM bonus_practices
+                WHERE bonus_id = ANY(%s)
+                ''',
+                (bonus_ids,),
+            )
+            bonuses = {row[0]: _decode_bonus_practice_row(row) for row in cursor.fetchall()}
+        conn.close()
+        return {
+            row[0]: {
+                "practice": _decode_practice_row(row[5:]),
+                "is_challenge": row[1],
+                "day_number": row[2],
+                "title": row[3],
+                "bonuses": [bonuses[bonus_id] for bonus_id in (row[4] or []) if bonus_id in bonuses],
+            }
+            for row in rows
+        }
+    except Exception as e:
+        logger.error(f"Ошибка чтения плана рассылки на {plan_date}: {e}")
+        if conn:
+            conn.close()
+        return {}
+
+
+def get_daily_plan_summary(plan_date: date) -> Optional[dict]:
+    """Сводка плана для админа: объём по часам, режимы, популярные практики и проверки.
+
+    Returns:
+        dict: {"users", "challenge", "messages", "by_hour": [(час, пользователей)],
+               "top_practices": [(practices_id, title, пользователей)], "unplanned"}
+              или None при ошибке
+    """
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            '''
+            SELECT COUNT(*),
+                   COUNT(*) FILTER (WHERE is_challenge),
+                   COALESCE(SUM(1 + COALESCE(cardinality(bonus_ids), 0)), 0)
+            FROM daily_plan
+            WHERE plan_date = %s
+            ''',
+            (plan_date,),
+        )
+        users, challenge, messages = cursor.fetchone()
+        cursor.execute(
+            '''
+            SELECT split_part(u.notify_time, ':', 1) AS hour, COUNT(*)
+            FROM daily_plan dp
+            JOIN users u ON u.user_id = dp.user_id
+            WHERE dp.plan_date = %s
+            GROUP BY hour
+            ORDER BY hour
+            ''',
+            (plan_date,),
+        )
+        by_hour = cursor.fetchall()
+        cursor.execute(
+            '''
+            SELECT dp.practice_id, p.title, COUNT(*) AS cnt
+            FROM daily_plan dp
+            JOIN yoga_practices p ON p.practices_id = dp.practice_id
+            WHERE dp.plan_date = %s
+            GROUP BY dp.practice_id, p.title
+            ORDER BY cnt DESC, dp.practice_id
+            LIMIT 5
+            ''',
+            (plan_date,),
+        )
+        top_practices = cursor.fetchall()
+        # Проверка: пользователи с рассылкой, для которых практика не нашлась (пустой каталог дня и т.п.)
+        cursor.execute(
+            '''
+            SELECT COUNT(*)
+            FROM users u
+            WHERE COALESCE(u.is_blocked, FALSE) = FALSE
+              AND COALESCE(u.is_paused, FALSE) = FALSE
+              AND COALESCE(u.onboarding_required, FALSE) = FALSE
+              AND COALESCE(u.bot_mode, 'daily') IN ('daily', 'challenge')
+              AND COALESCE(u.daily_schedule_enabled, TRUE) = TRUE
+              AND (u.first_daily_send_date IS NULL OR u.first_daily_send_date <= %s)
+              AND u.notify_time IS NOT NULL
+              AND NOT EXISTS (
+                  SELECT 1 FROM daily_plan dp WHERE dp.plan_date = %s AND dp.user_id = u.user_id
+              )
+            ''',
+            (plan_date, plan_date),
+        )
+        unplanned = cursor.fetchone()[0]
+        conn.close()
+        return {
+            "users": users,
+            "challenge": challenge,
+            "messages": messages,
+            "by_hour": by_hour,
+            "top_practices": top_practices,
+            "unplanned": unplanned,
+        }
+    except Exception as e:
+        logger.error(f"Ошибка сводки плана рассылки на {plan_date}: {e}")
+        if conn:
+            conn.close()
+        return None
+
+
+# --- Outbox исходящих сообщений ---
+# Плановые сообщения (ежедневная практика, бонусы, рассылка админа) не отправляются напрямую:
+# строка outbox_messages пишется в той же транзакции, что и изменение состояния
+# (счётчики пользователя, practice_logs), а отправляют её воркеры app/outbox.py.
+# Падение между коммитом и отправкой не теряет сообщение, повторный enqueue не задваивает
+# его (уникальный idempotency_key).
+#
+# Статусы: pending → sending (арендована воркером до lease_until) → sent;
+# временная ошибка — снова pending с next_attempt_at; постоянная — failed;
+# исчерпаны попытки — dead. Сообщения одного чата уходят строго по порядку id.
+OUTBOX_LEASE_SECONDS = 120
+OUTBOX_ACTIVE_STATUSES = ("pending", "sending")
+
+
+def _insert_outbox_rows(cursor, rows: list) -> list:
+    """INSERT строк outbox: rows — [(idempotency_key, user_id, chat_id, kind, payload, meta)].
+
+    Конфликт по ключу — psycopg2.IntegrityError (вызывающий откатывает всю транзакцию).
+    """
+    ids = psycopg2.extras.execute_values(
+        cursor,
+        '''
+        INSERT INTO outbox_messages (idempotency_key, user_id, chat_id, kind, payload, meta)
+        VALUES %s
+        RETURNING id
+        ''',
+        [
+            (key, user_id, chat_id, kind, psycopg2.extras.Json(payload), psycopg2.extras.Json(meta or {}))
+            for key, user_id, chat_id, kind, payload, meta in rows
+        ],
+        fetch=True,
+    )
+    return [row[0] for row in ids]
+
+
+def enqueue_practice_delivery(user_id: int, chat_id: int, practice_id: int, is_challenge: bool,
+                              messages: list, notify_time: Optional[str] = None) -> Optional[dict]:
+    """Одной транзакцией: продвигает прогресс, логирует отправку и ставит сообщения в outbox.
+
+    Args:
+        user_id: ID пользователя
+        chat_id: ID чата
+        practice_id: ID основной практики
+        is_challenge: режим челленджа (двигаем challenge_day, иначе program_position)
+        messages: [(kind, payload)] — первым основная практика, дальше бонусы
+        notify_time: плановое время пользователя (для метрики опоздания)
+
+    Returns:
+        dict: {"outbox_ids", "log_id", "total_practices"} или None — уже поставлено сегодня / ошибка
+    """
+    today = clock.now(ZoneInfo(DEFAULT_TZ)).date().isoformat()
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        counter = "challenge_day" if is_challenge else "program_position"
+        cursor.execute(
+            f'''
+            UPDATE users
+            SET {counter} = COALESCE({counter}, 0) + 1,
+                total_practices = COALESCE(total_practices, 0) + 1,
+                updated_at = CURRENT_TIMESTAMP
+            WHERE user_id = %s
+            RETURNING total_practices
+            ''',
+            (user_id,),
+        )
+        row = cursor.fetchone()
+        if not row:
+            conn.rollback()
+            conn.close()
+            return None
+        total_practices = row[0]
+        cursor.execute(
+            '''
+            INSERT INTO practice_logs (user_id, practice_id, day_number)
+            VALUES (%s, %s, %s)
+            RETURNING log_id
+            ''',
+            (user_id, practice_id, total_practices),
+        )
+        log_id = cursor.fetchone()[0]
+
+        rows = []
+        for index, (kind, payload) in enumerate(messages):
+            key = f"practice:{user_id}:{today}" if index == 0 else f"practice:{user_id}:{today}:{index}"
+            # day — день рассылки: до его конца временные ошибки доставки повторяются (app/outbox.py)
+            meta = {"day": today}
+            if index == 0:
+                meta.update(practice_id=practice_id, log_id=log_id, notify_time=notify_time)
+            rows.append((key, user_id, chat_id, kind, payload, meta))
+        outbox_ids = _insert_outbox_rows(cursor, rows)
+        conn.commit()
+        conn.close()
+        return {"outbox_ids": outbox_ids, "log_id": log_id, "total_practices": total_practices}
+    except psycopg2.IntegrityError:
+        # Практика на сегодня уже в outbox — прогресс не трогаем
+        if conn:
+            conn.rollback()
+            conn.close()
+        logger.debug("Практика пользователю %s на %s уже поставлена в outbox", user_id, today)
+        return None
+    except Exception as e:
+        logger.error(f"Ошибка постановки практики в outbox для пользователя {user_id}: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return None
+
+
+def enqueue_broadcast(broadcast_batch_id: int, recipients: list, payload: dict, meta: dict) -> int:
+    """Ставит рассылку в outbox: по строке на получателя, ключ broadcast:<batch>:<user_id>.
+
+    Args:
+        broadcast_batch_id: номер партии рассылки
+        recipients: [(user_id, chat_id)]
+        payload: {"method": ..., "params": {...}} без chat_id
+        meta: данные для broadcast_messages (message_type, message_text, photo_file_id)
+
+    Returns:
+        int: сколько сообщений поставлено (0 при ошибке)
+    """
+    conn = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
-        
-        cursor.execute('DELETE FROM users WHERE user_id = %s', (user_id,))
-        
+        batch_meta = dict(meta, broadcast_batch_id=broadcast_batch_id)
+        ids = _insert_outbox_rows(cursor, [
+            (f"broadcast:{broadcast_batch_id}:{user_id}", user_id, chat_id, "broadcast", payload, batch_meta)
+            for user_id, chat_id in recipients
+        ])
         conn.commit()
         conn.close()
-        print(f"Пользователь {user_id} удален из базы данных")
-        return True
-        
+        return len(ids)
     except Exception as e:
-        print(f"Ошибка удаления пользователя {user_id}: {e}")
+        logger.error(f"Ошибка постановки рассылки {broadcast_batch_id} в outbox: {e}")
         if conn:
             conn.rollback()
             conn.close()
-        return False
+        return 0
+
+
+def claim_outbox_messages(limit: int, lease_seconds: int = OUTBOX_LEASE_SECONDS,
+                          owner: str = DELIVERY_WORKER_ID) -> list:
+    """Забирает готовые к отправке сообщения и арендует их (status = sending).
+
+    Берутся pending с наступившим next_attempt_at и sending с истёкшей арендой (воркер упал).
+    Сообщение выдаётся, только если в его чате нет более раннего неотправленного — порядок
+    сообщений в чате сохраняется при любом числе воркеров.
 
-def get_all_users() -> list:
-    """Получает список всех пользователей с их данными.
-    
     Returns:
-        list: Список кортежей (user_id, chat_id, notify_time, user_name, user_nickname, total_practices)
+        list: [(id, user_id, chat_id, kind, payload, meta, attempts)]
     """
+    conn = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT user_id, chat_id, notify_time, user_name, user_nickname, total_practices
-            FROM users
-            ORDER BY user_id
-        ''')
-        
-        results = cursor.fetchall()
+        cursor.execute(
+            '''
+            WITH due AS (
+                SELECT o.id
+                FROM outbox_messages o
+                WHERE o.status IN ('pending', 'sending')
+                  AND (
+                      (o.status = 'pending' AND o.next_attempt_at <= NOW())
+                      OR (o.status = 'sending' AND o.lease_until < NOW())
+                  )
+                  AND NOT EXISTS (
+                      SELECT 1
+                      FROM outbox_messages prev
+                      WHERE prev.chat_id = o.chat_id
+                        AND prev.id < o.id
+                        AND prev.status IN ('pending', 'sending')
+                  )
+                ORDER BY o.id
+                LIMIT %s
+                FOR UPDATE OF o SKIP LOCKED
+            )
+            UPDATE outbox_messages o
+            SET status = 'sending',
+                attempts = o.attempts + 1,
+                lease_until = NOW() + make_interval(secs => %s),
+                lease_owner = %s,
+                updated_at = NOW()
+            FROM due
+            WHERE o.id = due.id
+            RETURNING o.id, o.user_id, o.chat_id, o.kind, o.payload, o.meta, o.attempts
+            ''',
+            (limit, lease_seconds, owner),
+        )
+        rows = sorted(cursor.fetchall(), key=lambda row: row[0])
+        conn.commit()
         conn.close()
-        
-        return results
-        
+        return rows
     except Exception as e:
-        print(f"Ошибка получения списка пользователей: {e}")
+        logger.error(f"Ошибка выборки сообщений outbox: {e}")
         if conn:
+            conn.rollback()
             conn.close()
         return []
 
-def get_users_by_time(notify_time: str) -> list:
-    """Получает список пользователей, которые должны получать уведомления в указанное время.
-    
-    Args:
-        notify_time: время в формате HH:MM
-        
-    Returns:
-        list: Список кортежей (user_id, chat_id)
-    """
+
+def _update_outbox_message(message_id: int, sql_set: str, params: tuple, owner: str) -> bool:
     conn = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
-        
-        cursor.execute('''
-            SELECT user_id, chat_id 
-            FROM users 
-            WHERE notify_time = %s
-              AND COALESCE(is_blocked, FALSE) = FALSE
-              AND COALESCE(onboarding_required, FALSE) = FALSE
-              AND COALESCE(bot_mode, 'daily') IN ('daily', 'challenge')
-              AND COALESCE(daily_schedule_enabled, TRUE) = TRUE
-        ''', (notify_time,))
-        
-        results = cursor.fetchall()
+        # Только своя аренда: если нас опередил воркер, забравший строку после истечения, не перетираем
+        cursor.execute(
+            f'''
+            UPDATE outbox_messages
+            SET {sql_set}, lease_until = NULL, lease_owner = NULL, updated_at = NOW()
+            WHERE id = %s AND status = 'sending' AND lease_owner = %s
+            ''',
+            params + (message_id, owner),
+        )
+        ok = cursor.rowcount > 0
+        conn.commit()
         conn.close()
-        
-        return results
-        
+        return ok
     except Exception as e:
-        print(f"Ошибка получения пользователей по времени {notify_time}: {e}")
+        logger.error(f"Ошибка обновления сообщения outbox {message_id}: {e}")
         if conn:
+            conn.rollback()
             conn.close()
-        return []
+        return False
 
 
-def get_users_pending_for_today(current_time: str) -> list:
-    """Возвращает пользователей, которым ещё не отправляли практику сегодня,
-    и чьё время уведомлений уже наступило.
+def mark_outbox_sent(message_id: int, telegram_message_id: Optional[int], owner: str = DELIVERY_WORKER_ID) -> bool:
+    return _update_outbox_message(
+        message_id, "status = 'sent', sent_at = NOW(), telegram_message_id = %s, last_error = NULL",
+        (telegram_message_id,), owner,
+    )
 
-    Для тех, кто уже получал запланированные практики (day_number >= 1 в логах),
-    используется notify_time <= current_time — чтобы дослать при сбое в тот же день.
 
-    Первая рассылка после онбординга — не раньше users.first_daily_send_date (завтра).
-    Для пользователей без этой даты действует прежняя логика (досыл в тот же день при сбое).
+def mark_outbox_retry(message_id: int, error: str, delay_seconds: float, owner: str = DELIVERY_WORKER_ID) -> bool:
+    return _update_outbox_message(
+        message_id, "status = 'pending', next_attempt_at = NOW() + make_interval(secs => %s), last_error = %s",
+        (delay_seconds, error[:1000]), owner,
+    )
 
-    Args:
-        current_time: текущее время в формате HH:MM (в базовой таймзоне бота)
+
+def mark_outbox_failed(message_id: int, error: str, status: str = "failed", owner: str = DELIVERY_WORKER_ID) -> bool:
+    """Постоянная ошибка (failed) или исчерпаны попытки (dead)."""
+    return _update_outbox_message(
+        message_id, "status = %s, last_error = %s", (status, error[:1000]), owner,
+    )
+
+
+def get_broadcast_outbox_status(broadcast_batch_id: int) -> dict:
+    """Сколько сообщений рассылки broadcast_batch_id в каждом статусе outbox."""
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            '''
+            SELECT status, COUNT(*)
+            FROM outbox_messages
+            WHERE kind = 'broadcast' AND idempotency_key LIKE %s
+            GROUP BY status
+            ''',
+            (f"broadcast:{broadcast_batch_id}:%",),
+        )
+        counts = dict(cursor.fetchall())
+        conn.close()
+        return counts
+    except Exception as e:
+        logger.error(f"Ошибка статистики рассылки {broadcast_batch_id} в outbox: {e}")
+        if conn:
+            conn.close()
+        return {}
+
+
+def requeue_outbox_messages(statuses: tuple = ("dead",), since_days: int = 1) -> int:
+    """Возвращает в очередь недоставленные сообщения за последние since_days дней.
 
     Returns:
-        list: Список кортежей (user_id, chat_id)
+        int: сколько сообщений снова pending
     """
     conn = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
-
         cursor.execute(
             '''
-            SELECT u.user_id, u.chat_id
-            FROM users u
-            WHERE COALESCE(u.is_blocked, FALSE) = FALSE
-              AND COALESCE(u.is_paused, FALSE) = FALSE
-              AND COALESCE(u.onboarding_required, FALSE) = FALSE
-              AND COALESCE(u.bot_mode, 'daily') IN ('daily', 'challenge')
-              AND COALESCE(u.daily_schedule_enabled, TRUE) = TRUE
-              AND (
-                  u.first_daily_send_date IS NULL
-                  OR u.first_daily_send_date <= (NOW() AT TIME ZONE %s)::date
-              )
-              AND NOT EXISTS (
-                  SELECT 1
-                  FROM practice_logs pl
-                  WHERE pl.user_id = u.user_id
-                    AND pl.sent_at::date = (NOW() AT TIME ZONE %s)::date
-                    AND pl.day_number >= 1
-              )
-              AND (
-                  EXISTS (
-                      SELECT 1
-                      FROM practice_logs pl
-                      WHERE pl.user_id = u.user_id
-                        AND pl.day_number >= 1
-                        AND pl.sent_at::date < (NOW() AT TIME ZONE %s)::date
-                  )
-                  AND u.notify_time <= %s
-                  OR (
-                      NOT EXISTS (
-                          SELECT 1
-                          FROM practice_logs pl
-                          WHERE pl.user_id = u.user_id
-                            AND pl.day_number >= 1
-                      )
-                      AND u.notify_time <= %s
-                      AND (u.updated_at AT TIME ZONE %s)::date
-                          < (NOW() AT TIME ZONE %s)::date
-                  )
-              )
+            UPDATE outbox_messages
+            SET status = 'pending', attempts = 0, next_attempt_at = NOW(),
+                lease_until = NULL, lease_owner = NULL, updated_at = NOW()
+            WHERE status = ANY(%s)
+              AND created_at >= NOW() - make_interval(days => %s)
             ''',
-            (DEFAULT_TZ, DEFAULT_TZ, DEFAULT_TZ, current_time, current_time, DEFAULT_TZ, DEFAULT_TZ),
+            (list(statuses), since_days),
         )
-
-        results = cursor.fetchall()
+        count = cursor.rowcount
+        conn.commit()
         conn.close()
+        return count
+    except Exception as e:
+        logger.error(f"Ошибка возврата сообщений outbox в очередь: {e}")
+        if conn:
+            conn.rollback()
+            conn.close()
+        return 0
 
-        return results
 
+def get_outbox_status_counts(since_days: int = 1) -> dict:
+    """Сколько сообщений outbox в каждом статусе за последние since_days дней."""
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        cursor.execute(
+            '''
+            SELECT status, COUNT(*)
+            FROM outbox_messages
+            WHERE created_at >= NOW() - make_interval(days => %s)
+            GROUP BY status
+            ''',
+            (since_days,),
+        )
+        counts = dict(cursor.fetchall())
+        conn.close()
+        return counts
     except Exception as e:
-        print(f"Ошибка получения пользователей для сегодняшней отправки на {current_time}: {e}")
+        logger.error(f"Ошибка статистики outbox: {e}")
         if conn:
             conn.close()
-        return []
+        return {}
 
 
 def toggle_user_pause(user_id: int):
@@ -1187,7 +1746,7 @@ def toggle_user_pause(user_id: int):
         conn.close()
         return (True, True, had_challenge)
     except Exception as e:
-        print(f"Ошибка toggle_user_pause {user_id}: {e}")
+        logger.error(f"Ошибка toggle_user_pause {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -1220,7 +1779,7 @@ def get_users_for_pause_reminder() -> list:
         conn.close()
         return result
     except Exception as e:
-        print(f"Ошибка get_users_for_pause_reminder: {e}")
+        logger.error(f"Ошибка get_users_for_pause_reminder: {e}")
         if conn:
             conn.close()
         return []
@@ -1249,7 +1808,7 @@ def touch_by_mood_activity(user_id: int) -> bool:
         conn.close()
         return True
     except Exception as e:
-        print(f"Ошибка touch_by_mood_activity для {user_id}: {e}")
+        logger.error(f"Ошибка touch_by_mood_activity для {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -1283,7 +1842,7 @@ def get_users_for_by_mood_reminder() -> list:
         conn.close()
         return result
     except Exception as e:
-        print(f"Ошибка get_users_for_by_mood_reminder: {e}")
+        logger.error(f"Ошибка get_users_for_by_mood_reminder: {e}")
         if conn:
             conn.close()
         return []
@@ -1309,7 +1868,7 @@ def mark_by_mood_reminder_sent(user_id: int) -> bool:
         conn.close()
         return True
     except Exception as e:
-        print(f"Ошибка mark_by_mood_reminder_sent для {user_id}: {e}")
+        logger.error(f"Ошибка mark_by_mood_reminder_sent для {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -1336,7 +1895,7 @@ def mark_pause_reminder_sent(user_id: int) -> bool:
         conn.close()
         return True
     except Exception as e:
-        print(f"Ошибка mark_pause_reminder_sent для {user_id}: {e}")
+        logger.error(f"Ошибка mark_pause_reminder_sent для {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -1358,7 +1917,7 @@ def get_user_challenge_start_id(user_id: int):
         conn.close()
         return row[0] if row and row[0] is not None else None
     except Exception as e:
-        print(f"Ошибка получения challenge_start_id для {user_id}: {e}")
+        logger.error(f"Ошибка получения challenge_start_id для {user_id}: {e}")
         if conn:
             conn.close()
         return None
@@ -1378,7 +1937,7 @@ def get_user_challenge_day(user_id: int) -> int:
         conn.close()
         return int(row[0]) if row else 0
     except Exception as e:
-        print(f"Ошибка get_user_challenge_day {user_id}: {e}")
+        logger.error(f"Ошибка get_user_challenge_day {user_id}: {e}")
         if conn:
             conn.close()
         return 0
@@ -1404,7 +1963,7 @@ def increment_challenge_day(user_id: int) -> bool:
         conn.close()
         return ok
     except Exception as e:
-        print(f"Ошибка increment_challenge_day {user_id}: {e}")
+        logger.error(f"Ошибка increment_challenge_day {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -1450,7 +2009,7 @@ def start_user_challenge_setup(
         conn.close()
         return True
     except Exception as e:
-        print(f"Ошибка start_user_challenge_setup {user_id}: {e}")
+        logger.error(f"Ошибка start_user_challenge_setup {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -1497,10 +2056,10 @@ def complete_user_challenge_setup(
             return False
         conn.commit()
         conn.close()
-        print(f"Пользователь {user_id}: режим челленджа включен на {notify_time}")
+        logger.info(f"Пользователь {user_id}: режим челленджа включен на {notify_time}")
         return True
     except Exception as e:
-        print(f"Ошибка complete_user_challenge_setup {user_id}: {e}")
+        logger.error(f"Ошибка complete_user_challenge_setup {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -1532,10 +2091,10 @@ def set_user_challenge(user_id: int, challenge_start_id: int) -> bool:
             return False
         conn.commit()
         conn.close()
-        print(f"Пользователь {user_id}: режим челленджа с id={challenge_start_id}, день челленджа обнулён")
+        logger.info(f"Пользователь {user_id}: режим челленджа с id={challenge_start_id}, день челленджа обнулён")
         return True
     except Exception as e:
-        print(f"Ошибка set_user_challenge {user_id}: {e}")
+        logger.error(f"Ошибка set_user_challenge {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -1568,10 +2127,10 @@ def clear_user_challenge(user_id: int) -> bool:
         ''', (user_id,))
         conn.commit()
         conn.close()
-        print(f"Пользователь {user_id}: режим челленджа выключен")
+        logger.info(f"Пользователь {user_id}: режим челленджа выключен")
         return True
     except Exception as e:
-        print(f"Ошибка clear_user_challenge {user_id}: {e}")
+        logger.error(f"Ошибка clear_user_challenge {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -1594,10 +2153,10 @@ def set_user_blocked(user_id: int, is_blocked: bool) -> bool:
         )
         conn.commit()
         conn.close()
-        print(f"Пользователь {user_id}: is_blocked={is_blocked}")
+        logger.info(f"Пользователь {user_id}: is_blocked={is_blocked}")
         return True
     except Exception as e:
-        print(f"Ошибка set_user_blocked {user_id}: {e}")
+        logger.error(f"Ошибка set_user_blocked {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -1631,7 +2190,7 @@ def get_user_notify_time(user_id: int):
             return None
         return row[0]
     except Exception as e:
-        print(f"Ошибка get_user_notify_time {user_id}: {e}")
+        logger.error(f"Ошибка get_user_notify_time {user_id}: {e}")
         if conn:
             conn.close()
         return None
@@ -1651,7 +2210,7 @@ def is_user_onboarding_required(user_id: int) -> bool:
         conn.close()
         return bool(row[0]) if row else False
     except Exception as e:
-        print(f"Ошибка is_user_onboarding_required для {user_id}: {e}")
+        logger.error(f"Ошибка is_user_onboarding_required для {user_id}: {e}")
         if conn:
             conn.close()
         return False
@@ -1666,8 +2225,8 @@ def set_user_onboarding_required(
     """Создает/помечает пользователя как требующего выбора режима после /start.
 
     Сбрасывает зависящие от старого состояния поля: challenge_start_id, challenge_day, total_practices, program_position,
-    is_paused (с датами/шагом напоминаний о паузе), а также обнуляет отметки выполненных практик (completed_at)
-    для полного "старта с нуля".
+    is_paused (с датами/шагом напоминаний о паузе), а также обнуляет отметки выполненных практик (completed_at
+    и completed_cnt в агрегатах свёрнутых месяцев) для полного "старта с нуля".
     """
     conn = None
     try:
@@ -1721,11 +2280,14 @@ def set_user_onboarding_required(
             'UPDATE practice_logs SET completed_at = NULL WHERE user_id = %s',
             (user_id,)
         )
+        # Отметки из свёрнутых месяцев тоже обнуляем, как в reset_user_progress
+        cursor.execute('UPDATE practice_daily_rollups SET completed_cnt = 0 WHERE user_id = %s', (user_id,))
+        cursor.execute('UPDATE practice_user_totals SET completed_cnt = 0 WHERE user_id = %s', (user_id,))
         conn.commit()
         conn.close()
         return True
     except Exception as e:
-        print(f"Ошибка set_user_onboarding_required для {user_id}: {e}")
+        logger.error(f"Ошибка set_user_onboarding_required для {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -1750,7 +2312,7 @@ def get_user_bot_mode(user_id: int) -> str:
         conn.close()
         return row[0] if row else "pending"
     except Exception as e:
-        print(f"Ошибка get_user_bot_mode {user_id}: {e}")
+        logger.error(f"Ошибка get_user_bot_mode {user_id}: {e}")
         if conn:
             conn.close()
         return "pending"
@@ -1815,7 +2377,7 @@ def append_extra_practices_inline_message(user_id: int, chat_id: int, message_id
         conn.close()
         return True
     except Exception as e:
-        print(f"Ошибка append_extra_practices_inline_message {user_id}: {e}")
+        logger.error(f"Ошибка append_extra_practices_inline_message {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -1858,7 +2420,7 @@ def remove_extra_practices_inline_message(user_id: int, chat_id: int, message_id
         conn.close()
         return True
     except Exception as e:
-        print(f"Ошибка remove_extra_practices_inline_message {user_id}: {e}")
+        logger.error(f"Ошибка remove_extra_practices_inline_message {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -1895,7 +2457,7 @@ def take_and_clear_extra_practices_inline_messages(user_id: int) -> list:
         conn.close()
         return lst
     except Exception as e:
-        print(f"Ошибка take_and_clear_extra_practices_inline_messages {user_id}: {e}")
+        logger.error(f"Ошибка take_and_clear_extra_practices_inline_messages {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -1937,7 +2499,7 @@ def activate_user_by_mood(
         conn.close()
         return True
     except Exception as e:
-        print(f"Ошибка activate_user_by_mood {user_id}: {e}")
+        logger.error(f"Ошибка activate_user_by_mood {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -1967,7 +2529,7 @@ def set_user_daily_pending(user_id: int) -> bool:
         conn.close()
         return True
     except Exception as e:
-        print(f"Ошибка set_user_daily_pending {user_id}: {e}")
+        logger.error(f"Ошибка set_user_daily_pending {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -1984,7 +2546,7 @@ def clear_by_mood_seen_for_user(user_id: int) -> bool:
         conn.close()
         return True
     except Exception as e:
-        print(f"Ошибка clear_by_mood_seen_for_user {user_id}: {e}")
+        logger.error(f"Ошибка clear_by_mood_seen_for_user {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -2041,7 +2603,7 @@ def pick_random_by_mood_practice(
             row = _fetch()
         return row
     except Exception as e:
-        print(f"Ошибка pick_random_by_mood_practice {user_id} {filter_key}: {e}")
+        logger.error(f"Ошибка pick_random_by_mood_practice {user_id} {filter_key}: {e}")
         return None
 
 
@@ -2062,7 +2624,7 @@ def record_by_mood_seen(user_id: int, filter_key: str, practice_id: int) -> bool
         conn.close()
         return True
     except Exception as e:
-        print(f"Ошибка record_by_mood_seen {user_id}: {e}")
+        logger.error(f"Ошибка record_by_mood_seen {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -2105,6 +2667,7 @@ def add_yoga_practice(title: str, video_url: str, time_practices: int, channel_n
         ''', (title, video_url, time_practices, channel_name, description, my_description, intensity, weekday))
         
         conn.commit()
+        _invalidate_practice_order()
         return (True, f"Йога практика добавлена: {title}")
         
     except psycopg2.IntegrityError:
@@ -2143,7 +2706,7 @@ def get_yoga_practice_by_id(practice_id: int) -> tuple:
         return _decode_practice_row(result)
         
     except Exception as e:
-        print(f"Ошибка получения йога практики {practice_id}: {e}")
+        logger.error(f"Ошибка получения йога практики {practice_id}: {e}")
         if conn:
             conn.close()
         return None
@@ -2174,7 +2737,7 @@ def get_yoga_practice_by_url(video_url: str) -> tuple:
         return _decode_practice_row(result)
         
     except Exception as e:
-        print(f"Ошибка получения йога практики по URL {video_url}: {e}")
+        logger.error(f"Ошибка получения йога практики по URL {video_url}: {e}")
         if conn:
             conn.close()
         return None
@@ -2199,7 +2762,7 @@ def get_yoga_practice_by_video_id(video_id: str) -> tuple:
         return _decode_practice_row(result)
 
     except Exception as e:
-        print(f"Ошибка получения йога практики по video_id {video_id}: {e}")
+        logger.error(f"Ошибка получения йога практики по video_id {video_id}: {e}")
         if conn:
             conn.close()
         return None
@@ -2226,7 +2789,7 @@ def get_all_yoga_practices() -> list:
         return [_decode_practice_row(row) for row in results]
         
     except Exception as e:
-        print(f"Ошибка получения списка йога практик: {e}")
+        logger.error(f"Ошибка получения списка йога практик: {e}")
         if conn:
             conn.close()
         return []
@@ -2257,7 +2820,7 @@ def get_yoga_practices_by_channel(channel_name: str) -> list:
         return results
         
     except Exception as e:
-        print(f"Ошибка получения йога практик канала {channel_name}: {e}")
+        logger.error(f"Ошибка получения йога практик канала {channel_name}: {e}")
         if conn:
             conn.close()
         return []
@@ -2310,7 +2873,7 @@ def get_yoga_practices_by_duration(min_duration: int = None, max_duration: int =
         return results
         
     except Exception as e:
-        print(f"Ошибка получения йога практик по длительности: {e}")
+        logger.error(f"Ошибка получения йога практик по длительности: {e}")
         if conn:
             conn.close()
         return []
@@ -2341,7 +2904,7 @@ def get_yoga_practices_by_weekday(weekday: int) -> list:
         return results
         
     except Exception as e:
-        print(f"Ошибка получения йога практик для дня недели {weekday}: {e}")
+        logger.error(f"Ошибка получения йога практик для дня недели {weekday}: {e}")
         if conn:
             conn.close()
         return []
@@ -2374,7 +2937,7 @@ def get_random_yoga_practice_by_weekday(weekday: int) -> tuple:
         return result
         
     except Exception as e:
-        print(f"Ошибка получения случайной йога практики для дня недели {weekday}: {e}")
+        logger.error(f"Ошибка получения случайной йога практики для дня недели {weekday}: {e}")
         if conn:
             conn.close()
         return None
@@ -2406,7 +2969,7 @@ def search_yoga_practices(search_term: str) -> list:
         return results
         
     except Exception as e:
-        print(f"Ошибка поиска йога практик: {e}")
+        logger.error(f"Ошибка поиска йога практик: {e}")
         if conn:
             conn.close()
         return []
@@ -2468,7 +3031,7 @@ def update_yoga_practice(practice_id: int, title: str = None, video_url: str = N
             params.append(weekday)
         
         if not update_fields:
-            print("Не указаны поля для обновления")
+            logger.warning("Не указаны поля для обновления")
             return False
         
         update_fields.append('updated_at = CURRENT_TIMESTAMP')
@@ -2483,16 +3046,16 @@ def update_yoga_practice(practice_id: int, title: str = None, video_url: str = N
         cursor.execute(sql, params)
         
         if cursor.rowcount == 0:
-            print(f"Йога практика с ID {practice_id} не найдена")
+            logger.warning(f"Йога практика с ID {practice_id} не найдена")
             return False
         
         conn.commit()
         conn.close()
-        print(f"Йога практика {practice_id} обновлена")
+        logger.info(f"Йога практика {practice_id} обновлена")
         return True
         
     except Exception as e:
-        print(f"Ошибка обновления йога практики {practice_id}: {e}")
+        logger.error(f"Ошибка обновления йога практики {practice_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -2514,16 +3077,17 @@ def delete_yoga_practice(practice_id: int) -> bool:
         cursor.execute('DELETE FROM yoga_practices WHERE practices_id = %s', (practice_id,))
         
         if cursor.rowcount == 0:
-            print(f"Йога практика с ID {practice_id} не найдена")
+            logger.warning(f"Йога практика с ID {practice_id} не найдена")
             return False
         
         conn.commit()
         conn.close()
-        print(f"Йога практика {practice_id} удалена из базы данных")
+        _invalidate_practice_order()
+        logger.info(f"Йога практика {practice_id} удалена из базы данных")
         return True
         
     except Exception as e:
-        print(f"Ошибка удаления йога практики {practice_id}: {e}")
+        logger.error(f"Ошибка удаления йога практики {practice_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -2553,7 +3117,7 @@ def get_random_yoga_practice() -> tuple:
         return result
         
     except Exception as e:
-        print(f"Ошибка получения случайной йога практики: {e}")
+        logger.error(f"Ошибка получения случайной йога практики: {e}")
         if conn:
             conn.close()
         return None
@@ -2576,7 +3140,7 @@ def get_practice_count() -> int:
         return result[0] if result else 0
         
     except Exception as e:
-        print(f"Ошибка получения количества йога практик: {e}")
+        logger.error(f"Ошибка получения количества йога практик: {e}")
         if conn:
             conn.close()
         return 0
@@ -2613,7 +3177,7 @@ def get_yoga_practice_by_weekday_order(weekday: int, day_number: int) -> tuple:
         conn.close()
         
         if not practices:
-            print(f"Нет практик для дня недели {weekday}")
+            logger.warning(f"Нет практик для дня недели {weekday}")
             return None
         
         # Вычисляем номер недели пользователя (0, 1, 2, 3...)
@@ -2627,12 +3191,95 @@ def get_yoga_practice_by_weekday_order(weekday: int, day_number: int) -> tuple:
         return _decode_practice_row(practices[practice_index])
         
     except Exception as e:
-        print(f"Ошибка получения практики по порядку для дня недели {weekday}, день {day_number}: {e}")
+        logger.error(f"Ошибка получения практики по порядку для дня недели {weekday}, день {day_number}: {e}")
         if conn:
             conn.close()
         return None
 
 
+# --- Порядок практик для челленджа ---
+# День N челленджа — это N-я практика по возрастанию practices_id, начиная с challenge_start_id
+# (по кругу). Вместо загрузки всего каталога на каждого участника держим в памяти
+# упорядоченный кортеж id и индекс id → позиция; строка практики читается одна, по PK.
+# Кэш сверяется с таблицей по «отпечатку» (COUNT/MAX/суммы id) не чаще раза в
+# PRACTICE_ORDER_CHECK_SECONDS — так подхватываются и вставки/удаления в обход бота
+# (psql, test/add_practices.sh). Изменения через функции этого модуля сбрасывают кэш сразу.
+PRACTICE_ORDER_CHECK_SECONDS = 30
+
+_PRACTICE_COLUMNS = (
+    "practices_id, title, video_url, time_practices, channel_name, description, "
+    "my_description, intensity, weekday, created_at, updated_at"
+)
+
+# (ids, {id: позиция}, отпечаток, когда проверяли) — заменяется целиком, без частичных обновлений
+_practice_order = ((), {}, None, 0.0)
+
+
+def _invalidate_practice_order() -> None:
+    """Сбрасывает кэш порядка практик (после INSERT/DELETE в yoga_practices)."""
+    global _practice_order
+    _practice_order = ((), {}, None, 0.0)
+
+
+def _load_practice_order(cursor, force: bool = False) -> tuple:
+    """Возвращает (ids, positions) — упорядоченные id практик и индекс id → позиция."""
+    global _practice_order
+    ids, positions, fingerprint, checked_at = _practice_order
+    now = time.monotonic()
+    if not force and fingerprint is not None and now - checked_at < PRACTICE_ORDER_CHECK_SECONDS:
+        return ids, positions
+
+    cursor.execute('''
+        SELECT COUNT(*), COALESCE(MAX(practices_id), 0), COALESCE(SUM(practices_id::bigint), 0),
+               COALESCE(SUM(practices_id::bigint * practices_id), 0)
+        FROM yoga_practices
+    ''')
+    current = tuple(cursor.fetchone())
+    if force or current != fingerprint:
+        cursor.execute('SELECT practices_id FROM yoga_practices ORDER BY practices_id')
+        ids = tuple(row[0] for row in cursor.fetchall())
+        positions = {practice_id: index for index, practice_id in enumerate(ids)}
+    _practice_order = (ids, positions, current, now)
+    return ids, positions
+
+
+def _challenge_start_index(ids: tuple, positions: dict, challenge_start_id: int) -> int:
+    """Позиция первой практики с id >= challenge_start_id (0, если таких нет)."""
+    index = positions.get(challenge_start_id)
+    if index is None:
+        # Стартовую практику удалили — берём следующую по id, за концом — с начала
+        index = bisect.bisect_left(ids, challenge_start_id)
+        if index >= len(ids):
+            index = 0
+    return index
+
+
+def _resolve_challenge_days(cursor, challenge_start_id: int, from_day: int, to_day: int, force: bool = False) -> list:
+    """[(day, practices_id)] для дней from_day..to_day челленджа."""
+    ids, positions = _load_practice_order(cursor, force)
+    if not ids:
+        return []
+    start_index = _challenge_start_index(ids, positions, challenge_start_id)
+    return [(day, ids[(start_index + day - 1) % len(ids)]) for day in range(from_day, to_day + 1)]
+
+
+def _fetch_challenge_practices(cursor, challenge_start_id: int, from_day: int, to_day: int) -> list:
+    """[(day, row)] одним запросом по PK. Если практику удалили между сверкой кэша и чтением,
+    перечитываем порядок и пробуем ещё раз."""
+    for force in (False, True):
+        days = _resolve_challenge_days(cursor, challenge_start_id, from_day, to_day, force)
+        if not days:
+            return []
+        cursor.execute(
+            f'SELECT {_PRACTICE_COLUMNS} FROM yoga_practices WHERE practices_id = ANY(%s)',
+            (list({practice_id for _, practice_id in days}),),
+        )
+        rows = {row[0]: row for row in cursor.fetchall()}
+        if all(practice_id in rows for _, practice_id in days):
+            return [(day, _decode_practice_row(rows[practice_id])) for day, practice_id in days]
+    return [(day, _decode_practice_row(rows[practice_id])) for day, practice_id in days if practice_id in rows]
+
+
 def get_yoga_practice_by_challenge_order(challenge_start_id: int, day_number: int):
     """Возвращает практику для режима челленджа: все практики по возрастанию id, день N — N-я от старта, цикл с id=1 после конца.
     
@@ -2643,34 +3290,47 @@ def get_yoga_practice_by_challenge_order(challenge_start_id: int, day_number: in
     Returns:
         tuple: (practices_id, title, video_url, ...) или None
     """
+    conn = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT practices_id, title, video_url, time_practices, channel_name, description, my_description, intensity, weekday, created_at, updated_at
-            FROM yoga_practices
-            ORDER BY practices_id
-        ''')
-        practices = cursor.fetchall()
+        practices = _fetch_challenge_practices(cursor, challenge_start_id, day_number, day_number)
         conn.close()
-        if not practices:
-            return None
-        # Найти индекс первой практики с id >= challenge_start_id
-        start_index = 0
-        for i, row in enumerate(practices):
-            if row[0] >= challenge_start_id:
-                start_index = i
-                break
-        # День N → индекс (start_index + (N - 1)) % len(practices)
-        position = (start_index + (day_number - 1)) % len(practices)
-        return _decode_practice_row(practices[position])
+        return practices[0][1] if practices else None
     except Exception as e:
-        print(f"Ошибка get_yoga_practice_by_challenge_order({challenge_start_id}, {day_number}): {e}")
+        logger.error(f"Ошибка get_yoga_practice_by_challenge_order({challenge_start_id}, {day_number}): {e}")
         if conn:
             conn.close()
         return None
 
 
+def get_yoga_practices_by_challenge_range(challenge_start_id: int, from_day: int, to_day: int) -> list:
+    """Практики челленджа сразу для диапазона дней (например, на неделю) — один запрос к БД.
+    
+    Args:
+        challenge_start_id: id практики, с которой начинается челлендж
+        from_day: первый день диапазона (включительно)
+        to_day: последний день диапазона (включительно)
+        
+    Returns:
+        list: [(day_number, (practices_id, title, video_url, ...)), ...] по возрастанию дня
+    """
+    if to_day < from_day:
+        return []
+    conn = None
+    try:
+        conn = get_connection()
+        cursor = conn.cursor()
+        practices = _fetch_challenge_practices(cursor, challenge_start_id, from_day, to_day)
+        conn.close()
+        return practices
+    except Exception as e:
+        logger.error(f"Ошибка get_yoga_practices_by_challenge_range({challenge_start_id}, {from_day}, {to_day}): {e}")
+        if conn:
+            conn.close()
+        return []
+
+
 def get_practice_count_by_weekday(weekday: int) -> int:
     """Получает количество практик для определенного дня недели.
     
@@ -2696,7 +3356,7 @@ def get_practice_count_by_weekday(weekday: int) -> int:
         return result[0] if result else 0
         
     except Exception as e:
-        print(f"Ошибка получения количества практик для дня недели {weekday}: {e}")
+        logger.error(f"Ошибка получения количества практик для дня недели {weekday}: {e}")
         if conn:
             conn.close()
         return 0
@@ -2745,17 +3405,17 @@ def add_bonus_practice(parent_practice_id: int, title: str, video_url: str, time
         
         conn.commit()
         conn.close()
-        print(f"Бонусная практика добавлена к {parent_practice_id}: {title}")
+        logger.info(f"Бонусная практика добавлена к {parent_practice_id}: {title}")
         return True
         
     except psycopg2.IntegrityError:
-        print(f"Бонусное видео с URL {video_url} уже существует")
+        logger.warning(f"Бонусное видео с URL {video_url} уже существует")
         if conn:
             conn.rollback()
             conn.close()
         return False
     except Exception as e:
-        print(f"Ошибка добавления бонусной практики: {e}")
+        logger.error(f"Ошибка добавления бонусной практики: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -2790,7 +3450,7 @@ def get_bonus_practices_by_parent(parent_practice_id: int) -> list:
         return [_decode_bonus_practice_row(row) for row in results]
         
     except Exception as e:
-        print(f"Ошибка получения бонусных практик для {parent_practice_id}: {e}")
+        logger.error(f"Ошибка получения бонусных практик для {parent_practice_id}: {e}")
         if conn:
             conn.close()
         return []
@@ -2812,16 +3472,16 @@ def delete_bonus_practice(bonus_id: int) -> bool:
         cursor.execute('DELETE FROM bonus_practices WHERE bonus_id = %s', (bonus_id,))
         
         if cursor.rowcount == 0:
-            print(f"Бонусная практика {bonus_id} не найдена")
+            logger.warning(f"Бонусная практика {bonus_id} не найдена")
             return False
         
         conn.commit()
         conn.close()
-        print(f"Бонусная практика {bonus_id} удалена")
+        logger.info(f"Бонусная практика {bonus_id} удалена")
         return True
         
     except Exception as e:
-        print(f"Ошибка удаления бонусной практики {bonus_id}: {e}")
+        logger.error(f"Ошибка удаления бонусной практики {bonus_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -2840,7 +3500,7 @@ def get_bonus_practice_count() -> int:
         return result[0] if result else 0
         
     except Exception as e:
-        print(f"Ошибка получения количества бонусных практик: {e}")
+        logger.error(f"Ошибка получения количества бонусных практик: {e}")
         if conn:
             conn.close()
         return 0
@@ -2933,7 +3593,7 @@ def get_weekday_statistics() -> dict:
         return stats
         
     except Exception as e:
-        print(f"Ошибка получения статистики по дням недели: {e}")
+        logger.error(f"Ошибка получения статистики по дням недели: {e}")
         if conn:
             conn.close()
         return {}
@@ -2963,11 +3623,11 @@ def log_practice_sent(user_id: int, practice_id: int, day_number: int) -> Option
         conn.commit()
         conn.close()
         log_id = row[0] if row else None
-        print(f"Практика {practice_id} залогирована для пользователя {user_id}, день {day_number}, log_id={log_id}")
+        logger.debug("Практика %s залогирована для пользователя %s, день %s, log_id=%s", practice_id, user_id, day_number, log_id)
         return log_id
 
     except Exception as e:
-        print(f"Ошибка логирования практики {practice_id} для пользователя {user_id}: {e}")
+        logger.error(f"Ошибка логирования практики {practice_id} для пользователя {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -2995,7 +3655,7 @@ def is_user_eligible_for_done_reminder(user_id: int) -> bool:
             return False
         return not row[0] and not row[1] and not row[2]
     except Exception as e:
-        print(f"Ошибка is_user_eligible_for_done_reminder {user_id}: {e}")
+        logger.error(f"Ошибка is_user_eligible_for_done_reminder {user_id}: {e}")
         if conn:
             conn.close()
         return False
@@ -3019,7 +3679,7 @@ def dismiss_done_reminders(user_id: int) -> bool:
         conn.close()
         return True
     except Exception as e:
-        print(f"Ошибка dismiss_done_reminders {user_id}: {e}")
+        logger.error(f"Ошибка dismiss_done_reminders {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -3058,7 +3718,7 @@ def is_pending_practice_log(user_id: int, log_id: int) -> bool:
         conn.close()
         return latest is not None and latest[0] == log_id
     except Exception as e:
-        print(f"Ошибка is_pending_practice_log user={user_id} log={log_id}: {e}")
+        logger.error(f"Ошибка is_pending_practice_log user={user_id} log={log_id}: {e}")
         if conn:
             conn.close()
         return False
@@ -3093,7 +3753,7 @@ def get_user_practice_history(user_id: int, limit: int = 10) -> list:
         return results
         
     except Exception as e:
-        print(f"Ошибка получения истории практик пользователя {user_id}: {e}")
+        logger.error(f"Ошибка получения истории практик пользователя {user_id}: {e}")
         if conn:
             conn.close()
         return []
@@ -3123,23 +3783,19 @@ def get_practice_sent_count(practice_id: int) -> int:
         return result[0] if result else 0
         
     except Exception as e:
-        print(f"Ошибка получения количества отправок практики {practice_id}: {e}")
+        logger.error(f"Ошибка получения количества отправок практики {practice_id}: {e}")
         if conn:
             conn.close()
         return 0
 
 
-def _completed_at_to_moscow_date(completed_at: datetime) -> date:
-    """Переводит метку выполнения в календарную дату по таймзоне бота."""
-    tz = ZoneInfo(DEFAULT_TZ)
-    if completed_at.tzinfo is None:
-        completed_at = completed_at.replace(tzinfo=ZoneInfo("UTC"))
-    return completed_at.astimezone(tz).date()
-
-
-def _timestamp_moscow_date_sql(column: str) -> str:
-    """SQL-выражение: календарная дата TIMESTAMP (хранится как UTC) в таймзоне бота."""
-    return f"({column} AT TIME ZONE 'UTC' AT TIME ZONE %s)::date"
+_CASCADE_MARK_TODAY_SQL = '''
+    UPDATE practice_logs SET completed_at = CURRENT_TIMESTAMP
+    WHERE user_id = %s
+      AND completed_at IS NULL
+      AND day_number >= 1
+      AND sent_day_msk = %s
+'''
 
 
 def _cascade_challenge_logs_on_done(cursor, user_id: int, today_moscow: date) -> int:
@@ -3151,31 +3807,21 @@ def _cascade_challenge_logs_on_done(cursor, user_id: int, today_moscow: date) ->
     if get_user_bot_mode(user_id) != "challenge":
         return 0
 
-    sent_moscow = _timestamp_moscow_date_sql("sent_at")
     updated = 0
 
-    cursor.execute(
-        f'''
-        UPDATE practice_logs SET completed_at = CURRENT_TIMESTAMP
-        WHERE user_id = %s
-          AND completed_at IS NULL
-          AND day_number >= 1
-          AND {sent_moscow} = %s
-        ''',
-        (DEFAULT_TZ, user_id, today_moscow),
-    )
+    cursor.execute(_CASCADE_MARK_TODAY_SQL, (user_id, today_moscow))
     updated += cursor.rowcount
 
     cursor.execute(
-        f'''
+        '''
         SELECT EXISTS (
             SELECT 1 FROM practice_logs
             WHERE user_id = %s
               AND day_number >= 1
-              AND {sent_moscow} = %s
+              AND sent_day_msk = %s
         )
         ''',
-        (DEFAULT_TZ, user_id, today_moscow),
+        (user_id, today_moscow),
     )
     challenge_sent_today = bool(cursor.fetchone()[0])
 
@@ -3222,7 +3868,7 @@ def mark_practice_completed_today(user_id: int) -> bool:
         conn.close()
         return marked
     except Exception as e:
-        print(f"Ошибка mark_practice_completed_today для {user_id}: {e}")
+        logger.error(f"Ошибка mark_practice_completed_today для {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -3230,18 +3876,19 @@ def mark_practice_completed_today(user_id: int) -> bool:
 
 
 def get_completed_count(user_id: int) -> int:
-    """Количество практик, отмеченных как выполненные (completed_at IS NOT NULL)."""
+    """Количество практик, отмеченных как выполненные: горячие логи + свёрнутые месяцы."""
     try:
         conn = get_connection()
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT COUNT(*) FROM practice_logs WHERE user_id = %s AND completed_at IS NOT NULL
-        ''', (user_id,))
+            SELECT (SELECT COUNT(*) FROM practice_logs WHERE user_id = %s AND completed_at IS NOT NULL)
+                 + COALESCE((SELECT completed_cnt FROM practice_user_totals WHERE user_id = %s), 0)
+        ''', (user_id, user_id))
         row = cursor.fetchone()
         conn.close()
         return row[0] if row else 0
     except Exception as e:
-        print(f"Ошибка get_completed_count для {user_id}: {e}")
+        logger.error(f"Ошибка get_completed_count для {user_id}: {e}")
         if conn:
             conn.close()
         return 0
@@ -3259,16 +3906,22 @@ def get_streak_days(user_id: int) -> int:
         conn = get_connection()
         cursor = conn.cursor()
         cursor.execute('''
-            SELECT completed_at FROM practice_logs
+            SELECT DISTINCT completed_day_msk FROM practice_logs
             WHERE user_id = %s AND completed_at IS NOT NULL
         ''', (user_id,))
         rows = cursor.fetchall()
+        # Дни из свёрнутых месяцев: серия может начинаться раньше горячего окна
+        cursor.execute('''
+            SELECT day_msk FROM practice_daily_rollups
+            WHERE user_id = %s AND completed_cnt > 0
+        ''', (user_id,))
+        rollup_days = {row[0] for row in cursor.fetchall()}
         conn.close()
 
-        if not rows:
+        if not rows and not rollup_days:
             return 0
 
-        completion_days = {_completed_at_to_moscow_date(row[0]) for row in rows}
+        completion_days = {row[0] for row in rows} | rollup_days
         tz = ZoneInfo(DEFAULT_TZ)
         today = datetime.now(tz).date()
         yesterday = today - timedelta(days=1)
@@ -3309,9 +3962,9 @@ def get_similar_result_percent(user_id: int, bucket_size: int = 5, min_completed
         cursor = conn.cursor()
 
         cursor.execute('''
-            SELECT COUNT(*) FROM practice_logs
-            WHERE user_id = %s AND completed_at IS NOT NULL
-        ''', (user_id,))
+            SELECT (SELECT COUNT(*) FROM practice_logs WHERE user_id = %s AND completed_at IS NOT NULL)
+                 + COALESCE((SELECT completed_cnt FROM practice_user_totals WHERE user_id = %s), 0)
+        ''', (user_id, user_id))
         completed_row = cursor.fetchone()
         user_completed = int(completed_row[0]) if completed_row else 0
         if user_completed < min_completed:
@@ -3322,9 +3975,17 @@ def get_similar_result_percent(user_id: int, bucket_size: int = 5, min_completed
 
         cursor.execute('''
             WITH completed_by_user AS (
-                SELECT user_id, COUNT(*) AS completed_cnt
-                FROM practice_logs
-                WHERE completed_at IS NOT NULL
+                SELECT user_id, SUM(cnt) AS completed_cnt
+                FROM (
+                    SELECT user_id, COUNT(*) AS cnt
+                    FROM practice_logs
+                    WHERE completed_at IS NOT NULL
+                    GROUP BY user_id
+                    UNION ALL
+                    SELECT user_id, completed_cnt
+                    FROM practice_user_totals
+                    WHERE completed_cnt > 0
+                ) parts
                 GROUP BY user_id
             ),
             eligible AS (
@@ -3375,12 +4036,14 @@ def reset_user_progress(user_id: int) -> bool:
             conn.close()
             return False
         cursor.execute('UPDATE practice_logs SET completed_at = NULL WHERE user_id = %s', (user_id,))
+        cursor.execute('UPDATE practice_daily_rollups SET completed_cnt = 0 WHERE user_id = %s', (user_id,))
+        cursor.execute('UPDATE practice_user_totals SET completed_cnt = 0 WHERE user_id = %s', (user_id,))
         conn.commit()
         conn.close()
-        print(f"Прогресс пользователя {user_id} сброшен")
+        logger.info(f"Прогресс пользователя {user_id} сброшен")
         return True
     except Exception as e:
-        print(f"Ошибка reset_user_progress для {user_id}: {e}")
+        logger.error(f"Ошибка reset_user_progress для {user_id}: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -3413,12 +4076,13 @@ def clear_all_yoga_practices() -> bool:
         deleted_count = cursor.rowcount
         conn.commit()
         conn.close()
+        _invalidate_practice_order()
         
-        print(f"✅ Успешно удалено {deleted_count} практик из базы данных (было {count_before})")
+        logger.info(f"Успешно удалено {deleted_count} практик из базы данных (было {count_before})")
         return True
         
     except Exception as e:
-        print(f"❌ Ошибка очистки таблицы yoga_practices: {e}")
+        logger.error(f"❌ Ошибка очистки таблицы yoga_practices: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -3432,12 +4096,19 @@ def get_next_broadcast_batch_id() -> int:
     try:
         conn = get_connection()
         cursor = conn.cursor()
-        cursor.execute('SELECT COALESCE(MAX(broadcast_batch_id), 0) + 1 FROM broadcast_messages')
+        # Партия может ещё целиком лежать в outbox (broadcast_messages пишутся после отправки)
+        cursor.execute('''
+            SELECT GREATEST(
+                (SELECT COALESCE(MAX(broadcast_batch_id), 0) FROM broadcast_messages),
+                (SELECT COALESCE(MAX((meta->>'broadcast_batch_id')::int), 0)
+                 FROM outbox_messages WHERE kind = 'broadcast')
+            ) + 1
+        ''')
         batch_id = cursor.fetchone()[0]
         conn.close()
         return batch_id
     except Exception as e:
-        print(f"Ошибка получения следующего broadcast_batch_id: {e}")
+        logger.error(f"Ошибка получения следующего broadcast_batch_id: {e}")
         if conn:
             conn.close()
         return 1
@@ -3471,7 +4142,7 @@ def save_broadcast_message(broadcast_batch_id: int, user_id: int, chat_id: int,
         conn.close()
         return True
     except Exception as e:
-        print(f"Ошибка сохранения сообщения рассылки: {e}")
+        logger.error(f"Ошибка сохранения сообщения рассылки: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -3504,7 +4175,7 @@ def get_latest_broadcast_messages() -> list:
         conn.close()
         return results
     except Exception as e:
-        print(f"Ошибка получения последней рассылки: {e}")
+        logger.error(f"Ошибка получения последней рассылки: {e}")
         if conn:
             conn.close()
         return []
@@ -3531,7 +4202,7 @@ def get_latest_broadcast_meta() -> tuple:
             return (row[0], row[1], row[2])
         return (None, None, None)
     except Exception as e:
-        print(f"Ошибка получения мета последней рассылки: {e}")
+        logger.error(f"Ошибка получения мета последней рассылки: {e}")
         if conn:
             conn.close()
         return (None, None, None)
@@ -3556,10 +4227,10 @@ def delete_latest_broadcast() -> bool:
         deleted_count = cursor.rowcount
         conn.commit()
         conn.close()
-        print(f"Удалено {deleted_count} записей рассылки (batch_id={batch_id}) из БД")
+        logger.info(f"Удалено {deleted_count} записей рассылки (batch_id={batch_id}) из БД")
         return True
     except Exception as e:
-        print(f"Ошибка удаления последней рассылки из БД: {e}")
+        logger.error(f"Ошибка удаления последней рассылки из БД: {e}")
         if conn:
             conn.rollback()
             conn.close()
@@ -3571,24 +4242,134 @@ CHALLENGE_SUMMARY_STOPPED_KEY = "challenge_summary_stopped"
 CHALLENGE_WEEKLY_SCHEDULE_SENT_KEY = "challenge_weekly_schedule_last_sent_date"
 
 
-def _get_system_state(key: str) -> Optional[str]:
+# --- Кэш system_state ---
+#
+# system_state целиком держится в памяти: чтения флагов — обращение к словарю.
+# Запись идёт в БД и сразу в кэш (write-through), а в той же транзакции отправляется
+# NOTIFY system_state с новым значением. Фоновый поток (start_system_state_listener)
+# слушает канал и применяет чужие изменения — так несколько процессов бота видят одно и то же.
+#
+# Пока слушатель подключён, кэш считается актуальным бессрочно. Без слушателя (tools/,
+# обрыв соединения) кэш перечитывается, если ему больше SYSTEM_STATE_TTL_SECONDS.
+#
+# NOTIFY приходят в порядке коммитов, а write-through выполняется уже после коммита — к этому
+# моменту слушатель мог применить и нашу запись, и более новую из другой реплики. Поэтому в
+# payload есть метка записи (writer), и write-through пропускается, если слушатель свою запись
+# уже применил: кэш тогда не старее нашей записи.
+SYSTEM_STATE_CHANNEL = "system_state"
+SYSTEM_STATE_TTL_SECONDS = 60
+# Сколько ждать уведомлений за один select, сек (заодно — как быстро поток замечает остановку)
+SYSTEM_STATE_LISTEN_POLL_SECONDS = 5
+# Лимит payload у NOTIFY — 8000 байт; длинные значения передаём без value, слушатель перечитает ключ
+_SYSTEM_STATE_PAYLOAD_LIMIT = 7000
+# Keepalive'ы подключения слушателя: без них полуоткрытое соединение молчит вечно, а кэш
+# считается актуальным; с ними обрыв обнаруживается за ~10 секунд и поток переподключается
+_SYSTEM_STATE_KEEPALIVE_OPTIONS = {
+    "keepalives": 1,
+    "keepalives_idle": 5,
+    "keepalives_interval": 2,
+    "keepalives_count": 3,
+    "connect_timeout": 5,
+}
+
+_system_state_cache: dict = {}
+_system_state_loaded_at: Optional[float] = None
+_system_state_lock = threading.Lock()
+_system_state_listener: Optional[threading.Thread] = None
+_system_state_listener_stop = threading.Event()
+_system_state_listening = False
+# Метки наших записей: ждут write-through и уже применённые слушателем (write-through не нужен)
+_system_state_pending: set = set()
+_system_state_applied: set = set()
+_system_state_writes = 0
+
+
+def _system_state_fresh() -> bool:
+    if _system_state_loaded_at is None:
+        return False
+    return _system_state_listening or time.monotonic() - _system_state_loaded_at < SYSTEM_STATE_TTL_SECONDS
+
+
+def _load_system_state(cursor) -> dict:
+    """Перечитывает всю таблицу в кэш."""
+    global _system_state_cache, _system_state_loaded_at
+    cursor.execute("SELECT key, value FROM system_state")
+    state = dict(cursor.fetchall())
+    with _system_state_lock:
+        _system_state_cache = state
+        _system_state_loaded_at = time.monotonic()
+    return state
+
+
+def _cache_system_state(key: str, value: Optional[str], writer: Optional[str] = None) -> None:
+    """Записывает ключ в кэш; writer — метка записи из NOTIFY (применяет слушатель)."""
+    with _system_state_lock:
+        if value is None:
+            _system_state_cache.pop(key, None)
+        else:
+            _system_state_cache[key] = value
+        if writer in _system_state_pending:
+            _system_state_applied.add(writer)
+
+
+def _write_through_system_state(key: str, value: Optional[str], writer: str) -> None:
+    """Кэш после своей записи — если слушатель ещё не применил её (и, возможно, более новую)."""
+    with _system_state_lock:
+        _system_state_pending.discard(writer)
+        if writer in _system_state_applied:
+            _system_state_applied.discard(writer)
+            return
+        if value is None:
+            _system_state_cache.pop(key, None)
+        else:
+            _system_state_cache[key] = value
+
+
+def _notify_system_state(cursor, key: str, value: Optional[str]) -> str:
+    """NOTIFY об изменении ключа; уходит подписчикам только после COMMIT.
+
+    Returns:
+        str: метка записи (writer) для _write_through_system_state
+    """
+    global _system_state_writes
+    with _system_state_lock:
+        _system_state_writes += 1
+        writer = f"{DELIVERY_WORKER_ID}#{_system_state_writes}"
+        _system_state_pending.add(writer)
+    payload = json.dumps({"key": key, "value": value, "writer": writer}, ensure_ascii=False)
+    if len(payload.encode("utf-8")) > _SYSTEM_STATE_PAYLOAD_LIMIT:
+        payload = json.dumps({"key": key, "reload": True, "writer": writer}, ensure_ascii=False)
+    cursor.execute("SELECT pg_notify(%s, %s)", (SYSTEM_STATE_CHANNEL, payload))
+    return writer
+
+
+def load_system_state() -> bool:
+    """Загружает system_state в память (при старте и после обрыва слушателя)."""
     conn = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
-        cursor.execute("SELECT value FROM system_state WHERE key = %s", (key,))
-        row = cursor.fetchone()
+        _load_system_state(cursor)
         conn.close()
-        return row[0] if row else None
+        return True
     except Exception as e:
-        print(f"Ошибка чтения system_state {key}: {e}")
+        logger.error(f"Ошибка загрузки system_state: {e}")
         if conn:
             conn.close()
-        return None
+        return False
+
+
+def _get_system_state(key: str) -> Optional[str]:
+    if not _system_state_fresh():
+        load_system_state()
+    # Если БД недоступна, отдаём последнее известное значение
+    with _system_state_lock:
+        return _system_state_cache.get(key)
 
 
 def _set_system_state(key: str, value: str) -> bool:
     conn = None
+    writer = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
@@ -3600,11 +4381,16 @@ def _set_system_state(key: str, value: str) -> bool:
             ''',
             (key, value),
         )
+        writer = _notify_system_state(cursor, key, value)
         conn.commit()
         conn.close()
+        _write_through_system_state(key, value, writer)
         return True
     except Exception as e:
-        print(f"Ошибка записи system_state {key}: {e}")
+        logger.error(f"Ошибка записи system_state {key}: {e}")
+        if writer:
+            with _system_state_lock:
+                _system_state_pending.discard(writer)
         if conn:
             conn.rollback()
             conn.close()
@@ -3613,21 +4399,132 @@ def _set_system_state(key: str, value: str) -> bool:
 
 def _delete_system_state(key: str) -> bool:
     conn = None
+    writer = None
     try:
         conn = get_connection()
         cursor = conn.cursor()
         cursor.execute("DELETE FROM system_state WHERE key = %s", (key,))
+        writer = _notify_system_state(cursor, key, None)
         conn.commit()
         conn.close()
+        _write_through_system_state(key, None, writer)
         return True
     except Exception as e:
-        print(f"Ошибка удаления system_state {key}: {e}")
+        logger.error(f"Ошибка удаления system_state {key}: {e}")
+        if writer:
+            with _system_state_lock:
+                _system_state_pending.discard(writer)
         if conn:
             conn.rollback()
             conn.close()
         return False
 
 
+def _apply_system_state_notify(cursor, payload: str) -> None:
+    try:
+        message = json.loads(payload)
+        key = message["key"]
+    except (ValueError, KeyError, TypeError):
+        logger.warning("Непонятное уведомление system_state: %r", payload)
+        return
+    if message.get("reload"):
+        cursor.execute("SELECT value FROM system_state WHERE key = %s", (key,))
+        row = cursor.fetchone()
+        _cache_system_state(key, row[0] if row else None, message.get("writer"))
+    else:
+        _cache_system_state(key, message.get("value"), message.get("writer"))
+
+
+def _system_state_listen_loop() -> None:
+    """Поток-слушатель NOTIFY system_state; при обрыве переподключается с паузой до минуты."""
+    global _system_state_listening
+    backoff = 1
+    while not _system_state_listener_stop.is_set():
+        conn = None
+        try:
+            conn = get_connection(**_SYSTEM_STATE_KEEPALIVE_OPTIONS)
+            conn.autocommit = True
+            cursor = conn.cursor()
+            cursor.execute(f"LISTEN {SYSTEM_STATE_CHANNEL}")
+            # Подписались — перечитываем всё: изменения до LISTEN могли пройти мимо
+            _load_system_state(cursor)
+            _system_state_listening = True
+            backoff = 1
+            logger.info("Слушатель system_state подключён")
+            while not _system_state_listener_stop.is_set():
+                if select.select([conn], [], [], SYSTEM_STATE_LISTEN_POLL_SECONDS) == ([], [], []):
+                    continue
+                conn.poll()
+                while conn.notifies:
+                    _apply_system_state_notify(cursor, conn.notifies.pop(0).payload)
+        except Exception as e:
+            logger.warning("Слушатель system_state отключился: %s", e)
+        finally:
+            _system_state_listening = False
+            if conn:
+                try:
+                    conn.close()
+                except Exception:
+                    pass
+        if _system_state_listener_stop.wait(backoff):
+            break
+        backoff = min(backoff * 2, 60)
+
+
+def start_system_state_listener() -> None:
+    """Запускает фоновый поток, который держит кэш system_state в актуальном состоянии."""
+    global _system_state_listener
+    if _system_state_listener and _system_state_listener.is_alive():
+        return
+    _system_state_listener_stop.clear()
+    _system_state_listener = threading.Thread(
+        target=_system_state_listen_loop, name="system-state-listener", daemon=True
+    )
+    _system_state_listener.start()
+
+
+def stop_system_state_listener(timeout: float = SYSTEM_STATE_LISTEN_POLL_SECONDS + 1) -> None:
+    """Останавливает поток-слушатель (при завершении бота)."""
+    _system_state_listener_stop.set()
+    if _system_state_listener:
+        _system_state_listener.join(timeout)
+
+
+def get_state_value(key: str, default: Optional[str] = None) -> Optional[str]:
+    """Строковое значение ключа system_state (из памяти)."""
+    value = _get_system_state(key)
+    return default if value is None else value
+
+
+def get_state_bool(key: str, default: bool = False) -> bool:
+    """Флаг system_state: хранится как 'true'/'false'."""
+    value = _get_system_state(key)
+    return default if value is None else value == "true"
+
+
+def set_state_bool(key: str, value: bool) -> bool:
+    return _set_system_state(key, "true" if value else "false")
+
+
+def get_state_date(key: str) -> Optional[date]:
+    """Дата system_state в ISO-формате (None — ключа нет или значение битое)."""
+    value = _get_system_state(key)
+    if not value:
+        return None
+    try:
+        return date.fromisoformat(value)
+    except ValueError:
+        return None
+
+
+def set_state_date(key: str, value: date) -> bool:
+    return _set_system_state(key, value.isoformat())
+
+
+def delete_state(key: str) -> bool:
+    return _delete_system_state(key)
+
+
 def get_active_challenge_participants() -> list:
     """Активные участники челленджа: bot_mode=challenge, challenge_start_id задан, не на паузе."""
     conn = None
@@ -3650,7 +4547,7 @@ def get_active_challenge_participants() -> list:
         conn.close()
         return results
     except Exception as e:
-        print(f"Ошибка get_active_challenge_participants: {e}")
+        logger.error(f"Ошибка get_active_challenge_participants: {e}")
         if conn:
             conn.close()
         return []
@@ -3677,7 +4574,7 @@ def get_group_challenge_day() -> int:
         conn.close()
         return int(row[0]) if row else 0
     except Exception as e:
-        print(f"Ошибка get_group_challenge_day: {e}")
+        logger.error(f"Ошибка get_group_challenge_day: {e}")
         if conn:
             conn.close()
         return 0
@@ -3707,12 +4604,36 @@ def get_group_challenge_start_id() -> Optional[int]:
         conn.close()
         return int(row[0]) if row else None
     except Exception as e:
-        print(f"Ошибка get_group_challenge_start_id: {e}")
+        logger.error(f"Ошибка get_group_challenge_start_id: {e}")
         if conn:
             conn.close()
         return None
 
 
+_YESTERDAY_COMPLETED_CHALLENGE_SQL = '''
+    SELECT u.user_id
+    FROM users u
+    WHERE COALESCE(u.bot_mode, 'daily') = 'challenge'
+      AND u.challenge_start_id IS NOT NULL
+      AND COALESCE(u.is_paused, FALSE) = FALSE
+      AND COALESCE(u.is_blocked, FALSE) = FALSE
+      AND COALESCE(u.onboarding_required, FALSE) = FALSE
+      AND (
+          u.user_id IN (
+              SELECT pl.user_id FROM practice_logs pl
+              WHERE pl.completed_day_msk = %s
+          )
+          OR EXISTS (
+              SELECT 1 FROM practice_logs pl
+              WHERE pl.user_id = u.user_id
+                AND pl.sent_day_msk = %s
+                AND pl.day_number >= 1
+                AND pl.completed_at IS NOT NULL
+          )
+      )
+'''
+
+
 def get_yesterday_completed_challenge_user_ids(yesterday: date) -> set:
     """user_id участников челленджа, выполнивших вчерашнее задание (календарь МСК).
 
@@ -3722,34 +4643,15 @@ def get_yesterday_completed_challenge_user_ids(yesterday: date) -> set:
       пока сегодняшняя ещё не пришла).
     """
     conn = None
-    completed_moscow = _timestamp_moscow_date_sql("pl.completed_at")
-    sent_moscow = _timestamp_moscow_date_sql("pl.sent_at")
     try:
         conn = get_connection()
         cursor = conn.cursor()
-        cursor.execute(
-            f'''
-            SELECT DISTINCT u.user_id
-            FROM users u
-            INNER JOIN practice_logs pl ON pl.user_id = u.user_id
-            WHERE COALESCE(u.bot_mode, 'daily') = 'challenge'
-              AND u.challenge_start_id IS NOT NULL
-              AND COALESCE(u.is_paused, FALSE) = FALSE
-              AND COALESCE(u.is_blocked, FALSE) = FALSE
-              AND COALESCE(u.onboarding_required, FALSE) = FALSE
-              AND pl.completed_at IS NOT NULL
-              AND (
-                  {completed_moscow} = %s
-                  OR ({sent_moscow} = %s AND pl.day_number >= 1)
-              )
-            ''',
-            (DEFAULT_TZ, DEFAULT_TZ, yesterday, yesterday),
-        )
+        cursor.execute(_YESTERDAY_COMPLETED_CHALLENGE_SQL, (yesterday, yesterday))
         results = {row[0] for row in cursor.fetchall()}
         conn.close()
         return results
     except Exception as e:
-        print(f"Ошибка get_yesterday_completed_challenge_user_ids: {e}")
+        logger.error(f"Ошибка get_yesterday_completed_challenge_user_ids: {e}")
         if conn:
             conn.close()
         return set()
@@ -3760,21 +4662,20 @@ def get_challenge_completed_in_last_n_days(user_id: int, n: int) -> int:
 
     День засчитан, если отмечена практика из расписания или в тот же календарный день
     (МСК) нажали «Я сделал» на любой другой практике бота («Ещё практики» и т.д.).
+    Для дней, ушедших в свёрнутые месяцы, смотрим practice_daily_rollups.
     """
     if n <= 0:
         return 0
     conn = None
-    sent_moscow = _timestamp_moscow_date_sql("c.sent_at")
-    sub_completed_moscow = _timestamp_moscow_date_sql("sub.completed_at")
     try:
         conn = get_connection()
         cursor = conn.cursor()
         cursor.execute(
-            f'''
+            '''
             SELECT COUNT(*) FROM (
                 SELECT
                     c.completed_at,
-                    {sent_moscow} AS sent_day
+                    c.sent_day_msk AS sent_day
                 FROM practice_logs c
                 WHERE c.user_id = %s AND c.day_number >= 1
                 ORDER BY c.sent_at DESC
@@ -3785,51 +4686,59 @@ def get_challenge_completed_in_last_n_days(user_id: int, n: int) -> int:
                    SELECT 1
                    FROM practice_logs sub
                    WHERE sub.user_id = %s
-                     AND sub.completed_at IS NOT NULL
-                     AND {sub_completed_moscow} = recent.sent_day
+                     AND sub.completed_day_msk = recent.sent_day
+               )
+               OR EXISTS (
+                   SELECT 1
+                   FROM practice_daily_rollups r
+                   WHERE r.user_id = %s
+                     AND r.day_msk = recent.sent_day
+                     AND r.completed_cnt > 0
                )
             ''',
-            (DEFAULT_TZ, user_id, n, user_id, DEFAULT_TZ),
+            (user_id, n, user_id, user_id),
         )
         row = cursor.fetchone()
         conn.close()
         return int(row[0]) if row else 0
     except Exception as e:
-        print(f"Ошибка get_challenge_completed_in_last_n_days user={user_id}: {e}")
+        logger.error(f"Ошибка get_challenge_completed_in_last_n_days user={user_id}: {e}")
         if conn:
             conn.close()
         return 0
 
 
 def is_challenge_summary_sent_on(sent_date: date) -> bool:
-    stored = _get_system_state(CHALLENGE_SUMMARY_LAST_SENT_KEY)
-    return stored == sent_date.isoformat()
+    return get_state_date(CHALLENGE_SUMMARY_LAST_SENT_KEY) == sent_date
 
 
 def mark_challenge_summary_sent(sent_date: date) -> bool:
-    return _set_system_state(CHALLENGE_SUMMARY_LAST_SENT_KEY, sent_date.isoformat())
+    return set_state_date(CHALLENGE_SUMMARY_LAST_SENT_KEY, sent_date)
 
 
 def is_challenge_weekly_schedule_sent_on(sent_date: date) -> bool:
-    stored = _get_system_state(CHALLENGE_WEEKLY_SCHEDULE_SENT_KEY)
-    return stored == sent_date.isoformat()
+    return get_state_date(CHALLENGE_WEEKLY_SCHEDULE_SENT_KEY) == sent_date
 
 
 def mark_challenge_weekly_schedule_sent(sent_date: date) -> bool:
-    return _set_system_state(CHALLENGE_WEEKLY_SCHEDULE_SENT_KEY, sent_date.isoformat())
+    return set_state_date(CHALLENGE_WEEKLY_SCHEDULE_SENT_KEY, sent_date)
 
 
 def is_challenge_summary_stopped() -> bool:
-    return _get_system_state(CHALLENGE_SUMMARY_STOPPED_KEY) == "true"
+    return get_state_bool(CHALLENGE_SUMMARY_STOPPED_KEY)
 
 
 def mark_challenge_summary_stopped() -> bool:
-    return _set_system_state(CHALLENGE_SUMMARY_STOPPED_KEY, "true")
+    return set_state_bool(CHALLENGE_SUMMARY_STOPPED_KEY, True)
 
 
 def reset_challenge_summary_state() -> bool:
-    ok1 = _delete_system_state(CHALLENGE_SUMMARY_LAST_SENT_KEY)
-    ok2 = _delete_system_state(CHALLENGE_SUMMARY_STOPPED_KEY)
-    ok3 = _delete_system_state(CHALLENGE_WEEKLY_SCHEDULE_SENT_KEY)
+    ok1 = delete_state(CHALLENGE_SUMMARY_LAST_SENT_KEY)
+    ok2 = delete_state(CHALLENGE_SUMMARY_STOPPED_KEY)
+    ok3 = delete_state(CHALLENGE_WEEKLY_SCHEDULE_SENT_KEY)
     return ok1 and ok2 and ok3
 
+
+# Счётчики вызовов/запросов по каждой функции модуля (см. data/instrumentation.py).
+# Должно оставаться в самом конце файла — оборачиваются уже определённые функции.
+instrument_module(globals(), exclude=("get_connection",))
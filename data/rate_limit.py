@@ -0,0 +1,323 @@
+"""Общий для всех процессов лимит запросов к Bot API: token bucket в PostgreSQL.
+
+Telegram ограничивает отправку на токен бота (~30 сообщений/с), а не на процесс. Бот (все
+реплики) и разовые скрипты из tools/ с тем же токеном берут токены из одного ведра —
+строки telegram_rate_limits с ключом «id бота» (часть токена до двоеточия, не секрет).
+
+Справедливость между процессами: у каждого клиента своё под-ведро в telegram_rate_clients,
+которое пополняется со скоростью rate * weight / (сумма весов активных клиентов). Активный —
+обращался за токенами за последние CLIENT_IDLE_SECONDS. Один клиент получает всю скорость;
+бот (вес больше) и рассылка из tools/ делят её пропорционально весам, и скрипт не может
+выбрать бюджет пользовательского трафика.
+
+Обратная связь по 429: report_retry_after() останавливает выдачу токенов всем клиентам на
+retry_after и вдвое снижает скорость ведра (не ниже MIN_RATE). Без новых 429 скорость
+возвращается к max_rate на RATE_RECOVERY_PER_SECOND в секунду.
+
+Каждый процесс берёт до prefetch токенов за одно обращение к БД (одна короткая транзакция
+с FOR UPDATE строки ведра), неиспользованные сгорают через секунду. Если БД недоступна,
+лимитер не блокирует отправку, а ограничивает процесс локально своей скоростью. Так же ведёт
+себя лимитер, пока к БД не применена миграция v0006_rate_limits (`python -m data.migrate`).
+
+Модуль не импортирует app/ и data.db — его можно подключать из tools/ без инициализации бота.
+"""
+
+import asyncio
+import logging
+import os
+import socket
+import threading
+import time
+from typing import Callable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Клиент, не бравший токены дольше, не учитывается при делении скорости
+CLIENT_IDLE_SECONDS = 10.0
+# Нижняя граница скорости после 429, сообщений в секунду
+MIN_RATE = 1.0
+# Восстановление скорости после последнего 429, сообщений/с за секунду
+RATE_RECOVERY_PER_SECOND = 0.2
+# Восстановление начинается не раньше, чем через столько секунд после 429
+RATE_RECOVERY_DELAY_SECONDS = 30.0
+# Через сколько секунд сгорают взятые впрок токены
+PREFETCH_TTL_SECONDS = 1.0
+# Пауза перед повторным подключением к БД после ошибки
+RECONNECT_DELAY_SECONDS = 5.0
+# Клиенты — это процессы (хост:pid): после перезапусков остаются строки, удаляем их через сутки
+STALE_CLIENT_INTERVAL = "1 day"
+
+
+def bucket_for_token(token: str) -> str:
+    """Ключ ведра для токена бота: id бота (часть до двоеточия), сам токен в БД не пишем."""
+    return "bot:" + (token or "").split(":", 1)[0]
+
+
+def default_client_id(name: str = "") -> str:
+    """Имя клиента по умолчанию: хост:pid (плюс метка, например имя скрипта)."""
+    client_id = f"{socket.gethostname()}:{os.getpid()}"
+    return f"{name}@{client_id}" if name else client_id
+
+
+def parse_retry_after(body) -> Optional[float]:
+    """retry_after из JSON-ответа Bot API с 429 (None, если его нет)."""
+    if not isinstance(body, dict):
+        return None
+    retry_after = (body.get("parameters") or {}).get("retry_after")
+    try:
+        return float(retry_after) if retry_after is not None else None
+    except (TypeError, ValueError):
+        return None
+
+
+def prune_rate_limit_clients(conn) -> None:
+    """Удаляет давно неактивных клиентов (таблицы создаёт миграция v0006_rate_limits)."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            "DELETE FROM telegram_rate_clients WHERE updated_at < NOW() - %s::interval",
+            (STALE_CLIENT_INTERVAL,),
+        )
+    conn.commit()
+
+
+def take_tokens(conn, bucket: str, client_id: str, want: int, max_rate: float, burst: float,
+                weight: float = 1.0) -> tuple:
+    """Берёт до want токенов из общего ведра и под-ведра клиента (одна транзакция).
+
+    Args:
+        conn: подключение psycopg2 (транзакция коммитится здесь)
+        bucket: ключ ведра (bucket_for_token)
+        client_id: имя процесса
+        want: сколько токенов нужно
+        max_rate: предельная скорость ведра, сообщений/с (задаёт вызывающий)
+        burst: ёмкость ведра
+        weight: вес клиента при делении скорости
+
+    Returns:
+        tuple: (сколько выдано, сколько секунд подождать, если выдано 0)
+    """
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            INSERT INTO telegram_rate_limits (bucket, tokens, rate, max_rate, burst)
+            VALUES (%s, %s, %s, %s, %s)
+            ON CONFLICT (bucket) DO NOTHING
+            """,
+            (bucket, burst, max_rate, max_rate, burst),
+        )
+        cursor.execute(
+            """
+            INSERT INTO telegram_rate_clients (bucket, client_id, weight)
+            VALUES (%s, %s, %s)
+            ON CONFLICT (bucket, client_id) DO UPDATE SET weight = EXCLUDED.weight
+            """,
+            (bucket, client_id, weight),
+        )
+        # Строка ведра — точка сериализации всех клиентов
+        cursor.execute(
+            """
+            SELECT tokens, rate, blocked_until, last_throttled_at, updated_at, NOW()
+            FROM telegram_rate_limits
+            WHERE bucket = %s
+            FOR UPDATE
+            """,
+            (bucket,),
+        )
+        tokens, rate, blocked_until, last_throttled_at, updated_at, now = cursor.fetchone()
+        cursor.execute(
+            """
+            SELECT client_id, weight, tokens, updated_at
+            FROM telegram_rate_clients
+            WHERE bucket = %s
+              AND (client_id = %s OR updated_at > NOW() - make_interval(secs => %s))
+            """,
+            (bucket, client_id, CLIENT_IDLE_SECONDS),
+        )
+        clients = cursor.fetchall()
+
+        elapsed = max(0.0, (now - updated_at).total_seconds())
+        if last_throttled_at is None or (now - last_throttled_at).total_seconds() > RATE_RECOVERY_DELAY_SECONDS:
+            rate = min(max_rate, rate + elapsed * RATE_RECOVERY_PER_SECOND)
+        rate = max(MIN_RATE, min(rate, max_rate))
+        tokens = min(burst, tokens + elapsed * rate)
+
+        total_weight = sum(row[1] for row in clients) or weight
+        own = next(row for row in clients if row[0] == client_id)
+        share = own[1] / total_weight
+        client_rate = rate * share
+        client_burst = max(1.0, burst * share)
+        client_elapsed = max(0.0, (now - own[3]).total_seconds())
+        client_tokens = min(client_burst, own[2] + client_elapsed * client_rate)
+
+        granted, wait = 0, 0.0
+        if blocked_until is not None and blocked_until > now:
+            wait = (blocked_until - now).total_seconds()
+        else:
+            granted = int(min(want, tokens, client_tokens))
+            if granted <= 0:
+                granted = 0
+                wait = max((1 - tokens) / rate, (1 - client_tokens) / client_rate, 0.0)
+        tokens -= granted
+        client_tokens -= granted
+
+        cursor.execute(
+            """
+            UPDATE telegram_rate_limits
+            SET tokens = %s, rate = %s, max_rate = %s, burst = %s, updated_at = %s
+            WHERE bucket = %s
+            """,
+            (tokens, rate, max_rate, burst, now, bucket),
+        )
+        cursor.execute(
+            """
+            UPDATE telegram_rate_clients
+            SET tokens = %s, updated_at = %s
+            WHERE bucket = %s AND client_id = %s
+            """,
+            (client_tokens, now, bucket, client_id),
+        )
+    conn.commit()
+    return granted, wait
+
+
+def record_throttled(conn, bucket: str, retry_after: float) -> None:
+    """Отмечает 429: пауза для всех клиентов ведра и снижение скорости вдвое."""
+    with conn.cursor() as cursor:
+        cursor.execute(
+            """
+            UPDATE telegram_rate_limits
+            SET tokens = 0,
+                rate = GREATEST(%s, rate / 2),
+                blocked_until = GREATEST(COALESCE(blocked_until, NOW()), NOW() + make_interval(secs => %s)),
+                last_throttled_at = NOW(),
+                throttled_count = throttled_count + 1,
+                updated_at = NOW()
+            WHERE bucket = %s
+            """,
+            (MIN_RATE, float(retry_after), bucket),
+        )
+    conn.commit()
+
+
+class SharedRateLimiter:
+    """Клиент общего ведра для одного процесса; потокобезопасен.
+
+    Args:
+        connect: функция без аргументов, возвращающая подключение psycopg2
+        bucket: ключ ведра (bucket_for_token)
+        rate: предельная скорость, сообщений/с
+        burst: ёмкость ведра
+        weight: вес процесса при делении скорости (бот — больше, скрипты — 1)
+        client_id: имя процесса (по умолчанию хост:pid)
+        prefetch: сколько токенов брать за одно обращение к БД
+    """
+
+    def __init__(self, connect: Callable, bucket: str, rate: float = 25.0, burst: float = 25.0,
+                 weight: float = 1.0, client_id: Optional[str] = None, prefetch: int = 5):
+        self.connect = connect
+        self.bucket = bucket
+        self.rate = rate
+        self.burst = burst
+        self.weight = weight
+        self.client_id = client_id or default_client_id()
+        self.prefetch = max(1, prefetch)
+        self._allowance = 0
+        self._allowance_expires = 0.0
+        self._conn = None
+        self._pruned = False
+        self._retry_connect_at = 0.0
+        self._local_next = 0.0
+        self._lock = threading.Lock()
+
+    def _connection(self):
+        if self._conn is None or self._conn.closed:
+            self._conn = self.connect()
+            if not self._pruned:
+                prune_rate_limit_clients(self._conn)
+                self._pruned = True
+        return self._conn
+
+    def _drop_connection(self, error: Exception) -> None:
+        logger.warning("Общий лимит Bot API недоступен, ограничиваем процесс локально: %s", error)
+        if self._conn is not None:
+            try:
+                self._conn.close()
+            except Exception:
+                pass
+        self._conn = None
+        self._retry_connect_at = time.monotonic() + RECONNECT_DELAY_SECONDS
+
+    def _local_wait(self) -> float:
+        """Запасной режим без БД: не чаще rate в секунду в этом процессе."""
+        now = time.monotonic()
+        if now < self._local_next:
+            return self._local_next - now
+        self._local_next = now + 1.0 / self.rate
+        return 0.0
+
+    def try_acquire(self) -> float:
+        """Пытается взять один токен.
+
+        Returns:
+            float: 0 — токен получен, иначе через сколько секунд попробовать снова
+        """
+        with self._lock:
+            now = time.monotonic()
+            if self._allowance > 0 and now < self._allowance_expires:
+                self._allowance -= 1
+                return 0.0
+            self._allowance = 0
+            if now < self._retry_connect_at:
+                return self._local_wait()
+            try:
+                granted, wait = take_tokens(
+                    self._connection(), self.bucket, self.client_id, self.prefetch,
+                    self.rate, self.burst, self.weight,
+                )
+            except Exception as e:
+                self._drop_connection(e)
+                return self._local_wait()
+            if granted:
+                self._allowance = granted - 1
+                self._allowance_expires = time.monotonic() + PREFETCH_TTL_SECONDS
+                return 0.0
+            return max(wait, 0.005)
+
+    def acquire(self) -> float:
+        """Ждёт токен (блокирующий вызов). Возвращает время ожидания, сек."""
+        started = time.monotonic()
+        while True:
+            wait = self.try_acquire()
+            if wait == 0:
+                return time.monotonic() - started
+            time.sleep(wait)
+
+    async def acquire_async(self) -> float:
+        """Как acquire, но не блокирует event loop: БД — в потоке, ожидание — asyncio.sleep."""
+        started = time.monotonic()
+        while True:
+            wait = await asyncio.to_thread(self.try_acquire)
+            if wait == 0:
+                return time.monotonic() - started
+            await asyncio.sleep(wait)
+
+    def report_retry_after(self, retry_after: float) -> None:
+        """Сообщает о 429 от Telegram: пауза и снижение скорости для всех процессов ведра."""
+        with self._lock:
+            self._allowance = 0
+            try:
+                record_throttled(self._connection(), self.bucket, retry_after)
+            except Exception as e:
+                self._drop_connection(e)
+            # В любом случае локально не отправляем до конца паузы
+            self._local_next = max(self._local_next, time.monotonic() + retry_after)
+            logger.warning("Telegram вернул 429 (retry_after=%s), общий лимит снижен", retry_after)
+
+    def close(self) -> None:
+        with self._lock:
+            if self._conn is not None:
+                try:
+                    self._conn.close()
+                except Exception:
+                    pass
+            self._conn = None
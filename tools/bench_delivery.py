@@ -0,0 +1,450 @@
+"""Бенчмарк ежедневной рассылки на локальном Postgres и фейковом Bot API.
+
+Что делает:
+  1) готовит отдельную БД бенчмарка: миграции (init_database) + синтетические пользователи, практики,
+     бонусы и история practice_logs (старые месяцы сворачиваются, как в проде);
+  2) гоняет реальные функции бота:
+       delivery — send_daily_practice (все пользователи «в очереди» на сегодня);
+       done     — handle_practice_done_callback для части пользователей;
+       by_mood  — pick_random_by_mood_practice (фильтр «Хард»);
+  3) печатает throughput, p50/p99 и сколько SQL-запросов, подключений к БД
+     и запросов к Telegram приходится на одну операцию (счётчики БД — data/instrumentation.py).
+
+Telegram подменяется tools/fake_telegram.py (задержка --tg-latency/--tg-jitter),
+к БД ходим по-настоящему — именно её стоимость и интересна перед пиком в 08:00.
+
+БД бенчмарка задаётся BENCH_DATABASE_URL (или --dsn) и ПОЛНОСТЬЮ перезаписывается,
+поэтому в имени базы должно быть «bench» (иначе нужен --force). Прод-настройки из .env
+не используются.
+
+Примеры:
+  createdb yoga_bench
+  BENCH_DATABASE_URL=postgresql://localhost/yoga_bench python3 tools/bench_delivery.py
+  python3 tools/bench_delivery.py --dsn postgresql://localhost/yoga_bench \\
+      --users 5000 --history-days 180 --tg-latency 0.05 --json bench.json
+  python3 tools/bench_delivery.py --dsn ... --baseline bench.json   # сравнить с прошлым прогоном
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import sys
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+from urllib.parse import urlparse
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+
+@dataclass
+class ScenarioResult:
+    name: str
+    latencies: list = field(default_factory=list)
+    wall_time: float = 0.0
+    queries: int = 0
+    connections: int = 0
+    query_time: float = 0.0
+    connect_time: float = 0.0
+    telegram_calls: dict = field(default_factory=dict)
+
+    @property
+    def count(self) -> int:
+        return len(self.latencies)
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies:
+            return 0.0
+        ordered = sorted(self.latencies)
+        index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+        return ordered[index]
+
+    def per_op(self, value: float) -> float:
+        return value / self.count if self.count else 0.0
+
+    def to_dict(self) -> dict:
+        return {
+            "count": self.count,
+            "wall_time_s": round(self.wall_time, 4),
+            "throughput_ops": round(self.count / self.wall_time, 2) if self.wall_time else 0.0,
+            "p50_ms": round(self.percentile(50) * 1000, 2),
+            "p99_ms": round(self.percentile(99) * 1000, 2),
+            "queries_per_op": round(self.per_op(self.queries), 2),
+            "connections_per_op": round(self.per_op(self.connections), 2),
+            "db_ms_per_op": round(self.per_op(self.query_time + self.connect_time) * 1000, 2),
+            "telegram_calls_per_op": round(self.per_op(sum(self.telegram_calls.values())), 2),
+            "telegram_calls": self.telegram_calls,
+        }
+
+
+# --- Подготовка данных ---
+
+def _check_bench_dsn(dsn: str, force: bool) -> None:
+    dbname = (urlparse(dsn).path or "/").lstrip("/")
+    if "bench" not in dbname and not force:
+        sys.exit(
+            f"База «{dbname}» будет перезаписана. Для бенчмарка нужна отдельная БД "
+            f"с «bench» в имени (или флаг --force)."
+        )
+
+
+def seed_database(args) -> None:
+    """Пересоздаёт схему и заливает синтетические данные. Детерминировано по --seed."""
+    import data.postgres_db as pg
+
+    conn = pg.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("DROP SCHEMA public CASCADE")
+    cursor.execute("CREATE SCHEMA public")
+    conn.commit()
+    conn.close()
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        pg.init_database()
+
+    conn = pg.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT setseed(%s)", (args.seed / 2**31,))
+
+    intensities = ["легкая", "средняя", "высокая", "сверх высокая"]
+    cursor.execute(
+        '''
+        INSERT INTO yoga_practices
+            (practices_id, title, video_url, time_practices, channel_name, my_description, intensity, weekday)
+        SELECT g,
+               'Практика ' || g,
+               'https://youtu.be/bench' || g,
+               (ARRAY[5, 10, 20, 30, 45])[1 + g %% 5],
+               'Bench channel ' || (g %% 17),
+               'Описание практики ' || g,
+               (%s::text[])[1 + g %% 4],
+               1 + g %% 7
+        FROM generate_series(1, %s) g
+        ''',
+        (intensities, args.practices),
+    )
+    cursor.execute(
+        "SELECT setval(pg_get_serial_sequence('yoga_practices', 'practices_id'), %s)",
+        (args.practices,),
+    )
+    # Бонус у каждой десятой практики — как «Бонус недели»
+    cursor.execute(
+        '''
+        INSERT INTO bonus_practices (parent_practice_id, title, video_url, time_practices, channel_name, my_description)
+        SELECT g, 'Бонус ' || g, 'https://youtu.be/bench-bonus' || g, 10, 'Bench channel', 'Бонус недели'
+        FROM generate_series(10, %s, 10) g
+        ''',
+        (args.practices,),
+    )
+
+    cursor.execute(
+        '''
+        INSERT INTO users (
+            user_id, chat_id, notify_time, user_name, bot_mode, challenge_start_id,
+            total_practices, program_position, challenge_day, last_practice_message_id,
+            created_at, updated_at
+        )
+        SELECT 1000000 + g,
+               1000000 + g,
+               '00:00',
+               'bench_' || g,
+               CASE WHEN random() < %s THEN 'challenge' ELSE 'daily' END,
+               1,
+               %s, %s, 0,
+               500 + g,
+               NOW() - INTERVAL '1 year',
+               NOW() - INTERVAL '2 days'
+        FROM generate_series(1, %s) g
+        ''',
+        (args.challenge_share, args.history_days, args.history_days, args.users),
+    )
+    # Challenge-пользователи начинают челлендж «сегодня», чтобы не упираться в конец каталога
+    cursor.execute("UPDATE users SET total_practices = 0, program_position = 0 WHERE bot_mode = 'challenge'")
+
+    if args.history_days > 0:
+        cursor.execute(
+            '''
+            INSERT INTO practice_logs (user_id, practice_id, sent_at, day_number, completed_at)
+            SELECT u.user_id,
+                   1 + (u.user_id + d) %% %s,
+                   (NOW() AT TIME ZONE 'UTC') - make_interval(days => d),
+                   %s - d + 1,
+                   CASE WHEN random() < %s
+                        THEN (NOW() AT TIME ZONE 'UTC') - make_interval(days => d) + INTERVAL '2 hours'
+                   END
+            FROM users u
+            CROSS JOIN generate_series(1, %s) d
+            WHERE u.bot_mode = 'daily'
+            ''',
+            (args.practices, args.history_days, args.completion_rate, args.history_days),
+        )
+    conn.commit()
+    conn.close()
+
+    with contextlib.redirect_stdout(open(os.devnull, "w")):
+        pg.ensure_practice_logs_partitions()
+        pg.rollup_cold_practice_logs()
+
+    conn = pg.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("ANALYZE")
+    conn.commit()
+    conn.close()
+
+
+# --- Сценарии ---
+
+class _Measure:
+    """Замер одной фазы: время, дельта счётчиков БД и вызовов Telegram."""
+
+    def __init__(self, result: ScenarioResult, request):
+        self.result = result
+        self.request = request
+
+    def __enter__(self):
+        from data.instrumentation import totals
+
+        self.request.reset()
+        self._db_before = totals()
+        self._started = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        from data.instrumentation import totals
+
+        self.result.wall_time = time.perf_counter() - self._started
+        db_after = totals()
+        for key in ("queries", "connections", "query_time", "connect_time"):
+            setattr(self.result, key, db_after[key] - self._db_before[key])
+        self.result.telegram_calls = dict(self.request.counts())
+        return False
+
+
+async def bench_delivery(application, request) -> ScenarioResult:
+    """send_daily_practice по всем пользователям, у которых наступило время.
+
+    Задержка считается по каждому сообщению outbox с практикой (отправка + отметки в БД).
+    """
+    from telegram.ext import CallbackContext
+
+    import app.outbox as outbox
+    import app.schedule.scheduler as scheduler
+
+    result = ScenarioResult("delivery")
+    original = outbox.deliver_outbox_message
+
+    async def timed_deliver(context, row):
+        started = time.perf_counter()
+        try:
+            return await original(context, row)
+        finally:
+            if row[3] in outbox.PRACTICE_KINDS:
+                result.latencies.append(time.perf_counter() - started)
+
+    outbox.deliver_outbox_message = timed_deliver
+    try:
+        with _Measure(result, request):
+            await scheduler.send_daily_practice(CallbackContext(application))
+    finally:
+        outbox.deliver_outbox_message = original
+    return result
+
+
+async def bench_done(application, request, user_ids: list) -> ScenarioResult:
+    """«✅ Я сделал!» — отметка, прогресс, серия, процент похожих."""
+    from telegram import Update
+    from telegram.ext import CallbackContext
+
+    from app.handlers.done import handle_practice_done_callback
+
+    result = ScenarioResult("done")
+    now = int(time.time())
+    with _Measure(result, request):
+        for index, user_id in enumerate(user_ids, start=1):
+            update = Update.de_json(
+                {
+                    "update_id": index,
+                    "callback_query": {
+                        "id": str(index),
+                        "from": {"id": user_id, "is_bot": False, "first_name": f"bench_{user_id}"},
+                        "chat_instance": "bench",
+                        "data": "practice_done",
+                        "message": {
+                            "message_id": index,
+                            "date": now,
+                            "chat": {"id": user_id, "type": "private"},
+                        },
+                    },
+                },
+                application.bot,
+            )
+            started = time.perf_counter()
+            await handle_practice_done_callback(update, CallbackContext(application))
+            result.latencies.append(time.perf_counter() - started)
+    return result
+
+
+def bench_by_mood(request, user_ids: list, picks_per_user: int) -> ScenarioResult:
+    """Случайная практика By mood (фильтр «Хард»): только выбор, без отправки."""
+    from app.by_mood.hard import FILTER_KEY, WHERE
+    from data.db import pick_random_by_mood_practice
+
+    result = ScenarioResult("by_mood")
+    with _Measure(result, request):
+        for user_id in user_ids:
+            for _ in range(picks_per_user):
+                started = time.perf_counter()
+                pick_random_by_mood_practice(user_id, FILTER_KEY, WHERE, ())
+                result.latencies.append(time.perf_counter() - started)
+    return result
+
+
+# --- Отчёт ---
+
+def print_report(results: list, baseline: Optional[dict]) -> None:
+    columns = [
+        ("count", "ops"),
+        ("throughput_ops", "ops/s"),
+        ("p50_ms", "p50 ms"),
+        ("p99_ms", "p99 ms"),
+        ("queries_per_op", "SQL/op"),
+        ("connections_per_op", "conn/op"),
+        ("db_ms_per_op", "DB ms/op"),
+        ("telegram_calls_per_op", "TG/op"),
+    ]
+    header = f"{'scenario':<10}" + "".join(f"{title:>11}" for _, title in columns)
+    print(header)
+    print("-" * len(header))
+    for result in results:
+        data = result.to_dict()
+        print(f"{result.name:<10}" + "".join(f"{data[key]:>11}" for key, _ in columns))
+        if baseline and result.name in baseline.get("scenarios", {}):
+            base = baseline["scenarios"][result.name]
+            deltas = []
+            for key, title in columns[1:]:
+                if base.get(key):
+                    deltas.append(f"{(data[key] - base[key]) / base[key] * 100:+.0f}%")
+                else:
+                    deltas.append("—")
+            print(f"{'  vs base':<10}{'':>11}" + "".join(f"{d:>11}" for d in deltas))
+    for result in results:
+        if result.telegram_calls:
+            calls = ", ".join(f"{k}={v}" for k, v in sorted(result.telegram_calls.items()))
+            print(f"{result.name}: Telegram {calls}")
+
+
+async def run(args) -> dict:
+    from telegram.ext import Application
+
+    from tools.fake_telegram import FAKE_BOT_TOKEN, FakeTelegramRequest
+
+    import data.postgres_db as pg
+
+    conn = pg.get_connection()
+    cursor = conn.cursor()
+    cursor.execute("SELECT user_id FROM users ORDER BY user_id")
+    all_users = [row[0] for row in cursor.fetchall()]
+    conn.close()
+
+    request = FakeTelegramRequest(latency=args.tg_latency, jitter=args.tg_jitter, seed=args.seed)
+    application = (
+        Application.builder()
+        .token(FAKE_BOT_TOKEN)
+        .request(request)
+        .get_updates_request(FakeTelegramRequest())
+        .build()
+    )
+    await application.initialize()
+
+    results = []
+    sink = open(os.devnull, "w") if not args.verbose else sys.stdout
+    with contextlib.redirect_stdout(sink):
+        if "delivery" in args.scenarios:
+            results.append(await bench_delivery(application, request))
+        sample = all_users[: args.sample]
+        if "done" in args.scenarios:
+            results.append(await bench_done(application, request, sample))
+        if "by_mood" in args.scenarios:
+            results.append(bench_by_mood(request, sample, args.by_mood_picks))
+
+    await application.shutdown()
+    print_report(results, _load_baseline(args.baseline))
+    return {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "params": {
+            key: getattr(args, key)
+            for key in (
+                "users", "practices", "history_days", "completion_rate", "challenge_share",
+                "sample", "by_mood_picks", "tg_latency", "tg_jitter", "seed",
+            )
+        },
+        "scenarios": {result.name: result.to_dict() for result in results},
+    }
+
+
+def _load_baseline(path: Optional[str]) -> Optional[dict]:
+    if not path:
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк рассылки YogaDailyBot")
+    parser.add_argument("--dsn", default=os.getenv("BENCH_DATABASE_URL", ""), help="БД бенчмарка (BENCH_DATABASE_URL)")
+    parser.add_argument("--force", action="store_true", help="разрешить БД без «bench» в имени")
+    parser.add_argument("--no-seed", action="store_true", help="не пересоздавать данные (повторный прогон)")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--practices", type=int, default=300)
+    parser.add_argument("--history-days", type=int, default=120, help="дней истории practice_logs на пользователя")
+    parser.add_argument("--completion-rate", type=float, default=0.6)
+    parser.add_argument("--challenge-share", type=float, default=0.2, help="доля пользователей в челлендже")
+    parser.add_argument("--sample", type=int, default=200, help="пользователей для done/by_mood")
+    parser.add_argument("--by-mood-picks", type=int, default=3)
+    parser.add_argument("--tg-latency", type=float, default=0.03, help="задержка фейкового Bot API, сек")
+    parser.add_argument("--tg-jitter", type=float, default=0.02)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument(
+        "--scenarios", nargs="+", default=["delivery", "done", "by_mood"],
+        choices=["delivery", "done", "by_mood"],
+    )
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--verbose", action="store_true", help="не глушить print() из кода бота")
+    args = parser.parse_args()
+
+    if not args.dsn:
+        parser.error("нужен --dsn или BENCH_DATABASE_URL")
+    _check_bench_dsn(args.dsn, args.force)
+
+    # Подключение бота к БД берётся из env: подменяем его до импорта app.config/.env
+    os.environ["ENV_FILE"] = os.devnull
+    os.environ["DATABASE_URL"] = args.dsn
+
+    import logging
+    logging.basicConfig(level=logging.WARNING)
+
+    # Счётчики запросов/подключений берём из инструментации слоя БД — она должна быть включена
+    os.environ["DB_METRICS_ENABLED"] = "1"
+
+    if not args.no_seed:
+        started = time.perf_counter()
+        seed_database(args)
+        print(f"Данные готовы за {time.perf_counter() - started:.1f} с "
+              f"({args.users} пользователей, {args.practices} практик, {args.history_days} дней истории)")
+
+    report = asyncio.run(run(args))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,174 @@
+"""Бенчмарк маршрутизации апдейтов: таблицы CallbackRouter/ButtonRouter против прежних regex-хендлеров.
+
+Что делает:
+  1) собирает Application с хендлерами прода (app.main.register_handlers) — это «после»;
+  2) строит «до» в прежнем порядке группы 0: команды → по CallbackQueryHandler на маршрут
+     (regex = метка маршрута, как было зарегистрировано раньше) → платежи → MessageHandler
+     с regex-альтернативой всех reply-кнопок → текстовый ввод;
+  3) для смеси апдейтов (кнопки под практикой, «Сам решу», звезды, reply-кнопки, свободный
+     текст, команды) замеряет поиск хендлера так же, как PTB: check_update по порядку
+     до первого совпадения. Печатает нс на апдейт и сколько check_update пришлось вызвать.
+
+--extra-routes N добавляет N точных callback-маршрутов в обе схемы: у regex-списка время
+растёт с числом кнопок, у таблицы — нет.
+
+Хендлеры не вызываются, БД и Telegram не нужны.
+
+Примеры:
+  python3 tools/bench_routing.py
+  python3 tools/bench_routing.py --extra-routes 200 --iterations 20000
+"""
+
+import argparse
+import asyncio
+import os
+import re
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from tools.fake_telegram import FAKE_BOT_TOKEN  # noqa: E402
+
+os.environ["ENV_FILE"] = os.devnull
+os.environ["BOT_TOKEN"] = FAKE_BOT_TOKEN
+os.environ["STORAGE_BACKEND"] = "memory"
+
+USER = {"id": 1001, "is_bot": False, "first_name": "bench"}
+CHAT = {"id": 1001, "type": "private", "first_name": "bench"}
+
+# Смесь апдейтов: (метка, данные, вес) — callback_data или текст сообщения
+CALLBACK_MIX = [
+    ("practice_done", "practice_done", 40),
+    ("self_time", "self_time:t15_20", 6),
+    ("self_intensity", "self_intensity:t15_20:imed", 6),
+    ("extra_self_intensity", "extra_self_intensity:t25p:iany", 4),
+    ("stars", "stars_50", 1),
+    ("progress_reset_no", "progress_reset_no", 1),
+]
+TEXT_MIX = [
+    ("button Пауза", "Пауза", 8),
+    ("button Сам решу", "Сам решу", 8),
+    ("text 08:30", "08:30", 6),
+    ("text free", "просто сообщение", 4),
+    ("/start", "/start", 4),
+]
+
+
+def _update(bot, update_id: int, kind: str, value: str):
+    from telegram import Update
+
+    message = {"message_id": update_id, "date": 1_700_000_000, "chat": CHAT, "from": USER}
+    if kind == "callback":
+        data = {"update_id": update_id, "callback_query": {
+            "id": str(update_id), "from": USER, "chat_instance": "1", "data": value,
+            "message": {**message, "text": "практика"},
+        }}
+    else:
+        entities = [{"type": "bot_command", "offset": 0, "length": len(value)}] if value.startswith("/") else []
+        data = {"update_id": update_id, "message": {**message, "text": value, "entities": entities}}
+    return Update.de_json(data, bot)
+
+
+def build_schemes(extra_routes: int):
+    """(bot, после, до): бот для апдейтов и списки хендлеров группы 0 в порядке проверки."""
+    from telegram.ext import (
+        Application, CallbackQueryHandler, MessageHandler, PreCheckoutQueryHandler, filters,
+    )
+
+    from app.main import register_handlers
+    from app.router import ButtonRouter, CallbackRouter
+    from tools.fake_telegram import FakeTelegramRequest
+
+    application = (
+        Application.builder()
+        .token(FAKE_BOT_TOKEN)
+        .request(FakeTelegramRequest())
+        .get_updates_request(FakeTelegramRequest())
+        .build()
+    )
+    register_handlers(application)
+    # CommandHandler сверяет @username бота: нужен getMe
+    asyncio.run(application.initialize())
+    after = list(application.handlers[0])
+
+    async def noop(update, context):
+        return None
+
+    callbacks, buttons, others = [], [], []
+    for handler in after:
+        if isinstance(handler, CallbackRouter):
+            for index in range(extra_routes):
+                handler.add(f"bench_extra_{index}", noop)
+            callbacks = [CallbackQueryHandler(route.callback, pattern=route.label) for route in handler.routes()]
+        elif isinstance(handler, ButtonRouter):
+            escaped = "|".join(re.escape(label) for label in handler.labels())
+            buttons = [MessageHandler(
+                filters.TEXT & filters.Regex(f"^({escaped})$") & filters.ChatType.PRIVATE, noop
+            )]
+        else:
+            others.append(handler)
+    # Платежи (SUCCESSFUL_PAYMENT и PreCheckout) стояли между callback- и reply-кнопками
+    payments_end = next(i for i, h in enumerate(others) if isinstance(h, PreCheckoutQueryHandler)) + 1
+    payments_start = payments_end - 2
+    before = (
+        others[:payments_start] + callbacks + others[payments_start:payments_end] + buttons + others[payments_end:]
+    )
+    return application.bot, after, before
+
+
+def _find(handlers: list, update) -> int:
+    """Сколько check_update понадобилось до первого совпадения (как Application.process_update)."""
+    for checked, handler in enumerate(handlers, 1):
+        check = handler.check_update(update)
+        if check is not None and check is not False:
+            return checked
+    return len(handlers)
+
+
+def bench(handlers: list, update, iterations: int) -> tuple:
+    checks = _find(handlers, update)
+    started = time.perf_counter()
+    for _ in range(iterations):
+        _find(handlers, update)
+    return (time.perf_counter() - started) / iterations * 1e9, checks
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Бенчмарк маршрутизации callback_data и reply-кнопок")
+    parser.add_argument("--iterations", type=int, default=5000, help="повторов на каждый апдейт")
+    parser.add_argument("--extra-routes", type=int, default=0, help="добавить N точных callback-маршрутов")
+    args = parser.parse_args()
+
+    bot, after, before = build_schemes(args.extra_routes)
+    print(f"Хендлеров группы 0: до {len(before)}, после {len(after)}; повторов {args.iterations}")
+    header = f"{'апдейт':<24}{'до, нс':>10}{'checks':>8}{'после, нс':>11}{'checks':>8}{'ускор.':>8}"
+    print(header)
+    print("-" * len(header))
+
+    mix = [("callback", label, value, weight) for label, value, weight in CALLBACK_MIX]
+    mix += [("text", label, value, weight) for label, value, weight in TEXT_MIX]
+    weighted_before = weighted_after = total_weight = 0
+    for update_id, (kind, label, value, weight) in enumerate(mix, 1):
+        update = _update(bot, update_id, kind, value)
+        before_ns, before_checks = bench(before, update, args.iterations)
+        after_ns, after_checks = bench(after, update, args.iterations)
+        print(
+            f"{label:<24}{before_ns:>10.0f}{before_checks:>8}{after_ns:>11.0f}{after_checks:>8}"
+            f"{before_ns / after_ns:>7.1f}x"
+        )
+        weighted_before += before_ns * weight
+        weighted_after += after_ns * weight
+        total_weight += weight
+    print("-" * len(header))
+    print(
+        f"{'смесь (взвешенно)':<24}{weighted_before / total_weight:>10.0f}{'':>8}"
+        f"{weighted_after / total_weight:>11.0f}{'':>8}{weighted_before / weighted_after:>7.1f}x"
+    )
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
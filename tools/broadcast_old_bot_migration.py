@@ -27,6 +27,14 @@ import psycopg2
 from psycopg2 import sql
 from psycopg2.extras import RealDictCursor
 
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from data.rate_limit import SharedRateLimiter, bucket_for_token, default_client_id, parse_retry_after  # noqa: E402
+
+# Сколько раз повторять сообщение после 429 Too Many Requests
+MAX_THROTTLED_RETRIES = 3
+
 
 def _load_env_files() -> None:
     """Подхватывает .env из корня проекта и tools/.env.broadcast (не перетирает уже выставленные export)."""
@@ -185,7 +193,9 @@ def send_message(
     text: str,
     *,
     parse_mode: Optional[str] = "Markdown",
+    limiter: Optional[SharedRateLimiter] = None,
 ) -> tuple[bool, str]:
+    """Отправляет сообщение; с limiter — по общему с ботом лимиту, после 429 ждёт и повторяет."""
     payload: dict = {
         "chat_id": chat_id,
         "text": text,
@@ -193,11 +203,24 @@ def send_message(
     }
     if parse_mode:
         payload["parse_mode"] = parse_mode
-    response = client.post(
-        f"https://api.telegram.org/bot{token}/sendMessage",
-        json=payload,
-        timeout=20,
-    )
+    for attempt in range(MAX_THROTTLED_RETRIES + 1):
+        if limiter is not None:
+            limiter.acquire()
+        response = client.post(
+            f"https://api.telegram.org/bot{token}/sendMessage",
+            json=payload,
+            timeout=20,
+        )
+        if response.status_code != 429 or attempt == MAX_THROTTLED_RETRIES:
+            break
+        try:
+            retry_after = parse_retry_after(response.json()) or 1.0
+        except ValueError:
+            retry_after = 1.0
+        print(f"429 от Telegram, пауза {retry_after} с", file=sys.stderr)
+        if limiter is not None:
+            limiter.report_retry_after(retry_after)
+        time.sleep(retry_after)
     if response.status_code == 200:
         return True, "ok"
     try:
@@ -255,8 +278,19 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--sleep",
         type=float,
-        default=0.05,
-        help="Delay between Telegram requests in seconds.",
+        default=0.0,
+        help="Extra delay between Telegram requests in seconds; pacing comes from the shared limit.",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=float(os.getenv("OUTBOUND_RATE_PER_SECOND", "25") or 25),
+        help="Общий лимит сообщений в секунду на токен (как OUTBOUND_RATE_PER_SECOND у бота).",
+    )
+    parser.add_argument(
+        "--no-shared-limit",
+        action="store_true",
+        help="Не брать токены из общего лимита в PostgreSQL (data/rate_limit.py), только --sleep.",
     )
     parser.add_argument(
         "--token",
@@ -342,15 +376,28 @@ def main() -> int:
         return 0
 
     assert token is not None
+    limiter = None
+    if not args.no_shared_limit and args.rate > 0:
+        # Тот же бюджет, что у бота с этим токеном: скрипт не отнимает его у пользователей
+        limiter = SharedRateLimiter(
+            lambda: psycopg2.connect(dsn, connect_timeout=10),
+            bucket_for_token(token),
+            rate=args.rate,
+            burst=args.rate,
+            client_id=default_client_id("broadcast_old_bot_migration"),
+        )
     with httpx.Client() as client:
         for recipient in recipients:
             ok, details = send_message(
-                client, token, recipient["chat_id"], message, parse_mode=parse_mode
+                client, token, recipient["chat_id"], message, parse_mode=parse_mode, limiter=limiter
             )
             status = "sent" if ok else "failed"
             report_rows.append({**recipient, "status": status, "details": details})
             print(f"{recipient['user_id']}: {status} ({details})")
-            time.sleep(args.sleep)
+            if args.sleep:
+                time.sleep(args.sleep)
+    if limiter is not None:
+        limiter.close()
 
     write_report(report_rows, args.report)
     sent = sum(1 for row in report_rows if row["status"] == "sent")
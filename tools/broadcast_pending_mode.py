@@ -25,6 +25,14 @@ import httpx
 import psycopg2
 from psycopg2.extras import RealDictCursor
 
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from data.rate_limit import SharedRateLimiter, bucket_for_token, default_client_id, parse_retry_after  # noqa: E402
+
+# Сколько раз повторять сообщение после 429 Too Many Requests
+MAX_THROTTLED_RETRIES = 3
+
 # Текст как в app/onboarding.py (напоминание через 1 ч)
 PENDING_MODE_MESSAGE = (
     "Ты все еще не выбрал режим...это займёт один миг ✨"
@@ -146,7 +154,9 @@ def send_message(
     text: str,
     *,
     parse_mode: Optional[str] = "Markdown",
+    limiter: Optional[SharedRateLimiter] = None,
 ) -> tuple[bool, str]:
+    """Отправляет сообщение; с limiter — по общему с ботом лимиту, после 429 ждёт и повторяет."""
     payload: dict = {
         "chat_id": chat_id,
         "text": text,
@@ -155,11 +165,24 @@ def send_message(
     if parse_mode:
         payload["parse_mode"] = parse_mode
 
-    response = client.post(
-        f"https://api.telegram.org/bot{token}/sendMessage",
-        json=payload,
-        timeout=20,
-    )
+    for attempt in range(MAX_THROTTLED_RETRIES + 1):
+        if limiter is not None:
+            limiter.acquire()
+        response = client.post(
+            f"https://api.telegram.org/bot{token}/sendMessage",
+            json=payload,
+            timeout=20,
+        )
+        if response.status_code != 429 or attempt == MAX_THROTTLED_RETRIES:
+            break
+        try:
+            retry_after = parse_retry_after(response.json()) or 1.0
+        except ValueError:
+            retry_after = 1.0
+        print(f"429 от Telegram, пауза {retry_after} с", file=sys.stderr)
+        if limiter is not None:
+            limiter.report_retry_after(retry_after)
+        time.sleep(retry_after)
     if response.status_code == 200:
         return True, "ok"
     try:
@@ -212,8 +235,19 @@ def parse_args() -> argparse.Namespace:
     parser.add_argument(
         "--sleep",
         type=float,
-        default=0.05,
-        help="Пауза между запросами к Telegram (сек).",
+        default=0.0,
+        help="Дополнительная пауза между запросами к Telegram (сек); темп задаёт общий лимит.",
+    )
+    parser.add_argument(
+        "--rate",
+        type=float,
+        default=float(os.getenv("OUTBOUND_RATE_PER_SECOND", "25") or 25),
+        help="Общий лимит сообщений в секунду на токен (как OUTBOUND_RATE_PER_SECOND у бота).",
+    )
+    parser.add_argument(
+        "--no-shared-limit",
+        action="store_true",
+        help="Не брать токены из общего лимита в PostgreSQL (data/rate_limit.py), только --sleep.",
     )
     parser.add_argument(
         "--token",
@@ -276,6 +310,16 @@ def main() -> int:
         return 0
 
     assert token is not None
+    limiter = None
+    if not args.no_shared_limit and args.rate > 0:
+        # Тот же бюджет, что у бота с этим токеном: скрипт не отнимает его у пользователей
+        limiter = SharedRateLimiter(
+            lambda: psycopg2.connect(dsn, connect_timeout=10),
+            bucket_for_token(token),
+            rate=args.rate,
+            burst=args.rate,
+            client_id=default_client_id("broadcast_pending_mode"),
+        )
     with httpx.Client() as client:
         for recipient in recipients:
             ok, details = send_message(
@@ -284,11 +328,15 @@ def main() -> int:
                 recipient["chat_id"],
                 PENDING_MODE_MESSAGE,
                 parse_mode=parse_mode,
+                limiter=limiter,
             )
             status = "sent" if ok else "failed"
             report_rows.append({**recipient, "status": status, "details": details})
             print(f"{recipient['user_id']}: {status} ({details})")
-            time.sleep(args.sleep)
+            if args.sleep:
+                time.sleep(args.sleep)
+    if limiter is not None:
+        limiter.close()
 
     write_report(report_rows, args.report)
     sent = sum(1 for row in report_rows if row["status"] == "sent")
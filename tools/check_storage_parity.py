@@ -0,0 +1,158 @@
+"""Проверка, что data/memory_db.py повторяет API data/postgres_db.py.
+
+Сравнивает публичные функции обоих модулей: набор имён и сигнатуры (аргументы и значения
+по умолчанию). Расхождение означает, что в одном из хранилищ забыли новую функцию или
+параметр — хендлеры с STORAGE_BACKEND=memory упадут только на живом апдейте.
+
+С --smoke дополнительно прогоняет короткий сценарий на хранилище в памяти: онбординг,
+план на день, захват и постановка практики в outbox, отметка «сделал», подбор по настроению.
+PostgreSQL не нужен ни в одном из режимов.
+
+Запуск:
+  python3 tools/check_storage_parity.py
+  python3 tools/check_storage_parity.py --smoke
+"""
+
+import argparse
+import inspect
+import sys
+from datetime import timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+import data.memory_db as memory  # noqa: E402
+import data.postgres_db as postgres  # noqa: E402
+
+# Функции только одного из хранилищ (служебные)
+ONLY_IN_MEMORY = {"reset_memory_db"}
+# data.db берёт их у postgres_db при любом STORAGE_BACKEND
+SHARED_FROM_POSTGRES = {"name_to_weekday"}
+
+
+def _public_functions(module) -> dict:
+    return {
+        name: value for name, value in vars(module).items()
+        if not name.startswith("_") and inspect.isfunction(value) and value.__module__ == module.__name__
+    }
+
+
+def _signature(func) -> inspect.Signature:
+    # instrument_module оборачивает через functools.wraps: сигнатура берётся у исходной функции
+    return inspect.signature(inspect.unwrap(func))
+
+
+def check_api() -> list:
+    """Список расхождений API (пустой — всё совпадает)."""
+    pg_funcs = _public_functions(postgres)
+    mem_funcs = _public_functions(memory)
+    # Чистые функции вроде weekday_to_name memory_db берёт у postgres_db как есть
+    mem_names = {name for name in vars(memory) if not name.startswith("_") and callable(getattr(memory, name))}
+    problems = []
+    for name in sorted(pg_funcs):
+        if name not in mem_names and name not in SHARED_FROM_POSTGRES:
+            problems.append(f"нет в memory_db: {name}{_signature(pg_funcs[name])}")
+        elif name in mem_funcs and _signature(pg_funcs[name]) != _signature(mem_funcs[name]):
+            problems.append(
+                f"сигнатура {name}: postgres{_signature(pg_funcs[name])} != memory{_signature(mem_funcs[name])}"
+            )
+    for name in sorted(set(mem_funcs) - set(pg_funcs) - ONLY_IN_MEMORY):
+        problems.append(f"нет в postgres_db: {name}{_signature(mem_funcs[name])}")
+    return problems
+
+
+def _expect(condition: bool, message: str, problems: list) -> None:
+    if not condition:
+        problems.append(message)
+
+
+def run_smoke() -> list:
+    """Короткий сценарий «пользователь получил и сделал практику» на хранилище в памяти."""
+    problems = []
+    memory.reset_memory_db()
+    weekday = memory.get_current_weekday()
+    for i in range(3):
+        ok, _msg = memory.add_yoga_practice(
+            f"Практика {i}", f"https://youtu.be/smoke{i}", 20 + i * 10, "Канал",
+            intensity="мягкая", weekday=weekday,
+        )
+        _expect(ok, f"add_yoga_practice {i}", problems)
+    memory.add_bonus_practice(1, "Бонус", "https://youtu.be/bonus", 5, "Канал")
+
+    memory.set_user_onboarding_required(1, chat_id=1, user_name="Тест")
+    _expect(memory.is_user_onboarding_required(1), "онбординг не включился", problems)
+    memory.save_user_time(1, 1, "07:00", user_name="Тест")
+    _expect(memory.get_user_bot_mode(1) == "daily", "режим после выбора времени не daily", problems)
+
+    # Первая рассылка — со следующего дня: сегодня пользователя в выборке нет
+    _expect(memory.get_users_pending_for_today("23:59") == [], "рассылка в день онбординга", problems)
+    memory._db.users[1]["first_daily_send_date"] = memory._today() - timedelta(days=1)
+    memory._db.users[1]["updated_at"] -= timedelta(days=2)
+
+    today = memory._today()
+    _expect(memory.build_daily_plan(today) == 1, "в плане на день не один пользователь", problems)
+    claimed = memory.claim_users_pending_for_today("23:59")
+    _expect([row[0] for row in claimed] == [1], f"claim_users_pending_for_today: {claimed}", problems)
+    _expect(memory.claim_users_pending_for_today("23:59") == [], "аренда доставки не держит", problems)
+
+    planned = memory.get_planned_deliveries([1], today).get(1)
+    _expect(planned is not None and len(planned["bonuses"]) == 1, f"план пользователя: {planned}", problems)
+    practice_id = planned["practice"][0] if planned else 1
+    result = memory.enqueue_practice_delivery(1, 1, practice_id, False, [("text", {"text": "a"}), ("text", {"text": "b"})])
+    _expect(result is not None and len(result["outbox_ids"]) == 2, f"enqueue_practice_delivery: {result}", problems)
+    _expect(
+        memory.enqueue_practice_delivery(1, 1, practice_id, False, [("text", {"text": "a"})]) is None,
+        "повторная постановка на тот же день", problems,
+    )
+    memory.release_delivery_leases([1])
+    _expect(memory.get_users_pending_for_today("23:59") == [], "отправленный сегодня остался в выборке", problems)
+
+    # Сообщения одного чата уходят по порядку: второе ждёт, пока не отправлено первое
+    first = memory.claim_outbox_messages(10)
+    _expect(len(first) == 1, f"claim_outbox_messages: {first}", problems)
+    if first:
+        memory.mark_outbox_sent(first[0][0], 100)
+    second = memory.claim_outbox_messages(10)
+    _expect(len(second) == 1 and second[0][0] != (first[0][0] if first else None), "второе сообщение чата", problems)
+
+    _expect(memory.mark_practice_completed_today(1), "mark_practice_completed_today", problems)
+    _expect(memory.get_completed_count(1) == 1, "get_completed_count", problems)
+    _expect(memory.get_streak_days(1) == 1, "get_streak_days", problems)
+
+    memory.activate_user_by_mood(2, 2)
+    seen = set()
+    for _ in range(3):
+        row = memory.pick_random_by_mood_practice(
+            2, "smoke", "AND yp.time_practices <= 30 AND LOWER(TRIM(COALESCE(yp.intensity, ''))) IN ('мягкая')"
+        )
+        _expect(row is not None and row[3] <= 30, f"pick_random_by_mood_practice: {row}", problems)
+        if row:
+            memory.record_by_mood_seen(2, "smoke", row[0])
+            seen.add(row[0])
+    _expect(seen == {1, 2}, f"подбор по настроению не перебрал пул: {seen}", problems)
+
+    memory.delete_user(1)
+    _expect(memory.get_completed_count(1) == 0 and memory.get_all_users() == [(2, 2, "00:00", None, None, 0)],
+            "delete_user", problems)
+    memory.reset_memory_db()
+    return problems
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Сверка API хранилищ postgres_db и memory_db")
+    parser.add_argument("--smoke", action="store_true", help="прогнать сценарий на хранилище в памяти")
+    args = parser.parse_args()
+
+    problems = check_api()
+    print(f"Функций postgres_db: {len(_public_functions(postgres))}, расхождений API: {len(problems)}")
+    if args.smoke:
+        smoke_problems = run_smoke()
+        print(f"Сценарий на memory_db: {'OK' if not smoke_problems else 'ошибки — ' + str(len(smoke_problems))}")
+        problems.extend(smoke_problems)
+    for problem in problems:
+        print(f"  ❌ {problem}")
+    return 1 if problems else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,129 @@
+"""Проверка планов запросов practice_logs: «дневные» условия должны идти по индексам.
+
+Запускает EXPLAIN (без ANALYZE — ничего не меняет) для запросов из data/postgres_db.py,
+которые фильтруют по календарному дню МСК, и проверяет, что в плане есть нужные индексы:
+  - idx_practice_logs_user_sent_day  (user_id, sent_day_msk)
+  - idx_practice_logs_completed_day  (completed_day_msk)
+
+На маленькой базе Postgres честно выбирает Seq Scan, поэтому по умолчанию он выключен
+(SET enable_seqscan = off): проверяем, что индекс вообще применим к условию.
+Если кто-то снова обернёт колонку в функцию, индекс перестанет подходить и проверка упадёт.
+
+Запуск (нужна локальная/тестовая БД, на которой уже прошёл python -m data.migrate):
+  ENV_FILE=.env.test python3 tools/explain_practice_logs.py
+  ENV_FILE=.env.test python3 tools/explain_practice_logs.py --allow-seqscan --verbose
+"""
+
+import argparse
+import json
+import sys
+from datetime import datetime, timedelta
+from pathlib import Path
+from zoneinfo import ZoneInfo
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from app.config import DEFAULT_TZ  # noqa: E402
+from data.postgres_db import (  # noqa: E402
+    _CASCADE_MARK_TODAY_SQL,
+    _PENDING_FOR_TODAY_SQL,
+    _YESTERDAY_COMPLETED_CHALLENGE_SQL,
+    _practice_logs_recent_bound,
+    get_connection,
+)
+
+SENT_DAY_INDEX = "idx_practice_logs_user_sent_day"
+COMPLETED_DAY_INDEX = "idx_practice_logs_completed_day"
+
+
+def _collect_index_names(plan: dict) -> set:
+    """Все «Index Name» из дерева плана (включая вложенные Plans)."""
+    names = set()
+    if plan.get("Index Name"):
+        names.add(plan["Index Name"])
+    for child in plan.get("Plans", []):
+        names |= _collect_index_names(child)
+    return names
+
+
+def _parent_index_names(cursor, names: set) -> set:
+    """На партициях индексы называются по-своему — поднимаемся до индекса на practice_logs."""
+    result = set(names)
+    for name in names:
+        cursor.execute(
+            '''
+            SELECT parent.relname
+            FROM pg_inherits i
+            JOIN pg_class child ON child.oid = i.inhrelid
+            JOIN pg_class parent ON parent.oid = i.inhparent
+            WHERE child.relname = %s
+            ''',
+            (name,),
+        )
+        result.update(row[0] for row in cursor.fetchall())
+    return result
+
+
+def _explain(cursor, sql: str, params: tuple) -> tuple:
+    cursor.execute(f"EXPLAIN (FORMAT JSON) {sql}", params)
+    raw = cursor.fetchone()[0]
+    plan = (raw if isinstance(raw, list) else json.loads(raw))[0]["Plan"]
+    return plan, _parent_index_names(cursor, _collect_index_names(plan))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="EXPLAIN-проверка индексов practice_logs")
+    parser.add_argument("--allow-seqscan", action="store_true", help="не выключать enable_seqscan")
+    parser.add_argument("--verbose", action="store_true", help="печатать планы целиком")
+    args = parser.parse_args()
+
+    today = datetime.now(ZoneInfo(DEFAULT_TZ)).date()
+    yesterday = today - timedelta(days=1)
+
+    conn = get_connection()
+    cursor = conn.cursor()
+    if not args.allow_seqscan:
+        cursor.execute("SET enable_seqscan = off")
+    cursor.execute("SELECT COALESCE(MIN(user_id), 0) FROM users")
+    user_id = cursor.fetchone()[0]
+
+    checks = [
+        (
+            "get_users_pending_for_today",
+            _PENDING_FOR_TODAY_SQL,
+            (DEFAULT_TZ, DEFAULT_TZ, _practice_logs_recent_bound(), "23:59", DEFAULT_TZ, DEFAULT_TZ),
+            {SENT_DAY_INDEX},
+        ),
+        (
+            "_cascade_challenge_logs_on_done",
+            _CASCADE_MARK_TODAY_SQL,
+            (user_id, today),
+            {SENT_DAY_INDEX},
+        ),
+        (
+            "get_yesterday_completed_challenge_user_ids",
+            _YESTERDAY_COMPLETED_CHALLENGE_SQL,
+            (yesterday, yesterday),
+            {SENT_DAY_INDEX, COMPLETED_DAY_INDEX},
+        ),
+    ]
+
+    failed = 0
+    for name, sql, params, expected in checks:
+        plan, used = _explain(cursor, sql, params)
+        missing = expected - used
+        status = "OK  " if not missing else "FAIL"
+        print(f"{status} {name}: индексы {sorted(used & {SENT_DAY_INDEX, COMPLETED_DAY_INDEX}) or '—'}")
+        if missing:
+            failed += 1
+            print(f"     не используется: {', '.join(sorted(missing))}")
+        if args.verbose or missing:
+            print(json.dumps(plan, ensure_ascii=False, indent=2))
+
+    conn.rollback()
+    conn.close()
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,145 @@
+"""Фейковый Telegram Bot API для бенчмарков и прогонов без сети.
+
+FakeTelegramRequest подменяет HTTP-слой python-telegram-bot: Bot сериализует запросы как
+обычно, а вместо api.telegram.org ответ собирается локально — с искусственной задержкой
+и записью всех вызовов. Так хендлеры и джобы работают без изменений, а мы видим,
+сколько запросов к Telegram ушло и сколько «сетевого» времени на них потрачено.
+
+Пример:
+    request = FakeTelegramRequest(latency=0.05, jitter=0.02)
+    application = (
+        Application.builder()
+        .token(FAKE_BOT_TOKEN)
+        .request(request)
+        .get_updates_request(FakeTelegramRequest())
+        .build()
+    )
+"""
+
+import asyncio
+import itertools
+import json
+import random
+import time
+from collections import Counter
+from dataclasses import dataclass
+from typing import Optional
+
+from telegram.request import BaseRequest, RequestData
+
+# Формат токена как у настоящего (id:secret), сам токен нигде не проверяется
+FAKE_BOT_TOKEN = "123456789:FAKE-bench-token"
+FAKE_BOT_ID = 123456789
+
+
+@dataclass
+class FakeCall:
+    """Один запрос к Bot API."""
+    method: str
+    params: dict
+    started_at: float
+    duration: float = 0.0
+
+
+class FakeTelegramRequest(BaseRequest):
+    """BaseRequest, который отвечает сам и записывает вызовы.
+
+    Args:
+        latency: базовая задержка ответа, сек
+        jitter: случайная добавка к задержке (равномерно от 0 до jitter), сек
+        fail_rate: доля запросов send*, на которые отвечаем «bot was blocked by the user»
+        seed: зерно для jitter/fail_rate — прогоны воспроизводимы
+    """
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        fail_rate: float = 0.0,
+        seed: Optional[int] = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.fail_rate = fail_rate
+        self.calls: list = []
+        self._random = random.Random(seed)
+        self._message_ids = itertools.count(1_000)
+
+    async def initialize(self) -> None:
+        pass
+
+    async def shutdown(self) -> None:
+        pass
+
+    @property
+    def read_timeout(self) -> Optional[float]:
+        return None
+
+    def counts(self) -> Counter:
+        """Сколько раз вызывался каждый метод Bot API."""
+        return Counter(call.method for call in self.calls)
+
+    def reset(self) -> None:
+        self.calls.clear()
+
+    async def do_request(
+        self,
+        url: str,
+        method: str,
+        request_data: Optional[RequestData] = None,
+        read_timeout=None,
+        write_timeout=None,
+        connect_timeout=None,
+        pool_timeout=None,
+    ) -> tuple:
+        api_method = url.rsplit("/", 1)[-1]
+        params = request_data.parameters if request_data else {}
+        call = FakeCall(method=api_method, params=params, started_at=time.perf_counter())
+        self.calls.append(call)
+
+        delay = self.latency + (self._random.uniform(0, self.jitter) if self.jitter else 0.0)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        call.duration = time.perf_counter() - call.started_at
+
+        if (
+            self.fail_rate
+            and api_method.startswith("send")
+            and self._random.random() < self.fail_rate
+        ):
+            return 403, json.dumps({
+                "ok": False,
+                "error_code": 403,
+                "description": "Forbidden: bot was blocked by the user",
+            }).encode()
+
+        return 200, json.dumps({"ok": True, "result": self._result(api_method, params)}).encode()
+
+    def _result(self, api_method: str, params: dict):
+        """Минимально правдоподобный result для методов, которые вызывает бот."""
+        if api_method == "getMe":
+            return {
+                "id": FAKE_BOT_ID,
+                "is_bot": True,
+                "first_name": "YogaDailyBot (fake)",
+                "username": "yoga_daily_fake_bot",
+                "can_join_groups": True,
+                "can_read_all_group_messages": False,
+                "supports_inline_queries": False,
+            }
+        if api_method in ("sendMessage", "sendPhoto", "copyMessage", "forwardMessage"):
+            message = {
+                "message_id": next(self._message_ids),
+                "date": int(time.time()),
+                "chat": {"id": int(params.get("chat_id", 0)), "type": "private"},
+                "from": {"id": FAKE_BOT_ID, "is_bot": True, "first_name": "YogaDailyBot (fake)"},
+            }
+            if "text" in params:
+                message["text"] = params["text"]
+            if api_method == "copyMessage":
+                return {"message_id": message["message_id"]}
+            return message
+        if api_method == "getUpdates":
+            return []
+        # editMessage*, deleteMessage, answerCallbackQuery, setMyCommands и т.п.
+        return True
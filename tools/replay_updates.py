@@ -0,0 +1,333 @@
+"""Воспроизведение записанных апдейтов через хендлеры бота — регрессия пропускной способности перед деплоем.
+
+Запись делает сам бот при UPDATE_RECORD_PATH (app/update_recorder.py): обезличенные апдейты
+с временем получения, gzip, одна строка JSON на апдейт.
+
+Что делает:
+  1) собирает Application с теми же хендлерами, что и прод (app.main.register_handlers),
+     но с фейковым Bot API (tools/fake_telegram.py, задержка --tg-latency/--tg-jitter);
+  2) подаёт апдейты в application.process_update по расписанию записи, ускоренному в --speed раз
+     (1–100; паузы длиннее --max-gap секунд записи сжимаются). Одновременно обрабатывается
+     столько апдейтов, сколько разрешает Application (concurrent_updates, в проде — 1),
+     или --concurrency;
+  3) печатает по каждому хендлеру (метка как в метриках: паттерн callback_data, /команда, имя
+     функции): число апдейтов, ошибки, p50/p95/p99 обработки и p95 «от прихода до конца»
+     с ожиданием очереди; итог — апдейтов в секунду и запросы к Bot API.
+
+Хранилище по умолчанию — в памяти (STORAGE_BACKEND=memory): пользователи из записи для бота
+новые, состояние копится по ходу воспроизведения. С --dsn — отдельная БД PostgreSQL
+(в имени «bench», как у bench_delivery.py), схема догоняется миграциями.
+
+--baseline сравнивает с прошлым прогоном (--json), --max-p95-ms и --max-error-rate
+завершают процесс с кодом 1 при превышении — для проверки в CI.
+
+Примеры:
+  UPDATE_RECORD_PATH=records/updates.jsonl.gz python -m app.main     # запись на проде/стейдже
+  python3 tools/replay_updates.py records/updates.jsonl.gz --speed 20 --json replay.json
+  python3 tools/replay_updates.py records/updates.jsonl.gz --speed 100 --baseline replay.json --max-p95-ms 250
+"""
+
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import json
+import logging
+import os
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from tools.fake_telegram import FAKE_BOT_TOKEN, FakeTelegramRequest  # noqa: E402
+
+logger = logging.getLogger("replay_updates")
+
+# Метка апдейта, который сейчас обрабатывается, — для подсчёта ошибок в error handler
+_current_label = contextvars.ContextVar("replay_label", default="—")
+NO_HANDLER = "(нет хендлера)"
+
+
+def _percentile(values: list, p: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(p / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _configure_env(args) -> None:
+    """Окружение до импорта app.config: .env прода не читаем."""
+    os.environ["ENV_FILE"] = os.devnull
+    os.environ["BOT_TOKEN"] = FAKE_BOT_TOKEN
+    os.environ["UPDATE_RECORD_PATH"] = ""
+    os.environ["METRICS_PORT"] = "0"
+    if args.dsn:
+        from tools.bench_delivery import _check_bench_dsn
+
+        _check_bench_dsn(args.dsn, args.force)
+        os.environ["STORAGE_BACKEND"] = "postgres"
+        os.environ["DATABASE_URL"] = args.dsn
+    else:
+        os.environ["STORAGE_BACKEND"] = "memory"
+
+
+def load_records(path: str, limit: Optional[int]) -> list:
+    from app.update_recorder import read_recording
+
+    records = []
+    for t, update in read_recording(path):
+        records.append((t, update))
+        if limit and len(records) >= limit:
+            break
+    records.sort(key=lambda record: record[0])
+    return records
+
+
+def replay_offsets(records: list, speed: float, max_gap: float) -> list:
+    """Моменты подачи апдейтов от начала воспроизведения, сек (паузы сжаты до max_gap, затем / speed)."""
+    offsets = []
+    elapsed = 0.0
+    previous = records[0][0] if records else 0.0
+    for t, _update in records:
+        gap = t - previous
+        elapsed += min(gap, max_gap) if max_gap > 0 else gap
+        previous = t
+        offsets.append(elapsed / speed)
+    return offsets
+
+
+def _route_label(application, update) -> str:
+    """Метка хендлера, который обработает апдейт (первый подходящий, как в PTB)."""
+    from app.metrics import _handler_label
+
+    for group in sorted(application.handlers):
+        for handler in application.handlers[group]:
+            check = handler.check_update(update)
+            if check is not None and check is not False:
+                return _handler_label(handler, check)
+    return NO_HANDLER
+
+
+async def replay(args, records: list) -> dict:
+    from telegram import Update
+    from telegram.ext import Application
+
+    from app.main import register_handlers
+
+    if args.dsn:
+        from data.migrations import ensure_schema
+
+        ensure_schema(auto_migrate=True)
+
+    request = FakeTelegramRequest(
+        latency=args.tg_latency, jitter=args.tg_jitter, fail_rate=args.fail_rate, seed=args.seed
+    )
+    application = (
+        Application.builder()
+        .token(FAKE_BOT_TOKEN)
+        .request(request)
+        .get_updates_request(FakeTelegramRequest())
+        .build()
+    )
+    register_handlers(application)
+    errors = Counter()
+
+    async def count_error(update, context):
+        errors[_current_label.get()] += 1
+
+    application.add_error_handler(count_error)
+    await application.initialize()
+    await application.start()
+    request.reset()
+
+    concurrency = args.concurrency or max(1, application.concurrent_updates)
+    semaphore = asyncio.Semaphore(concurrency)
+    service = defaultdict(list)
+    total = defaultdict(list)
+    offsets = replay_offsets(records, args.speed, args.max_gap)
+
+    async def run_one(update, label: str, due: float) -> None:
+        async with semaphore:
+            _current_label.set(label)
+            started = time.perf_counter()
+            await application.process_update(update)
+            finished = time.perf_counter()
+        service[label].append(finished - started)
+        total[label].append(finished - due)
+
+    tasks = []
+    replay_started = time.perf_counter()
+    for (_t, data), offset in zip(records, offsets):
+        due = replay_started + offset
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        update = Update.de_json(data, application.bot)
+        tasks.append(asyncio.create_task(run_one(update, _route_label(application, update), due)))
+    await asyncio.gather(*tasks)
+    wall_time = time.perf_counter() - replay_started
+
+    await application.stop()
+    await application.shutdown()
+
+    handlers = {}
+    for label in sorted(service, key=lambda name: -len(service[name])):
+        durations = service[label]
+        handlers[label] = {
+            "count": len(durations),
+            "errors": errors.get(label, 0),
+            "p50_ms": round(_percentile(durations, 50) * 1000, 2),
+            "p95_ms": round(_percentile(durations, 95) * 1000, 2),
+            "p99_ms": round(_percentile(durations, 99) * 1000, 2),
+            "max_ms": round(max(durations) * 1000, 2),
+            "total_p95_ms": round(_percentile(total[label], 95) * 1000, 2),
+        }
+    all_service = [value for values in service.values() for value in values]
+    all_total = [value for values in total.values() for value in values]
+    count = len(all_service)
+    error_count = sum(errors.values())
+    recorded_span = records[-1][0] - records[0][0] if records else 0.0
+    return {
+        "started_at": datetime.now().isoformat(timespec="seconds"),
+        "params": {
+            "file": args.file, "speed": args.speed, "max_gap": args.max_gap, "concurrency": concurrency,
+            "tg_latency": args.tg_latency, "tg_jitter": args.tg_jitter, "fail_rate": args.fail_rate,
+            "storage": "postgres" if args.dsn else "memory",
+        },
+        "summary": {
+            "updates": count,
+            "recorded_span_s": round(recorded_span, 1),
+            "wall_time_s": round(wall_time, 3),
+            "throughput_ups": round(count / wall_time, 2) if wall_time else 0.0,
+            "errors": error_count,
+            "error_rate": round(error_count / count, 4) if count else 0.0,
+            "p50_ms": round(_percentile(all_service, 50) * 1000, 2),
+            "p95_ms": round(_percentile(all_service, 95) * 1000, 2),
+            "p99_ms": round(_percentile(all_service, 99) * 1000, 2),
+            "total_p95_ms": round(_percentile(all_total, 95) * 1000, 2),
+            "telegram_calls": dict(request.counts()),
+        },
+        "handlers": handlers,
+    }
+
+
+def _delta(value: float, base: Optional[float]) -> str:
+    if not base:
+        return "—"
+    return f"{(value - base) / base * 100:+.0f}%"
+
+
+def print_report(report: dict, baseline: Optional[dict]) -> None:
+    summary = report["summary"]
+    params = report["params"]
+    print(
+        f"Апдейтов: {summary['updates']} (запись {summary['recorded_span_s']} с) за {summary['wall_time_s']} с "
+        f"при x{params['speed']:g}, параллельно {params['concurrency']}, хранилище {params['storage']}"
+    )
+    print(
+        f"Пропускная способность: {summary['throughput_ups']} апд/с, ошибок {summary['errors']} "
+        f"({summary['error_rate'] * 100:.2f}%), p50/p95/p99 {summary['p50_ms']}/{summary['p95_ms']}/"
+        f"{summary['p99_ms']} мс, p95 с очередью {summary['total_p95_ms']} мс"
+    )
+    if baseline:
+        base = baseline.get("summary", {})
+        print(
+            f"  vs base: апд/с {_delta(summary['throughput_ups'], base.get('throughput_ups'))}, "
+            f"p95 {_delta(summary['p95_ms'], base.get('p95_ms'))}, "
+            f"p99 {_delta(summary['p99_ms'], base.get('p99_ms'))}, "
+            f"ошибки {base.get('error_rate', 0) * 100:.2f}% → {summary['error_rate'] * 100:.2f}%"
+        )
+
+    columns = [
+        ("count", "n"), ("errors", "err"), ("p50_ms", "p50 ms"), ("p95_ms", "p95 ms"),
+        ("p99_ms", "p99 ms"), ("max_ms", "max ms"), ("total_p95_ms", "p95+q ms"),
+    ]
+    width = max([len("handler")] + [len(label) for label in report["handlers"]]) + 2
+    header = f"{'handler':<{width}}" + "".join(f"{title:>10}" for _, title in columns)
+    print()
+    print(header)
+    print("-" * len(header))
+    base_handlers = (baseline or {}).get("handlers", {})
+    for label, data in report["handlers"].items():
+        print(f"{label:<{width}}" + "".join(f"{data[key]:>10}" for key, _ in columns))
+        if label in base_handlers:
+            base = base_handlers[label]
+            print(f"{'  vs base':<{width}}{'':>10}{'':>10}" + "".join(
+                f"{_delta(data[key], base.get(key)):>10}" for key, _ in columns[2:]
+            ))
+    if summary["telegram_calls"]:
+        calls = ", ".join(f"{k}={v}" for k, v in sorted(summary["telegram_calls"].items()))
+        print(f"\nTelegram: {calls}")
+
+
+def _load_baseline(path: Optional[str]) -> Optional[dict]:
+    if not path:
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Воспроизведение записанных апдейтов YogaDailyBot")
+    parser.add_argument("file", help="файл записи (UPDATE_RECORD_PATH), .jsonl.gz")
+    parser.add_argument("--speed", type=float, default=10.0, help="ускорение относительно записи, 1–100")
+    parser.add_argument("--max-gap", type=float, default=60.0, help="паузы записи длиннее, сек, сжимаются (0 — нет)")
+    parser.add_argument("--limit", type=int, default=0, help="воспроизвести только первые N апдейтов")
+    parser.add_argument("--concurrency", type=int, default=0, help="апдейтов параллельно (0 — как в Application)")
+    parser.add_argument("--tg-latency", type=float, default=0.03, help="задержка фейкового Bot API, сек")
+    parser.add_argument("--tg-jitter", type=float, default=0.02)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="доля send*, на которые бот «заблокирован»")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--dsn", default="", help="PostgreSQL вместо хранилища в памяти (в имени БД — «bench»)")
+    parser.add_argument("--force", action="store_true", help="разрешить БД без «bench» в имени")
+    parser.add_argument("--json", help="сохранить результаты в файл")
+    parser.add_argument("--baseline", help="JSON прошлого прогона для сравнения")
+    parser.add_argument("--max-p95-ms", type=float, default=0.0, help="код 1, если общий p95 обработки выше")
+    parser.add_argument("--max-error-rate", type=float, default=-1.0, help="код 1, если доля ошибок выше")
+    parser.add_argument("--verbose", action="store_true", help="не глушить print() и логи бота")
+    args = parser.parse_args()
+    if not 1 <= args.speed <= 100:
+        parser.error("--speed должен быть от 1 до 100")
+
+    _configure_env(args)
+    records = load_records(args.file, args.limit or None)
+    if not records:
+        print(f"В {args.file} нет апдейтов")
+        return 1
+
+    sink = sys.stdout if args.verbose else open(os.devnull, "w")
+    with contextlib.redirect_stdout(sink):
+        from app.logging_setup import setup_logging
+
+        # Настраиваем логирование сами, до app.main: его повторный setup_logging() ничего не сделает
+        # и не вернёт уровень LOG_LEVEL. Логи идут через QueueHandler корневого логгера в stderr,
+        # redirect_stdout их не глушит; уровень корня отсекает записи ещё в logger.info(), до очереди
+        setup_logging()
+        logging.getLogger().setLevel(logging.INFO if args.verbose else logging.ERROR)
+        report = asyncio.run(replay(args, records))
+
+    print_report(report, _load_baseline(args.baseline))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Результаты сохранены в {args.json}")
+
+    summary = report["summary"]
+    failed = []
+    if args.max_p95_ms and summary["p95_ms"] > args.max_p95_ms:
+        failed.append(f"p95 {summary['p95_ms']} мс > {args.max_p95_ms:g} мс")
+    if args.max_error_rate >= 0 and summary["error_rate"] > args.max_error_rate:
+        failed.append(f"доля ошибок {summary['error_rate']} > {args.max_error_rate:g}")
+    for problem in failed:
+        print(f"❌ {problem}")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
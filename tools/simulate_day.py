@@ -0,0 +1,631 @@
+"""Симуляция суток (или недели) работы бота на виртуальных часах — для планирования пика в 08:00.
+
+Что делает:
+  1) включает хранилище в памяти (STORAGE_BACKEND=memory) и виртуальные часы (app/clock.py);
+  2) заселяет синтетическую аудиторию: Daily с пиком на --spike-time, челлендж, пауза 7+ дней,
+     By mood без активности 7+ дней, новые пользователи по ходу дня (застревают после /start);
+  3) регистрирует те же фоновые задачи, что и app/main.py (рассылка, план на день, outbox,
+     напоминания о паузе и By mood, сводка челленджа, снятие кнопок, обслуживание логов),
+     и прокручивает их очередь по виртуальному времени: задачи, назначенные на один момент,
+     стартуют одновременно, между моментами часы перескакивают без ожидания;
+  4) пользователи жмут «✅ Я сделал!» (--done-rate) через случайное время после практики —
+     настоящим хендлером, поэтому вечерние напоминания в 19:30 получают только не отметившие.
+
+Telegram подменяется tools/fake_telegram.py. Отчёт: сообщения по минутам и пиковая минута,
+одновременные задачи и запросы к Bot API, вызовы хранилища по минутам (≈ транзакции PostgreSQL)
+и очередь отправки при лимите OUTBOUND_RATE_PER_SECOND: сколько сообщений копится в пик
+и через сколько уходит последнее.
+
+Примеры:
+  python3 tools/simulate_day.py --users 5000
+  python3 tools/simulate_day.py --users 20000 --days 7 --spike-share 0.4 --json sim.json
+  python3 tools/simulate_day.py --users 2000 --tg-latency 0.03 --rate 30
+"""
+
+import argparse
+import asyncio
+import contextlib
+import contextvars
+import heapq
+import itertools
+import json
+import logging
+import os
+import random
+import re
+import sys
+import time
+from collections import Counter, defaultdict
+from datetime import date, datetime, time as dt_time, timedelta, timezone
+from pathlib import Path
+from typing import Optional
+
+ROOT = Path(__file__).resolve().parent.parent
+sys.path.insert(0, str(ROOT))
+
+from tools.fake_telegram import FAKE_BOT_TOKEN, FakeTelegramRequest  # noqa: E402
+
+# Окружение симуляции — до импорта app.config: .env прода не читаем, хранилище только в памяти
+SIM_GROUP_CHAT_ID = "-1000000000001"
+os.environ["ENV_FILE"] = os.devnull
+os.environ["STORAGE_BACKEND"] = "memory"
+os.environ["DB_METRICS_ENABLED"] = "1"
+os.environ["BOT_TOKEN"] = FAKE_BOT_TOKEN
+os.environ.setdefault("CHALLENGE_GROUP_CHAT_ID", SIM_GROUP_CHAT_ID)
+
+from app import clock  # noqa: E402
+from app.config import DEFAULT_TZ, OUTBOUND_RATE_PER_SECOND  # noqa: E402
+from zoneinfo import ZoneInfo  # noqa: E402
+
+logger = logging.getLogger("simulate_day")
+
+MOSCOW_TZ = ZoneInfo(DEFAULT_TZ)
+# Лимит Telegram на исходящие, если OUTBOUND_RATE_PER_SECOND=0 (без ограничения)
+TELEGRAM_RATE_PER_SECOND = 30
+# Пользователи «приходят» за столько дней до старта: пауза и By mood успевают стать недельными
+SEED_DAYS_BEFORE = 8
+USER_ID_BASE = 1_000_000
+INTENSITIES = ("мягкая", "средняя", "интенсивная")
+DURATIONS = (15, 20, 30, 45, 60)
+# Методы Bot API, которые доставляют пользователю новое сообщение
+MESSAGE_METHODS = ("sendMessage", "sendPhoto", "sendVideo", "sendDocument", "copyMessage", "forwardMessage")
+
+# Какая задача сейчас выполняется — чтобы разложить сообщения по источникам
+_current_job = contextvars.ContextVar("simulated_job", default="—")
+
+
+def _job_label(name: Optional[str]) -> str:
+    """Имя задачи без user_id в конце: done_reminder_1930_123 → done_reminder_1930."""
+    return re.sub(r"_\d+$", "", name or "") or "—"
+
+
+def _minute(moment: datetime) -> datetime:
+    return moment.astimezone(MOSCOW_TZ).replace(second=0, microsecond=0)
+
+
+# --- Виртуальная JobQueue ---
+
+class SimJob:
+    """Задача виртуальной очереди: то, что callback'и читают из context.job."""
+
+    def __init__(self, callback, next_t: datetime, name: Optional[str], data, interval: Optional[timedelta]):
+        self.callback = callback
+        self.next_t = next_t
+        self.name = name
+        self.data = data
+        self.interval = interval
+        self.removed = False
+
+    def schedule_removal(self) -> None:
+        self.removed = True
+
+
+class _NoScheduler:
+    """job_queue.scheduler: задачи живут только в VirtualJobQueue, у APScheduler их нет."""
+
+    def get_job(self, job_id):
+        return None
+
+    def remove_job(self, job_id):
+        pass
+
+
+class VirtualJobQueue:
+    """Подмножество telegram.ext.JobQueue, которое использует бот, на виртуальных часах."""
+
+    def __init__(self, virtual_clock: clock.VirtualClock):
+        self._clock = virtual_clock
+        self._heap = []
+        self._seq = itertools.count()
+        self._by_name = defaultdict(list)
+        self.scheduler = _NoScheduler()
+
+    def _resolve_when(self, when) -> datetime:
+        now = self._clock()
+        if isinstance(when, (int, float)):
+            return now + timedelta(seconds=when)
+        if isinstance(when, timedelta):
+            return now + when
+        if isinstance(when, datetime):
+            return (when if when.tzinfo else when.replace(tzinfo=MOSCOW_TZ)).astimezone(timezone.utc)
+        if isinstance(when, dt_time):
+            local_now = now.astimezone(MOSCOW_TZ)
+            moment = datetime.combine(local_now.date(), when, tzinfo=when.tzinfo or MOSCOW_TZ)
+            if moment <= local_now:
+                moment += timedelta(days=1)
+            return moment.astimezone(timezone.utc)
+        raise TypeError(f"Неподдерживаемый when: {when!r}")
+
+    def _push(self, job: SimJob) -> SimJob:
+        heapq.heappush(self._heap, (job.next_t, next(self._seq), job))
+        if job.name:
+            self._by_name[job.name].append(job)
+        return job
+
+    def run_once(self, callback, when, data=None, name=None, chat_id=None, user_id=None, job_kwargs=None):
+        return self._push(SimJob(callback, self._resolve_when(when), name, data, None))
+
+    def run_repeating(self, callback, interval, first=None, last=None, data=None, name=None,
+                      chat_id=None, user_id=None, job_kwargs=None):
+        if not isinstance(interval, timedelta):
+            interval = timedelta(seconds=interval)
+        next_t = self._resolve_when(first if first is not None else interval)
+        return self._push(SimJob(callback, next_t, name, data, interval))
+
+    def get_jobs_by_name(self, name: str) -> tuple:
+        return tuple(job for job in self._by_name.get(name, ()) if not job.removed)
+
+    def next_time(self) -> Optional[datetime]:
+        while self._heap and self._heap[0][2].removed:
+            self._forget(heapq.heappop(self._heap)[2])
+        return self._heap[0][0] if self._heap else None
+
+    def pop_due(self, moment: datetime) -> list:
+        """Все живые задачи, назначенные на moment и раньше."""
+        due = []
+        while self._heap and self._heap[0][0] <= moment:
+            job = heapq.heappop(self._heap)[2]
+            if job.removed:
+                self._forget(job)
+            else:
+                due.append(job)
+        return due
+
+    def reschedule(self, job: SimJob) -> None:
+        """Повторяющаяся задача — на следующий интервал от планового момента, разовая — забыть."""
+        if job.interval is not None and not job.removed:
+            job.next_t += job.interval
+            heapq.heappush(self._heap, (job.next_t, next(self._seq), job))
+        else:
+            job.removed = True
+            self._forget(job)
+
+    def _forget(self, job: SimJob) -> None:
+        jobs = self._by_name.get(job.name)
+        if jobs is not None:
+            with contextlib.suppress(ValueError):
+                jobs.remove(job)
+            if not jobs:
+                del self._by_name[job.name]
+
+
+class SimApplication:
+    """То, что schedule_*() и callback'и берут из Application: bot, job_queue и данные пользователей."""
+
+    def __init__(self, bot, job_queue: VirtualJobQueue):
+        self.bot = bot
+        self.job_queue = job_queue
+        self.bot_data = {}
+        self.user_data = defaultdict(dict)
+        self.chat_data = defaultdict(dict)
+
+
+class SimContext:
+    """Аналог CallbackContext для задачи или действия пользователя."""
+
+    def __init__(self, application: SimApplication, job: Optional[SimJob] = None, user_id: Optional[int] = None):
+        self.application = application
+        self.bot = application.bot
+        self.job_queue = application.job_queue
+        self.job = job
+        self.bot_data = application.bot_data
+        self.user_data = application.user_data[user_id] if user_id is not None else {}
+        self.chat_data = application.chat_data[user_id] if user_id is not None else {}
+
+
+# --- Статистика ---
+
+class SimulationStats:
+    def __init__(self):
+        self.messages_by_minute = Counter()
+        self.api_by_minute = Counter()
+        self.db_by_minute = Counter()
+        self.methods = Counter()
+        self.messages_by_job = Counter()
+        self.job_runs = Counter()
+        # [(момент, сообщений)] — по тикам очереди, для расчёта очереди отправки
+        self.message_ticks = []
+        self.messages = 0
+        self.running_jobs = 0
+        self.peak_jobs = 0
+        self.in_flight = 0
+        self.peak_in_flight = 0
+
+    def api_call_started(self, method: str) -> None:
+        minute = _minute(clock.now())
+        self.methods[method] += 1
+        self.api_by_minute[minute] += 1
+        if method in MESSAGE_METHODS:
+            self.messages += 1
+            self.messages_by_minute[minute] += 1
+            self.messages_by_job[_current_job.get()] += 1
+        self.in_flight += 1
+        self.peak_in_flight = max(self.peak_in_flight, self.in_flight)
+
+    def api_call_finished(self) -> None:
+        self.in_flight -= 1
+
+    def job_started(self, label: str) -> None:
+        self.job_runs[label] += 1
+        self.running_jobs += 1
+        self.peak_jobs = max(self.peak_jobs, self.running_jobs)
+
+    def job_finished(self) -> None:
+        self.running_jobs -= 1
+
+
+class _SimRequest(FakeTelegramRequest):
+    """Фейковый Bot API, который считает вызовы по виртуальным минутам и сообщает об отправленных практиках."""
+
+    def __init__(self, stats: SimulationStats, on_practice_sent=None, **kwargs):
+        super().__init__(**kwargs)
+        self._stats = stats
+        self._on_practice_sent = on_practice_sent
+
+    async def do_request(self, url, method, request_data=None, read_timeout=None, write_timeout=None,
+                         connect_timeout=None, pool_timeout=None):
+        self._stats.api_call_started(url.rsplit("/", 1)[-1])
+        try:
+            return await super().do_request(
+                url, method, request_data, read_timeout, write_timeout, connect_timeout, pool_timeout,
+            )
+        finally:
+            self._stats.api_call_finished()
+
+    def _result(self, api_method: str, params: dict):
+        result = super()._result(api_method, params)
+        if (
+            self._on_practice_sent
+            and api_method == "sendMessage"
+            and "practice_done" in str(params.get("reply_markup") or "")
+        ):
+            self._on_practice_sent(int(params["chat_id"]), result["message_id"])
+        return result
+
+
+# --- Аудитория ---
+
+def _pick_notify_time(rng: random.Random, args) -> str:
+    if rng.random() < args.spike_share:
+        return args.spike_time
+    minutes = rng.randrange(6 * 60, 23 * 60, 5)
+    return f"{minutes // 60:02d}:{minutes % 60:02d}"
+
+
+def seed_population(args, rng: random.Random) -> Counter:
+    """Каталог практик и пользователи; часы в этот момент стоят за SEED_DAYS_BEFORE дней до старта."""
+    import data.db as db
+
+    for index in range(1, args.practices + 1):
+        db.add_yoga_practice(
+            f"Практика {index}", f"https://youtu.be/sim{index:05d}", rng.choice(DURATIONS), "Канал симуляции",
+            my_description="Практика для симуляции", intensity=rng.choice(INTENSITIES), weekday=(index - 1) % 7 + 1,
+        )
+        if index % 10 == 1:
+            db.add_bonus_practice(index, "Бонус", f"https://youtu.be/simbonus{index:05d}", 10, "Канал симуляции")
+
+    shares = (("challenge", args.challenge_share), ("paused", args.paused_share), ("by_mood", args.by_mood_share))
+    roles = Counter()
+    for user_id in range(USER_ID_BASE, USER_ID_BASE + args.users):
+        draw = rng.random()
+        role = "daily"
+        for name, share in shares:
+            if draw < share:
+                role = name
+                break
+            draw -= share
+        roles[role] += 1
+        name = f"sim_{user_id}"
+        if role == "by_mood":
+            db.activate_user_by_mood(user_id, user_id, user_name=name)
+            db.touch_by_mood_activity(user_id)
+            continue
+        db.save_user_time(user_id, user_id, _pick_notify_time(rng, args), user_name=name)
+        if role == "challenge":
+            db.set_user_challenge(user_id, 1)
+        elif role == "paused":
+            db.toggle_user_pause(user_id)
+    return roles
+
+
+# --- Прогон ---
+
+class DaySimulation:
+    def __init__(self, args, application: SimApplication, virtual_clock: clock.VirtualClock,
+                 stats: SimulationStats, rng: random.Random):
+        self.args = args
+        self.app = application
+        self.clock = virtual_clock
+        self.stats = stats
+        self.rng = rng
+        self._next_new_user = USER_ID_BASE + args.users
+        self._update_ids = itertools.count(1)
+
+    # Действия пользователей — те же задачи в виртуальной очереди
+
+    def on_practice_sent(self, chat_id: int, message_id: int) -> None:
+        if self.rng.random() < self.args.done_rate:
+            delay = timedelta(hours=self.rng.uniform(0.1, self.args.done_within_hours))
+            self.app.job_queue.run_once(
+                self._press_done, when=delay, data={"user_id": chat_id, "message_id": message_id}, name="user_done",
+            )
+
+    async def _press_done(self, context: SimContext) -> None:
+        from telegram import Update
+
+        from app.handlers.done import handle_practice_done_callback
+
+        user_id = context.job.data["user_id"]
+        update = Update.de_json(
+            {
+                "update_id": next(self._update_ids),
+                "callback_query": {
+                    "id": str(next(self._update_ids)),
+                    "from": {"id": user_id, "is_bot": False, "first_name": f"sim_{user_id}"},
+                    "chat_instance": "sim",
+                    "data": "practice_done",
+                    "message": {
+                        "message_id": context.job.data["message_id"],
+                        "date": int(self.clock().timestamp()),
+                        "chat": {"id": user_id, "type": "private"},
+                    },
+                },
+            },
+            self.app.bot,
+        )
+        await handle_practice_done_callback(update, context)
+
+    async def _start_new_user(self, context: SimContext) -> None:
+        from app.onboarding import schedule_mode_reminders
+        from data.db import set_user_onboarding_required
+
+        user_id = context.job.data["user_id"]
+        set_user_onboarding_required(user_id, chat_id=user_id, user_name=f"sim_{user_id}")
+        await schedule_mode_reminders(context, user_id, user_id)
+
+    def schedule_new_users(self, start: datetime) -> int:
+        """Новые пользователи по ходу каждого дня: /start без выбора режима (напоминания через 1 и 24 ч)."""
+        total = 0
+        for day in range(self.args.days):
+            for _ in range(self.args.new_users):
+                moment = start + timedelta(days=day, seconds=self.rng.uniform(7 * 3600, 23 * 3600))
+                self.app.job_queue.run_once(
+                    self._start_new_user, when=moment, data={"user_id": self._next_new_user}, name="user_start",
+                )
+                self._next_new_user += 1
+                total += 1
+        return total
+
+    async def _run_job(self, job: SimJob) -> None:
+        label = _job_label(job.name)
+        token = _current_job.set(label)
+        self.stats.job_started(label)
+        user_id = job.data.get("user_id") if isinstance(job.data, dict) else None
+        try:
+            await job.callback(SimContext(self.app, job, user_id))
+        except Exception as e:
+            logger.error("Задача %s упала: %s", job.name, e)
+        finally:
+            self.stats.job_finished()
+            _current_job.reset(token)
+
+    async def run_until(self, end: datetime, request: FakeTelegramRequest) -> int:
+        """Прокручивает очередь до end; возвращает число тиков (моментов с задачами)."""
+        from data.instrumentation import totals
+
+        queue = self.app.job_queue
+        ticks = 0
+        db_calls = totals()["calls"]
+        while True:
+            moment = queue.next_time()
+            if moment is None or moment > end:
+                break
+            self.clock.set(moment)
+            jobs = queue.pop_due(moment)
+            messages_before = self.stats.messages
+            # Задачи одного момента стартуют вместе, как у APScheduler
+            await asyncio.gather(*(self._run_job(job) for job in jobs))
+            for job in jobs:
+                queue.reschedule(job)
+            ticks += 1
+            sent = self.stats.messages - messages_before
+            if sent:
+                self.stats.message_ticks.append((moment, sent))
+            calls = totals()["calls"]
+            if calls != db_calls:
+                self.stats.db_by_minute[_minute(moment)] += calls - db_calls
+                db_calls = calls
+            # Журнал вызовов фейкового API не нужен — всё уже в счётчиках
+            request.reset()
+        self.clock.set(end)
+        return ticks
+
+
+def project_send_queue(message_ticks: list, rate: float) -> dict:
+    """Очередь отправки при rate сообщений/с: пик и сколько ждёт последнее сообщение пика."""
+    backlog = 0.0
+    previous = None
+    peak, peak_at = 0.0, None
+    for moment, count in message_ticks:
+        if previous is not None:
+            backlog = max(0.0, backlog - rate * (moment - previous).total_seconds())
+        backlog += count
+        previous = moment
+        if backlog > peak:
+            peak, peak_at = backlog, moment
+    return {
+        "rate_per_second": rate,
+        "peak_backlog": int(peak),
+        "peak_at": peak_at.astimezone(MOSCOW_TZ).isoformat(timespec="seconds") if peak_at else None,
+        "max_wait_seconds": round(peak / rate, 1) if rate else None,
+    }
+
+
+async def simulate(args) -> dict:
+    from telegram.ext import Application
+
+    import data.instrumentation as instrumentation
+    import data.memory_db as memory_db
+    from app.by_mood.reminders import schedule_by_mood_reminders
+    from app.challenge.job import schedule_challenge_summary
+    from app.daily.pause import schedule_pause_reminders
+    from app.keyboard_cleanup import schedule_keyboard_cleanup
+    from app.outbox import schedule_outbox_sender
+    from app.schedule.daily_plan import schedule_daily_plan
+    from app.schedule.maintenance import schedule_practice_logs_maintenance
+    from app.schedule.scheduler import schedule_daily_practices
+
+    rng = random.Random(args.seed)
+    start = datetime.combine(args.start, dt_time(0, 0), tzinfo=MOSCOW_TZ)
+    end = start + timedelta(days=args.days)
+    virtual_clock = clock.VirtualClock(start - timedelta(days=SEED_DAYS_BEFORE))
+    clock.set_clock(virtual_clock)
+    memory_db.reset_memory_db()
+
+    stats = SimulationStats()
+    request = _SimRequest(stats, latency=args.tg_latency, jitter=args.tg_jitter, fail_rate=args.fail_rate, seed=args.seed)
+    application = (
+        Application.builder()
+        .token(FAKE_BOT_TOKEN)
+        .request(request)
+        .get_updates_request(FakeTelegramRequest())
+        .job_queue(None)
+        .build()
+    )
+    await application.initialize()
+    sim_app = SimApplication(application.bot, VirtualJobQueue(virtual_clock))
+    simulation = DaySimulation(args, sim_app, virtual_clock, stats, rng)
+    request._on_practice_sent = simulation.on_practice_sent
+
+    roles = seed_population(args, rng)
+    virtual_clock.set(start)
+    new_users = simulation.schedule_new_users(start)
+    # Те же фоновые задачи, что регистрирует app/main.py
+    for register in (
+        schedule_daily_practices, schedule_daily_plan, schedule_pause_reminders, schedule_by_mood_reminders,
+        schedule_challenge_summary, schedule_practice_logs_maintenance, schedule_outbox_sender,
+        schedule_keyboard_cleanup,
+    ):
+        register(sim_app)
+    instrumentation.reset()
+    stats.__init__()
+    request.reset()
+
+    started = time.perf_counter()
+    ticks = await simulation.run_until(end, request)
+    wall_time = time.perf_counter() - started
+    await application.shutdown()
+    clock.set_clock(None)
+
+    rate = args.rate or OUTBOUND_RATE_PER_SECOND or TELEGRAM_RATE_PER_SECOND
+    db_functions = sorted(instrumentation.snapshot().items(), key=lambda item: item[1]["calls"], reverse=True)
+    peak_minute = max(stats.messages_by_minute.items(), key=lambda item: item[1], default=(None, 0))
+    peak_db_minute = max(stats.db_by_minute.items(), key=lambda item: item[1], default=(None, 0))
+    minutes = sorted(set(stats.api_by_minute) | set(stats.db_by_minute))
+    return {
+        "params": {key: (value.isoformat() if isinstance(value, date) else value) for key, value in vars(args).items()},
+        "population": dict(roles, new_users=new_users),
+        "wall_seconds": round(wall_time, 2),
+        "virtual_seconds": (end - start).total_seconds(),
+        "ticks": ticks,
+        "messages": stats.messages,
+        "api_calls": sum(stats.methods.values()),
+        "methods": dict(stats.methods.most_common()),
+        "messages_by_job": dict(stats.messages_by_job.most_common()),
+        "job_runs": dict(stats.job_runs.most_common()),
+        "peak_minute": {
+            "minute": peak_minute[0].isoformat(timespec="minutes") if peak_minute[0] else None,
+            "messages": peak_minute[1],
+        },
+        "minutes_over_rate": sum(1 for count in stats.messages_by_minute.values() if count > rate * 60),
+        "peak_concurrent_jobs": stats.peak_jobs,
+        "peak_in_flight_requests": stats.peak_in_flight,
+        "send_queue": project_send_queue(stats.message_ticks, rate),
+        "db": {
+            "calls": sum(stats.db_by_minute.values()),
+            "peak_minute": peak_db_minute[0].isoformat(timespec="minutes") if peak_db_minute[0] else None,
+            "peak_minute_calls": peak_db_minute[1],
+            "top_functions": {name: data["calls"] for name, data in db_functions[:10]},
+        },
+        "per_minute": [
+            {
+                "minute": minute.isoformat(timespec="minutes"),
+                "messages": stats.messages_by_minute.get(minute, 0),
+                "api_calls": stats.api_by_minute.get(minute, 0),
+                "db_calls": stats.db_by_minute.get(minute, 0),
+            }
+            for minute in minutes
+        ],
+    }
+
+
+def print_report(report: dict, top_minutes: int) -> None:
+    params = report["params"]
+    population = ", ".join(f"{role} {count}" for role, count in report["population"].items())
+    speedup = report["virtual_seconds"] / report["wall_seconds"] if report["wall_seconds"] else 0
+    print(f"Симуляция с {params['start']} на {params['days']} дн.: {population}")
+    print(f"Прогон {report['wall_seconds']:.1f} с, ускорение ×{speedup:,.0f}, моментов с задачами {report['ticks']}")
+    print(f"Сообщений: {report['messages']}, запросов к Bot API: {report['api_calls']}")
+    print("  по методам: " + ", ".join(f"{m}={c}" for m, c in report["methods"].items()))
+    print("  сообщения по задачам: " + ", ".join(f"{j}={c}" for j, c in report["messages_by_job"].items()))
+    rate = report["send_queue"]["rate_per_second"]
+    peak = report["peak_minute"]
+    if peak["minute"]:
+        print(f"Пиковая минута: {peak['minute']} — {peak['messages']} сообщений ({peak['messages'] / 60:.1f}/с)")
+    print(f"Минут выше лимита {rate:g}/с ({rate * 60:.0f}/мин): {report['minutes_over_rate']}")
+    busiest = sorted(report["per_minute"], key=lambda row: row["messages"], reverse=True)[:top_minutes]
+    for row in busiest:
+        if row["messages"]:
+            print(f"  {row['minute']}  сообщений {row['messages']:>7}  запросов {row['api_calls']:>7}  хранилище {row['db_calls']:>7}")
+    print(f"Одновременно: задач до {report['peak_concurrent_jobs']}, "
+          f"запросов к Bot API в полёте до {report['peak_in_flight_requests']}")
+    queue = report["send_queue"]
+    if queue["peak_at"]:
+        print(f"Очередь отправки при {rate:g} сообщ./с: пик {queue['peak_backlog']} в {queue['peak_at']}, "
+              f"последнее сообщение пика уйдёт через {queue['max_wait_seconds']} с")
+    db = report["db"]
+    print(f"Хранилище: {db['calls']} вызовов (≈ транзакций PostgreSQL), пик {db['peak_minute_calls']}/мин в {db['peak_minute']}")
+    print("  чаще всего: " + ", ".join(f"{name}={calls}" for name, calls in db["top_functions"].items()))
+    print("Задачи: " + ", ".join(f"{job}={runs}" for job, runs in report["job_runs"].items()))
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Симуляция суток работы YogaDailyBot на виртуальных часах")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--days", type=int, default=1, help="сколько суток прокрутить (7 — неделя)")
+    parser.add_argument("--start", type=date.fromisoformat, default=None, help="первый день, YYYY-MM-DD (по умолчанию сегодня МСК)")
+    parser.add_argument("--practices", type=int, default=140)
+    parser.add_argument("--spike-time", default="08:00", help="самое популярное время рассылки")
+    parser.add_argument("--spike-share", type=float, default=0.3, help="доля пользователей с этим временем")
+    parser.add_argument("--challenge-share", type=float, default=0.2)
+    parser.add_argument("--paused-share", type=float, default=0.05)
+    parser.add_argument("--by-mood-share", type=float, default=0.1)
+    parser.add_argument("--new-users", type=int, default=20, help="новых пользователей в день (застревают после /start)")
+    parser.add_argument("--done-rate", type=float, default=0.6, help="доля практик, отмеченных «Я сделал»")
+    parser.add_argument("--done-within-hours", type=float, default=12.0, help="в пределах скольких часов жмут кнопку")
+    parser.add_argument("--tg-latency", type=float, default=0.0, help="задержка фейкового Bot API, реальные сек")
+    parser.add_argument("--tg-jitter", type=float, default=0.0)
+    parser.add_argument("--fail-rate", type=float, default=0.0, help="доля send*, на которые бот «заблокирован»")
+    parser.add_argument("--rate", type=float, default=0.0, help="лимит отправки для расчёта очереди, сообщ./с")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--top-minutes", type=int, default=5, help="сколько самых нагруженных минут показать")
+    parser.add_argument("--json", help="сохранить отчёт с рядом по минутам в файл")
+    parser.add_argument("--verbose", action="store_true", help="не глушить print() и логи бота")
+    args = parser.parse_args()
+    if args.start is None:
+        args.start = datetime.now(MOSCOW_TZ).date()
+
+    logging.basicConfig(level=logging.INFO if args.verbose else logging.WARNING)
+    sink = sys.stdout if args.verbose else open(os.devnull, "w")
+    with contextlib.redirect_stdout(sink):
+        report = asyncio.run(simulate(args))
+    print_report(report, args.top_minutes)
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Отчёт сохранён в {args.json}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,151 @@
+"""Разбор файла трасс (TRACE_FILE, app/tracing.py): куда уходит время апдейтов и джобов.
+
+Печатает:
+  1) по каждому корню (update ^practice_done$, job outbox_sender, ...) — число трасс,
+     p50/p95/max длительности;
+  2) для корней, подходящих под --root, — из чего складывается их время: собственное время
+     спанов по имени (db mark_practice_completed_today, telegram sendMessage, http sendMessage,
+     handler …), среднее на трассу и доля от суммарной длительности корней;
+  3) самые медленные трассы деревом спанов.
+
+Собственное время спана = его длительность минус длительность дочерних, поэтому доли
+складываются в 100% и вложенные вызовы БД не считаются дважды.
+
+Файл — JSON Lines в формате OTLP/JSON; подходят и файлы otlpjsonfile/file exporter
+OpenTelemetry Collector.
+
+Примеры:
+  python3 tools/trace_report.py traces.jsonl
+  python3 tools/trace_report.py traces.jsonl --root practice_done --slowest 3
+"""
+
+import argparse
+import json
+import sys
+from collections import defaultdict
+
+
+def _attributes(span: dict) -> dict:
+    result = {}
+    for item in span.get("attributes", []):
+        value = item.get("value", {})
+        result[item["key"]] = next(iter(value.values()), None) if value else None
+    return result
+
+
+def read_spans(path: str) -> list:
+    spans = []
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                request = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            for resource in request.get("resourceSpans", []):
+                for scope in resource.get("scopeSpans", []):
+                    for span in scope.get("spans", []):
+                        spans.append({
+                            "trace": span["traceId"],
+                            "id": span["spanId"],
+                            "parent": span.get("parentSpanId") or None,
+                            "name": span["name"],
+                            "start": int(span["startTimeUnixNano"]),
+                            "ms": (int(span["endTimeUnixNano"]) - int(span["startTimeUnixNano"])) / 1e6,
+                            "error": (span.get("status") or {}).get("message"),
+                            "attributes": _attributes(span),
+                        })
+    return spans
+
+
+def build_traces(spans: list) -> list:
+    """[(корень, {span_id: [дочерние]})] — трассы с корнем, дочерние по времени начала."""
+    by_trace = defaultdict(list)
+    for span in spans:
+        by_trace[span["trace"]].append(span)
+    traces = []
+    for trace_spans in by_trace.values():
+        children = defaultdict(list)
+        root = None
+        for span in sorted(trace_spans, key=lambda s: s["start"]):
+            if span["parent"] is None:
+                root = span
+            else:
+                children[span["parent"]].append(span)
+        if root is not None:
+            traces.append((root, children))
+    return traces
+
+
+def _percentile(values: list, q: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q * len(values)))] if values else 0.0
+
+
+def _self_times(span: dict, children: dict, totals: dict) -> None:
+    kids = children.get(span["id"], [])
+    # Дочерние спаны из asyncio.to_thread могут перекрываться: собственное время не меньше нуля
+    totals[span["name"]] += max(0.0, span["ms"] - sum(kid["ms"] for kid in kids))
+    for kid in kids:
+        _self_times(kid, children, totals)
+
+
+def _print_tree(span: dict, children: dict, depth: int = 0) -> None:
+    extra = " ".join(f"{key}={value}" for key, value in span["attributes"].items())
+    error = f"  ❌ {span['error']}" if span["error"] else ""
+    print(f"  {'  ' * depth}{span['ms']:9.1f} мс  {span['name']}{('  ' + extra) if extra else ''}{error}")
+    for kid in children.get(span["id"], []):
+        _print_tree(kid, children, depth + 1)
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Разбор трасс: время апдейтов и джобов по спанам")
+    parser.add_argument("path", help="файл трасс (TRACE_FILE)")
+    parser.add_argument("--root", default="", help="подстрока имени корня для разбивки и медленных трасс")
+    parser.add_argument("--slowest", type=int, default=5, help="сколько самых медленных трасс показать")
+    parser.add_argument("--top", type=int, default=15, help="сколько имён спанов в разбивке")
+    args = parser.parse_args()
+
+    traces = build_traces(read_spans(args.path))
+    if not traces:
+        print("В файле нет трасс с корневым спаном.")
+        return 1
+
+    by_root = defaultdict(list)
+    for root, children in traces:
+        by_root[root["name"]].append(root["ms"])
+    print(f"Трасс: {len(traces)}")
+    header = f"{'корень':<48}{'n':>7}{'p50, мс':>10}{'p95, мс':>10}{'max, мс':>10}"
+    print(header)
+    print("-" * len(header))
+    for name, durations in sorted(by_root.items(), key=lambda item: -sum(item[1])):
+        print(
+            f"{name[:47]:<48}{len(durations):>7}{_percentile(durations, 0.5):>10.1f}"
+            f"{_percentile(durations, 0.95):>10.1f}{max(durations):>10.1f}"
+        )
+
+    selected = [(root, children) for root, children in traces if args.root in root["name"]]
+    if not selected:
+        print(f"\nНет корней, содержащих {args.root!r}.")
+        return 1
+
+    totals = defaultdict(float)
+    for root, children in selected:
+        _self_times(root, children, totals)
+    root_total = sum(root["ms"] for root, _ in selected) or 1.0
+    title = f"корни с {args.root!r}" if args.root else "все корни"
+    print(f"\nСобственное время спанов, {title} ({len(selected)} трасс):")
+    for name, total in sorted(totals.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"  {total / root_total:6.1%}  {total / len(selected):9.1f} мс/трассу  {name}")
+
+    print(f"\nСамые медленные ({min(args.slowest, len(selected))}):")
+    for root, children in sorted(selected, key=lambda item: -item[0]["ms"])[:args.slowest]:
+        print(f"trace {root['trace']}")
+        _print_tree(root, children)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())